@@ -11,6 +11,10 @@ import patch_asyncio
 import asyncio
 from pyrogram import Client, __version__, idle
 from pyrogram.raw.all import layer
+from core.utils import metrics, governor
+metrics.install()
+# After metrics, so time spent waiting for the governor is not counted as RPC time
+governor.install()
 from config import LOG_CHANNEL, ON_HEROKU, CLONE_MODE, PORT
 from Script import script 
 from datetime import date, datetime 
@@ -18,6 +22,11 @@ import pytz
 from aiohttp import web
 from plugins.clone import restart_bots
 from core.bot import StreamBot
+from core.bot.identity import register_bot
+from core.utils.jobs import JOBS
+from core.utils.verification import VERIFICATION
+from core.utils.blobs import BLOBS
+from plugins.dbusers import db
 from core.utils.keepalive import ping_server
 from core.bot.clients import initialize_clients
 
@@ -30,6 +39,10 @@ async def health_check(_):
     """Minimal health check endpoint for port binding"""
     return web.json_response({"status": "running"})
 
+async def metrics_handler(_):
+    """Prometheus scrape endpoint"""
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
 ppath = "plugins/*.py"
 files = glob.glob(ppath)
 StreamBot.start()
@@ -38,7 +51,7 @@ loop = asyncio.get_event_loop()
 async def start():
     print('\n')
     print('Initializing Bot')
-    bot_info = await StreamBot.get_me()
+    bot_info = register_bot(StreamBot, StreamBot.me or await StreamBot.get_me())
     StreamBot.username = bot_info.username
     await initialize_clients()
     for name in files:
@@ -54,7 +67,10 @@ async def start():
             print("Imported => " + plugin_name)
     if ON_HEROKU:
         asyncio.create_task(ping_server())
-    me = await StreamBot.get_me()
+    asyncio.create_task(metrics.sample_loop_lag())
+    await JOBS.start(db.db.jobs)
+    await VERIFICATION.start(db.db.verification)
+    await BLOBS.start(db.db.blobs, StreamBot)
     tz = pytz.timezone('Asia/Kolkata')
     today = date.today()
     now = datetime.now(tz)
@@ -64,6 +80,7 @@ async def start():
     # Minimal HTTP server for port binding (Render requirement)
     app = web.Application()
     app.router.add_get("/", health_check)
+    app.router.add_get("/metrics", metrics_handler)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", PORT)
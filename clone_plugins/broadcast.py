@@ -3,6 +3,7 @@ from pyrogram.errors import InputUserDeactivated, UserNotParticipant, FloodWait,
 from plugins.dbusers import db
 from pyrogram import Client, filters
 from config import ADMINS
+from core.utils.progress import ProgressReporter
 import asyncio
 import datetime
 import time
@@ -31,6 +32,7 @@ async def verupikkals(bot, message):
     users = await db.get_all_users()
     b_msg = message.reply_to_message
     sts = await message.reply_text(text='**Broadcasting your messages...**')
+    progress = ProgressReporter.for_message(sts)
     start_time = time.time()
     total_users = await db.total_users_count()
     done = 0
@@ -52,21 +54,12 @@ async def verupikkals(bot, message):
                 elif sh == "Error":
                     failed += 1
             done += 1
-            if not done % 20:
-                try:
-                    await sts.edit(f"Broadcast in progress:\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
-                except:
-                    pass
         else:
             # Handle the case where 'id' key is missing in the user dictionary
             done += 1
             failed += 1
-            if not done % 20:
-                try:
-                    await sts.edit(f"Broadcast in progress:\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
-                except:
-                    pass
+        await progress.update(f"Broadcast in progress:\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
     
     time_taken = datetime.timedelta(seconds=int(time.time()-start_time))
-    await sts.edit(f"Broadcast Completed:\nCompleted in {time_taken} seconds.\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
+    await progress.flush(f"Broadcast Completed:\nCompleted in {time_taken} seconds.\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
 
@@ -9,7 +9,7 @@ from plugins.dbusers import db
 from pyrogram import Client, filters, enums
 from pyrogram.errors import ChatAdminRequired, FloodWait
 from pyrogram.types import *
-from utils import verify_user, check_token, check_verification, get_token
+from utils import verify_user, check_token, check_verification, get_token, read_json
 from config import *
 import re
 import json
@@ -17,9 +17,14 @@ import base64
 from urllib.parse import quote_plus
 from core.utils.file_properties import get_name, get_hash, get_media_file_size
 from pyrogram.errors import PeerIdInvalid, ChannelInvalid, ChatIdInvalid
+from core.utils.router import CallbackRouter
+from core.utils.menus import MenuCache
+from core.bot.identity import bot_identity
+from core.utils.state import STATE
+from core.utils.offload import offload
 logger = logging.getLogger(__name__)
 
-BATCH_FILES = {}
+BATCH_FILES = STATE.namespace("clone_batch_files", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
 BATCH_STOP_FLAGS = {}  # Track which batches should stop: {user_id: True/False}
 
 def get_size(size):
@@ -58,23 +63,21 @@ async def get_forum_topics(client, chat_id):
         logger.error(f"Error fetching forum topics: {e}")
         return []
 
-async def build_settings_ui(destinations, delivery_mode):
-    """Build consistent Settings UI buttons and text"""
+MENUS = MenuCache()  # Keyboards cached per bot identity
+
+def _settings_menu(destinations_count, delivery_mode, clone_mode):
     from config import MAX_DESTINATIONS
     
     buttons = []
     
     # Clone status
-    clone_status = "✅ Enabled" if CLONE_MODE else "❌ Disabled"
+    clone_status = "✅ Enabled" if clone_mode else "❌ Disabled"
     
     # Add Destination button
     buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
     
     # Destinations button
-    if destinations:
-        buttons.append([InlineKeyboardButton(f'📋 Destinations ({len(destinations)}/{MAX_DESTINATIONS})', callback_data='view_destinations')])
-    else:
-        buttons.append([InlineKeyboardButton(f'📋 Destinations (0/{MAX_DESTINATIONS})', callback_data='view_destinations')])
+    buttons.append([InlineKeyboardButton(f'📋 Destinations ({destinations_count}/{MAX_DESTINATIONS})', callback_data='view_destinations')])
     
     # Delivery mode button
     buttons.append([InlineKeyboardButton(f'📨 Mode: {delivery_mode.upper()}', callback_data='delivery_mode')])
@@ -85,14 +88,19 @@ async def build_settings_ui(destinations, delivery_mode):
     # Back button
     buttons.append([InlineKeyboardButton('🏠 Back', callback_data='start')])
     
-    text = f"<b>⚙️ Settings\n\n📤 Destinations: {len(destinations)}/{MAX_DESTINATIONS}\n📨 Delivery Mode: {delivery_mode.upper()}\n🤖 Clone Mode: {clone_status}</b>"
+    text = f"<b>⚙️ Settings\n\n📤 Destinations: {destinations_count}/{MAX_DESTINATIONS}\n📨 Delivery Mode: {delivery_mode.upper()}\n🤖 Clone Mode: {clone_status}</b>"
     
     return buttons, text
 
+async def build_settings_ui(client, destinations, delivery_mode):
+    """Build consistent Settings UI buttons and text"""
+    return MENUS.static(client, "settings", _settings_menu, len(destinations), delivery_mode, bool(CLONE_MODE))
+
 @Client.on_message(filters.command("start") & filters.incoming)
 async def start(client, message):
     try:
-        username = client.me.username
+        me = await bot_identity(client)
+        username = me.username
         if not await db.is_user_exist(message.from_user.id):
             await db.add_user(message.from_user.id, message.from_user.first_name)
             try:
@@ -113,7 +121,6 @@ async def start(client, message):
             ]]
             
             reply_markup = InlineKeyboardMarkup(buttons)
-            me = client.me
             start_text = f"<b>Hello {message.from_user.mention}, My name {me.mention}\n\nI am a File Store Bot with clone features!</b>"
             
             try:
@@ -149,12 +156,12 @@ async def start(client, message):
                 text="<b>This link is for different user !!</b>",
                 protect_content=True,
             )
-        if await check_verification(client, userid):
+        if await check_verification(userid):
             return await message.reply_text(
                 text="<b>Already Verified !</b>",
                 protect_content=True,
             )
-        is_verify = await verify_user(client, userid, token)
+        is_verify = await verify_user(userid, token)
         if is_verify:
             return await message.reply_text(
                 text="<b>Successfully verified !</b>",
@@ -186,8 +193,7 @@ async def start(client, message):
                     # Download the JSON file
                     json_file = await client.download_media(batch_doc)
                     
-                    with open(json_file, 'r') as f:
-                        msgs = json.load(f)
+                    msgs = await offload(read_json, json_file)
                     
                     # Clean up
                     try:
@@ -344,8 +350,6 @@ async def start(client, message):
                         except Exception as e:
                             logger.error(f"Error copying message: {e}")
                             continue
-                    
-                    await asyncio.sleep(0.5)
                 except Exception as e:
                     logger.error(f"Error processing batch item: {e}")
                     continue
@@ -375,9 +379,9 @@ async def start(client, message):
         return
 
     pre, decode_file_id = ((base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))).decode("ascii")).split("_", 1)
-    if not await check_verification(client, message.from_user.id) and VERIFY_MODE == True:
+    if VERIFY_MODE == True and not await check_verification(message.from_user.id):
         btn = [[
-            InlineKeyboardButton("Verify", url=await get_token(client, message.from_user.id, f"https://telegram.me/{username}?start="))
+            InlineKeyboardButton("Verify", url=await get_token(message.from_user.id, f"https://telegram.me/{username}?start="))
         ],[
             InlineKeyboardButton("How To Open Link & Verify", url=VERIFY_TUTORIAL)
         ]]
@@ -576,673 +580,706 @@ async def handle_tme_link(client, message):
     except Exception as e:
         logger.error(f"Error in handle_tme_link: {e}")
 
-@Client.on_callback_query()
-async def callback(client, query):
-    try:
-        if query.data.startswith("stop_batch_"):
-            user_id = int(query.data.split("_")[2])
-            if query.from_user.id == user_id:
-                BATCH_STOP_FLAGS[user_id] = True
-                await query.answer("⏹️ Stopping batch...", show_alert=False)
-            else:
-                await query.answer("❌ This is not your batch!", show_alert=True)
-            return
-        
-        if query.data == "clone":
-            await query.answer()
-        elif query.data == "toggle_clone":
-            current = await get_clone_mode()
-            new_status = not current
-            await set_clone_mode(new_status)
-            text = "✅ Enabled" if new_status else "❌ Disabled"
-            buttons = [[InlineKeyboardButton(f"Clone: {text}", callback_data="toggle_clone")]]
-            await query.message.edit_text(f"<b>Clone Mode {text}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer(f"Clone {text}", show_alert=False)
-            return
-            
-        if query.data == "close_data":
-            await query.message.delete()
-            await query.answer()
-            return
+
+CALLBACKS = CallbackRouter("clone")
+
+
+@CALLBACKS.prefix("stop_batch_", int)
+async def cb_stop_batch(client, query, arg):
+    user_id = arg
+    if query.from_user.id == user_id:
+        BATCH_STOP_FLAGS[user_id] = True
+        await query.answer("⏹️ Stopping batch...", show_alert=False)
+    else:
+        await query.answer("❌ This is not your batch!", show_alert=True)
+
+
+@CALLBACKS.route("clone")
+async def cb_clone(client, query, arg):
+    await query.answer()
+
+
+@CALLBACKS.route("toggle_clone")
+async def cb_toggle_clone(client, query, arg):
+    current = await get_clone_mode()
+    new_status = not current
+    await set_clone_mode(new_status)
+    text = "✅ Enabled" if new_status else "❌ Disabled"
+    buttons = [[InlineKeyboardButton(f"Clone: {text}", callback_data="toggle_clone")]]
+    await query.message.edit_text(f"<b>Clone Mode {text}</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer(f"Clone {text}", show_alert=False)
+
+
+@CALLBACKS.route("close_data")
+async def cb_close_data(client, query, arg):
+    await query.message.delete()
+    await query.answer()
+
+
+@CALLBACKS.route("help")
+async def cb_help(client, query, arg):
+    buttons = [[InlineKeyboardButton('🔙 Back', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
+    await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+    await query.message.edit_text(text=script.HELP_TXT, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("about")
+async def cb_about(client, query, arg):
+    buttons = [[InlineKeyboardButton('🔙 Back', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
+    await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+    me2 = (await bot_identity(client)).mention
+    await query.message.edit_text(text=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("start")
+async def cb_start(client, query, arg):
+    buttons = [
+        [InlineKeyboardButton('💝 Help', callback_data='help')],
+        [InlineKeyboardButton('🔍 Support', url='https://t.me/premium'), InlineKeyboardButton('🤖 Updates', url='https://t.me/premium')],
+        [InlineKeyboardButton('😊 About', callback_data='about')],
+        [InlineKeyboardButton('⚙️ Settings', callback_data='settings')]
+    ]
+    await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+    me2 = (await bot_identity(client)).mention
+    await query.message.edit_text(text=script.START_TXT.format(query.from_user.mention, me2), reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("settings")
+async def cb_settings(client, query, arg):
+    destinations = await db.get_destinations(query.from_user.id)
+    delivery_mode = await db.get_delivery_mode(query.from_user.id)
+    buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+    await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("view_destinations")
+async def cb_view_destinations(client, query, arg):
+    destinations = await db.get_destinations(query.from_user.id)
+    buttons = []
+    text = "<b>📋 Your Destinations:\n\n</b>"
+    
+    if not destinations:
+        text += "No destinations added yet!"
+    else:
+        for i, dest in enumerate(destinations, 1):
+            try:
+                chat = await client.get_chat(dest['channel_id'])
+                dest_name = chat.title
+            except:
+                dest_name = f"Chat {dest['channel_id']}"
             
-        if query.data == "help":
-            buttons = [[InlineKeyboardButton('🔙 Back', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
-            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-            await query.message.edit_text(text=script.HELP_TXT, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+            # Show topic info if exists
+            topic_id = dest.get('topic_id')
+            topic_name = dest.get('topic_name')
+            topic_info = ""
+            if topic_id:
+                topic_info = f" → {topic_name}" if topic_name else f" → Topic {topic_id}"
             
-        elif query.data == "about":
-            buttons = [[InlineKeyboardButton('🔙 Back', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
-            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-            me2 = (await client.get_me()).mention
-            await query.message.edit_text(text=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+            # Show status
+            status = "✅" if dest.get('enabled', True) else "❌"
             
-        elif query.data == "start":
-            buttons = [
-                [InlineKeyboardButton('💝 Help', callback_data='help')],
-                [InlineKeyboardButton('🔍 Support', url='https://t.me/premium'), InlineKeyboardButton('🤖 Updates', url='https://t.me/premium')],
-                [InlineKeyboardButton('😊 About', callback_data='about')],
-                [InlineKeyboardButton('⚙️ Settings', callback_data='settings')]
-            ]
-            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-            me2 = (await client.get_me()).mention
-            await query.message.edit_text(text=script.START_TXT.format(query.from_user.mention, me2), reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+            # Show as clickable button to view details
+            text += f"{i}. {dest_name}{topic_info} {status}\n"
+            buttons.append([InlineKeyboardButton(f"📌 {dest_name}{topic_info}", callback_data=f"dest_detail_{dest['channel_id']}")])
+    
+    buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
+    buttons.append([InlineKeyboardButton('🔙 Back', callback_data='settings')])
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.prefix("dest_detail_", int)
+async def cb_dest_detail(client, query, arg):
+    channel_id = arg
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    # Find this destination
+    dest_info = None
+    for dest in destinations:
+        if dest['channel_id'] == channel_id:
+            dest_info = dest
+            break
+    
+    if not dest_info:
+        await query.answer("Destination not found!", show_alert=True)
+        return
+    
+    try:
+        chat = await client.get_chat(channel_id)
+        dest_name = chat.title
+    except:
+        dest_name = f"Chat {channel_id}"
+    
+    # Get current status
+    is_enabled = dest_info.get('enabled', True)
+    status_button = "Enabled✅" if is_enabled else "Disabled❌"
+    status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
+    
+    # Get topic info if exists (only for groups)
+    dest_type = dest_info.get('type', 'channel')
+    topic_text = ""
+    if dest_type == "group":
+        topic_id = dest_info.get('topic_id')
+        topic_name = dest_info.get('topic_name')
+        if topic_id:
+            topic_text = f"\n📌 Topic: {topic_name}" if topic_name else f"\n📌 Topic ID: {topic_id}"
+        else:
+            topic_text = "\n📌 Topic: General (All Topics)"
+    
+    text = f"<b>📌 Destination Details\n\n"
+    text += f"Channel: {dest_name}\n"
+    text += f"Status: {status_display}{topic_text}\n\n</b>"
+    
+    buttons = [
+        [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
+         InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")]
+    ]
+    
+    # Only show Edit Topic for groups
+    if dest_type == "group":
+        buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")])
+    
+    buttons.append([InlineKeyboardButton('🔙 Back', callback_data='view_destinations')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("add_destination")
+async def cb_add_destination(client, query, arg):
+    from config import MAX_DESTINATIONS
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    if len(destinations) >= MAX_DESTINATIONS:
+        await query.answer(f"❌ Maximum {MAX_DESTINATIONS} destinations reached!", show_alert=True)
+        return
+    
+    await query.message.reply_text(
+        "<b>➕ Add New Destination\n\n"
+        "Option 1: Forward a message from channel/group\n"
+        "Option 2: Send a group link like:\n"
+        "<code>https://t.me/c/3354769817/7/8</code>\n"
+        "Option 3: Send a channel ID like:\n"
+        "<code>-1001234567890</code>"
+    )
+    try:
+        user_input = await client.ask(query.message.chat.id, "<b>Forward message, send link, or send ID</b>", timeout=120)
         
-        elif query.data == "settings":
-            destinations = await db.get_destinations(query.from_user.id)
-            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-            buttons, text = await build_settings_ui(destinations, delivery_mode)
-            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+        chat_id = None
+        chat_title = None
+        is_group = False
+        topic_id = None
+        dest_type = "channel"
         
-        elif query.data == "view_destinations":
-            destinations = await db.get_destinations(query.from_user.id)
-            buttons = []
-            text = "<b>📋 Your Destinations:\n\n</b>"
+        # Check forwarded message FIRST
+        if user_input.forward_from_chat:
+            chat_id = user_input.forward_from_chat.id
+            chat_title = user_input.forward_from_chat.title
+            chat_type = user_input.forward_from_chat.type
+            is_group = chat_type in ("group", "supergroup")
             
-            if not destinations:
-                text += "No destinations added yet!"
+            if is_group and user_input.message_thread_id:
+                topic_id = user_input.message_thread_id
+                dest_type = "group"
             else:
-                for i, dest in enumerate(destinations, 1):
-                    try:
-                        chat = await client.get_chat(dest['channel_id'])
-                        dest_name = chat.title
-                    except:
-                        dest_name = f"Chat {dest['channel_id']}"
-                    
-                    # Show topic info if exists
-                    topic_id = dest.get('topic_id')
-                    topic_name = dest.get('topic_name')
-                    topic_info = ""
-                    if topic_id:
-                        topic_info = f" → {topic_name}" if topic_name else f" → Topic {topic_id}"
-                    
-                    # Show status
-                    status = "✅" if dest.get('enabled', True) else "❌"
-                    
-                    # Show as clickable button to view details
-                    text += f"{i}. {dest_name}{topic_info} {status}\n"
-                    buttons.append([InlineKeyboardButton(f"📌 {dest_name}{topic_info}", callback_data=f"dest_detail_{dest['channel_id']}")])
-            
-            buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
-            buttons.append([InlineKeyboardButton('🔙 Back', callback_data='settings')])
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+                dest_type = "group" if is_group else "channel"
         
-        elif query.data.startswith("dest_detail_"):
-            channel_id = int(query.data.split("_")[2])
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            # Find this destination
-            dest_info = None
-            for dest in destinations:
-                if dest['channel_id'] == channel_id:
-                    dest_info = dest
-                    break
-            
-            if not dest_info:
-                await query.answer("Destination not found!", show_alert=True)
-                return
-            
+        # Check for direct ID (like -1001234567890)
+        elif user_input.text and user_input.text.strip().startswith("-100"):
             try:
-                chat = await client.get_chat(channel_id)
-                dest_name = chat.title
-            except:
-                dest_name = f"Chat {channel_id}"
-            
-            # Get current status
-            is_enabled = dest_info.get('enabled', True)
-            status_button = "Enabled✅" if is_enabled else "Disabled❌"
-            status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-            
-            # Get topic info if exists (only for groups)
-            dest_type = dest_info.get('type', 'channel')
-            topic_text = ""
-            if dest_type == "group":
-                topic_id = dest_info.get('topic_id')
-                topic_name = dest_info.get('topic_name')
-                if topic_id:
-                    topic_text = f"\n📌 Topic: {topic_name}" if topic_name else f"\n📌 Topic ID: {topic_id}"
-                else:
-                    topic_text = "\n📌 Topic: General (All Topics)"
-            
-            text = f"<b>📌 Destination Details\n\n"
-            text += f"Channel: {dest_name}\n"
-            text += f"Status: {status_display}{topic_text}\n\n</b>"
-            
-            buttons = [
-                [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
-                 InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")]
-            ]
-            
-            # Only show Edit Topic for groups
-            if dest_type == "group":
-                buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")])
-            
-            buttons.append([InlineKeyboardButton('🔙 Back', callback_data='view_destinations')])
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+                chat_id = int(user_input.text.strip())
+                dest_type = "channel"
+                is_group = False
+            except ValueError:
+                await query.message.reply_text("<b>❌ Invalid channel ID format!</b>")
+                await user_input.delete()
+                destinations = await db.get_destinations(query.from_user.id)
+                delivery_mode = await db.get_delivery_mode(query.from_user.id)
+                buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+                await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+                return
         
-        elif query.data == "add_destination":
-            from config import MAX_DESTINATIONS
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            if len(destinations) >= MAX_DESTINATIONS:
-                await query.answer(f"❌ Maximum {MAX_DESTINATIONS} destinations reached!", show_alert=True)
+        # Then check for link
+        elif user_input.text and "t.me" in user_input.text:
+            link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', user_input.text)
+            if link_parts:
+                extracted_chat_id = link_parts[0][0]
+                extracted_topic_id = link_parts[0][1] if link_parts[0][1] else None
+                chat_id = int(f"-100{extracted_chat_id}")
+                topic_id = int(extracted_topic_id) if extracted_topic_id else None
+                dest_type = "group"
+                is_group = True
+            else:
+                await query.message.reply_text("<b>❌ Invalid link format!</b>")
+                await user_input.delete()
+                destinations = await db.get_destinations(query.from_user.id)
+                delivery_mode = await db.get_delivery_mode(query.from_user.id)
+                buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+                await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
                 return
-            
-            await query.message.reply_text(
-                "<b>➕ Add New Destination\n\n"
-                "Option 1: Forward a message from channel/group\n"
-                "Option 2: Send a group link like:\n"
-                "<code>https://t.me/c/3354769817/7/8</code>\n"
-                "Option 3: Send a channel ID like:\n"
-                "<code>-1001234567890</code>"
-            )
+        else:
+            await query.message.reply_text("<b>❌ Please forward a message, send a link, or send a channel ID!</b>")
+            await user_input.delete()
+            destinations = await db.get_destinations(query.from_user.id)
+            delivery_mode = await db.get_delivery_mode(query.from_user.id)
+            buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+            return
+        
+        if chat_id:
             try:
-                user_input = await client.ask(query.message.chat.id, "<b>Forward message, send link, or send ID</b>", timeout=120)
-                
-                chat_id = None
-                chat_title = None
-                is_group = False
-                topic_id = None
-                dest_type = "channel"
-                
-                # Check forwarded message FIRST
-                if user_input.forward_from_chat:
-                    chat_id = user_input.forward_from_chat.id
-                    chat_title = user_input.forward_from_chat.title
-                    chat_type = user_input.forward_from_chat.type
-                    is_group = chat_type in ("group", "supergroup")
+                member = await client.get_chat_member(chat_id, "me")
+                if member.privileges and (member.privileges.can_pin_messages or member.privileges.can_delete_messages):
+                    was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id)
+                    await user_input.delete()
                     
-                    if is_group and user_input.message_thread_id:
-                        topic_id = user_input.message_thread_id
-                        dest_type = "group"
-                    else:
-                        dest_type = "group" if is_group else "channel"
-                
-                # Check for direct ID (like -1001234567890)
-                elif user_input.text and user_input.text.strip().startswith("-100"):
-                    try:
-                        chat_id = int(user_input.text.strip())
-                        dest_type = "channel"
-                        is_group = False
-                    except ValueError:
-                        await query.message.reply_text("<b>❌ Invalid channel ID format!</b>")
-                        await user_input.delete()
-                        destinations = await db.get_destinations(query.from_user.id)
-                        delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                        buttons, text = await build_settings_ui(destinations, delivery_mode)
-                        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                        return
-                
-                # Then check for link
-                elif user_input.text and "t.me" in user_input.text:
-                    link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', user_input.text)
-                    if link_parts:
-                        extracted_chat_id = link_parts[0][0]
-                        extracted_topic_id = link_parts[0][1] if link_parts[0][1] else None
-                        chat_id = int(f"-100{extracted_chat_id}")
-                        topic_id = int(extracted_topic_id) if extracted_topic_id else None
-                        dest_type = "group"
-                        is_group = True
+                    if not chat_title:
+                        try:
+                            chat_obj = await client.get_chat(chat_id)
+                            chat_title = chat_obj.title
+                        except:
+                            chat_title = f"Chat {chat_id}"
+                    
+                    topic_text = f"\n📌 Topic: {topic_id}" if topic_id else ""
+                    
+                    if was_added:
+                        await query.message.reply_text(
+                            f"<b>✅ Added to destinations!\n\n"
+                            f"Type: {'Group' if is_group else 'Channel'}\n"
+                            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+                        )
                     else:
-                        await query.message.reply_text("<b>❌ Invalid link format!</b>")
-                        await user_input.delete()
-                        destinations = await db.get_destinations(query.from_user.id)
-                        delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                        buttons, text = await build_settings_ui(destinations, delivery_mode)
-                        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                        return
+                        await query.message.reply_text(
+                            f"<b>ℹ️ This destination is already saved!\n\n"
+                            f"Type: {'Group' if is_group else 'Channel'}\n"
+                            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+                        )
+                    destinations = await db.get_destinations(query.from_user.id)
+                    delivery_mode = await db.get_delivery_mode(query.from_user.id)
+                    buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+                    await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
                 else:
-                    await query.message.reply_text("<b>❌ Please forward a message, send a link, or send a channel ID!</b>")
-                    await user_input.delete()
+                    await query.message.reply_text("<b>❌ I'm not admin there!</b>")
                     destinations = await db.get_destinations(query.from_user.id)
                     delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                    buttons, text = await build_settings_ui(destinations, delivery_mode)
+                    buttons, text = await build_settings_ui(client, destinations, delivery_mode)
                     await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
                     await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                    return
-                
-                if chat_id:
-                    try:
-                        member = await client.get_chat_member(chat_id, "me")
-                        if member.privileges and (member.privileges.can_pin_messages or member.privileges.can_delete_messages):
-                            was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id)
-                            await user_input.delete()
-                            
-                            if not chat_title:
-                                try:
-                                    chat_obj = await client.get_chat(chat_id)
-                                    chat_title = chat_obj.title
-                                except:
-                                    chat_title = f"Chat {chat_id}"
-                            
-                            topic_text = f"\n📌 Topic: {topic_id}" if topic_id else ""
-                            
-                            if was_added:
-                                await query.message.reply_text(
-                                    f"<b>✅ Added to destinations!\n\n"
-                                    f"Type: {'Group' if is_group else 'Channel'}\n"
-                                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                                )
-                            else:
-                                await query.message.reply_text(
-                                    f"<b>ℹ️ This destination is already saved!\n\n"
-                                    f"Type: {'Group' if is_group else 'Channel'}\n"
-                                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                                )
-                            destinations = await db.get_destinations(query.from_user.id)
-                            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                            buttons, text = await build_settings_ui(destinations, delivery_mode)
-                            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                        else:
-                            await query.message.reply_text("<b>❌ I'm not admin there!</b>")
-                            destinations = await db.get_destinations(query.from_user.id)
-                            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                            buttons, text = await build_settings_ui(destinations, delivery_mode)
-                            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                    except Exception as e:
-                        logger.error(f"Admin check error: {e}")
-                        await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
-                        destinations = await db.get_destinations(query.from_user.id)
-                        delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                        buttons, text = await build_settings_ui(destinations, delivery_mode)
-                        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except asyncio.TimeoutError:
-                await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
-                destinations = await db.get_destinations(query.from_user.id)
-                delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                buttons, text = await build_settings_ui(destinations, delivery_mode)
-                await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
             except Exception as e:
-                logger.error(f"Add destination error: {e}")
+                logger.error(f"Admin check error: {e}")
                 await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
                 destinations = await db.get_destinations(query.from_user.id)
                 delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                buttons, text = await build_settings_ui(destinations, delivery_mode)
+                buttons, text = await build_settings_ui(client, destinations, delivery_mode)
                 await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
                 await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            return
+    except asyncio.TimeoutError:
+        await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
+        destinations = await db.get_destinations(query.from_user.id)
+        delivery_mode = await db.get_delivery_mode(query.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    except Exception as e:
+        logger.error(f"Add destination error: {e}")
+        await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
+        destinations = await db.get_destinations(query.from_user.id)
+        delivery_mode = await db.get_delivery_mode(query.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.prefix("select_topic_")
+async def cb_select_topic(client, query, arg):
+    # Handle topic selection: select_topic_chat_id_topic_id_topic_title
+    parts = query.data.split("_", 4)  # Split only into 5 parts max
+    chat_id = int(parts[2])
+    topic_id = int(parts[3]) if parts[3] != "0" else None
+    topic_name = parts[4].replace("_", " ") if len(parts) > 4 and parts[4] != "0" else None
+    
+    # Check if this is from add_destination or edit_topic
+    temp_key_add = f"topic_{query.from_user.id}"
+    temp_key_edit = f"edit_topic_{query.from_user.id}"
+    
+    if temp_key_add in BATCH_FILES:
+        # Adding new destination
+        temp_data = BATCH_FILES[temp_key_add]
+        dest_type = temp_data['dest_type']
+        chat_title = temp_data['chat_title']
+        is_group = temp_data['is_group']
         
-        elif query.data.startswith("select_topic_"):
-            # Handle topic selection: select_topic_chat_id_topic_id_topic_title
-            parts = query.data.split("_", 4)  # Split only into 5 parts max
-            chat_id = int(parts[2])
-            topic_id = int(parts[3]) if parts[3] != "0" else None
-            topic_name = parts[4].replace("_", " ") if len(parts) > 4 and parts[4] != "0" else None
-            
-            # Check if this is from add_destination or edit_topic
-            temp_key_add = f"topic_{query.from_user.id}"
-            temp_key_edit = f"edit_topic_{query.from_user.id}"
-            
-            if temp_key_add in BATCH_FILES:
-                # Adding new destination
-                temp_data = BATCH_FILES[temp_key_add]
-                dest_type = temp_data['dest_type']
-                chat_title = temp_data['chat_title']
-                is_group = temp_data['is_group']
-                
-                was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id, topic_name)
-                
-                topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
-                
-                if was_added:
-                    await query.message.edit_text(
-                        f"<b>✅ Added to destinations!\n\n"
-                        f"Type: {'Group' if is_group else 'Channel'}\n"
-                        f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                    )
-                else:
-                    await query.message.edit_text(
-                        f"<b>ℹ️ This destination is already saved!\n\n"
-                        f"Type: {'Group' if is_group else 'Channel'}\n"
-                        f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                    )
-                
-                del BATCH_FILES[temp_key_add]
-                destinations = await db.get_destinations(query.from_user.id)
-                delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                buttons, text = await build_settings_ui(destinations, delivery_mode)
-                
-                # Wait a moment then go back to settings
-                await asyncio.sleep(1.5)
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            
-            elif temp_key_edit in BATCH_FILES:
-                # Editing existing destination
-                temp_data = BATCH_FILES[temp_key_edit]
-                chat_title = temp_data['chat_title']
-                
-                await db.update_destination_topic(query.from_user.id, chat_id, topic_id, topic_name)
-                
-                topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
-                
-                await query.message.edit_text(
-                    f"<b>✅ Topic updated!\n\n"
-                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                )
-                
-                del BATCH_FILES[temp_key_edit]
-                
-                # Wait a moment then go back to destination detail
-                await asyncio.sleep(1.5)
-                destinations = await db.get_destinations(query.from_user.id)
-                for dest in destinations:
-                    if dest['channel_id'] == chat_id:
-                        dest_info = dest
-                        break
-                
-                try:
-                    chat = await client.get_chat(chat_id)
-                    dest_name = chat.title
-                except:
-                    dest_name = f"Chat {chat_id}"
-                
-                is_enabled = dest_info.get('enabled', True)
-                status_button = "Enabled✅" if is_enabled else "Disabled❌"
-                status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-                
-                new_topic_id = dest_info.get('topic_id')
-                new_topic_name = dest_info.get('topic_name')
-                new_dest_type = dest_info.get('type', 'channel')
-                topic_txt = ""
-                if new_dest_type == "group":
-                    if new_topic_id:
-                        topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
-                    else:
-                        topic_txt = "\n📌 Topic: General (All Topics)"
-                
-                text = f"<b>📌 Destination Details\n\n"
-                text += f"Channel: {dest_name}\n"
-                text += f"Status: {status_display}{topic_txt}\n\n</b>"
-                
-                buttons = [
-                    [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{chat_id}"), 
-                     InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{chat_id}")]
-                ]
-                
-                # Only show Edit Topic for groups
-                if new_dest_type == "group":
-                    buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{chat_id}")])
-                
-                buttons.append([InlineKeyboardButton('🔙 Back', callback_data='view_destinations')])
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            
-            await query.answer("✅ Topic updated!", show_alert=False)
-            return
+        was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id, topic_name)
         
-        elif query.data.startswith("edit_topic_"):
-            # Edit topic for existing destination
-            channel_id = int(query.data.split("_")[2])
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            dest_info = None
-            for dest in destinations:
-                if dest['channel_id'] == channel_id:
-                    dest_info = dest
-                    break
-            
-            if not dest_info:
-                await query.answer("Destination not found!", show_alert=True)
-                return
-            
-            try:
-                chat = await client.get_chat(channel_id)
-                chat_title = chat.title
-            except:
-                chat_title = f"Chat {channel_id}"
-            
-            # Ask user to enter topic ID manually or send a link
+        topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
+        
+        if was_added:
             await query.message.edit_text(
-                f"<b>📝 Edit Topic for {chat_title}\n\n"
-                f"Send a topic ID (number), or send a link like:\n"
-                f"<code>https://t.me/c/3354769817/2/52</code>\n\n"
-                f"Or send 0 for General (All Topics)</b>"
+                f"<b>✅ Added to destinations!\n\n"
+                f"Type: {'Group' if is_group else 'Channel'}\n"
+                f"Name: <code>{chat_title}</code>{topic_text}</b>"
+            )
+        else:
+            await query.message.edit_text(
+                f"<b>ℹ️ This destination is already saved!\n\n"
+                f"Type: {'Group' if is_group else 'Channel'}\n"
+                f"Name: <code>{chat_title}</code>{topic_text}</b>"
             )
-            
-            try:
-                topic_input = await client.ask(query.message.chat.id, "<b>Topic ID, link, or 0 for General:</b>", timeout=120)
-                entered_topic_id = None
-                entered_topic_name = None
-                
-                if topic_input.text.strip() == "0":
-                    entered_topic_id = None
-                    entered_topic_name = None
-                elif "t.me" in topic_input.text:
-                    # Parse t.me link: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID
-                    link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', topic_input.text)
-                    if link_parts and link_parts[0][1]:
-                        entered_topic_id = int(link_parts[0][1])
-                        entered_topic_name = f"Topic {entered_topic_id}"
-                    else:
-                        await query.message.reply_text("<b>❌ Invalid link format! Use: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID</b>")
-                        await topic_input.delete()
-                        return
-                else:
-                    try:
-                        entered_topic_id = int(topic_input.text.strip())
-                        entered_topic_name = f"Topic {entered_topic_id}"  # Default name since we can't fetch it
-                    except ValueError:
-                        await query.message.reply_text("<b>❌ Invalid input! Please send a number or a valid link.</b>")
-                        await topic_input.delete()
-                        return
-                
-                await db.update_destination_topic(query.from_user.id, channel_id, entered_topic_id, entered_topic_name)
-                await topic_input.delete()
-                
-                topic_text = f"\n📌 Topic: {entered_topic_name}" if entered_topic_id else "\n📌 Topic: General (All Topics)"
-                
-                await query.message.edit_text(
-                    f"<b>✅ Topic updated!\n\n"
-                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                )
-                
-                # Go back to destination detail
-                await asyncio.sleep(1.5)
-                destinations = await db.get_destinations(query.from_user.id)
-                for dest in destinations:
-                    if dest['channel_id'] == channel_id:
-                        dest_info = dest
-                        break
-                
-                try:
-                    chat = await client.get_chat(channel_id)
-                    dest_name = chat.title
-                except:
-                    dest_name = f"Chat {channel_id}"
-                
-                is_enabled = dest_info.get('enabled', True)
-                status_button = "Enabled✅" if is_enabled else "Disabled❌"
-                status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-                
-                new_topic_id = dest_info.get('topic_id')
-                new_topic_name = dest_info.get('topic_name')
-                topic_txt = ""
-                if new_topic_id:
-                    topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
-                else:
-                    topic_txt = "\n📌 Topic: General (All Topics)"
-                
-                text = f"<b>📌 Destination Details\n\n"
-                text += f"Channel: {dest_name}\n"
-                text += f"Status: {status_display}{topic_txt}\n\n</b>"
-                
-                buttons = [
-                    [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
-                     InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
-                    [InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")],
-                    [InlineKeyboardButton('🔙 Back', callback_data='view_destinations')]
-                ]
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except asyncio.TimeoutError:
-                await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
-            except Exception as e:
-                logger.error(f"Edit topic error: {e}")
-                await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
-            
-            return
         
-        elif query.data.startswith("remove_dest_"):
-            channel_id = int(query.data.split("_")[2])
-            await db.remove_destination(query.from_user.id, channel_id)
-            
-            # Go back to destinations list
-            destinations = await db.get_destinations(query.from_user.id)
-            buttons = []
-            text = "<b>📋 Your Destinations:\n\n</b>"
-            
-            if not destinations:
-                text += "No destinations added yet!"
+        BATCH_FILES.pop(temp_key_add, None)
+        destinations = await db.get_destinations(query.from_user.id)
+        delivery_mode = await db.get_delivery_mode(query.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+        
+        # Wait a moment then go back to settings
+        await asyncio.sleep(1.5)
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    
+    elif temp_key_edit in BATCH_FILES:
+        # Editing existing destination
+        temp_data = BATCH_FILES[temp_key_edit]
+        chat_title = temp_data['chat_title']
+        
+        await db.update_destination_topic(query.from_user.id, chat_id, topic_id, topic_name)
+        
+        topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
+        
+        await query.message.edit_text(
+            f"<b>✅ Topic updated!\n\n"
+            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+        )
+        
+        BATCH_FILES.pop(temp_key_edit, None)
+        
+        # Wait a moment then go back to destination detail
+        await asyncio.sleep(1.5)
+        destinations = await db.get_destinations(query.from_user.id)
+        for dest in destinations:
+            if dest['channel_id'] == chat_id:
+                dest_info = dest
+                break
+        
+        try:
+            chat = await client.get_chat(chat_id)
+            dest_name = chat.title
+        except:
+            dest_name = f"Chat {chat_id}"
+        
+        is_enabled = dest_info.get('enabled', True)
+        status_button = "Enabled✅" if is_enabled else "Disabled❌"
+        status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
+        
+        new_topic_id = dest_info.get('topic_id')
+        new_topic_name = dest_info.get('topic_name')
+        new_dest_type = dest_info.get('type', 'channel')
+        topic_txt = ""
+        if new_dest_type == "group":
+            if new_topic_id:
+                topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
             else:
-                for i, dest in enumerate(destinations, 1):
-                    try:
-                        chat = await client.get_chat(dest['channel_id'])
-                        dest_name = chat.title
-                    except:
-                        dest_name = f"Chat {dest['channel_id']}"
-                    
-                    text += f"{i}. {dest_name}\n"
-                    buttons.append([InlineKeyboardButton(f"📌 {dest_name}", callback_data=f"dest_detail_{dest['channel_id']}")])
-            
-            buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
-            buttons.append([InlineKeyboardButton('🔙 Back', callback_data='settings')])
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer("✅ Destination removed!", show_alert=False)
-            return
+                topic_txt = "\n📌 Topic: General (All Topics)"
         
-        elif query.data.startswith("toggle_dest_enable_"):
-            channel_id = int(query.data.split("_")[3])
-            await db.toggle_destination_status(query.from_user.id, channel_id)
-            
-            # Refresh the detail view
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            dest_info = None
-            for dest in destinations:
-                if dest['channel_id'] == channel_id:
-                    dest_info = dest
-                    break
-            
-            if not dest_info:
-                await query.answer("Destination not found!", show_alert=True)
+        text = f"<b>📌 Destination Details\n\n"
+        text += f"Channel: {dest_name}\n"
+        text += f"Status: {status_display}{topic_txt}\n\n</b>"
+        
+        buttons = [
+            [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{chat_id}"), 
+             InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{chat_id}")]
+        ]
+        
+        # Only show Edit Topic for groups
+        if new_dest_type == "group":
+            buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{chat_id}")])
+        
+        buttons.append([InlineKeyboardButton('🔙 Back', callback_data='view_destinations')])
+        
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    
+    await query.answer("✅ Topic updated!", show_alert=False)
+
+
+@CALLBACKS.prefix("edit_topic_", int)
+async def cb_edit_topic(client, query, arg):
+    # Edit topic for existing destination
+    channel_id = arg
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    dest_info = None
+    for dest in destinations:
+        if dest['channel_id'] == channel_id:
+            dest_info = dest
+            break
+    
+    if not dest_info:
+        await query.answer("Destination not found!", show_alert=True)
+        return
+    
+    try:
+        chat = await client.get_chat(channel_id)
+        chat_title = chat.title
+    except:
+        chat_title = f"Chat {channel_id}"
+    
+    # Ask user to enter topic ID manually or send a link
+    await query.message.edit_text(
+        f"<b>📝 Edit Topic for {chat_title}\n\n"
+        f"Send a topic ID (number), or send a link like:\n"
+        f"<code>https://t.me/c/3354769817/2/52</code>\n\n"
+        f"Or send 0 for General (All Topics)</b>"
+    )
+    
+    try:
+        topic_input = await client.ask(query.message.chat.id, "<b>Topic ID, link, or 0 for General:</b>", timeout=120)
+        entered_topic_id = None
+        entered_topic_name = None
+        
+        if topic_input.text.strip() == "0":
+            entered_topic_id = None
+            entered_topic_name = None
+        elif "t.me" in topic_input.text:
+            # Parse t.me link: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID
+            link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', topic_input.text)
+            if link_parts and link_parts[0][1]:
+                entered_topic_id = int(link_parts[0][1])
+                entered_topic_name = f"Topic {entered_topic_id}"
+            else:
+                await query.message.reply_text("<b>❌ Invalid link format! Use: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID</b>")
+                await topic_input.delete()
                 return
-            
+        else:
             try:
-                chat = await client.get_chat(channel_id)
-                dest_name = chat.title
-            except:
-                dest_name = f"Chat {channel_id}"
-            
-            is_enabled = dest_info.get('enabled', True)
-            status_button = "Enabled✅" if is_enabled else "Disabled❌"
-            status_msg = "Enabled ✅" if is_enabled else "Disabled ❌"
-            status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-            
-            # Get topic info for toggle view (only for groups)
-            toggle_type = dest_info.get('type', 'channel')
-            toggle_topic_txt = ""
-            if toggle_type == "group":
-                toggle_topic_id = dest_info.get('topic_id')
-                toggle_topic_name = dest_info.get('topic_name')
-                if toggle_topic_id:
-                    toggle_topic_txt = f"\n📌 Topic: {toggle_topic_name}" if toggle_topic_name else f"\n📌 Topic ID: {toggle_topic_id}"
-                else:
-                    toggle_topic_txt = "\n📌 Topic: General (All Topics)"
-            
-            text = f"<b>📌 Destination Details\n\n"
-            text += f"Channel: {dest_name}\n"
-            text += f"Status: {status_display}{toggle_topic_txt}\n\n</b>"
-            
-            buttons = [
-                [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
-                 InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
-                [InlineKeyboardButton('🔙 Back', callback_data='view_destinations')]
-            ]
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer(f"Status changed to {status_msg}!", show_alert=False)
-            return
+                entered_topic_id = int(topic_input.text.strip())
+                entered_topic_name = f"Topic {entered_topic_id}"  # Default name since we can't fetch it
+            except ValueError:
+                await query.message.reply_text("<b>❌ Invalid input! Please send a number or a valid link.</b>")
+                await topic_input.delete()
+                return
         
+        await db.update_destination_topic(query.from_user.id, channel_id, entered_topic_id, entered_topic_name)
+        await topic_input.delete()
         
+        topic_text = f"\n📌 Topic: {entered_topic_name}" if entered_topic_id else "\n📌 Topic: General (All Topics)"
         
-        elif query.data == "delivery_mode":
-            buttons = [
-                [InlineKeyboardButton('📨 PM Only', callback_data='mode_pm')],
-                [InlineKeyboardButton('📤 Channel Only', callback_data='mode_channel')],
-                [InlineKeyboardButton('📨📤 Both', callback_data='mode_both')],
-                [InlineKeyboardButton('🔙 Back', callback_data='settings')]
-            ]
-            await query.message.edit_text("<b>📨 Select Delivery Mode:</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+        await query.message.edit_text(
+            f"<b>✅ Topic updated!\n\n"
+            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+        )
         
-        elif query.data.startswith("mode_"):
-            mode = query.data.split("_")[1]
-            await db.set_delivery_mode(query.from_user.id, mode)
-            mode_text = {"pm": "PM Only", "channel": "Channel Only", "both": "Both"}
-            await query.message.edit_text(f"<b>✅ Delivery mode set to: {mode_text.get(mode)}</b>")
-            await query.answer()
-            return
+        # Go back to destination detail
+        await asyncio.sleep(1.5)
+        destinations = await db.get_destinations(query.from_user.id)
+        for dest in destinations:
+            if dest['channel_id'] == channel_id:
+                dest_info = dest
+                break
         
-        elif query.data.startswith("select_dest_"):
-            channel_id = int(query.data.split("_")[2])
-            selected = BATCH_FILES.get(query.from_user.id, {}).get('selected_dests', [])
-            
-            if channel_id in selected:
-                selected.remove(channel_id)
-            else:
-                selected.append(channel_id)
+        try:
+            chat = await client.get_chat(channel_id)
+            dest_name = chat.title
+        except:
+            dest_name = f"Chat {channel_id}"
+        
+        is_enabled = dest_info.get('enabled', True)
+        status_button = "Enabled✅" if is_enabled else "Disabled❌"
+        status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
+        
+        new_topic_id = dest_info.get('topic_id')
+        new_topic_name = dest_info.get('topic_name')
+        topic_txt = ""
+        if new_topic_id:
+            topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
+        else:
+            topic_txt = "\n📌 Topic: General (All Topics)"
+        
+        text = f"<b>📌 Destination Details\n\n"
+        text += f"Channel: {dest_name}\n"
+        text += f"Status: {status_display}{topic_txt}\n\n</b>"
+        
+        buttons = [
+            [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
+             InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
+            [InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")],
+            [InlineKeyboardButton('🔙 Back', callback_data='view_destinations')]
+        ]
+        
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    except asyncio.TimeoutError:
+        await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
+    except Exception as e:
+        logger.error(f"Edit topic error: {e}")
+        await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
+    
+
+
+@CALLBACKS.prefix("remove_dest_", int)
+async def cb_remove_dest(client, query, arg):
+    channel_id = arg
+    await db.remove_destination(query.from_user.id, channel_id)
+    
+    # Go back to destinations list
+    destinations = await db.get_destinations(query.from_user.id)
+    buttons = []
+    text = "<b>📋 Your Destinations:\n\n</b>"
+    
+    if not destinations:
+        text += "No destinations added yet!"
+    else:
+        for i, dest in enumerate(destinations, 1):
+            try:
+                chat = await client.get_chat(dest['channel_id'])
+                dest_name = chat.title
+            except:
+                dest_name = f"Chat {dest['channel_id']}"
             
-            # Update UI
-            await query.answer()
-            return
+            text += f"{i}. {dest_name}\n"
+            buttons.append([InlineKeyboardButton(f"📌 {dest_name}", callback_data=f"dest_detail_{dest['channel_id']}")])
+    
+    buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
+    buttons.append([InlineKeyboardButton('🔙 Back', callback_data='settings')])
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer("✅ Destination removed!", show_alert=False)
+
+
+@CALLBACKS.prefix("toggle_dest_enable_", int)
+async def cb_toggle_dest_enable(client, query, arg):
+    channel_id = arg
+    await db.toggle_destination_status(query.from_user.id, channel_id)
+    
+    # Refresh the detail view
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    dest_info = None
+    for dest in destinations:
+        if dest['channel_id'] == channel_id:
+            dest_info = dest
+            break
+    
+    if not dest_info:
+        await query.answer("Destination not found!", show_alert=True)
+        return
+    
+    try:
+        chat = await client.get_chat(channel_id)
+        dest_name = chat.title
+    except:
+        dest_name = f"Chat {channel_id}"
+    
+    is_enabled = dest_info.get('enabled', True)
+    status_button = "Enabled✅" if is_enabled else "Disabled❌"
+    status_msg = "Enabled ✅" if is_enabled else "Disabled ❌"
+    status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
+    
+    # Get topic info for toggle view (only for groups)
+    toggle_type = dest_info.get('type', 'channel')
+    toggle_topic_txt = ""
+    if toggle_type == "group":
+        toggle_topic_id = dest_info.get('topic_id')
+        toggle_topic_name = dest_info.get('topic_name')
+        if toggle_topic_id:
+            toggle_topic_txt = f"\n📌 Topic: {toggle_topic_name}" if toggle_topic_name else f"\n📌 Topic ID: {toggle_topic_id}"
+        else:
+            toggle_topic_txt = "\n📌 Topic: General (All Topics)"
+    
+    text = f"<b>📌 Destination Details\n\n"
+    text += f"Channel: {dest_name}\n"
+    text += f"Status: {status_display}{toggle_topic_txt}\n\n</b>"
+    
+    buttons = [
+        [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
+         InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
+        [InlineKeyboardButton('🔙 Back', callback_data='view_destinations')]
+    ]
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer(f"Status changed to {status_msg}!", show_alert=False)
+
+
+@CALLBACKS.route("delivery_mode")
+async def cb_delivery_mode(client, query, arg):
+    buttons = [
+        [InlineKeyboardButton('📨 PM Only', callback_data='mode_pm')],
+        [InlineKeyboardButton('📤 Channel Only', callback_data='mode_channel')],
+        [InlineKeyboardButton('📨📤 Both', callback_data='mode_both')],
+        [InlineKeyboardButton('🔙 Back', callback_data='settings')]
+    ]
+    await query.message.edit_text("<b>📨 Select Delivery Mode:</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.prefix("mode_")
+async def cb_mode(client, query, arg):
+    mode = query.data.split("_")[1]
+    await db.set_delivery_mode(query.from_user.id, mode)
+    mode_text = {"pm": "PM Only", "channel": "Channel Only", "both": "Both"}
+    await query.message.edit_text(f"<b>✅ Delivery mode set to: {mode_text.get(mode)}</b>")
+    await query.answer()
+
+
+@CALLBACKS.prefix("select_dest_", int)
+async def cb_select_dest(client, query, arg):
+    channel_id = arg
+    selected = BATCH_FILES.get(query.from_user.id, {}).get('selected_dests', [])
+    
+    if channel_id in selected:
+        selected.remove(channel_id)
+    else:
+        selected.append(channel_id)
+    
+    # Update UI
+    await query.answer()
+
+
+@CALLBACKS.route("send_to_pm")
+async def cb_send_to_pm(client, query, arg):
+    file_data = BATCH_FILES.get(query.from_user.id)
+    if file_data:
+        msg = file_data['msg']
+        caption = file_data['caption']
+        await msg.copy(chat_id=query.from_user.id, caption=caption, protect_content=False)
+        await query.message.delete()
+        BATCH_FILES.pop(query.from_user.id, None)
+        await query.answer("✅ Sent to PM!", show_alert=False)
+
+
+@CALLBACKS.route("send_selected")
+async def cb_send_selected(client, query, arg):
+    file_data = BATCH_FILES.get(query.from_user.id)
+    if file_data:
+        msg = file_data['msg']
+        selected_dests = file_data.get('selected_dests', [])
         
-        elif query.data == "send_to_pm":
-            file_data = BATCH_FILES.get(query.from_user.id)
-            if file_data:
-                msg = file_data['msg']
-                caption = file_data['caption']
-                await msg.copy(chat_id=query.from_user.id, caption=caption, protect_content=False)
-                await query.message.delete()
-                BATCH_FILES.pop(query.from_user.id, None)
-                await query.answer("✅ Sent to PM!", show_alert=False)
+        if not selected_dests:
+            await query.answer("❌ No destinations selected!", show_alert=True)
             return
         
-        elif query.data == "send_selected":
-            file_data = BATCH_FILES.get(query.from_user.id)
-            if file_data:
-                msg = file_data['msg']
-                selected_dests = file_data.get('selected_dests', [])
-                
-                if not selected_dests:
-                    await query.answer("❌ No destinations selected!", show_alert=True)
-                    return
-                
-                sts = await query.message.edit_text("🔄 Sending to destinations...")
-                success = 0
-                
-                for dest_id in selected_dests:
-                    try:
-                        await msg.copy(chat_id=dest_id, caption=None, protect_content=False)
-                        success += 1
-                    except Exception as e:
-                        logger.error(f"Error sending to destination: {e}")
-                
-                await sts.edit(f"✅ Sent to {success} destination(s)!")
-                BATCH_FILES.pop(query.from_user.id, None)
-            return
+        sts = await query.message.edit_text("🔄 Sending to destinations...")
+        success = 0
+        
+        for dest_id in selected_dests:
+            try:
+                await msg.copy(chat_id=dest_id, caption=None, protect_content=False)
+                success += 1
+            except Exception as e:
+                logger.error(f"Error sending to destination: {e}")
+        
+        await sts.edit(f"✅ Sent to {success} destination(s)!")
+        BATCH_FILES.pop(query.from_user.id, None)
+
+
+@Client.on_callback_query()
+async def callback(client, query):
+    try:
+        await CALLBACKS.dispatch(client, query)
     except Exception as e:
         logger.error(f"Callback error: {e}")
         try:
@@ -1,7 +1,9 @@
 
 import motor.motor_asyncio
 from config import DB_NAME, DB_URI
+from core.utils.metrics import DB_SECONDS, instrument_methods
 
+@instrument_methods(DB_SECONDS, prefix="clone.")
 class Database:
     
     def __init__(self, uri, database_name):
@@ -6,6 +6,8 @@ from config import ADMINS, LOG_CHANNEL, PUBLIC_FILE_STORE, WEBSITE_URL, WEBSITE_
 import os
 import json
 import base64
+from core.bot.identity import bot_username
+from core.utils.progress import ProgressReporter
 
 
 async def allowed(_, __, message):
@@ -18,7 +20,7 @@ async def allowed(_, __, message):
 
 @Client.on_message((filters.document | filters.video | filters.audio | filters.photo) & filters.private & filters.create(allowed))
 async def incoming_gen_link(bot, message):
-    username = (await bot.get_me()).username
+    username = await bot_username(bot)
     file_type = message.media
     post = await message.copy(LOG_CHANNEL)
     file_id = str(post.id)
@@ -35,7 +37,7 @@ async def incoming_gen_link(bot, message):
 @Client.on_message(filters.command(['link']) & filters.private)
 async def gen_link_s(bot, message):
     try:
-        username = (await bot.get_me()).username
+        username = await bot_username(bot)
         replied = message.reply_to_message
         if not replied:
             return await message.reply('Reply to a message to get a shareable link.')
@@ -60,7 +62,7 @@ async def gen_link_s(bot, message):
 
 @Client.on_message(filters.command(['batch']) & filters.create(allowed))
 async def gen_link_batch(bot, message):
-    username = (await bot.get_me()).username
+    username = await bot_username(bot)
     if " " not in message.text:
         return await message.reply("Use correct format.\nExample /batch https://t.me/premium/10 https://t.me/premium/20.")
     links = message.text.strip().split(" ")
@@ -122,15 +124,12 @@ async def gen_link_batch(bot, message):
 
 
     # file store without db channel
+    progress = ProgressReporter.for_message(sts)
     og_msg = 0
     tot = 0
     async for msg in bot.iter_messages(f_chat_id, l_msg_id, f_msg_id):
         tot += 1
-        if og_msg % 20 == 0:
-            try:
-                await sts.edit(FRMT.format(total=l_msg_id-f_msg_id, current=tot, rem=((l_msg_id-f_msg_id) - tot), sts="Saving Messages"))
-            except:
-                pass
+        await progress.update(FRMT.format(total=l_msg_id-f_msg_id, current=tot, rem=((l_msg_id-f_msg_id) - tot), sts="Saving Messages"))
         if msg.empty or msg.service:
             continue
         file = {
@@ -151,7 +150,7 @@ async def gen_link_batch(bot, message):
         share_link = f"{WEBSITE_URL}?file=BATCH-{file_id}"
     else:
         share_link = f"https://t.me/{username}?start=BATCH-{file_id}"
-    await sts.edit(f"<b>⭕ ʜᴇʀᴇ ɪs ʏᴏᴜʀ ʟɪɴᴋ:\n\nContains `{og_msg}` files.\n\n🔗 ʟɪɴᴋ :- {share_link}</b>")
+    await progress.flush(f"<b>⭕ ʜᴇʀᴇ ɪs ʏᴏᴜʀ ʟɪɴᴋ:\n\nContains `{og_msg}` files.\n\n🔗 ʟɪɴᴋ :- {share_link}</b>")
         
 
 
@@ -18,6 +18,8 @@ def is_enabled(value, default):
 API_ID = int(environ.get("API_ID", ""))
 API_HASH = environ.get("API_HASH", "")
 BOT_TOKEN = environ.get("BOT_TOKEN", "")
+LINK_SECRET = environ.get("LINK_SECRET", BOT_TOKEN) # Key used to sign shared links
+LEGACY_LINKS = is_enabled(environ.get("LEGACY_LINKS", "False"), False) # Also accept unsigned shared folder/file links made by older versions; anyone can forge those
 
 PICS = (environ.get('PICS', 'https://similar-amaranth-kjpniizohu-c1wb9jb4gd.edgeone.dev/IMG-20251129-WA0003.jpg')).split() # Bot Start Picture
 ADMINS = [int(admin) if id_pattern.search(admin) else admin for admin in environ.get('ADMINS', '').split()]
@@ -66,6 +68,35 @@ WEBSITE_URL = environ.get("WEBSITE_URL", "")
 
 # Destinations Configuration
 MAX_DESTINATIONS = int(environ.get("MAX_DESTINATIONS", "3"))  # Maximum destinations a user can add
+DEST_FAILURE_LIMIT = int(environ.get("DEST_FAILURE_LIMIT", "5"))  # Consecutive failures before a destination is disabled
+BULK_COPY_SIZE = min(int(environ.get("BULK_COPY_SIZE", "100")), 100)  # Messages per call when files go out without a new caption (1 = one by one)
+
+# Outbound Rate Limits (per bot token; FloodWait lowers them temporarily)
+OUTBOUND_GLOBAL_RATE = float(environ.get("OUTBOUND_GLOBAL_RATE", "25"))  # Messages per second across all chats
+OUTBOUND_CHAT_RATE = float(environ.get("OUTBOUND_CHAT_RATE", "1"))  # Messages per second to one private chat
+OUTBOUND_GROUP_RATE = float(environ.get("OUTBOUND_GROUP_RATE", "0.33"))  # Messages per second to one group or channel
+
+# Conversation State Configuration
+CONVERSATION_TTL = int(environ.get("CONVERSATION_TTL", "3600"))  # Seconds before an abandoned prompt or input mode is forgotten
+CONVERSATION_MAX_USERS = int(environ.get("CONVERSATION_MAX_USERS", "100000"))  # Entries kept per kind of conversation state
+FOLDER_ACCESS_TTL = int(environ.get("FOLDER_ACCESS_TTL", "43200"))  # Seconds a correct folder/file password stays unlocked
+
+# CPU Offload Configuration
+CPU_WORKERS = int(environ.get("CPU_WORKERS", "4"))  # Threads for password hashing and other CPU-heavy steps
+CPU_QUEUE_LIMIT = int(environ.get("CPU_QUEUE_LIMIT", "64"))  # CPU tasks admitted to the pool at once; others wait
+
+# Storage Deduplication Configuration
+BLOB_SWEEP_INTERVAL = int(environ.get("BLOB_SWEEP_INTERVAL", "3600"))  # Seconds between sweeps for LOG_CHANNEL copies no one stores any more
+BLOB_GRACE_SECONDS = int(environ.get("BLOB_GRACE_SECONDS", "86400"))  # An unreferenced copy is kept this long before it is deleted
+
+# Upload Batching Configuration
+UPLOAD_BATCH_WINDOW = float(environ.get("UPLOAD_BATCH_WINDOW", "1.5"))  # Seconds of quiet after which a user's burst of uploads is saved together
+UPLOAD_BATCH_MAX_WAIT = float(environ.get("UPLOAD_BATCH_MAX_WAIT", "10"))  # A burst is saved at the latest this long after its first file
+
+# Background Jobs Configuration
+JOB_WORKERS = int(environ.get("JOB_WORKERS", "4"))  # Batch, Get All, category and broadcast jobs running at once
+JOB_USER_LIMIT = int(environ.get("JOB_USER_LIMIT", "1"))  # Jobs a single user can have running at once
+JOB_LEASE_SECONDS = int(environ.get("JOB_LEASE_SECONDS", "60"))  # A running job is taken over if not renewed within this time
 
 # File Stream Config
 MULTI_CLIENT = False
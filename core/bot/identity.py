@@ -0,0 +1,43 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bot users and started clients keyed by client session name (StreamBot is "filebot", clones use their token)
+BOT_IDENTITIES = {}
+BOT_CLIENTS = {}
+
+
+def register_bot(client, me):
+    """Remember who a started client is, so handlers never need get_me()"""
+    BOT_IDENTITIES[client.name] = me
+    BOT_CLIENTS[client.name] = client
+    client.me = me
+    return me
+
+
+def unregister_bot(client):
+    BOT_IDENTITIES.pop(client.name, None)
+    BOT_CLIENTS.pop(client.name, None)
+
+
+def client_for(name):
+    """Started client registered under a session name, or None"""
+    return BOT_CLIENTS.get(name)
+
+
+def cached_identity(client):
+    """Registered identity for client, or None if it was never registered"""
+    return BOT_IDENTITIES.get(client.name) or getattr(client, 'me', None)
+
+
+async def bot_identity(client):
+    """Identity of client; falls back to one get_me() for unregistered clients"""
+    me = cached_identity(client)
+    if me is None:
+        logger.warning("Bot identity was not registered at start, fetching it once")
+        me = register_bot(client, await client.get_me())
+    return me
+
+
+async def bot_username(client):
+    return (await bot_identity(client)).username
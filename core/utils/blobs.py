@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import logging
+import datetime
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from config import LOG_CHANNEL, BLOB_SWEEP_INTERVAL, BLOB_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH = 100  # messages.deleteMessages takes at most 100 ids
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def blob_key(message):
+    """file_unique_id of a message's media plus a hash of its caption, or None
+
+    Copies keep the caption, so the same file with another caption is a
+    different blob; otherwise one user's caption would reach another.
+    """
+    if not message or not message.media:
+        return None
+    unique_id = getattr(getattr(message, message.media.value, None), 'file_unique_id', None)
+    if not unique_id:
+        return None
+    caption = message.caption or ''
+    caption = getattr(caption, 'html', caption)
+    return f"{unique_id}:{hashlib.blake2b(caption.encode('utf-8'), digest_size=8).hexdigest()}"
+
+
+class BlobStore:
+    """Content-addressed index of the files copied to LOG_CHANNEL.
+
+    One Mongo document per blob_key (file and caption) holds the
+    LOG_CHANNEL message that has the file and refs, the number of users
+    whose stored_files point at that message. Storing a file that is already there reuses the
+    message instead of copying it again. Messages handed out as share
+    links are pinned and never removed. A message whose refs dropped to
+    zero is deleted by the sweeper once it has been unused for
+    BLOB_GRACE_SECONDS. Files stored before this index existed have no
+    document, so they are never swept.
+    """
+
+    def __init__(self):
+        self.col = None
+        self.client = None
+
+    async def start(self, collection, client):
+        self.col = collection
+        self.client = client
+        await self.col.create_index('msg_id')
+        await self.col.create_index([('refs', 1), ('touched_at', 1)])
+        asyncio.create_task(self._sweep_loop())
+
+    async def store(self, message, copy, pin=False):
+        """LOG_CHANNEL message id holding message's media, calling copy() only if no copy exists yet"""
+        key = blob_key(message) if self.col is not None else None
+        if key is None:
+            return (await copy()).id
+
+        update = {'$set': {'touched_at': _utcnow()}}
+        if pin:
+            update['$set']['pinned'] = True
+        doc = await self.col.find_one_and_update({'_id': key}, update, projection={'msg_id': 1})
+        if doc:
+            return doc['msg_id']
+
+        post = await copy()
+        try:
+            await self.col.insert_one({
+                '_id': key, 'msg_id': post.id, 'refs': 0,
+                'pinned': pin, 'touched_at': _utcnow()
+            })
+            return post.id
+        except DuplicateKeyError:
+            # Someone stored the same file meanwhile; keep theirs and drop this copy
+            doc = await self.col.find_one_and_update({'_id': key}, update, projection={'msg_id': 1})
+            if not doc:
+                return post.id
+            try:
+                await self.client.delete_messages(LOG_CHANNEL, post.id)
+            except Exception as e:
+                logger.warning(f"Could not delete duplicate copy {post.id}: {e}")
+            return doc['msg_id']
+
+    async def store_many(self, messages, copy, pin=False):
+        """store() for a batch: LOG_CHANNEL message ids aligned with messages (None where copying failed)
+
+        Known files are looked up with one query, and copy(fresh) is called
+        once with the messages that still need copying and returns their new
+        ids in order. A file that appears twice in the batch is copied once.
+        """
+        keys = [blob_key(m) if self.col is not None else None for m in messages]
+        unique = list({k for k in keys if k})
+        known = {}
+        if unique:
+            update = {'$set': {'touched_at': _utcnow()}}
+            if pin:
+                update['$set']['pinned'] = True
+            # Touching first keeps the sweeper away from what is about to be reused
+            await self.col.update_many({'_id': {'$in': unique}}, update)
+            async for doc in self.col.find({'_id': {'$in': unique}}, {'msg_id': 1}):
+                known[doc['_id']] = doc['msg_id']
+
+        fresh, queued = [], set()
+        for message, key in zip(messages, keys):
+            if key is None or (key not in known and key not in queued):
+                fresh.append(message)
+                if key:
+                    queued.add(key)
+        copied = dict(zip((m.id for m in fresh), await copy(fresh))) if fresh else {}
+
+        new_docs = []
+        for message in fresh:
+            key = blob_key(message) if self.col is not None else None
+            if key and copied.get(message.id):
+                known[key] = copied[message.id]
+                new_docs.append({'_id': key, 'msg_id': copied[message.id], 'refs': 0,
+                                 'pinned': pin, 'touched_at': _utcnow()})
+        if new_docs:
+            try:
+                await self.col.insert_many(new_docs, ordered=False)
+            except BulkWriteError as e:
+                await self._settle_duplicates(new_docs, e, known, pin)
+
+        return [known.get(key) if key else copied.get(message.id)
+                for message, key in zip(messages, keys)]
+
+    async def _settle_duplicates(self, new_docs, error, known, pin):
+        """Point ids that lost an insert race at the winner's message and delete our copies"""
+        losers = [new_docs[w['index']] for w in error.details.get('writeErrors', []) if w.get('code') == 11000]
+        update = {'$set': {'touched_at': _utcnow()}}
+        if pin:
+            update['$set']['pinned'] = True
+        duplicates = []
+        for doc in losers:
+            winner = await self.col.find_one_and_update({'_id': doc['_id']}, update, projection={'msg_id': 1})
+            if winner:
+                known[doc['_id']] = winner['msg_id']
+                duplicates.append(doc['msg_id'])
+        if duplicates:
+            try:
+                await self.client.delete_messages(LOG_CHANNEL, duplicates)
+            except Exception as e:
+                logger.warning(f"Could not delete {len(duplicates)} duplicate copies: {e}")
+
+    async def acquire(self, msg_ids):
+        """One more user references each of msg_ids"""
+        msg_ids = [int(i) for i in msg_ids if str(i).isdigit()]
+        if self.col is None or not msg_ids:
+            return
+        await self.col.update_many({'msg_id': {'$in': msg_ids}}, {'$inc': {'refs': 1}})
+
+    async def release(self, msg_ids):
+        """One user fewer references each of msg_ids"""
+        msg_ids = [int(i) for i in msg_ids if str(i).isdigit()]
+        if self.col is None or not msg_ids:
+            return
+        await self.col.update_many(
+            {'msg_id': {'$in': msg_ids}},
+            {'$inc': {'refs': -1}, '$set': {'touched_at': _utcnow()}}
+        )
+
+    async def sweep(self):
+        """Delete unreferenced, unpinned messages that outlived the grace period; returns how many"""
+        cutoff = _utcnow() - datetime.timedelta(seconds=BLOB_GRACE_SECONDS)
+        orphan = {'refs': {'$lte': 0}, 'pinned': {'$ne': True}, 'touched_at': {'$lt': cutoff}}
+        removed = 0
+        while True:
+            candidates = await self.col.find(orphan, {'_id': 1}).limit(SWEEP_BATCH).to_list(length=SWEEP_BATCH)
+            if not candidates:
+                return removed
+            # Claim each one atomically, so a file stored again meanwhile is left alone
+            claimed = []
+            for doc in candidates:
+                gone = await self.col.find_one_and_delete(dict(orphan, _id=doc['_id']), projection={'msg_id': 1})
+                if gone:
+                    claimed.append(gone['msg_id'])
+            if claimed:
+                try:
+                    await self.client.delete_messages(LOG_CHANNEL, claimed)
+                except Exception as e:
+                    logger.error(f"Orphan sweep could not delete {len(claimed)} messages: {e}")
+                removed += len(claimed)
+            if len(candidates) < SWEEP_BATCH:
+                return removed
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(BLOB_SWEEP_INTERVAL)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"Orphan sweep removed {removed} LOG_CHANNEL messages")
+            except Exception as e:
+                logger.error(f"Orphan sweep error: {e}")
+
+
+BLOBS = BlobStore()
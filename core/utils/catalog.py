@@ -0,0 +1,224 @@
+import sys
+import datetime
+from array import array
+from collections import OrderedDict
+from itertools import compress, repeat
+from operator import eq
+
+EPOCH = datetime.datetime(1970, 1, 1)
+NO_TIME = -(2 ** 63)  # created_at missing
+NO_FOLDER = -1
+NO_ID = -1  # file_id that isn't a LOG_CHANNEL message id, kept in extras instead
+COLUMNS = ('file_id', 'folder', 'created_at', 'file_name', 'file_type', 'protected')
+
+
+def _micros(value):
+    if not isinstance(value, datetime.datetime):
+        return NO_TIME
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class FileCatalog:
+    """Column-oriented copy of one user's stored_files.
+
+    Each field lives in its own compact array - message ids and timestamps
+    as int64, folders as indexes into a folder table, types as one byte -
+    and names are interned, so a file costs a few dozen bytes instead of a
+    decoded dict. Filters walk a column with C-level iterators and return
+    positions; only the rows a caller asks for are turned back into dicts.
+    Fields other than the usual ones (passwords, access tokens) are rare
+    and kept per position in a side dict.
+    """
+
+    def __init__(self, files):
+        self.file_ids = array('q')
+        self.folders = array('l')
+        self.created = array('q')
+        self.types = bytearray()
+        self.flags = bytearray()  # 1 = protected
+        self.names = []
+        self.extras = {}
+        self._folder_table = []
+        self._folder_codes = {}
+        self._type_table = []
+        self._type_codes = {}
+        for f in files:
+            self._append(f)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _code(value, table, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def _append(self, f):
+        idx = len(self.names)
+        file_id = str(f.get('file_id'))
+        self.file_ids.append(int(file_id) if file_id.isdigit() else NO_ID)
+        folder = f.get('folder')
+        self.folders.append(NO_FOLDER if folder is None else self._code(folder, self._folder_table, self._folder_codes))
+        self.created.append(_micros(f.get('created_at')))
+        self.types.append(self._code(f.get('file_type') or 'document', self._type_table, self._type_codes))
+        self.flags.append(1 if f.get('protected') else 0)
+        self.names.append(sys.intern(f.get('file_name') or ''))
+        extra = {k: v for k, v in f.items() if k not in COLUMNS}
+        if not file_id.isdigit():
+            extra['file_id'] = f.get('file_id')
+        if extra:
+            self.extras[idx] = extra
+
+    def row(self, idx):
+        """stored_files[idx] as the dict MongoDB would return"""
+        folder = self.folders[idx]
+        created = self.created[idx]
+        f = {
+            'file_id': str(self.file_ids[idx]),
+            'folder': None if folder == NO_FOLDER else self._folder_table[folder],
+            'created_at': None if created == NO_TIME else EPOCH + datetime.timedelta(microseconds=created),
+            'file_name': self.names[idx],
+            'file_type': self._type_table[self.types[idx]],
+            'protected': bool(self.flags[idx] & 1),
+        }
+        extra = self.extras.get(idx)
+        if extra:
+            f.update(extra)
+        return f
+
+    def rows(self, indexes):
+        return [self.row(i) for i in indexes]
+
+    def _where(self, column, code):
+        return list(compress(range(len(column)), map(eq, column, repeat(code))))
+
+    def in_folder(self, folder):
+        """Positions of files directly in folder (None = no folder)"""
+        if folder is None:
+            return self._where(self.folders, NO_FOLDER)
+        code = self._folder_codes.get(folder)
+        return [] if code is None else self._where(self.folders, code)
+
+    def in_tree(self, folder_path):
+        """Positions of files in folder_path or any of its subfolders"""
+        prefix = f"{folder_path}/"
+        codes = {code for name, code in self._folder_codes.items()
+                 if name == folder_path or (isinstance(name, str) and name.startswith(prefix))}
+        if not codes:
+            return []
+        if len(codes) == 1:
+            return self._where(self.folders, codes.pop())
+        return list(compress(range(len(self.folders)), map(codes.__contains__, self.folders)))
+
+    def of_type(self, file_type):
+        """Positions of files of one category"""
+        code = self._type_codes.get(file_type)
+        return [] if code is None else self._where(self.types, code)
+
+    def newest(self, indexes, n):
+        """The n most recently created of indexes, oldest first; undated files count as oldest"""
+        if len(indexes) <= n:
+            return list(indexes)
+        created = self.created
+        return sorted(indexes, key=lambda i: (created[i], i))[-n:]
+
+
+class FileCatalogs:
+    """FileCatalog per recently active user, tagged with the state version it was built at (LRU)"""
+
+    def __init__(self, max_users=500):
+        self._catalogs = OrderedDict()
+        self._max_users = max_users
+
+    def get(self, user_id, version):
+        entry = self._catalogs.get(int(user_id))
+        if entry is None or entry[0] != version:
+            return None
+        self._catalogs.move_to_end(int(user_id))
+        return entry[1]
+
+    def put(self, user_id, version, catalog):
+        self._catalogs[int(user_id)] = (version, catalog)
+        self._catalogs.move_to_end(int(user_id))
+        while len(self._catalogs) > self._max_users:
+            self._catalogs.popitem(last=False)
+        return catalog
+
+    def drop(self, user_id):
+        self._catalogs.pop(int(user_id), None)
+
+
+class CategoryIndex:
+    """File ids of one user grouped by file_type, with running counts.
+
+    Kept up to date by the writes that add or remove files, so the
+    category menu and category sends never look at stored_files. A file id
+    can be stored more than once, so copies are counted per id and a delete
+    removes one of them.
+    """
+
+    def __init__(self, files=()):
+        self._ids = {}  # {file_type: {file_id: copies}} - dicts keep stored order
+        self._types = {}  # {file_id: file_type}
+        self.counts = {}
+        for f in files:
+            self.add(f.get('file_id'), f.get('file_type'))
+
+    def __contains__(self, file_id):
+        return str(file_id) in self._types
+
+    def add(self, file_id, file_type):
+        file_id = str(file_id)
+        file_type = self._types.setdefault(file_id, file_type or 'document')
+        ids = self._ids.setdefault(file_type, {})
+        ids[file_id] = ids.get(file_id, 0) + 1
+        self.counts[file_type] = self.counts.get(file_type, 0) + 1
+
+    def remove(self, file_id):
+        """Drop one stored copy of file_id"""
+        file_id = str(file_id)
+        file_type = self._types.get(file_id)
+        if file_type is None:
+            return
+        ids = self._ids[file_type]
+        ids[file_id] -= 1
+        self.counts[file_type] -= 1
+        if not ids[file_id]:
+            del ids[file_id]
+            del self._types[file_id]
+
+    def file_ids(self, file_type):
+        """Stored file ids of one category, each copy listed, in stored order"""
+        ids = []
+        for file_id, copies in self._ids.get(file_type, {}).items():
+            ids.extend([file_id] * copies)
+        return ids
+
+
+class CategoryIndexes:
+    """CategoryIndex per recently active user (LRU)"""
+
+    def __init__(self, max_users=2000):
+        self._indexes = OrderedDict()
+        self._max_users = max_users
+
+    def get(self, user_id):
+        index = self._indexes.get(int(user_id))
+        if index is not None:
+            self._indexes.move_to_end(int(user_id))
+        return index
+
+    def put(self, user_id, index):
+        self._indexes[int(user_id)] = index
+        self._indexes.move_to_end(int(user_id))
+        while len(self._indexes) > self._max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def drop(self, user_id):
+        self._indexes.pop(int(user_id), None)
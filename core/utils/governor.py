@@ -0,0 +1,180 @@
+import time
+import asyncio
+import logging
+import functools
+from config import OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE
+
+logger = logging.getLogger(__name__)
+
+# Raw API calls that post, change or remove messages
+OUTBOUND_PREFIXES = ("Send", "Forward", "Edit", "Delete")
+MIN_RATE_FACTOR = 0.1  # A budget never drops below this share of its configured rate
+RECOVERY_STEP = 0.05  # Share of the configured rate won back per successful call
+IDLE_BUCKETS_LIMIT = 10000
+
+
+class TokenBucket:
+    """Token bucket whose rate halves on FloodWait and creeps back on success"""
+
+    __slots__ = ('base_rate', 'rate', 'burst', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, burst):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token can be taken"""
+        self._refill(now)
+        wait = self.blocked_until - now
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return max(wait, 0.0)
+
+    def take(self):
+        self.tokens -= 1
+
+    def penalize(self, now, seconds):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+
+    def reward(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+    @property
+    def idle(self):
+        return self.rate == self.base_rate and self.tokens >= self.burst and self.blocked_until <= time.monotonic()
+
+
+class OutboundGovernor:
+    """Process-wide pacing for outbound Telegram calls.
+
+    Every call takes a token from the bot's global bucket and from the
+    target chat's bucket; groups and channels get the slower group budget.
+    Telegram's limits are per bot token, so each bot (StreamBot and every
+    clone) has its own buckets. A FloodWait blocks the affected buckets for
+    the wait and halves their rate, which then recovers a little on every
+    successful call, so the bot settles just under the limit instead of
+    bursting into long penalties.
+    """
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE, group_rate=OUTBOUND_GROUP_RATE):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self._global = {}
+        self._chats = {}
+
+    def _buckets(self, bot, chat_id, is_group):
+        glob = self._global.get(bot)
+        if glob is None:
+            glob = self._global[bot] = TokenBucket(self.global_rate, max(1, self.global_rate))
+        if chat_id is None:
+            return glob, None
+        key = (bot, chat_id)
+        chat = self._chats.get(key)
+        if chat is None:
+            if len(self._chats) >= IDLE_BUCKETS_LIMIT:
+                self._drop_idle()
+            if is_group:
+                chat = TokenBucket(self.group_rate, 3)
+            else:
+                chat = TokenBucket(self.chat_rate, 3)
+            self._chats[key] = chat
+        return glob, chat
+
+    def _drop_idle(self):
+        for key in [k for k, b in self._chats.items() if b.idle]:
+            del self._chats[key]
+
+    async def acquire(self, bot, chat_id=None, is_group=False):
+        """Wait until both the bot and the chat budgets allow one more call"""
+        glob, chat = self._buckets(bot, chat_id, is_group)
+        while True:
+            now = time.monotonic()
+            wait = glob.delay(now)
+            if chat is not None:
+                wait = max(wait, chat.delay(now))
+            if wait <= 0:
+                glob.take()
+                if chat is not None:
+                    chat.take()
+                return
+            await asyncio.sleep(wait)
+
+    def flood_wait(self, bot, chat_id, is_group, seconds):
+        """Feed a FloodWait back into the budgets it came from"""
+        glob, chat = self._buckets(bot, chat_id, is_group)
+        now = time.monotonic()
+        if chat is not None:
+            chat.penalize(now, seconds)
+        else:
+            glob.penalize(now, seconds)
+        logger.warning(f"FloodWait {seconds}s for chat {chat_id}; slowing outbound sends")
+
+    def success(self, bot, chat_id, is_group):
+        glob, chat = self._buckets(bot, chat_id, is_group)
+        glob.reward()
+        if chat is not None:
+            chat.reward()
+
+
+GOVERNOR = OutboundGovernor()
+
+
+def query_target(query):
+    """(is_outbound, chat_id, is_group) for a raw API query.
+
+    chat_id is in Bot API form (-100... for channels), the same ids the raw
+    Bot API helpers use, so both paths share one bucket per chat.
+    """
+    name = type(query).__name__
+    if not name.startswith(OUTBOUND_PREFIXES):
+        return False, None, False
+    peer = getattr(query, 'to_peer', None) or getattr(query, 'peer', None) or getattr(query, 'channel', None)
+    if peer is None:
+        return True, None, False
+    if getattr(peer, 'user_id', None) is not None:
+        return True, peer.user_id, False
+    if getattr(peer, 'chat_id', None) is not None:
+        return True, -peer.chat_id, True
+    if getattr(peer, 'channel_id', None) is not None:
+        return True, -1000000000000 - peer.channel_id, True
+    return True, None, False
+
+
+def install():
+    """Route every outbound raw call of every Client through GOVERNOR"""
+    import pyrogram
+    from pyrogram.errors import FloodWait
+
+    if getattr(pyrogram.Client, '_governor_installed', False):
+        return
+
+    original_invoke = pyrogram.Client.invoke
+
+    @functools.wraps(original_invoke)
+    async def invoke(self, query, *args, **kwargs):
+        outbound, chat_id, is_group = query_target(query)
+        if not outbound:
+            return await original_invoke(self, query, *args, **kwargs)
+        await GOVERNOR.acquire(self.name, chat_id, is_group)
+        try:
+            result = await original_invoke(self, query, *args, **kwargs)
+        except FloodWait as e:
+            GOVERNOR.flood_wait(self.name, chat_id, is_group, e.value)
+            raise
+        GOVERNOR.success(self.name, chat_id, is_group)
+        return result
+
+    pyrogram.Client.invoke = invoke
+    pyrogram.Client._governor_installed = True
@@ -0,0 +1,56 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBuffer:
+    """Groups items that arrive close together per key and hands them over as one batch.
+
+    A batch is flushed once window seconds pass without a new item, once it
+    holds max_items, or at the latest max_wait seconds after its first
+    item, so a forwarded album or a burst of files becomes a single call
+    to flush(key, items). Items of a media group never trigger the size
+    flush, so an album is not split between batches.
+    """
+
+    def __init__(self, flush, window, max_wait, max_items):
+        self._flush = flush
+        self.window = window
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._pending = {}  # {key: [items, started, timer]}
+        self._running = set()
+
+    def add(self, key, item, media_group_id=None):
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = [[], now, None]
+        batch[0].append(item)
+        if batch[2] is not None:
+            batch[2].cancel()
+        if len(batch[0]) >= self.max_items and media_group_id is None:
+            self._close(key)
+            return
+        delay = max(0.0, min(self.window, batch[1] + self.max_wait - now))
+        batch[2] = loop.call_later(delay, self._close, key)
+
+    def _close(self, key):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch[2] is not None:
+            batch[2].cancel()
+        task = asyncio.get_running_loop().create_task(self._run(key, batch[0]))
+        # Keep a reference until it is done
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key, items):
+        try:
+            await self._flush(key, items)
+        except Exception as e:
+            logger.error(f"Ingest flush error for {key}: {e}")
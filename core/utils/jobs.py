@@ -0,0 +1,293 @@
+import os
+import time
+import asyncio
+import logging
+import datetime
+from collections import defaultdict
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from config import JOB_WORKERS, JOB_USER_LIMIT, JOB_LEASE_SECONDS
+from core.bot.identity import BOT_CLIENTS, client_for
+from core.utils.progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_STOPPED = "stopped"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+CHECKPOINT_INTERVAL = 5  # Seconds between progress writes while a job runs
+FINISHED_JOB_TTL = 7 * 24 * 3600  # Finished, stopped and failed jobs are dropped by Mongo after a week
+
+
+def new_job_id():
+    return ObjectId()
+
+
+def parse_job_id(value):
+    """ObjectId from callback/command text, or None if it isn't one"""
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def stop_button(job_id):
+    return InlineKeyboardMarkup([[InlineKeyboardButton('⏹️ Stop', callback_data=f'stop_job_{job_id}')]])
+
+
+def resume_button(job_id):
+    return InlineKeyboardMarkup([[InlineKeyboardButton('▶️ Resume', callback_data=f'resume_job_{job_id}')]])
+
+
+class JobContext:
+    """What a job handler sees: the client, its payload and saved progress.
+
+    Handlers walk their items from ctx.cursor, call checkpoint() before each
+    item and return as soon as it reports False (the job was stopped).
+    """
+
+    def __init__(self, queue, client, job):
+        self.queue = queue
+        self.client = client
+        self.job = job
+        self.id = job['_id']
+        self.user_id = job['user_id']
+        self.payload = job.get('payload') or {}
+        self.cursor = job.get('cursor', 0)
+        self.progress = dict(job.get('progress') or {})
+        self._saved_at = time.monotonic()
+        status = job.get('status')
+        self._status = ProgressReporter(client, status[0], status[1]) if status and client else None
+
+    @property
+    def stopping(self):
+        return self.id in self.queue._stop_requested
+
+    async def checkpoint(self, cursor, force=False, **progress):
+        """Record progress up to cursor; returns False once the job should stop"""
+        self.cursor = cursor
+        self.progress.update(progress)
+        now = time.monotonic()
+        if force or now - self._saved_at >= CHECKPOINT_INTERVAL:
+            self._saved_at = now
+            await self.queue._save_progress(self)
+        return not self.stopping
+
+    async def report(self, text):
+        """Update the job's status message, keeping the Stop button.
+
+        Cheap enough to call on every item; edits are coalesced.
+        """
+        if self._status is not None:
+            await self._status.update(text, stop_button(self.id))
+
+    async def finish(self, text):
+        """Final status edit; offers Resume when the job was stopped"""
+        if self._status is not None:
+            await self._status.flush(text, resume_button(self.id) if self.stopping else None)
+
+
+class JobQueue:
+    """Durable job queue backed by a Mongo collection.
+
+    Jobs are claimed with a lease that a heartbeat keeps renewing, so a job
+    whose process died is picked up again once the lease runs out, from the
+    last saved cursor. A bounded pool of workers runs jobs, and a user never
+    has more than JOB_USER_LIMIT jobs running at once. Handlers register per
+    job kind with @JOBS.handler(kind).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, per_user=JOB_USER_LIMIT, lease=JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.per_user = per_user
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{ObjectId()}"
+        self.col = None
+        self._handlers = {}
+        self._running = set()
+        self._user_running = defaultdict(int)
+        self._stop_requested = set()
+        self._claim_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._tasks = []
+
+    def handler(self, kind):
+        """Register the coroutine that runs jobs of this kind"""
+        def decorator(func):
+            # Plugins can be imported twice; the first registration wins
+            self._handlers.setdefault(kind, func)
+            return func
+        return decorator
+
+    async def start(self, collection):
+        self.col = collection
+        await self.col.create_index([('state', 1), ('lease_until', 1), ('created_at', 1)])
+        await self.col.create_index([('user_id', 1), ('state', 1)])
+        await self.col.create_index('finished_at', expireAfterSeconds=FINISHED_JOB_TTL)
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        self._wake.set()
+
+    async def enqueue(self, client, kind, user_id, payload, total=0, job_id=None, status=None):
+        """Persist a new job and wake a worker; returns the job id"""
+        job = {
+            '_id': job_id or new_job_id(),
+            'kind': kind,
+            'bot': client.name,
+            'user_id': int(user_id),
+            'payload': payload,
+            'total': total,
+            'cursor': 0,
+            'progress': {},
+            'state': JOB_QUEUED,
+            'stop_requested': False,
+            'status': list(status) if status else None,
+            'created_at': datetime.datetime.utcnow(),
+        }
+        await self.col.insert_one(job)
+        self._wake.set()
+        return job['_id']
+
+    async def stop(self, job_id, user_id=None):
+        """Ask a job to stop; returns True if an active job matched"""
+        query = {'_id': job_id, 'state': {'$in': list(ACTIVE_STATES)}}
+        if user_id is not None:
+            query['user_id'] = int(user_id)
+        result = await self.col.update_one(query, {'$set': {'stop_requested': True}})
+        if not result.matched_count:
+            return False
+        if job_id in self._running:
+            self._stop_requested.add(job_id)
+        # A job still waiting for a worker stops right away; one running on
+        # another process sees the flag on its next heartbeat
+        await self.col.update_one({'_id': job_id, 'state': JOB_QUEUED}, {'$set': {'state': JOB_STOPPED}})
+        return True
+
+    async def stop_user_jobs(self, user_id):
+        """Stop every active job of a user; returns how many were asked to stop"""
+        stopped = 0
+        async for job in self.col.find({'user_id': int(user_id), 'state': {'$in': list(ACTIVE_STATES)}}, {'_id': 1}):
+            if await self.stop(job['_id']):
+                stopped += 1
+        return stopped
+
+    async def resume(self, job_id, user_id=None):
+        """Queue a stopped or failed job again from its saved cursor"""
+        query = {'_id': job_id, 'state': {'$in': [JOB_STOPPED, JOB_FAILED]}}
+        if user_id is not None:
+            query['user_id'] = int(user_id)
+        result = await self.col.update_one(query, {'$set': {'state': JOB_QUEUED, 'stop_requested': False}, '$unset': {'error': '', 'finished_at': ''}})
+        if not result.matched_count:
+            return False
+        self._stop_requested.discard(job_id)
+        self._wake.set()
+        return True
+
+    async def user_jobs(self, user_id, limit=10):
+        """Unfinished jobs of a user, newest first"""
+        cursor = self.col.find({'user_id': int(user_id), 'state': {'$in': [JOB_QUEUED, JOB_RUNNING, JOB_STOPPED, JOB_FAILED]}})
+        return await cursor.sort('created_at', -1).to_list(length=limit)
+
+    async def _claim(self):
+        async with self._claim_lock:
+            now = time.time()
+            busy_users = [u for u, n in self._user_running.items() if n >= self.per_user]
+            query = {
+                'bot': {'$in': list(BOT_CLIENTS)},
+                '_id': {'$nin': list(self._running)},
+                'user_id': {'$nin': busy_users},
+                '$or': [
+                    {'state': JOB_QUEUED},
+                    {'state': JOB_RUNNING, 'lease_until': {'$lt': now}},
+                ],
+            }
+            job = await self.col.find_one_and_update(
+                query,
+                {'$set': {'state': JOB_RUNNING, 'lease_until': now + self.lease, 'owner': self.owner}},
+                sort=[('created_at', 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job:
+                self._running.add(job['_id'])
+                self._user_running[job['user_id']] += 1
+            return job
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Job claim error: {e}")
+                job = None
+            if job is None:
+                self._wake.clear()
+                try:
+                    # Expired leases are only noticed by polling
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.lease / 2)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                job = await self.col.find_one_and_update(
+                    {'_id': job_id, 'owner': self.owner},
+                    {'$set': {'lease_until': time.time() + self.lease}},
+                    projection={'stop_requested': 1},
+                )
+                if job and job.get('stop_requested'):
+                    self._stop_requested.add(job_id)
+            except Exception as e:
+                logger.error(f"Job heartbeat error: {e}")
+
+    async def _save_progress(self, ctx):
+        await self.col.update_one(
+            {'_id': ctx.id, 'owner': self.owner},
+            {'$set': {'cursor': ctx.cursor, 'progress': ctx.progress, 'lease_until': time.time() + self.lease}}
+        )
+
+    async def _run(self, job):
+        job_id = job['_id']
+        if job.get('stop_requested'):
+            self._stop_requested.add(job_id)
+        handler = self._handlers.get(job['kind'])
+        client = client_for(job['bot'])
+        ctx = JobContext(self, client, job)
+        beat = asyncio.create_task(self._heartbeat(job_id))
+        update = {}
+        try:
+            if handler is None or client is None:
+                raise RuntimeError(f"No handler or client for job kind {job['kind']!r}")
+            await handler(ctx)
+            state = JOB_STOPPED if ctx.stopping else JOB_DONE
+            if ctx._status is not None:
+                # Drop a progress edit still waiting for its interval
+                await ctx._status.flush()
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job['kind']}) failed")
+            state = JOB_FAILED
+            update['error'] = str(e)[:200]
+        finally:
+            beat.cancel()
+            self._running.discard(job_id)
+            self._user_running[job['user_id']] -= 1
+            if self._user_running[job['user_id']] <= 0:
+                del self._user_running[job['user_id']]
+            self._wake.set()
+        self._stop_requested.discard(job_id)
+        update.update({'state': state, 'cursor': ctx.cursor, 'progress': ctx.progress, 'finished_at': datetime.datetime.utcnow()})
+        try:
+            await self.col.update_one({'_id': job_id, 'owner': self.owner}, {'$set': update, '$unset': {'lease_until': '', 'owner': ''}})
+        except Exception as e:
+            logger.error(f"Could not save final state of job {job_id}: {e}")
+
+
+JOBS = JobQueue()
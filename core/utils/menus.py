@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from core.bot.identity import cached_identity
+
+
+def bot_key(client):
+    """Identity used to key per-bot caches without calling get_me()"""
+    me = cached_identity(client)
+    if me is not None:
+        return me.id
+    return getattr(client, 'name', None) or id(client)
+
+
+class MenuCache:
+    """Keyboards built once per bot identity.
+
+    Static menus are keyed by (bot, name, args) and never expire. Menus that
+    depend on user data are keyed with the user's state version from the
+    Database, so any write for that user makes the old entry unreachable;
+    those entries are held in a bounded LRU.
+    """
+
+    def __init__(self, max_user_entries=5000):
+        self._static = {}
+        self._user = OrderedDict()
+        self._max_user_entries = max_user_entries
+
+    def static(self, client, name, builder, *args):
+        key = (bot_key(client), name, args)
+        menu = self._static.get(key)
+        if menu is None:
+            menu = self._static[key] = builder(*args)
+        return menu
+
+    def get_user(self, client, name, user_id, version, *args):
+        key = (bot_key(client), name, int(user_id), version, args)
+        menu = self._user.get(key)
+        if menu is not None:
+            self._user.move_to_end(key)
+        return menu
+
+    def set_user(self, client, name, user_id, version, menu, *args):
+        key = (bot_key(client), name, int(user_id), version, args)
+        self._user[key] = menu
+        self._user.move_to_end(key)
+        while len(self._user) > self._max_user_entries:
+            self._user.popitem(last=False)
+        return menu
+
+    def clear(self):
+        self._static.clear()
+        self._user.clear()
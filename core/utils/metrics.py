@@ -0,0 +1,207 @@
+import re
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a single label"""
+
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, label_value, value):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in sorted(self._series.items()):
+            label_value = str(label_value).replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {cumulative}')
+        return "\n".join(lines)
+
+
+class CallbackGauge:
+    """Gauge whose values are read from collect() -> {label_value: value} at render time"""
+
+    def __init__(self, name, documentation, label, collect):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for label_value, value in sorted(self.collect().items()):
+            label_value = str(label_value).replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return "\n".join(lines)
+
+
+REGISTRY = {}
+
+
+def histogram(name, documentation, label, buckets=DEFAULT_BUCKETS):
+    """Get or create a histogram in the module registry"""
+    if name not in REGISTRY:
+        REGISTRY[name] = Histogram(name, documentation, label, buckets)
+    return REGISTRY[name]
+
+
+def gauge(name, documentation, label, collect):
+    """Get or create a callback gauge in the module registry"""
+    if name not in REGISTRY:
+        REGISTRY[name] = CallbackGauge(name, documentation, label, collect)
+    return REGISTRY[name]
+
+
+HANDLER_SECONDS = histogram("bot_handler_seconds", "Time spent in update handlers", "route")
+DB_SECONDS = histogram("bot_db_method_seconds", "Time spent in Database methods", "method")
+RPC_SECONDS = histogram("bot_telegram_rpc_seconds", "Time spent in Telegram API calls", "method")
+LOOP_LAG_SECONDS = histogram(
+    "bot_event_loop_lag_seconds", "Event loop scheduling delay", "loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+
+def render():
+    """Render every registered metric in Prometheus text format"""
+    return "\n".join(h.render() for h in REGISTRY.values()) + "\n"
+
+
+class timer:
+    """Context manager that records elapsed time into a histogram"""
+
+    def __init__(self, hist, label_value):
+        self.hist = hist
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(self.label_value, time.perf_counter() - self.started)
+        return False
+
+
+def timed(hist, label_value):
+    """Decorator that times an async function into a histogram"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with timer(hist, label_value):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(hist, prefix=""):
+    """Class decorator that times every public coroutine method"""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or not asyncio.iscoroutinefunction(value):
+                continue
+            setattr(cls, attr, timed(hist, f"{prefix}{attr}")(value))
+        return cls
+    return decorator
+
+
+_CALLBACK_TOKEN = re.compile(r'[a-z]+')
+
+
+def callback_route(data):
+    """Reduce callback data to a low-cardinality route label"""
+    if not data:
+        return "empty"
+    if isinstance(data, bytes):
+        return "binary"
+    parts = []
+    for token in re.split(r'[_:]', data):
+        if not _CALLBACK_TOKEN.fullmatch(token) or len(parts) == 4:
+            break
+        parts.append(token)
+    return "_".join(parts) or "other"
+
+
+def message_route(message, func):
+    """Label a message update by its command, falling back to the handler name
+
+    Only commands a filters.command matched are used (Pyrogram sets
+    message.command then), so arbitrary "/words" can't create new series.
+    """
+    command = getattr(message, 'command', None)
+    if command:
+        return f"/{command[0].lower()}"
+    return func.__name__
+
+
+def _wrap_handler(func, label_fn):
+    @functools.wraps(func)
+    async def wrapper(client, update, *args):
+        with timer(HANDLER_SECONDS, label_fn(update, func)):
+            return await func(client, update, *args)
+    return wrapper
+
+
+def install():
+    """Hook Pyrogram so handlers and RPCs are timed.
+
+    Must run before any plugin module is imported, since the
+    on_message/on_callback_query decorators build their handlers at import.
+    """
+    import pyrogram
+    from pyrogram import handlers
+
+    if getattr(pyrogram.Client, '_metrics_installed', False):
+        return
+
+    def patch_handler(cls, label_fn):
+        original_init = cls.__init__
+
+        def __init__(self, callback, *args, **kwargs):
+            original_init(self, _wrap_handler(callback, label_fn), *args, **kwargs)
+        cls.__init__ = __init__
+
+    patch_handler(handlers.MessageHandler, message_route)
+    patch_handler(handlers.CallbackQueryHandler, lambda query, func: callback_route(query.data))
+
+    original_invoke = pyrogram.Client.invoke
+
+    @functools.wraps(original_invoke)
+    async def invoke(self, query, *args, **kwargs):
+        with timer(RPC_SECONDS, type(query).__name__):
+            return await original_invoke(self, query, *args, **kwargs)
+
+    pyrogram.Client.invoke = invoke
+    pyrogram.Client._metrics_installed = True
+
+
+async def sample_loop_lag(interval=1.0):
+    """Measure how late the event loop wakes a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe("main", max(0.0, loop.time() - started - interval))
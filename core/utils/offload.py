@@ -0,0 +1,71 @@
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import CPU_WORKERS, CPU_QUEUE_LIMIT
+from core.utils.metrics import histogram, gauge
+
+OFFLOAD_WAIT_SECONDS = histogram("bot_offload_wait_seconds", "Time CPU work waits before a pool thread picks it up", "task")
+OFFLOAD_RUN_SECONDS = histogram("bot_offload_run_seconds", "Time CPU work spends running in the pool", "task")
+
+
+class CpuPool:
+    """Small thread pool for CPU-heavy steps that would stall the event loop.
+
+    bcrypt releases the GIL while hashing, so hashes really run in parallel
+    with the loop; pure-Python work such as JSON parsing still holds the GIL
+    but gets preempted, so the loop keeps serving updates meanwhile. At most
+    CPU_QUEUE_LIMIT calls are admitted at once; callers beyond that wait
+    their turn on the loop instead of piling work onto the executor.
+    """
+
+    def __init__(self, workers=CPU_WORKERS, queue_limit=CPU_QUEUE_LIMIT):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+        self._admission = None
+        self._queue_limit = max(queue_limit, workers)
+        self.pending = 0  # Submitted and not finished, including calls waiting for admission
+        self.admitted = 0  # Handed to the executor and not finished
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the pool and return its result"""
+        label = getattr(func, '__name__', 'call')
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self._queue_limit)
+        submitted = time.perf_counter()
+        timing = []
+        self.pending += 1
+        try:
+            async with self._admission:
+                self.admitted += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._executor, functools.partial(self._call, timing, func, args, kwargs))
+                finally:
+                    self.admitted -= 1
+        finally:
+            self.pending -= 1
+            # Metrics are recorded here, on the loop thread
+            if timing:
+                started, finished = timing[0], timing[-1]
+                OFFLOAD_WAIT_SECONDS.observe(label, started - submitted)
+                OFFLOAD_RUN_SECONDS.observe(label, finished - started)
+
+    @staticmethod
+    def _call(timing, func, args, kwargs):
+        timing.append(time.perf_counter())
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing.append(time.perf_counter())
+
+    def depth(self):
+        running = min(self.admitted, self.workers)
+        return {"running": running, "waiting": self.pending - running}
+
+
+CPU_POOL = CpuPool()
+offload = CPU_POOL.run
+
+gauge("bot_offload_queue_depth", "CPU work submitted to the pool and not finished yet", "state",
+      CPU_POOL.depth)
@@ -0,0 +1,82 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EDIT_INTERVAL = 3  # Seconds between edits of one status message
+
+
+class ProgressReporter:
+    """Coalesced edits of one status message.
+
+    update() can be called on every item of a bulk loop: at most one edit
+    goes out per PROGRESS_EDIT_INTERVAL, an edit identical to what the
+    message already shows is dropped, and the latest text deferred inside
+    an interval is sent when the interval ends. flush() always sends the
+    final state, so status edits stop competing with the deliveries
+    themselves for the flood budget.
+    """
+
+    def __init__(self, client, chat_id, message_id, interval=PROGRESS_EDIT_INTERVAL):
+        self.client = client
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self._shown = None
+        self._pending = None
+        self._edited_at = 0.0
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def for_message(cls, message, interval=PROGRESS_EDIT_INTERVAL):
+        return cls(message._client, message.chat.id, message.id, interval)
+
+    async def update(self, text, reply_markup=None):
+        """Show text now if the interval allows, otherwise once it ends"""
+        if self._key(text, reply_markup) == self._shown:
+            self._pending = None
+            return
+        self._pending = (text, reply_markup)
+        wait = self._edited_at + self.interval - time.monotonic()
+        if wait <= 0:
+            await self._send_pending()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._send_later(wait))
+
+    async def flush(self, text=None, reply_markup=None):
+        """Send the final state right away, ignoring the interval"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if text is not None:
+            self._pending = (text, reply_markup)
+        if self._pending is not None and self._key(*self._pending) != self._shown:
+            await self._send_pending()
+        self._pending = None
+
+    @staticmethod
+    def _key(text, reply_markup):
+        return text, repr(reply_markup) if reply_markup is not None else None
+
+    async def _send_later(self, wait):
+        try:
+            await asyncio.sleep(wait)
+            self._timer = None
+            await self._send_pending()
+        except asyncio.CancelledError:
+            pass
+
+    async def _send_pending(self):
+        async with self._lock:
+            if self._pending is None:
+                return
+            text, reply_markup = self._pending
+            self._pending = None
+            self._edited_at = time.monotonic()
+            try:
+                await self.client.edit_message_text(self.chat_id, self.message_id, text, reply_markup=reply_markup)
+                self._shown = self._key(text, reply_markup)
+            except Exception as e:
+                logger.debug(f"Status edit failed: {e}")
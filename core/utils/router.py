@@ -0,0 +1,74 @@
+import time
+import logging
+from core.utils.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+ROUTE_SECONDS = histogram("bot_callback_route_seconds", "Time spent in callback routes", "route")
+
+
+class CallbackRouter:
+    """Table-driven dispatcher for callback_data.
+
+    Exact keys live in a dict, prefixes in a character trie, so a lookup is a
+    single walk over the data and the longest registered prefix wins. This
+    removes the ordering constraints of the old if/elif chain (for example
+    rename_folder_ vs rename_folder_action_).
+
+    Handlers are called as handler(client, query, arg) where arg is the data
+    remaining after the prefix, converted by the route's parser. Exact routes
+    get an empty string.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._exact = {}
+        self._trie = {}
+
+    def route(self, key):
+        """Register a handler for an exact callback_data value"""
+        def decorator(func):
+            self._exact[key] = (key, func, str)
+            return func
+        return decorator
+
+    def prefix(self, key, parser=str):
+        """Register a handler for callback_data starting with key"""
+        def decorator(func):
+            node = self._trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[None] = (key, func, parser)
+            return func
+        return decorator
+
+    def match(self, data):
+        """Return (route, handler, parser, arg) for data, or None"""
+        entry = self._exact.get(data)
+        if entry is not None:
+            return entry[0], entry[1], entry[2], ""
+        node = self._trie
+        found = None
+        for pos, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                found = (node[None], pos + 1)
+        if found is None:
+            return None
+        (key, func, parser), end = found
+        return key, func, parser, data[end:]
+
+    async def dispatch(self, client, query):
+        """Run the handler for query.data; returns False if nothing matched"""
+        matched = self.match(query.data or "")
+        if matched is None:
+            return False
+        key, func, parser, arg = matched
+        started = time.perf_counter()
+        try:
+            await func(client, query, parser(arg))
+        finally:
+            ROUTE_SECONDS.observe(f"{self.name}:{key}", time.perf_counter() - started)
+        return True
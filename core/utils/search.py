@@ -0,0 +1,126 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """Casefolded word tokens with accents stripped; '_', '.', '-' and spaces all split words"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN.findall(text)
+
+
+class FileSearchIndex:
+    """Inverted index over one user's stored file names.
+
+    Postings map a token to the file_ids whose name contains it, and a
+    sorted vocabulary answers prefix lookups with a bisect, so every query
+    word matches as a prefix ("bat" finds "Batman"). Positions in
+    stored_files are derived lazily after deletes, since removing an entry
+    shifts every later index.
+    """
+
+    def __init__(self, files):
+        self._postings = {}
+        self._vocab = []
+        self._names = {}
+        self._order = []
+        self._positions = None
+        for f in files:
+            self._add(str(f.get('file_id')), f.get('file_name') or '')
+        self._vocab = sorted(self._postings)
+
+    def add(self, file_id, file_name):
+        self._add(str(file_id), file_name, keep_vocab=True)
+
+    def _add(self, file_id, file_name, keep_vocab=False):
+        self._order.append(file_id)
+        if self._positions is not None:
+            self._positions.setdefault(file_id, len(self._order) - 1)
+        if file_id in self._names:
+            return
+        self._names[file_id] = file_name
+        for token in set(tokenize(file_name)):
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                if keep_vocab:
+                    insort(self._vocab, token)
+            posting.add(file_id)
+
+    def remove_at(self, file_idx):
+        """Forget the file at one position; its name is dropped once no copy of it is left"""
+        if not 0 <= file_idx < len(self._order):
+            return
+        file_id = self._order.pop(file_idx)
+        self._positions = None
+        if file_id in self._order:
+            return
+        file_name = self._names.pop(file_id, None)
+        if file_name is None:
+            return
+        for token in set(tokenize(file_name)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(file_id)
+            if not posting:
+                del self._postings[token]
+                i = bisect_left(self._vocab, token)
+                if i < len(self._vocab) and self._vocab[i] == token:
+                    del self._vocab[i]
+
+    def _prefix_matches(self, prefix):
+        matched = set()
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            matched |= self._postings[self._vocab[i]]
+            i += 1
+        return matched
+
+    def search(self, query):
+        """[(file_idx, file_name)] matching every word of query, in stored order"""
+        tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not tokens:
+            return []
+        result = None
+        for token in tokens:
+            matched = self._prefix_matches(token)
+            result = matched if result is None else result & matched
+            if not result:
+                return []
+        if self._positions is None:
+            self._positions = {}
+            for idx, fid in enumerate(self._order):
+                self._positions.setdefault(fid, idx)
+        hits = sorted((self._positions[fid], fid) for fid in result)
+        return [(idx, self._names[fid]) for idx, fid in hits]
+
+
+class SearchIndexes:
+    """Per-user FileSearchIndex objects for recently active users (LRU)"""
+
+    def __init__(self, max_users=500):
+        self._indexes = OrderedDict()
+        self._max_users = max_users
+
+    def get(self, user_id):
+        index = self._indexes.get(int(user_id))
+        if index is not None:
+            self._indexes.move_to_end(int(user_id))
+        return index
+
+    def put(self, user_id, index):
+        self._indexes[int(user_id)] = index
+        self._indexes.move_to_end(int(user_id))
+        while len(self._indexes) > self._max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def drop(self, user_id):
+        self._indexes.pop(int(user_id), None)
@@ -0,0 +1,167 @@
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from core.utils.metrics import gauge
+
+WHEEL_SLOTS = 4096  # One-second slots; longer TTLs go round the wheel more than once
+_MISSING = object()
+
+
+def _sizeof(key, value):
+    """Shallow size of an entry, one level into containers"""
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(sys.getsizeof(v) for v in value)
+    return size
+
+
+class StateNamespace(MutableMapping):
+    """Dict-like view of one namespace of ExpiringState.
+
+    Entries expire ttl seconds after they were last set and the least
+    recently used entry is dropped once max_size is reached. Reads of an
+    expired entry behave as if it was never there, so callers keep using
+    it exactly like the plain dict it replaces.
+    """
+
+    def __init__(self, store, name, ttl, max_size):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.bytes = 0
+        self.evicted = 0
+        self.expired = 0
+        self._data = OrderedDict()  # {key: [value, expires_tick, size]}
+
+    def _live(self, key):
+        tick = self.store._advance()
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= tick:
+            self._drop(key)
+            self.expired += 1
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _drop(self, key):
+        entry = self._data.pop(key)
+        self.bytes -= entry[2]
+
+    def __getitem__(self, key):
+        entry = self._live(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[0]
+
+    def __contains__(self, key):
+        return self._live(key) is not None
+
+    def get(self, key, default=None):
+        entry = self._live(key)
+        return default if entry is None else entry[0]
+
+    def pop(self, key, default=_MISSING):
+        entry = self._live(key)
+        if entry is None:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        self._drop(key)
+        return entry[0]
+
+    def __setitem__(self, key, value):
+        tick = self.store._advance()
+        if key in self._data:
+            self._drop(key)
+        elif len(self._data) >= self.max_size:
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self.evicted += 1
+        expires = tick + self.ttl
+        size = _sizeof(key, value)
+        self._data[key] = [value, expires, size]
+        self.bytes += size
+        self.store._schedule(self, key, expires)
+
+    def __delitem__(self, key):
+        if self._live(key) is None:
+            raise KeyError(key)
+        self._drop(key)
+
+    def __iter__(self):
+        self.store._advance()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self.store._advance()
+        return len(self._data)
+
+
+class ExpiringState:
+    """Process-wide home for short-lived conversation state.
+
+    Each namespace gets its own TTL and size cap. Expiry runs on a timing
+    wheel with one-second slots that is advanced by whatever operation
+    comes next, so removing an expired entry is O(1) and needs no
+    background task. Namespaces are registered by name and the first
+    registration wins, so a plugin module imported twice still shares one
+    namespace.
+    """
+
+    def __init__(self, slots=WHEEL_SLOTS):
+        self._namespaces = {}
+        self._wheel = [set() for _ in range(slots)]
+        self._tick = int(time.monotonic())
+
+    def namespace(self, name, ttl, max_size):
+        ns = self._namespaces.get(name)
+        if ns is None:
+            ns = self._namespaces[name] = StateNamespace(self, name, int(ttl), max_size)
+        return ns
+
+    def _schedule(self, ns, key, expires):
+        self._wheel[expires % len(self._wheel)].add((ns.name, key))
+
+    def _advance(self):
+        now = int(time.monotonic())
+        if now <= self._tick:
+            return self._tick
+        slots = len(self._wheel)
+        start = self._tick + 1 if now - self._tick < slots else now - slots + 1
+        for tick in range(start, now + 1):
+            index = tick % slots
+            due = self._wheel[index]
+            if not due:
+                continue
+            self._wheel[index] = keep = set()
+            for name, key in due:
+                ns = self._namespaces[name]
+                entry = ns._data.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    ns._drop(key)
+                    ns.expired += 1
+                elif entry[1] % slots == index:
+                    # Due on a later turn of the wheel
+                    keep.add((name, key))
+        self._tick = now
+        return now
+
+    def stats(self):
+        """{namespace: (entries, approximate bytes, evicted, expired)}"""
+        self._advance()
+        return {name: (len(ns._data), ns.bytes, ns.evicted, ns.expired) for name, ns in self._namespaces.items()}
+
+
+STATE = ExpiringState()
+gauge("bot_state_entries", "Live entries per conversation-state namespace", "namespace",
+      lambda: {name: entries for name, (entries, _, _, _) in STATE.stats().items()})
+gauge("bot_state_bytes", "Approximate memory held per conversation-state namespace", "namespace",
+      lambda: {name: size for name, (_, size, _, _) in STATE.stats().items()})
@@ -0,0 +1,92 @@
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+
+def _overlap(a, b):
+    """True if a and b can share characters in one text: one contains the other or they chain end to start"""
+    if a in b or b in a:
+        return True
+    shorter = min(len(a), len(b))
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, shorter))
+
+
+class CompiledFilters:
+    """A user's word filters compiled into one alternation regex.
+
+    Filters are stored as "word" (remove) or "old|new" (replace). Every
+    needle goes into a single pattern and a replacement map, so applying the
+    whole list is one scan of the text instead of one str.replace per filter.
+    A single scan never looks at text a filter produced, so it is only used
+    when that cannot matter: no two needles overlap, no replacement can form
+    a later needle with the text around it, and no removal is followed by a
+    needle of several characters its neighbours could join into. Any other
+    list is applied one filter after another, exactly as before.
+    """
+
+    __slots__ = ('pattern', 'replacements', 'steps')
+
+    def __init__(self, filters_list):
+        self.replacements = {}
+        self.steps = []
+        for item in filters_list:
+            if "|" in item:
+                old, new = item.split("|", 1)
+                old, new = old.strip(), new.strip()
+            else:
+                old, new = item, ""
+            if old:
+                self.steps.append((old, new))
+                self.replacements.setdefault(old, new)
+        needles = list(self.replacements)
+        chained = any(_overlap(a, b) for i, a in enumerate(needles) for b in needles[i + 1:]) or any(
+            (new and _overlap(new, later)) or (not new and len(later) > 1)
+            for i, (old, new) in enumerate(self.steps) for later, _ in self.steps[i + 1:]
+        )
+        if self.replacements and not chained:
+            self.pattern = re.compile("|".join(re.escape(old) for old in needles))
+        else:
+            self.pattern = None
+
+    def _replace(self, match):
+        return self.replacements[match.group(0)]
+
+    def apply(self, text):
+        """Apply filters, then collapse extra spaces per line keeping line breaks"""
+        if self.pattern is not None:
+            text = self.pattern.sub(self._replace, text)
+        else:
+            for old, new in self.steps:
+                text = text.replace(old, new)
+        return '\n'.join(' '.join(line.split()) for line in text.split('\n'))
+
+
+@lru_cache(maxsize=1024)
+def compile_filters(filters_list):
+    """Compile a tuple of filters; identical lists share one compiled object"""
+    return CompiledFilters(filters_list)
+
+
+class CompiledFilterCache:
+    """CompiledFilters per recently active user, tagged with the state version it was built at (LRU)"""
+
+    def __init__(self, max_users=2000):
+        self._entries = OrderedDict()
+        self._max_users = max_users
+
+    def get(self, user_id, version):
+        entry = self._entries.get(int(user_id))
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(int(user_id))
+        return entry[1]
+
+    def put(self, user_id, version, compiled):
+        self._entries[int(user_id)] = (version, compiled)
+        self._entries.move_to_end(int(user_id))
+        while len(self._entries) > self._max_users:
+            self._entries.popitem(last=False)
+        return compiled
+
+    def drop(self, user_id):
+        self._entries.pop(int(user_id), None)
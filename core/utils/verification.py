@@ -0,0 +1,92 @@
+import random
+import string
+import logging
+import datetime
+from collections import OrderedDict
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TTL = 24 * 3600  # Seconds an unused verify link stays valid
+CACHE_SIZE = 50000  # Users whose verification state is kept in memory
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def _end_of_today():
+    """Next local midnight as naive UTC; a verification lasts for the rest of the day"""
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    midnight = datetime.datetime.combine(tomorrow, datetime.time.min).astimezone(datetime.timezone.utc)
+    return midnight.replace(tzinfo=None)
+
+
+class VerificationStore:
+    """Verify tokens and verified-until times, one Mongo document per user.
+
+    Documents carry an expires_at covering both the pending token and the
+    verification, and a TTL index removes them once both are over. Lookups
+    from /start go through an in-process LRU that also remembers users with
+    no verification, so checks for known users never leave the process.
+    This process is the only writer, so the LRU is updated on every write.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.col = None
+        self._verified = OrderedDict()  # {user_id: verified_until or None}
+        self._cache_size = cache_size
+
+    async def start(self, collection):
+        self.col = collection
+        await self.col.create_index('expires_at', expireAfterSeconds=0)
+
+    def _remember(self, user_id, verified_until):
+        self._verified[user_id] = verified_until
+        self._verified.move_to_end(user_id)
+        while len(self._verified) > self._cache_size:
+            self._verified.popitem(last=False)
+
+    async def is_verified(self, user_id):
+        user_id = int(user_id)
+        if user_id in self._verified:
+            self._verified.move_to_end(user_id)
+            verified_until = self._verified[user_id]
+        else:
+            doc = await self.col.find_one({'_id': user_id}, {'verified_until': 1})
+            verified_until = doc.get('verified_until') if doc else None
+            self._remember(user_id, verified_until)
+        return verified_until is not None and verified_until > _utcnow()
+
+    async def new_token(self, user_id):
+        """Issue a fresh token for user_id, replacing any unused one"""
+        user_id = int(user_id)
+        token = ''.join(random.choices(string.ascii_letters + string.digits, k=7))
+        await self.col.update_one(
+            {'_id': user_id},
+            {'$set': {'token': token, 'token_used': False}, '$max': {'expires_at': _utcnow() + datetime.timedelta(seconds=TOKEN_TTL)}},
+            upsert=True
+        )
+        return token
+
+    async def token_valid(self, user_id, token):
+        doc = await self.col.find_one({'_id': int(user_id), 'token': token}, {'token_used': 1})
+        return bool(doc) and not doc.get('token_used')
+
+    async def redeem(self, user_id, token):
+        """Mark token used and verify the user until the end of the day; False if the token is unknown or used"""
+        user_id = int(user_id)
+        verified_until = _end_of_today()
+        doc = await self.col.find_one_and_update(
+            {'_id': user_id, 'token': token, 'token_used': False},
+            {'$set': {'token_used': True, 'verified_until': verified_until}, '$max': {'expires_at': verified_until}},
+            projection={'_id': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not doc:
+            return False
+        self._remember(user_id, verified_until)
+        return True
+
+
+VERIFICATION = VerificationStore()
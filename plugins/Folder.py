@@ -1,18 +1,22 @@
 import logging
 import asyncio
+import hashlib
 from pyrogram import Client, filters, enums
-from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from pyrogram.types import InlineKeyboardButton, ReplyKeyboardMarkup
 from pyrogram.errors import FloodWait
 from plugins.dbusers import db
 from plugins.rawapi import edit_message_with_fallback, send_message_raw, edit_message_text_raw, convert_pyrogram_buttons_to_raw
+from plugins.delivery import copy_many
 from plugins.password import build_password_buttons, VERIFIED_FOLDER_ACCESS, CAPTION_INPUT_MODE, PASSWORD_ATTEMPTS, PASSWORD_PROMPT_MESSAGES, PASSWORD_RESPONSE_MESSAGES
-from utils import b64_encode, b64_decode
-from config import LOG_CHANNEL
+from utils import b64_encode, b64_decode, encode_ref, decode_ref, REF_FOLDER, REF_FILE, REF_SHARED_FOLDER, REF_SHARED_FILE, REF_MESSAGE
+from core.bot.identity import bot_username
+from core.utils.jobs import JOBS, new_job_id, stop_button
+from core.utils.state import STATE
+from config import LOG_CHANNEL, CONVERSATION_TTL, CONVERSATION_MAX_USERS, BULK_COPY_SIZE, LEGACY_LINKS
 
 logger = logging.getLogger(__name__)
 
-BATCH_STOP_FLAGS = {}
-FOLDER_PROMPT_MSG = {}
+FOLDER_PROMPT_MSG = STATE.namespace("folder_prompts", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
 
 
 async def get_folder_name_from_idx(user_id: int, idx: int) -> tuple:
@@ -25,17 +29,107 @@ async def get_folder_name_from_idx(user_id: int, idx: int) -> tuple:
     return None, None, folders
 
 
+async def folder_ref(user_id: int, folder_name: str, page: int = 0) -> str:
+    """Compact callback reference to one of the user's folders"""
+    folders = await db.get_folders(user_id)
+    for idx, f in enumerate(folders):
+        name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        if name == folder_name:
+            return encode_ref(REF_FOLDER, idx, page)
+    return b64_encode(folder_name, "utf-8")
+
+
+def folder_key(folder_name: str) -> int:
+    """Stable 48-bit key for a folder path; unlike its position it survives folders being added or removed"""
+    return int.from_bytes(hashlib.blake2b(folder_name.encode('utf-8'), digest_size=6).digest(), 'big')
+
+
+def shared_folder_ref(owner_id: int, folder_name: str, page: int = 0) -> str:
+    """Signed reference to another user's folder, safe to hand to viewers"""
+    return encode_ref(REF_SHARED_FOLDER, owner_id, folder_key(folder_name), page)
+
+
+def file_ref(file_idx: int) -> str:
+    """Deep link payload for one of the user's own stored files"""
+    return encode_ref(REF_FILE, file_idx)
+
+
+def shared_file_ref(owner_id: int, file_id) -> str:
+    """Signed deep link payload for a file in someone else's folder"""
+    return encode_ref(REF_SHARED_FILE, owner_id, int(file_id))
+
+
+async def resolve_folder_ref(user_id: int, payload: str) -> tuple:
+    """Return (folder_name, page) for a folder_ref payload or a legacy base64 name"""
+    ref = decode_ref(payload)
+    if ref and ref[0] == REF_FOLDER and len(ref[1]) == 2:
+        idx, page = ref[1]
+        folders = await db.get_folders(user_id)
+        if idx < len(folders):
+            f = folders[idx]
+            return (f.get('name', str(f)) if isinstance(f, dict) else str(f)), page
+        return None, 0
+    return b64_decode(payload, "utf-8"), 0
+
+
+async def resolve_shared_folder_ref(payload: str) -> tuple:
+    """Return (owner_id, folder_name, page) for a shared_folder_ref payload.
+
+    The unsigned {owner_id}_{base64 name} form of older versions is only
+    accepted with LEGACY_LINKS enabled. Returns (None, None, 0) when the
+    signature or the reference is invalid.
+    """
+    ref = decode_ref(payload)
+    if ref:
+        if ref[0] != REF_SHARED_FOLDER or len(ref[1]) != 3:
+            return None, None, 0
+        owner_id, key, page = ref[1]
+        for f in await db.get_folders(owner_id):
+            name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+            if folder_key(name) == key:
+                return owner_id, name, page
+        return None, None, 0
+    if not LEGACY_LINKS:
+        return None, None, 0
+    owner, _, encoded = payload.partition('_')
+    if not owner.isdigit() or not encoded:
+        return None, None, 0
+    return int(owner), b64_decode(encoded, "utf-8"), 0
+
+
+async def expand_start_ref(data: str):
+    """Translate a compact deep-link ref into the legacy start payload text.
+
+    Returns None when data is not a ref so callers can fall back to base64.
+    """
+    ref = decode_ref(data)
+    if not ref:
+        return None
+    kind, values = ref
+    if kind == REF_FILE and len(values) == 1:
+        return f"file_{values[0]}"
+    if kind == REF_SHARED_FILE and len(values) == 2:
+        return f"sharedfile_{values[0]}_{values[1]}"
+    if kind == REF_MESSAGE and len(values) == 1:
+        return f"msg_{values[0]}"
+    if kind == REF_SHARED_FOLDER:
+        owner_id, folder_name, _ = await resolve_shared_folder_ref(data)
+        if folder_name:
+            return f"folder_{owner_id}_{b64_encode(folder_name, 'utf-8')}"
+    return ""
+
+
 async def get_folder_share_link(client, user_id: int, folder_name: str) -> str:
     token = await db.get_folder_token(user_id, folder_name)
     if not token:
         token = await db.generate_folder_token(user_id, folder_name)
-    username = (await client.get_me()).username
+    username = await bot_username(client)
     return f"https://t.me/{username}?start=folder_{token}"
 
 
 async def show_folder_edit_menu(client, user_id: int, message_id: int, idx: int, folder_name: str, display_name: str, force_is_protected=None):
     share_link = await get_folder_share_link(client, user_id, folder_name)
-    folder_encoded = b64_encode(folder_name, "utf-8")
+    folder_encoded = encode_ref(REF_FOLDER, idx, 0)
     
     if force_is_protected is not None:
         is_protected = force_is_protected
@@ -68,7 +162,7 @@ async def build_folder_buttons(user_id: int, folders: list, selected: str = None
                     InlineKeyboardButton("❌", callback_data=f"del_folder_{idx}")
                 ])
             else:
-                buttons.append([InlineKeyboardButton(f"📁 {folder_name}", callback_data=f"browse_folder_{b64_encode(folder_name, 'utf-8')}")])
+                buttons.append([InlineKeyboardButton(f"📁 {folder_name}", callback_data=f"browse_folder_{encode_ref(REF_FOLDER, idx, 0)}")])
     return buttons
 
 
@@ -76,10 +170,10 @@ async def build_browse_folder_ui(client, user_id: int, current_path: str, page:
     display_name = await db.get_folder_display_name(current_path)
     text = f"<b>📁 {display_name}\n📍 Path: {current_path}\n\n</b>"
     
-    files_in_folder = await db.get_files_by_folder(user_id, folder=current_path)
-    total_files_recursive = await db.get_files_in_folder_recursive(user_id, current_path)
+    files_here = await db.count_files_in_folder(user_id, current_path, recursive=False)
+    total_files_recursive = await db.count_files_in_folder(user_id, current_path)
     
-    text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {len(total_files_recursive)}"
+    text += f"📄 Files here: {files_here}\n📂 Total (incl. subfolders): {total_files_recursive}"
     
     all_folders = await db.get_folders(user_id)
     folder_idx = None
@@ -90,7 +184,8 @@ async def build_browse_folder_ui(client, user_id: int, current_path: str, page:
             break
     
     buttons = []
-    encoded = b64_encode(current_path, "utf-8")
+    folder_ids = {(f.get('name', str(f)) if isinstance(f, dict) else str(f)): i for i, f in enumerate(all_folders)}
+    encoded = encode_ref(REF_FOLDER, folder_idx, 0) if folder_idx is not None else b64_encode(current_path, "utf-8")
     
     action_row = []
     if total_files_recursive:
@@ -109,48 +204,39 @@ async def build_browse_folder_ui(client, user_id: int, current_path: str, page:
     for f in subfolders:
         folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
         sub_display = await db.get_folder_display_name(folder_name)
-        files_in_f = await db.get_files_in_folder_recursive(user_id, folder_name)
-        sub_encoded = b64_encode(folder_name, "utf-8")
-        row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_f)})', callback_data=f'browse_folder_{sub_encoded}'))
+        files_in_f = await db.count_files_in_folder(user_id, folder_name)
+        sub_encoded = encode_ref(REF_FOLDER, folder_ids[folder_name], 0) if folder_name in folder_ids else b64_encode(folder_name, "utf-8")
+        row.append(InlineKeyboardButton(f'📁 {sub_display} ({files_in_f})', callback_data=f'browse_folder_{sub_encoded}'))
         if len(row) == 2:
             buttons.append(row)
             row = []
     if row:
         buttons.append(row)
     
-    if files_in_folder:
-        username = (await client.get_me()).username
-        user = await db.col.find_one({'id': int(user_id)})
-        all_files = user.get('stored_files', []) if user else []
+    if files_here:
+        username = await bot_username(client)
         
         items_per_page = 10
-        total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
+        total_pages = max(1, (files_here + items_per_page - 1) // items_per_page)
         page = max(0, min(page, total_pages - 1))
-        start_idx = page * items_per_page
-        end_idx = start_idx + items_per_page
-        display_files = files_in_folder[start_idx:end_idx]
+        # Positions come from the catalog, so links need no scan of stored_files
+        display_files, _ = await db.get_folder_files_page(user_id, current_path, page, items_per_page)
         
         text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-        for file_obj in display_files:
+        for file_idx, file_obj in display_files:
             file_name = file_obj.get('file_name', 'Unknown')
             if len(file_name) > 40:
                 file_name = file_name[:37] + "..."
-            file_idx = next((i for i, f in enumerate(all_files) if f.get('file_id') == file_obj.get('file_id')), None)
-            if file_idx is not None:
-                string = f'file_{file_idx}'
-                encoded_file = b64_encode(string)
-                link = f"https://t.me/{username}?start={encoded_file}"
-                text += f"• <a href='{link}'>{file_name}</a>\n"
-            else:
-                text += f"• {file_name}\n"
+            encoded_file = file_ref(file_idx)
+            link = f"https://t.me/{username}?start={encoded_file}"
+            text += f"• <a href='{link}'>{file_name}</a>\n"
         
-        if total_pages > 1:
-            encoded_path = b64_encode(current_path, "utf-8")
+        if total_pages > 1 and folder_idx is not None:
             nav_row = []
             if page > 0:
-                nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'folderp:{page - 1}:{encoded_path}'))
+                nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'browse_folder_{encode_ref(REF_FOLDER, folder_idx, page - 1)}'))
             if page < total_pages - 1:
-                nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'folderp:{page + 1}:{encoded_path}'))
+                nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'browse_folder_{encode_ref(REF_FOLDER, folder_idx, page + 1)}'))
             if nav_row:
                 buttons.append(nav_row)
     
@@ -159,7 +245,7 @@ async def build_browse_folder_ui(client, user_id: int, current_path: str, page:
     
     if '/' in current_path:
         parent_path = '/'.join(current_path.split('/')[:-1])
-        parent_encoded = b64_encode(parent_path, "utf-8")
+        parent_encoded = encode_ref(REF_FOLDER, folder_ids[parent_path], 0) if parent_path in folder_ids else b64_encode(parent_path, "utf-8")
         buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'browse_folder_{parent_encoded}')])
     else:
         buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_folder')])
@@ -167,20 +253,20 @@ async def build_browse_folder_ui(client, user_id: int, current_path: str, page:
     return text, buttons
 
 
-async def build_shared_folder_ui(client, owner_id: int, current_path: str, viewer_id: int, page: int = 0) -> tuple:
+async def build_shared_folder_ui(client, owner_id: int, current_path: str, viewer_id: int, page: int = 0, share_link: str = None) -> tuple:
     display_name = await db.get_folder_display_name(current_path)
     files_in_folder = await db.get_files_by_folder(owner_id, folder=current_path)
-    total_files_recursive = await db.get_files_in_folder_recursive(owner_id, current_path)
+    total_files_recursive = await db.count_files_in_folder(owner_id, current_path)
     
     text = f"<b>📁 Shared Folder: {display_name}\n📍 Path: {current_path}\n\n</b>"
-    text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {len(total_files_recursive)}"
+    text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {total_files_recursive}"
     
     buttons = []
-    username = (await client.get_me()).username
-    encoded_path = b64_encode(current_path, "utf-8")
+    username = await bot_username(client)
+    encoded_path = shared_folder_ref(owner_id, current_path)
     
     action_row = []
-    action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{owner_id}_{encoded_path}'))
+    action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{encoded_path}'))
     buttons.append(action_row)
     
     subfolders = await db.get_subfolders(owner_id, current_path)
@@ -188,16 +274,16 @@ async def build_shared_folder_ui(client, owner_id: int, current_path: str, viewe
     for f in subfolders:
         sub_folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
         sub_display = await db.get_folder_display_name(sub_folder_name)
-        sub_encoded = b64_encode(sub_folder_name, "utf-8")
+        sub_encoded = shared_folder_ref(owner_id, sub_folder_name)
         
         sub_access_key = f"{viewer_id}_{owner_id}_{sub_folder_name}"
         is_sub_protected = await db.is_folder_password_protected(owner_id, sub_folder_name)
         
         if is_sub_protected and sub_access_key not in VERIFIED_FOLDER_ACCESS:
-            row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
+            row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{sub_encoded}'))
         else:
-            files_in_sub = await db.get_files_in_folder_recursive(owner_id, sub_folder_name)
-            row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_sub)})', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
+            files_in_sub = await db.count_files_in_folder(owner_id, sub_folder_name)
+            row.append(InlineKeyboardButton(f'📁 {sub_display} ({files_in_sub})', callback_data=f'shared_folder_{sub_encoded}'))
         
         if len(row) == 2:
             buttons.append(row)
@@ -220,8 +306,7 @@ async def build_shared_folder_ui(client, owner_id: int, current_path: str, viewe
                 file_name = file_name[:37] + "..."
             file_id = file_obj.get('file_id')
             if file_id:
-                file_link_data = f"sharedfile_{owner_id}_{file_id}"
-                encoded_file_link = b64_encode(file_link_data)
+                encoded_file_link = shared_file_ref(owner_id, file_id)
                 link = f"https://t.me/{username}?start={encoded_file_link}"
                 text += f"• <a href='{link}'>{file_name}</a>\n"
             else:
@@ -230,83 +315,129 @@ async def build_shared_folder_ui(client, owner_id: int, current_path: str, viewe
         if total_pages > 1:
             nav_row = []
             if page > 0:
-                nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'sharedp:{page - 1}:{owner_id}:{encoded_path}'))
+                nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'shared_folder_{shared_folder_ref(owner_id, current_path, page - 1)}'))
             if page < total_pages - 1:
-                nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'sharedp:{page + 1}:{owner_id}:{encoded_path}'))
+                nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'shared_folder_{shared_folder_ref(owner_id, current_path, page + 1)}'))
             if nav_row:
                 buttons.append(nav_row)
     
     if '/' in current_path:
         parent_path = '/'.join(current_path.split('/')[:-1])
-        parent_encoded = b64_encode(parent_path, "utf-8")
-        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{owner_id}_{parent_encoded}')])
+        parent_encoded = shared_folder_ref(owner_id, parent_path)
+        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{parent_encoded}')])
     
-    link_data = f"folder_{owner_id}_{encoded_path}"
-    encoded_link = b64_encode(link_data)
-    share_link = f"https://t.me/{username}?start={encoded_link}"
+    if not share_link:
+        # Prefer the owner's folder token link when there is one; the signed ref is stable too
+        token = await db.get_folder_token(owner_id, current_path)
+        share_link = f"https://t.me/{username}?start=" + (f"folder_{token}" if token else encoded_path)
     
     raw_buttons = [[
         {"text": "Copy folder link", "copy_text": {"text": share_link}}, 
-        {"text": "📋 Last 5", "callback_data": f"last5_shared_{owner_id}_{encoded_path}"}
+        {"text": "📋 Last 5", "callback_data": f"last5_shared_{encoded_path}"}
     ]]
     raw_buttons.extend(convert_pyrogram_buttons_to_raw(buttons))
     
     return text, raw_buttons
 
 
-async def send_folder_files(client, user_id: int, files: list, folder_path: str, sts_message, buttons: list):
-    success_count = 0
-    error_count = 0
-    total = len(files)
+async def enqueue_file_send(client, query, files: list, label: str):
+    """Queue a durable job that copies stored files from LOG_CHANNEL to the user"""
+    return await enqueue_file_ids_send(client, query, [file_obj.get('file_id') for file_obj in files], label)
+
+
+async def enqueue_file_ids_send(client, query, file_ids: list, label: str):
+    """enqueue_file_send for callers that only hold LOG_CHANNEL message ids"""
+    file_ids = [int(file_id) for file_id in file_ids if str(file_id).isdigit()]
     
-    for file_obj in files:
-        if BATCH_STOP_FLAGS.get(user_id, False):
-            await sts_message.edit(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
-            BATCH_STOP_FLAGS.pop(user_id, None)
-            return success_count, error_count, True
+    job_id = new_job_id()
+    sts = await query.message.reply_text(f"<b>Sending {len(file_ids)} files {label}...\n\nPlease wait...</b>", reply_markup=stop_button(job_id))
+    await JOBS.enqueue(
+        client, "send_files", query.from_user.id,
+        {'file_ids': file_ids, 'label': label, 'chat_id': query.from_user.id},
+        total=len(file_ids), job_id=job_id, status=(sts.chat.id, sts.id)
+    )
+    return job_id
+
+
+async def copy_each(client, chat_id, file_ids):
+    """Copy stored files one message at a time; returns (sent, errors)"""
+    sent = errors = 0
+    for file_id in file_ids:
+        for attempt in range(2):
+            try:
+                msg = await client.get_messages(LOG_CHANNEL, file_id)
+                if msg and msg.media:
+                    await msg.copy(chat_id=chat_id, protect_content=False)
+                    sent += 1
+                break
+            except FloodWait as e:
+                if attempt:
+                    errors += 1
+                    break
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                logger.error(f"Error sending file: {e}")
+                errors += 1
+                break
+    return sent, errors
+
+
+@JOBS.handler("send_files")
+async def run_send_files_job(ctx):
+    file_ids = ctx.payload['file_ids']
+    label = ctx.payload['label']
+    chat_id = ctx.payload['chat_id']
+    total = len(file_ids)
+    success_count = ctx.progress.get('sent', 0)
+    error_count = ctx.progress.get('errors', 0)
+    
+    # No caption is rewritten here, so whole runs of ids go out in one call each
+    i = ctx.cursor
+    retried = False
+    while i < total:
+        if not await ctx.checkpoint(i, sent=success_count, errors=error_count):
+            await ctx.finish(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
+            return
         
+        chunk = file_ids[i:i + max(BULK_COPY_SIZE, 1)]
         try:
-            file_id = file_obj.get('file_id')
-            if not file_id:
-                continue
-            
-            msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-            if msg and msg.media:
-                await msg.copy(chat_id=user_id, protect_content=False)
-                success_count += 1
-                
-                if success_count % 10 == 0:
-                    try:
-                        await sts_message.edit(f"<b>Sending files...\n\nSent: {success_count}/{total}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                    except:
-                        pass
-                
-                await asyncio.sleep(0.5)
+            if len(chunk) > 1:
+                success_count += sum(1 for msg_id in await copy_many(ctx.client, chat_id, LOG_CHANNEL, chunk) if msg_id)
+            else:
+                sent, errors = await copy_each(ctx.client, chat_id, chunk)
+                success_count += sent
+                error_count += errors
         except FloodWait as e:
             logger.info(f"FloodWait: sleeping for {e.value} seconds")
-            try:
-                await sts_message.edit(f"<b>FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{total}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            except:
-                pass
+            await ctx.report(f"<b>⏳ FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{total}</b>")
             await asyncio.sleep(e.value)
-            if BATCH_STOP_FLAGS.get(user_id, False):
-                await sts_message.edit(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
-                BATCH_STOP_FLAGS.pop(user_id, None)
-                return success_count, error_count, True
-            try:
-                msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                if msg and msg.media:
-                    await msg.copy(chat_id=user_id, protect_content=False)
-                    success_count += 1
-            except Exception as retry_err:
-                logger.error(f"Retry error: {retry_err}")
-                error_count += 1
+            if ctx.stopping:
+                await ctx.checkpoint(i, sent=success_count, errors=error_count)
+                await ctx.finish(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
+                return
+            if not retried:
+                # Retry this chunk once
+                retried = True
+                continue
+            sent, errors = await copy_each(ctx.client, chat_id, chunk)
+            success_count += sent
+            error_count += errors
         except Exception as e:
-            logger.error(f"Error sending file: {e}")
-            error_count += 1
+            logger.warning(f"Bulk copy failed, sending one by one: {e}")
+            sent, errors = await copy_each(ctx.client, chat_id, chunk)
+            success_count += sent
+            error_count += errors
+        
+        i += len(chunk)
+        retried = False
+        await ctx.report(f"<b>Sending files {label}...\n\nSent: {success_count}/{total}</b>")
     
-    BATCH_STOP_FLAGS.pop(user_id, None)
-    return success_count, error_count, False
+    await ctx.checkpoint(total, force=True, sent=success_count, errors=error_count)
+    result_text = f"<b>✅ Completed!\n\nSent: {success_count} files {label}"
+    if error_count > 0:
+        result_text += f"\n❌ Errors: {error_count}"
+    result_text += "</b>"
+    await ctx.finish(result_text)
 
 
 async def validate_folder_name(folder_name: str, user_id: int, allow_nested: bool = False) -> tuple:
@@ -420,9 +551,9 @@ async def build_root_folders_ui(client, user_id: int) -> tuple:
         folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
         if not folder_name or folder_name.lower() == 'default' or folder_name == 'None':
             continue
-        files_in_f = await db.get_files_in_folder_recursive(user_id, folder_name)
-        encoded = b64_encode(folder_name, "utf-8")
-        row.append(InlineKeyboardButton(f'📁 {folder_name} ({len(files_in_f)})', callback_data=f'browse_folder_{encoded}'))
+        files_in_f = await db.count_files_in_folder(user_id, folder_name)
+        encoded = await folder_ref(user_id, folder_name)
+        row.append(InlineKeyboardButton(f'📁 {folder_name} ({files_in_f})', callback_data=f'browse_folder_{encoded}'))
         if len(row) == 2:
             buttons.append(row)
             row = []
@@ -3,6 +3,7 @@ from pyrogram.errors import InputUserDeactivated, UserNotParticipant, FloodWait,
 from plugins.dbusers import db
 from pyrogram import Client, filters
 from config import ADMINS
+from core.utils.jobs import JOBS, new_job_id, stop_button
 import asyncio
 import datetime
 import time
@@ -26,20 +27,27 @@ async def broadcast_messages(user_id, message):
     except Exception as e:
         return False, "Error"
 
-@Client.on_message(filters.command("broadcast") & filters.user(ADMINS) & filters.reply)
-async def verupikkals(bot, message):
-    users = await db.get_all_users()
-    b_msg = message.reply_to_message
-    sts = await message.reply_text(text='**Broadcasting your messages...**')
-    start_time = time.time()
-    total_users = await db.total_users_count()
-    done = 0
-    blocked = 0
-    deleted = 0
-    failed = 0
-    success = 0
+def broadcast_status(title, total_users, done, success, blocked, deleted):
+    return f"{title}:\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}"
+
+@JOBS.handler("broadcast")
+async def run_broadcast_job(ctx):
+    b_msg = await ctx.client.get_messages(ctx.payload['chat_id'], ctx.payload['message_id'])
+    total_users = ctx.payload['total_users']
+    progress = ctx.progress
+    done = progress.get('done', 0)
+    blocked = progress.get('blocked', 0)
+    deleted = progress.get('deleted', 0)
+    failed = progress.get('failed', 0)
+    success = progress.get('success', 0)
+    last_id = progress.get('last_id')
 
-    async for user in users:
+    # Users are walked in _id order so a resumed job continues after the last one handled
+    query = {'_id': {'$gt': last_id}} if last_id else {}
+    async for user in db.col.find(query, {'id': 1}).sort('_id', 1):
+        if not await ctx.checkpoint(done, done=done, blocked=blocked, deleted=deleted, failed=failed, success=success, last_id=last_id):
+            await ctx.finish(broadcast_status("Broadcast Stopped", total_users, done, success, blocked, deleted))
+            return
         if 'id' in user:
             pti, sh = await broadcast_messages(int(user['id']), b_msg)
             if pti:
@@ -51,22 +59,22 @@ async def verupikkals(bot, message):
                     deleted += 1
                 elif sh == "Error":
                     failed += 1
-            done += 1
-            if not done % 20:
-                try:
-                    await sts.edit(f"Broadcast in progress:\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
-                except:
-                    pass
         else:
             # Handle the case where 'id' key is missing in the user dictionary
-            done += 1
             failed += 1
-            if not done % 20:
-                try:
-                    await sts.edit(f"Broadcast in progress:\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
-                except:
-                    pass
-    
-    time_taken = datetime.timedelta(seconds=int(time.time()-start_time))
-    await sts.edit(f"Broadcast Completed:\nCompleted in {time_taken} seconds.\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
+        done += 1
+        last_id = user['_id']
+        await ctx.report(broadcast_status("Broadcast in progress", total_users, done, success, blocked, deleted))
 
+    await ctx.checkpoint(done, force=True, done=done, blocked=blocked, deleted=deleted, failed=failed, success=success, last_id=last_id)
+    time_taken = datetime.timedelta(seconds=int(time.time() - ctx.payload['started_at']))
+    await ctx.finish(f"Broadcast Completed:\nCompleted in {time_taken} seconds.\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nBlocked: {blocked}\nDeleted: {deleted}")
+
+@Client.on_message(filters.command("broadcast") & filters.user(ADMINS) & filters.reply)
+async def verupikkals(bot, message):
+    b_msg = message.reply_to_message
+    job_id = new_job_id()
+    sts = await message.reply_text(text='**Broadcasting your messages...**', reply_markup=stop_button(job_id))
+    total_users = await db.total_users_count()
+    payload = {'chat_id': b_msg.chat.id, 'message_id': b_msg.id, 'total_users': total_users, 'started_at': time.time()}
+    await JOBS.enqueue(bot, "broadcast", message.from_user.id, payload, total=total_users, job_id=job_id, status=(sts.chat.id, sts.id))
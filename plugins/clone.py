@@ -7,6 +7,7 @@ from pyrogram import Client, filters
 from pyrogram.types import Message
 from pyrogram.errors.exceptions.bad_request_400 import AccessTokenExpired, AccessTokenInvalid
 from config import API_ID, API_HASH, DB_URI, DB_NAME, CLONE_MODE
+from core.bot.identity import register_bot
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +66,7 @@ async def clone(client, message):
             plugins={"root": "clone_plugins"}
         )
         await StoreClient.start()
-        bot = await StoreClient.get_me()
+        bot = register_bot(StoreClient, StoreClient.me or await StoreClient.get_me())
         details = {
             'bot_id': bot.id,
             'is_bot': True,
@@ -123,6 +124,7 @@ async def restart_bots():
                     plugins={"root": "clone_plugins"},
                 )
                 await StoreClient.start()
+                register_bot(StoreClient, StoreClient.me or await StoreClient.get_me())
             except:
                 pass
     except Exception as e:
@@ -10,11 +10,12 @@ from pyrogram import Client, filters, enums
 from pyrogram.errors import ChatAdminRequired, FloodWait
 from pyrogram.types import *
 from pyrogram.raw import functions, types as raw_types
-from plugins.rawapi import send_message_raw, edit_message_text_raw, edit_message_caption_raw, edit_message_reply_markup_raw, edit_message_with_fallback, convert_pyrogram_buttons_to_raw
+from plugins.rawapi import send_message_raw, edit_message_text_raw, edit_message_caption_raw, edit_message_reply_markup_raw, edit_message_with_fallback
 from plugins.password import (
     build_password_buttons,
     handle_set_password_callback,
     handle_view_password_callback,
+    password_alert,
     handle_confirm_remove_password_callback,
     handle_remove_password_callback,
     handle_set_folder_password_message,
@@ -34,7 +35,7 @@ from plugins.password import (
     PASSWORD_PROMPT_MESSAGES,
     PASSWORD_RESPONSE_MESSAGES,
 )
-from utils import verify_user, check_token, check_verification, get_token, b64_encode, b64_decode
+from utils import verify_user, check_token, check_verification, get_token, read_json, b64_encode, b64_decode, encode_ref, decode_ref, REF_FOLDER, REF_BATCH
 from config import *
 from plugins.Folder import (
     get_folder_name_from_idx,
@@ -43,7 +44,6 @@ from plugins.Folder import (
     build_folder_buttons,
     build_browse_folder_ui,
     build_shared_folder_ui,
-    send_folder_files,
     validate_folder_name,
     create_folder_for_user,
     create_subfolder_for_user,
@@ -52,46 +52,39 @@ from plugins.Folder import (
     build_manage_folders_ui,
     build_root_folders_ui,
     build_change_file_folder_ui,
-    BATCH_STOP_FLAGS as FOLDER_BATCH_STOP_FLAGS,
+    folder_ref,
+    file_ref,
+    resolve_folder_ref,
+    resolve_shared_folder_ref,
+    expand_start_ref,
+    enqueue_file_send,
+    enqueue_file_ids_send,
     FOLDER_PROMPT_MSG as FOLDER_PROMPT_MSG_SHARED,
 )
 import re
-import json
+import html
 from urllib.parse import quote_plus
 from core.utils.file_properties import get_name, get_hash, get_media_file_size
+from core.utils.router import CallbackRouter
+from core.utils.menus import MenuCache
+from core.utils.jobs import JOBS, new_job_id, parse_job_id, stop_button, JOB_RUNNING, JOB_QUEUED
+from core.bot.identity import bot_identity, bot_username
+from core.utils.state import STATE
+from core.utils.offload import offload
+from core.utils.blobs import BLOBS
+from core.utils.ingest import IngestBuffer
+from plugins.delivery import DeliverySession, fan_out, disabled_notice, pack_albums, send_album, copy_many, AlbumFloodWait, ALBUM_SIZE
 from pyrogram.errors import PeerIdInvalid, ChannelInvalid, ChatIdInvalid
 import aiohttp
 logger = logging.getLogger(__name__)
 
-BATCH_FILES = {}
-BATCH_STOP_FLAGS = FOLDER_BATCH_STOP_FLAGS  # Use shared batch stop flags from Folder module
+BATCH_FILES = STATE.namespace("batch_files", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
 FOLDER_PROMPT_MSG = FOLDER_PROMPT_MSG_SHARED  # Use shared folder prompt messages from Folder module
-REPORT_BUG_MODE = {}  # Track users in report bug mode: {user_id: message_id}
-RESTORE_MODE = {}  # Track users entering restore token: {user_id: True}
-
-def get_size(size):
-    """Get size in readable format"""
-
-    units = ["Bytes", "KB", "MB", "GB", "TB", "PB", "EB"]
-    size = float(size)
-    i = 0
-    while size >= 1024.0 and i < len(units):
-        i += 1
-        size /= 1024.0
-    return "%.2f %s" % (size, units[i])
-
-async def formate_file_name(file_name, user_id=None):
-    """Format filename by removing brackets, URLs, and applying user filters"""
-    chars = ["[", "]", "(", ")"]
-    for c in chars:
-        file_name = file_name.replace(c, "")
-    file_name = ' '.join(filter(lambda x: not x.startswith('http') and not x.startswith('@') and not x.startswith('www.'), file_name.split()))
-    
-    # Apply user filters to filename
-    if user_id:
-        file_name = await apply_text_filters(user_id, file_name)
-    
-    return file_name
+REPORT_BUG_MODE = STATE.namespace("report_bug", CONVERSATION_TTL, CONVERSATION_MAX_USERS)  # Track users in report bug mode: {user_id: message_id}
+RESTORE_MODE = STATE.namespace("restore_mode", CONVERSATION_TTL, CONVERSATION_MAX_USERS)  # Track users entering restore token: {user_id: True}
+SEARCH_QUERIES = STATE.namespace("search_queries", CONVERSATION_TTL, CONVERSATION_MAX_USERS)  # Last /search per user for paging: {user_id: query}
+SEARCH_PAGE_SIZE = 10
+MENUS = MenuCache()  # Keyboards cached per bot identity
 
 async def get_forum_topics(client, chat_id):
     """Fetch all forum topics from a supergroup"""
@@ -113,61 +106,19 @@ async def get_forum_topics(client, chat_id):
 
 async def apply_text_filters(user_id, text):
     """Apply filters to any text (caption or filename) while preserving line breaks"""
-    filters_list = await db.get_filename_filters(user_id)
-    for item in filters_list:
-        if "|" in item:
-            # Replacement format: old|new
-            old, new = item.split("|", 1)
-            text = text.replace(old.strip(), new.strip())
-        else:
-            # Removal format: just remove
-            text = text.replace(item, "")
-    # Clean up extra spaces per line while preserving line breaks
-    lines = text.split('\n')
-    lines = [' '.join(line.split()) for line in lines]
-    return '\n'.join(lines)
-
-async def build_file_caption(user_id, file_name, file_size, duration=None, original_caption=None, original_filename=None):
-    """Build caption with template variable support, then apply word filters"""
-    user_caption = await db.get_caption(user_id)
-    
-    # Step 1 — Build the caption (original or template)
-    if not user_caption:
-        # No custom caption → use original if available, otherwise empty
-        caption = original_caption or ""
-    else:
-        # Use custom caption template
-        caption = user_caption
-        caption = caption.replace("{filename}", file_name)
-        caption = caption.replace("{filesize}", file_size)
-        caption = caption.replace("{duration}", duration or "N/A")
-    
-    # Step 2 — Apply filters to the entire caption
-    if caption:
-        caption = await apply_text_filters(user_id, caption)
-    
-    return caption
+    compiled = await db.get_compiled_filters(user_id)
+    return compiled.apply(text)
 
-async def build_settings_ui(destinations, delivery_mode, user_id=None):
-    """Build consistent Settings UI buttons and text"""
+def _settings_menu(destinations_count, delivery_mode, caption_length):
     from config import MAX_DESTINATIONS
     
     buttons = []
-    caption = None
-    folders_count = 0
-    if user_id:
-        caption = await db.get_caption(user_id)
-        folders = await db.get_folders(user_id)
-        folders_count = len(folders)
     
     # Destinations button
-    if destinations:
-        buttons.append([InlineKeyboardButton(f'📋 Destinations ({len(destinations)}/{MAX_DESTINATIONS})', callback_data='view_destinations')])
-    else:
-        buttons.append([InlineKeyboardButton(f'📋 Destinations (0/{MAX_DESTINATIONS})', callback_data='view_destinations')])
+    buttons.append([InlineKeyboardButton(f'📋 Destinations ({destinations_count}/{MAX_DESTINATIONS})', callback_data='view_destinations')])
     
     # Caption button
-    caption_text = f"📝 Caption" if not caption else f"📝 Caption ({len(caption)} chars)"
+    caption_text = f"📝 Caption" if not caption_length else f"📝 Caption ({caption_length} chars)"
     buttons.append([InlineKeyboardButton(caption_text, callback_data='caption_menu')])
     
     # Replace or Delete Word button
@@ -177,20 +128,40 @@ async def build_settings_ui(destinations, delivery_mode, user_id=None):
     buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start')])
     
     mode_display = {"pm": "Bot only", "channel": "Channel only", "both": "Both Bot and Channel"}.get(delivery_mode.lower(), delivery_mode.upper())
-    text = f"<b>⚙️ Settings\n\n📤 Destinations: {len(destinations)}/{MAX_DESTINATIONS}\n📨 Send file in: {mode_display}</b>"
+    text = f"<b>⚙️ Settings\n\n📤 Destinations: {destinations_count}/{MAX_DESTINATIONS}\n📨 Send file in: {mode_display}</b>"
     
     return buttons, text
 
-def build_start_buttons():
-    """Build consistent Start menu buttons - used by both /start command and callback"""
+async def build_settings_ui(client, destinations, delivery_mode, user_id=None):
+    """Build consistent Settings UI buttons and text
+    
+    With a user_id the result is memoized on the user's state version, so
+    it is rebuilt only after that user's settings change.
+    """
+    if not user_id:
+        return MENUS.static(client, "settings", _settings_menu, len(destinations), delivery_mode, 0)
+    
+    version = db.state_version(user_id)
+    cached = MENUS.get_user(client, "settings", user_id, version)
+    if cached is not None:
+        return cached
+    
+    caption = await db.get_caption(user_id)
+    menu = MENUS.static(client, "settings", _settings_menu, len(destinations), delivery_mode, len(caption) if caption else 0)
+    return MENUS.set_user(client, "settings", user_id, version, menu)
+
+def _start_buttons():
     return [
         [InlineKeyboardButton('🔍 Support', url='https://t.me/premium'), InlineKeyboardButton('🤖 Updates', url='https://t.me/premium')],
         [InlineKeyboardButton('💝 Help', callback_data='help'), InlineKeyboardButton('😊 About', callback_data='about')],
         [InlineKeyboardButton('📂 My Files', callback_data='my_files_menu'), InlineKeyboardButton('⚙️ Settings', callback_data='settings')]
     ]
 
-def build_reply_keyboard(report_mode=False):
-    """Build Reply Keyboard for main menu"""
+def build_start_buttons(client):
+    """Build consistent Start menu buttons - used by both /start command and callback"""
+    return MENUS.static(client, "start", _start_buttons)
+
+def _reply_keyboard(report_mode):
     if report_mode:
         return ReplyKeyboardMarkup([['❌ Cancel']], resize_keyboard=True, one_time_keyboard=False, is_persistent=False)
     return ReplyKeyboardMarkup([
@@ -198,8 +169,11 @@ def build_reply_keyboard(report_mode=False):
         ['🧐 Report Bug', '💗 About Us']
     ], resize_keyboard=True, one_time_keyboard=False, is_persistent=False)
 
-def build_my_files_buttons():
-    """Build consistent My Files menu buttons - used by both reply keyboard and callback"""
+def build_reply_keyboard(client, report_mode=False):
+    """Build Reply Keyboard for main menu"""
+    return MENUS.static(client, "reply_keyboard", _reply_keyboard, report_mode)
+
+def _my_files_buttons():
     return [
         [InlineKeyboardButton('📄 All Files', callback_data='view_all_files')],
         [InlineKeyboardButton('🏷️ By Category', callback_data='files_by_category'), InlineKeyboardButton('📁 By Folder', callback_data='files_by_folder')],
@@ -207,8 +181,11 @@ def build_my_files_buttons():
         [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start')]
     ]
 
-def build_backup_restore_buttons():
-    """Build Backup & Restore menu buttons"""
+def build_my_files_buttons(client):
+    """Build consistent My Files menu buttons - used by both reply keyboard and callback"""
+    return MENUS.static(client, "my_files", _my_files_buttons)
+
+def _backup_restore_buttons():
     return [
         [InlineKeyboardButton('🔑 Generate Token', callback_data='generate_backup_token'), InlineKeyboardButton('📥 Restore', callback_data='restore_files')],
         [InlineKeyboardButton('🔗 Get Restore Link', callback_data='get_restore_link')],
@@ -216,6 +193,10 @@ def build_backup_restore_buttons():
         [InlineKeyboardButton('❌ Close', callback_data='close_data')]
     ]
 
+def build_backup_restore_buttons(client):
+    """Build Backup & Restore menu buttons"""
+    return MENUS.static(client, "backup_restore", _backup_restore_buttons)
+
 @Client.on_message(filters.command("addcaption") & filters.private)
 async def add_caption_cmd(client, message):
     """Add custom caption with template variables"""
@@ -378,7 +359,7 @@ async def settings_cmd(client, message):
     try:
         destinations = await db.get_destinations(message.from_user.id)
         delivery_mode = await db.get_delivery_mode(message.from_user.id)
-        buttons, text = await build_settings_ui(destinations, delivery_mode, message.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode, message.from_user.id)
         
         try:
             await message.reply_photo(
@@ -392,10 +373,164 @@ async def settings_cmd(client, message):
         logger.error(f"Settings command error: {e}")
         await message.reply_text("<b>❌ Error loading settings</b>")
 
+async def fetch_batch_messages(client, items):
+    """Messages for [(channel_id, msg_id)] in order, one get_messages call per run of the same channel"""
+    messages = []
+    start = 0
+    while start < len(items):
+        channel_id = items[start][0]
+        end = start
+        while end < len(items) and items[end][0] == channel_id:
+            end += 1
+        try:
+            messages.extend(await client.get_messages(channel_id, [msgid for _, msgid in items[start:end]]))
+        except Exception as e:
+            logger.error(f"Error fetching batch files: {e}")
+        start = end
+    return messages
+
+
+@JOBS.handler("batch_link")
+async def run_batch_link_job(ctx):
+    """Deliver the files of a /batch link using the user's delivery settings"""
+    client = ctx.client
+    user_id = ctx.user_id
+    items = ctx.payload['items']
+    session = await DeliverySession.open(user_id)
+    success_count = ctx.progress.get('sent', 0)
+    disabled_dests = list(ctx.progress.get('disabled', []))
+    is_protected_batch = False  # Batch files don't have individual protection status
+    
+    # Items are handled an album's worth at a time: fetched together and packed into media groups
+    i = ctx.cursor
+    while i < len(items):
+        # Check if user clicked stop
+        if not await ctx.checkpoint(i, sent=success_count, disabled=disabled_dests):
+            await ctx.finish(f"⏹️ Batch stopped! Sent {success_count} files before stopping.")
+            return
+        
+        window = items[i:i + ALBUM_SIZE]
+        i += len(window)
+        media = []
+        for info in await fetch_batch_messages(client, window):
+            if not info or info.empty or not info.media:
+                continue
+            file = getattr(info, info.media.value)
+            
+            # Get original caption from message (same as single file logic)
+            original_caption_link = getattr(info, 'caption', None)
+            if original_caption_link:
+                original_caption_link = original_caption_link.html if hasattr(original_caption_link, 'html') else str(original_caption_link)
+            
+            # Build caption with same logic as single file
+            media.append((info, session.media_caption(file, original_caption_link)))
+        
+        for run in pack_albums(media):
+            if session.to_pm:
+                remaining = run
+                for attempt in range(2):
+                    try:
+                        success_count += await send_album(client, user_id, remaining, is_protected_batch)
+                        break
+                    except AlbumFloodWait as e:
+                        # Wait it out and send what is left of the run once more before counting it as failed
+                        success_count += e.sent
+                        remaining = remaining[e.sent:]
+                        if attempt:
+                            logger.error(f"Batch album to {user_id} failed after FloodWait: {e}")
+                        else:
+                            await asyncio.sleep(e.value)
+                    except Exception as e:
+                        logger.error(f"Error processing batch file: {e}")
+                        break
+            
+            if session.delivery_mode != 'pm':
+                # Send to all enabled destinations at once; fan_out retries a FloodWait per
+                # destination, which picks up after the items that already arrived there
+                delivered = {}
+                
+                async def send_rest(dest):
+                    chat_id = dest['channel_id']
+                    done = delivered.get(chat_id, 0)
+                    try:
+                        delivered[chat_id] = done + await send_album(client, chat_id, run[done:], is_protected_batch, dest.get('topic_id'))
+                    except AlbumFloodWait as e:
+                        delivered[chat_id] = done + e.sent
+                        raise
+                
+                try:
+                    result = await fan_out(session, send_rest)
+                    disabled_dests.extend(result.disabled)
+                except Exception as e:
+                    logger.error(f"Error processing batch file: {e}")
+                # Only files that actually arrived are counted
+                success_count += sum(delivered.values())
+        await ctx.report(f"🔄 Processing batch files... {i}/{len(items)}\n\nSent: {success_count}")
+    
+    await ctx.checkpoint(len(items), force=True, sent=success_count, disabled=disabled_dests)
+    await ctx.finish(f"✅ Batch complete! Sent {success_count} files")
+    if disabled_dests:
+        await client.send_message(user_id, disabled_notice(disabled_dests))
+
+JOB_LABELS = {"batch_link": "Batch", "send_files": "Send files", "broadcast": "Broadcast"}
+
+@Client.on_message(filters.command("jobs") & filters.private)
+async def jobs_cmd(client, message):
+    """List the user's unfinished background jobs with Stop/Resume buttons"""
+    jobs = await JOBS.user_jobs(message.from_user.id)
+    if not jobs:
+        await message.reply_text("<b>📭 No running or stopped jobs</b>")
+        return
+    
+    text = "<b>🗂 Your Jobs:</b>\n\n"
+    buttons = []
+    for i, job in enumerate(jobs, 1):
+        label = JOB_LABELS.get(job['kind'], job['kind'])
+        text += f"{i}. {label} — {job['state']} ({job.get('cursor', 0)}/{job.get('total', 0)})\n<code>{job['_id']}</code>\n"
+        if job['state'] in (JOB_QUEUED, JOB_RUNNING):
+            buttons.append([InlineKeyboardButton(f'⏹️ Stop {i}', callback_data=f'stop_job_{job["_id"]}')])
+        else:
+            buttons.append([InlineKeyboardButton(f'▶️ Resume {i}', callback_data=f'resume_job_{job["_id"]}')])
+    await message.reply_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+async def build_search_results(client, user_id, search_query, page):
+    """Text and buttons for one page of /search results"""
+    results = await db.search_files(user_id, search_query)
+    total = len(results)
+    start_idx = page * SEARCH_PAGE_SIZE
+    end_idx = start_idx + SEARCH_PAGE_SIZE
+    
+    username = await bot_username(client)
+    text = f"<b>🔍 Search: {html.escape(search_query)}\n{total} file(s) found - Page {page + 1}\n\n</b>"
+    if not results:
+        text += "❌ No matching files"
+    for n, (file_idx, file_name) in enumerate(results[start_idx:end_idx], start_idx + 1):
+        link = f"https://t.me/{username}?start={file_ref(file_idx)}"
+        text += f"{n}. <a href='{link}'>{html.escape(file_name or 'Unknown')}</a>\n\n"
+    
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'search_page_{page - 1}'))
+    if end_idx < total:
+        buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'search_page_{page + 1}'))
+    return text, [buttons] if buttons else []
+
+@Client.on_message(filters.command("search") & filters.private)
+async def search_cmd(client, message):
+    """Search stored files by name: /search words"""
+    if len(message.command) < 2:
+        await message.reply_text("<b>Usage: /search file name words</b>")
+        return
+    search_query = message.text.split(None, 1)[1].strip()[:100]
+    SEARCH_QUERIES[message.from_user.id] = search_query
+    text, buttons = await build_search_results(client, message.from_user.id, search_query, 0)
+    await message.reply_text(text, reply_markup=InlineKeyboardMarkup(buttons) if buttons else None, disable_web_page_preview=True)
+
 @Client.on_message(filters.command("start") & filters.incoming)
 async def start(client, message):
     try:
-        username = client.me.username
+        me = await bot_identity(client)
+        username = me.username
         if not await db.is_user_exist(message.from_user.id):
             await db.add_user(message.from_user.id, message.from_user.first_name)
             try:
@@ -405,11 +540,10 @@ async def start(client, message):
         
         if len(message.command) != 2:
             # Use shared function for consistent buttons
-            inline_buttons = build_start_buttons()
+            inline_buttons = build_start_buttons(client)
             inline_markup = InlineKeyboardMarkup(inline_buttons)
-            reply_keyboard = build_reply_keyboard()
+            reply_keyboard = build_reply_keyboard(client)
             
-            me = client.me
             start_text = script.START_TXT.format(message.from_user.mention, me.mention)
             
             try:
@@ -444,12 +578,12 @@ async def start(client, message):
                 text="<b>This link is for different user !!</b>",
                 protect_content=True,
             )
-        if await check_verification(client, userid):
+        if await check_verification(userid):
             return await message.reply_text(
                 text="<b>Already Verified !</b>",
                 protect_content=True,
             )
-        is_verify = await verify_user(client, userid, token)
+        is_verify = await verify_user(userid, token)
         if is_verify:
             return await message.reply_text(
                 text="<b>Successfully verified !</b>",
@@ -540,92 +674,25 @@ async def start(client, message):
                 return
             
             # Get all files from this folder
-            folder_files = await db.get_files_in_folder_recursive(owner_id, folder_name)
+            file_count = await db.count_files_in_folder(owner_id, folder_name)
             
-            if not folder_files:
+            if not file_count:
                 return await message.reply_text("<b>❌ This folder is empty or doesn't exist!</b>")
             
             # Show browsable folder UI
-            display_name = await db.get_folder_display_name(folder_name)
-            files_in_folder = await db.get_files_by_folder(owner_id, folder=folder_name)
-            total_files_recursive = len(folder_files)
-            
-            text = f"<b>📁 Shared Folder: {display_name}\n📍 Path: {folder_name}\n\n</b>"
-            text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {total_files_recursive}"
-            
-            buttons = []
-            username = (await client.get_me()).username
+            username = await bot_username(client)
             share_link = f"https://t.me/{username}?start=folder_{token}"
-            
-            # Get All Files button
-            encoded_path = b64_encode(folder_name, "utf-8")
-            buttons.append([InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{owner_id}_{encoded_path}')])
-            
-            # Get subfolders
-            subfolders = await db.get_subfolders(owner_id, folder_name)
-            row = []
-            for f in subfolders:
-                sub_folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                sub_display = await db.get_folder_display_name(sub_folder_name)
-                sub_encoded = b64_encode(sub_folder_name, "utf-8")
-                sub_access_key = f"{message.from_user.id}_{owner_id}_{sub_folder_name}"
-                is_sub_protected = await db.is_folder_password_protected(owner_id, sub_folder_name)
-                
-                if is_sub_protected and sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                    row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                else:
-                    files_in_sub = await db.get_files_in_folder_recursive(owner_id, sub_folder_name)
-                    row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_sub)})', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                
-                if len(row) == 2:
-                    buttons.append(row)
-                    row = []
-            if row:
-                buttons.append(row)
-            
-            # List files with pagination
-            if files_in_folder:
-                items_per_page = 10
-                page = 0
-                total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
-                start_idx = page * items_per_page
-                end_idx = start_idx + items_per_page
-                display_files = files_in_folder[start_idx:end_idx]
-                
-                text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-                for file_obj in display_files:
-                    file_name = file_obj.get('file_name', 'Unknown')
-                    if len(file_name) > 40:
-                        file_name = file_name[:37] + "..."
-                    file_id = file_obj.get('file_id')
-                    if file_id:
-                        file_link_data = f"sharedfile_{owner_id}_{file_id}"
-                        encoded_file_link = b64_encode(file_link_data)
-                        link = f"https://t.me/{username}?start={encoded_file_link}"
-                        text += f"• <a href='{link}'>{file_name}</a>\n"
-                    else:
-                        text += f"• {file_name}\n"
-                
-                if total_pages > 1:
-                    buttons.append([InlineKeyboardButton('Next ➡️', callback_data=f'sharedp:1:{owner_id}:{encoded_path}')])
-            
-            # Back button
-            if '/' in folder_name:
-                parent_path = '/'.join(folder_name.split('/')[:-1])
-                parent_encoded = b64_encode(parent_path, "utf-8")
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{owner_id}_{parent_encoded}')])
-            
-            # Convert to raw API format
-            encoded_path = b64_encode(folder_name, "utf-8")
-            raw_buttons = [[{"text": "Copy folder link", "copy_text": {"text": share_link}}, {"text": "📋 Last 5", "callback_data": f"last5_shared_{owner_id}_{encoded_path}"}]]
-            raw_buttons.extend(convert_pyrogram_buttons_to_raw(buttons))
-            
+            text, raw_buttons = await build_shared_folder_ui(client, owner_id, folder_name, message.from_user.id, share_link=share_link)
             await send_message_raw(message.from_user.id, text, reply_markup=raw_buttons)
             
             return
         
+        ref = decode_ref(data)
+        if ref and ref[0] == REF_BATCH and len(ref[1]) == 1:
+            is_batch = True
+            msg_id = ref[1][0]
         # Check if it's a BATCH link (old format)
-        if data.startswith("BATCH-"):
+        elif data.startswith("BATCH-"):
             # Remove BATCH- prefix and decode
             batch_data = data[6:]  # Remove "BATCH-" prefix
             decoded = b64_decode(batch_data)
@@ -637,7 +704,14 @@ async def start(client, message):
             else:
                 return await message.reply_text("<b>❌ Invalid batch link format!</b>")
         else:
-            decoded = b64_decode(data)
+            decoded = await expand_start_ref(data)
+            signed = decoded is not None
+            if decoded is None:
+                decoded = b64_decode(data)
+            
+            if decoded.startswith(("folder_", "sharedfile_")) and not signed and not LEGACY_LINKS:
+                # Unsigned shared links of older versions name any owner's folder or file
+                return await message.reply_text("<b>❌ This link has expired. Ask the owner for a new one.</b>")
             
             if decoded.startswith("folder_"):
                 # Folder share link format: folder_{owner_user_id}_{encoded_folder_name}
@@ -662,110 +736,13 @@ async def start(client, message):
                         return
                     
                     # Get all files from this folder
-                    folder_files = await db.get_files_in_folder_recursive(owner_id, folder_name)
+                    file_count = await db.count_files_in_folder(owner_id, folder_name)
                     
-                    if not folder_files:
+                    if not file_count:
                         return await message.reply_text("<b>❌ This folder is empty or doesn't exist!</b>")
                     
                     # Show browsable folder UI instead of sending all files
-                    display_name = await db.get_folder_display_name(folder_name)
-                    
-                    # Get files in current folder (not subfolders)
-                    files_in_folder = await db.get_files_by_folder(owner_id, folder=folder_name)
-                    total_files_recursive = len(folder_files)
-                    
-                    text = f"<b>📁 Shared Folder: {display_name}\n📍 Path: {folder_name}\n\n</b>"
-                    text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {total_files_recursive}"
-                    
-                    buttons = []
-                    
-                    # Generate share link for Copy folder link button
-                    username = (await client.get_me()).username
-                    link_data = f"folder_{owner_id}_{encoded_folder}"
-                    encoded_link = b64_encode(link_data)
-                    share_link = f"https://t.me/{username}?start={encoded_link}"
-                    
-                    # 1. Get All Files button
-                    action_row = []
-                    encoded_path = b64_encode(folder_name, "utf-8")
-                    action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{owner_id}_{encoded_path}'))
-                    buttons.append(action_row)
-                    
-                    # 2. Get subfolders
-                    subfolders = await db.get_subfolders(owner_id, folder_name)
-                    
-                    # List subfolders - 2 per row
-                    row = []
-                    for f in subfolders:
-                        sub_folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                        sub_display = await db.get_folder_display_name(sub_folder_name)
-                        sub_encoded = b64_encode(sub_folder_name, "utf-8")
-                        
-                        # Check if subfolder has its own password
-                        sub_access_key = f"{message.from_user.id}_{owner_id}_{sub_folder_name}"
-                        is_sub_protected = await db.is_folder_password_protected(owner_id, sub_folder_name)
-                        
-                        if is_sub_protected and sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                            # Show lock icon, hide file count for protected subfolders
-                            row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                        else:
-                            files_in_sub = await db.get_files_in_folder_recursive(owner_id, sub_folder_name)
-                            row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_sub)})', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                        
-                        if len(row) == 2:
-                            buttons.append(row)
-                            row = []
-                    if row:
-                        buttons.append(row)
-                    
-                    # 3. List files with pagination
-                    if files_in_folder:
-                        owner_user = await db.col.find_one({'id': int(owner_id)})
-                        all_owner_files = owner_user.get('stored_files', []) if owner_user else []
-                        
-                        items_per_page = 10
-                        page = 0
-                        total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
-                        start_idx = page * items_per_page
-                        end_idx = start_idx + items_per_page
-                        display_files = files_in_folder[start_idx:end_idx]
-                        
-                        text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-                        for file_obj in display_files:
-                            file_name = file_obj.get('file_name', 'Unknown')
-                            if len(file_name) > 40:
-                                file_name = file_name[:37] + "..."
-                            # Create a direct file link using file_id from LOG_CHANNEL
-                            file_id = file_obj.get('file_id')
-                            if file_id:
-                                # Create shared file link
-                                file_link_data = f"sharedfile_{owner_id}_{file_id}"
-                                encoded_file_link = b64_encode(file_link_data)
-                                link = f"https://t.me/{username}?start={encoded_file_link}"
-                                text += f"• <a href='{link}'>{file_name}</a>\n"
-                            else:
-                                text += f"• {file_name}\n"
-                        
-                        # Add pagination buttons if needed
-                        if total_pages > 1:
-                            nav_row = []
-                            nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'sharedp:1:{owner_id}:{encoded_path}'))
-                            buttons.append(nav_row)
-                    
-                    # Back button - go to parent folder if exists
-                    if '/' in folder_name:
-                        parent_path = '/'.join(folder_name.split('/')[:-1])
-                        parent_encoded = b64_encode(parent_path, "utf-8")
-                        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{owner_id}_{parent_encoded}')])
-                    
-                    # Convert buttons to raw API format and add copy link buttons
-                    encoded_path = b64_encode(folder_name, "utf-8")
-                    raw_buttons = [[
-                        {"text": "Copy folder link", "copy_text": {"text": share_link}}, 
-                        {"text": "📋 Last 5", "callback_data": f"last5_shared_{owner_id}_{encoded_path}"}
-                    ]]
-                    raw_buttons.extend(convert_pyrogram_buttons_to_raw(buttons))
-                    
+                    text, raw_buttons = await build_shared_folder_ui(client, owner_id, folder_name, message.from_user.id)
                     await send_message_raw(message.from_user.id, text, reply_markup=raw_buttons)
                     
                     return
@@ -947,8 +924,7 @@ async def start(client, message):
             batch_doc = await client.get_messages(LOG_CHANNEL, int(msg_id))
             if batch_doc.document:
                 json_file = await client.download_media(batch_doc)
-                with open(json_file, 'r') as f:
-                    msgs = json.load(f)
+                msgs = await offload(read_json, json_file)
                 try:
                     os.remove(json_file)
                 except:
@@ -966,99 +942,20 @@ async def start(client, message):
     # Process batch files if it's a batch
     if is_batch and msgs:
         try:
-            delivery_mode = await db.get_delivery_mode(message.from_user.id)
-            destinations = await db.get_destinations(message.from_user.id)
-            success_count = 0
-            is_protected_batch = False  # Batch files don't have individual protection status
-            
-            # Set stop flag for this batch
-            BATCH_STOP_FLAGS[message.from_user.id] = False
-            
-            buttons = [[InlineKeyboardButton('⏹️ Stop', callback_data=f'stop_batch_{message.from_user.id}')]]
-            sts = await message.reply_text("🔄 Processing batch files...", reply_markup=InlineKeyboardMarkup(buttons))
-            
-            for msg_item in msgs:
-                # Check if user clicked stop
-                if BATCH_STOP_FLAGS.get(message.from_user.id, False):
-                    await sts.edit(f"⏹️ Batch stopped! Sent {success_count} files before stopping.")
-                    BATCH_STOP_FLAGS.pop(message.from_user.id, None)
-                    return
-                
-                try:
-                    channel_id = int(msg_item.get("channel_id"))
-                    msgid = int(msg_item.get("msg_id"))
-                    
-                    info = await client.get_messages(channel_id, msgid)
-                    if info.media:
-                        file = getattr(info, info.media.value)
-                        title = await formate_file_name(file.file_name, message.from_user.id) if hasattr(file, 'file_name') and file.file_name else "File"
-                        size = get_size(file.file_size) if hasattr(file, 'file_size') else "Unknown"
-                        
-                        # Get original caption from message (same as single file logic)
-                        original_caption_link = getattr(info, 'caption', None)
-                        if original_caption_link:
-                            original_caption_link = original_caption_link.html if hasattr(original_caption_link, 'html') else str(original_caption_link)
-                        
-                        # Build caption with same logic as single file
-                        if hasattr(file, 'file_name') and file.file_name:
-                            f_caption = await build_file_caption(message.from_user.id, title, size, original_caption=original_caption_link, original_filename=file.file_name)
-                        else:
-                            # For media without file_name - apply filters to caption
-                            f_caption = await db.get_caption(message.from_user.id) or original_caption_link or ""
-                            if f_caption:
-                                f_caption = await apply_text_filters(message.from_user.id, f_caption)
-                        
-                        # Use exact same logic as single file delivery
-                        if delivery_mode == 'pm':
-                            # PM only mode
-                            await info.copy(chat_id=message.from_user.id, caption=f_caption if f_caption else None, protect_content=False)
-                            success_count += 1
-                        
-                        elif delivery_mode == 'channel':
-                            # Channel only mode - no PM
-                            enabled_dests = [d for d in destinations if d.get('enabled', True)]
-                            if enabled_dests:
-                                for dest in enabled_dests:
-                                    try:
-                                        await info.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=is_protected_batch, message_thread_id=dest.get('topic_id'))
-                                        success_count += 1
-                                    except Exception as e:
-                                        logger.error(f"Error sending to destination: {e}")
-                        
-                        else:  # 'both' or default
-                            # Send to both PM and destinations
-                            await info.copy(chat_id=message.from_user.id, caption=f_caption if f_caption else None, protect_content=is_protected_batch)
-                            success_count += 1
-                            
-                            if destinations:
-                                enabled_dests = [d for d in destinations if d.get('enabled', True)]
-                                for dest in enabled_dests:
-                                    try:
-                                        await info.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=is_protected_batch, message_thread_id=dest.get('topic_id'))
-                                        # Only count as success if file was actually sent to channel
-                                        success_count += 1
-                                    except Exception as e:
-                                        logger.error(f"Error sending to destination: {e}")
-                    
-                    await asyncio.sleep(0.5)
-                except Exception as e:
-                    logger.error(f"Error processing batch file: {e}")
-                    continue
-            
-            await sts.edit(f"✅ Batch complete! Sent {success_count} files")
-            BATCH_STOP_FLAGS.pop(message.from_user.id, None)
-            return
+            items = [[int(m.get("channel_id")), int(m.get("msg_id"))] for m in msgs]
+            job_id = new_job_id()
+            sts = await message.reply_text("🔄 Processing batch files...", reply_markup=stop_button(job_id))
+            await JOBS.enqueue(client, "batch_link", message.from_user.id, {'items': items}, total=len(items), job_id=job_id, status=(sts.chat.id, sts.id))
         except Exception as e:
             logger.error(f"Batch processing error: {e}")
             await message.reply_text(f"❌ Error processing batch: {str(e)[:50]}")
-            BATCH_STOP_FLAGS.pop(message.from_user.id, None)
-            return
+        return
     
     # For single file links - msg_id contains the file message ID
     decode_file_id = msg_id
-    if not await check_verification(client, message.from_user.id) and VERIFY_MODE == True:
+    if VERIFY_MODE == True and not await check_verification(message.from_user.id):
         btn = [[
-            InlineKeyboardButton("Verify", url=await get_token(client, message.from_user.id, f"https://telegram.me/{username}?start="))
+            InlineKeyboardButton("Verify", url=await get_token(message.from_user.id, f"https://telegram.me/{username}?start="))
         ],[
             InlineKeyboardButton("How To Open Link & Verify", url=VERIFY_TUTORIAL)
         ]]
@@ -1072,8 +969,6 @@ async def start(client, message):
         msg = await client.get_messages(LOG_CHANNEL, int(decode_file_id))
         if msg.media:
             media = getattr(msg, msg.media.value)
-            title = None
-            size = None
             f_caption = ""
             reply_markup = None
             
@@ -1082,18 +977,13 @@ async def start(client, message):
             if original_caption_link:
                 original_caption_link = original_caption_link.html if hasattr(original_caption_link, 'html') else str(original_caption_link)
             
-            if hasattr(media, 'file_name') and media.file_name:
-                title = await formate_file_name(media.file_name, message.from_user.id)
-                size = get_size(media.file_size)
-                f_caption = await build_file_caption(message.from_user.id, title, size, original_caption=original_caption_link, original_filename=media.file_name)
-            else:
-                # For photos and other media without file_name
-                f_caption = await db.get_caption(message.from_user.id) or original_caption_link
+            session = await DeliverySession.open(message.from_user.id)
+            # Photos and other media without file_name keep the template or original caption unfiltered
+            f_caption = session.media_caption(media, original_caption_link, filter_fallback=False)
             
             
             try:
-                delivery_mode = await db.get_delivery_mode(message.from_user.id)
-                destinations = await db.get_destinations(message.from_user.id)
+                delivery_mode = session.delivery_mode
                 
                 # Get file index for action buttons - only if file is in user's database
                 user = await db.col.find_one({'id': int(message.from_user.id)})
@@ -1131,34 +1021,15 @@ async def start(client, message):
                     # PM only mode
                     del_msg = await msg.copy(chat_id=message.from_user.id, caption=f_caption if f_caption else None, reply_markup=reply_markup, protect_content=is_protected)
                 
-                elif delivery_mode == 'channel':
-                    # Channel only mode - no PM
-                    enabled_dests = [d for d in destinations if d.get('enabled', True)]
-                    if enabled_dests:
-                        for dest in enabled_dests:
-                            try:
-                                await msg.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=is_protected, message_thread_id=dest.get('topic_id'))
-                            except Exception as e:
-                                logger.error(f"Error sending to destination: {e}")
-                    return
-                
-                else:  # 'both' or default
-                    # Send to both PM and destinations
-                    if not destinations:
-                        del_msg = await msg.copy(chat_id=message.from_user.id, caption=f_caption if f_caption else None, reply_markup=reply_markup, protect_content=is_protected)
-                    else:
-                        enabled_dests = [d for d in destinations if d.get('enabled', True)]
-                        
+                else:  # 'channel', 'both' or default
+                    if delivery_mode != 'channel':
                         # Send to PM with action buttons
                         del_msg = await msg.copy(chat_id=message.from_user.id, caption=f_caption if f_caption else None, reply_markup=reply_markup, protect_content=is_protected)
-                        
-                        # Send to enabled destinations with filtered caption
-                        for dest in enabled_dests:
-                            try:
-                                await msg.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=is_protected, message_thread_id=dest.get('topic_id'))
-                            except Exception as e:
-                                logger.error(f"Error sending to destination: {e}")
                     
+                    # Send to enabled destinations with filtered caption
+                    result = await fan_out(session, lambda dest: msg.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=is_protected, message_thread_id=dest.get('topic_id')))
+                    if result.disabled:
+                        await message.reply_text(disabled_notice(result.disabled))
                     return
                 
                 if AUTO_DELETE_MODE == True and del_msg:
@@ -1180,13 +1051,13 @@ async def start(client, message):
         logger.error(f"Error: {e}")
         await message.reply_text(f"<b>Error : {str(e)[:50]}</b>")
 
-@Client.on_message(filters.private & filters.text & ~filters.command(["start", "clone", "deletecloned", "batch", "link", "addcaption", "settings", "view_caption", "del_caption"]))
+@Client.on_message(filters.private & filters.text & ~filters.command(["start", "clone", "deletecloned", "batch", "link", "addcaption", "settings", "view_caption", "del_caption", "jobs", "search"]))
 async def handle_user_input(client, message):
     """Unified handler for caption input and t.me links"""
     try:
         # Check for keyboard button taps
         if message.text == "📂 My Files" or message.text == "📁 My Files":
-            buttons = build_my_files_buttons()
+            buttons = build_my_files_buttons(client)
             await message.reply_text("<b>📂 My Files\n\nChoose view:</b>", reply_markup=InlineKeyboardMarkup(buttons))
             return
         
@@ -1207,12 +1078,12 @@ async def handle_user_input(client, message):
         elif message.text == "🧐 Report Bug":
             # Enter report bug mode
             REPORT_BUG_MODE[message.from_user.id] = True
-            report_keyboard = build_reply_keyboard(report_mode=True)
+            report_keyboard = build_reply_keyboard(client, report_mode=True)
             await message.reply_text("<b>🧐 Report a Bug\n\nPlease describe the issue you encountered.\nType your message and send it:</b>", reply_markup=report_keyboard)
             return
         
         elif message.text == "💗 About Us":
-            me2 = client.me.mention if client.me else (await client.get_me()).mention
+            me2 = (await bot_identity(client)).mention
             buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
             await message.reply_text(text=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
             return
@@ -1220,15 +1091,15 @@ async def handle_user_input(client, message):
         elif message.text == "❌ Cancel":
             # Cancel report mode
             if message.from_user.id in REPORT_BUG_MODE:
-                del REPORT_BUG_MODE[message.from_user.id]
-            reply_keyboard = build_reply_keyboard()
+                REPORT_BUG_MODE.pop(message.from_user.id, None)
+            reply_keyboard = build_reply_keyboard(client)
             await message.reply_text("<b>Cancelled</b>", reply_markup=reply_keyboard)
             return
         
         elif message.text == "⚙️ Settings":
             destinations = await db.get_destinations(message.from_user.id)
             delivery_mode = await db.get_delivery_mode(message.from_user.id)
-            buttons, text = await build_settings_ui(destinations, delivery_mode, message.from_user.id)
+            buttons, text = await build_settings_ui(client, destinations, delivery_mode, message.from_user.id)
             
             try:
                 await message.reply_photo(
@@ -1256,17 +1127,17 @@ async def handle_user_input(client, message):
                 await client.send_message(LOG_CHANNEL, report_msg)
                 
                 # Remove from report mode
-                del REPORT_BUG_MODE[message.from_user.id]
+                REPORT_BUG_MODE.pop(message.from_user.id, None)
                 
                 # Send confirmation and restore normal reply keyboard
-                reply_keyboard = build_reply_keyboard()
+                reply_keyboard = build_reply_keyboard(client)
                 await message.reply_text("<b>✅ Thank you! Your bug report has been submitted.</b>", reply_markup=reply_keyboard)
                 return
             except Exception as e:
                 logger.error(f"Report bug error: {e}")
                 if message.from_user.id in REPORT_BUG_MODE:
-                    del REPORT_BUG_MODE[message.from_user.id]
-                reply_keyboard = build_reply_keyboard()
+                    REPORT_BUG_MODE.pop(message.from_user.id, None)
+                reply_keyboard = build_reply_keyboard(client)
                 await message.reply_text("<b>❌ Failed to submit report. Please try again later.</b>", reply_markup=reply_keyboard)
                 return
         
@@ -1292,13 +1163,13 @@ async def handle_user_input(client, message):
                 # Verify token ownership - only the token creator can authorize restore
                 if source_user['id'] != token_user_id:
                     await message.reply_text("<b>❌ Token validation failed! This token is not valid.</b>")
-                    del RESTORE_MODE[message.from_user.id]
+                    RESTORE_MODE.pop(message.from_user.id, None)
                     return
                 
                 # Prevent self-restore
                 if source_user['id'] == message.from_user.id:
                     await message.reply_text("<b>❌ You cannot restore to the same account!</b>")
-                    del RESTORE_MODE[message.from_user.id]
+                    RESTORE_MODE.pop(message.from_user.id, None)
                     return
                 
                 # Transfer files
@@ -1307,16 +1178,16 @@ async def handle_user_input(client, message):
                 if success:
                     # Invalidate the token after successful transfer
                     await db.invalidate_backup_token(source_user['id'])
-                    del RESTORE_MODE[message.from_user.id]
+                    RESTORE_MODE.pop(message.from_user.id, None)
                     await message.reply_text(f"<b>✅ Successfully restored {file_count} files to your account!</b>")
                 else:
                     await message.reply_text("<b>❌ No files found to restore or transfer failed.</b>")
-                    del RESTORE_MODE[message.from_user.id]
+                    RESTORE_MODE.pop(message.from_user.id, None)
                 return
             except Exception as e:
                 logger.error(f"Restore error: {e}")
                 if message.from_user.id in RESTORE_MODE:
-                    del RESTORE_MODE[message.from_user.id]
+                    RESTORE_MODE.pop(message.from_user.id, None)
                 await message.reply_text("<b>❌ Error during restore. Please try again.</b>")
                 return
         
@@ -1661,106 +1532,14 @@ async def handle_user_input(client, message):
                         VERIFIED_FOLDER_ACCESS[f"{message.from_user.id}_{owner_id}_{folder_name}"] = True
                         
                         # Get all files from this folder (including subfolders)
-                        all_folder_files = await db.get_files_in_folder_recursive(owner_id, folder_name)
+                        file_count = await db.count_files_in_folder(owner_id, folder_name)
                         
-                        if not all_folder_files:
+                        if not file_count:
                             await message.reply_text("<b>❌ This folder is empty!</b>")
                             return
                         
                         # Show browsable folder UI
-                        display_name = await db.get_folder_display_name(folder_name)
-                        
-                        # Get files in current folder (not subfolders)
-                        files_in_folder = await db.get_files_by_folder(owner_id, folder=folder_name)
-                        total_files_recursive = len(all_folder_files)
-                        
-                        text = f"<b>📁 Shared Folder: {display_name}\n📍 Path: {folder_name}\n\n</b>"
-                        text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {total_files_recursive}"
-                        
-                        buttons = []
-                        
-                        # Generate share link for Copy folder link button
-                        username = (await client.get_me()).username
-                        link_data = f"folder_{owner_id}_{encoded_folder}"
-                        encoded_link = b64_encode(link_data)
-                        share_link = f"https://t.me/{username}?start={encoded_link}"
-                        
-                        # 1. Get All Files button
-                        action_row = []
-                        encoded_path = b64_encode(folder_name, "utf-8")
-                        action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{owner_id}_{encoded_path}'))
-                        buttons.append(action_row)
-                        
-                        # 2. Get subfolders
-                        subfolders = await db.get_subfolders(owner_id, folder_name)
-                        
-                        # List subfolders - 2 per row
-                        row = []
-                        for f in subfolders:
-                            sub_folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                            sub_display = await db.get_folder_display_name(sub_folder_name)
-                            sub_encoded = b64_encode(sub_folder_name, "utf-8")
-                            
-                            # Check if subfolder has its own password
-                            sub_access_key = f"{message.from_user.id}_{owner_id}_{sub_folder_name}"
-                            is_sub_protected = await db.is_folder_password_protected(owner_id, sub_folder_name)
-                            
-                            if is_sub_protected and sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                                # Show lock icon, hide file count for protected subfolders
-                                row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                            else:
-                                files_in_sub = await db.get_files_in_folder_recursive(owner_id, sub_folder_name)
-                                row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_sub)})', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                            
-                            if len(row) == 2:
-                                buttons.append(row)
-                                row = []
-                        if row:
-                            buttons.append(row)
-                        
-                        # 3. List files with pagination
-                        if files_in_folder:
-                            items_per_page = 10
-                            page = 0
-                            total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
-                            start_idx = page * items_per_page
-                            end_idx = start_idx + items_per_page
-                            display_files = files_in_folder[start_idx:end_idx]
-                            
-                            text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-                            for file_obj in display_files:
-                                file_name = file_obj.get('file_name', 'Unknown')
-                                if len(file_name) > 40:
-                                    file_name = file_name[:37] + "..."
-                                file_id = file_obj.get('file_id')
-                                if file_id:
-                                    # Create shared file link
-                                    file_link_data = f"sharedfile_{owner_id}_{file_id}"
-                                    encoded_file_link = b64_encode(file_link_data)
-                                    link = f"https://t.me/{username}?start={encoded_file_link}"
-                                    text += f"• <a href='{link}'>{file_name}</a>\n"
-                                else:
-                                    text += f"• {file_name}\n"
-                            
-                            # Add pagination buttons if needed
-                            if total_pages > 1:
-                                nav_row = []
-                                nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'sharedp:1:{owner_id}:{encoded_path}'))
-                                buttons.append(nav_row)
-                        
-                        # Back button - go to parent folder if exists
-                        if '/' in folder_name:
-                            parent_path = '/'.join(folder_name.split('/')[:-1])
-                            parent_encoded = b64_encode(parent_path, "utf-8")
-                            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{owner_id}_{parent_encoded}')])
-                        
-                        # Convert buttons to raw API format and add copy link buttons
-                        raw_buttons = [[
-                            {"text": "Copy folder link", "copy_text": {"text": share_link}}, 
-                            {"text": "📋 Last 5", "callback_data": f"last5_shared_{owner_id}_{encoded_path}"}
-                        ]]
-                        raw_buttons.extend(convert_pyrogram_buttons_to_raw(buttons))
-                        
+                        text, raw_buttons = await build_shared_folder_ui(client, owner_id, folder_name, message.from_user.id)
                         await send_message_raw(message.from_user.id, text, reply_markup=raw_buttons)
                     else:
                         # Delete the password input message
@@ -1871,24 +1650,17 @@ async def handle_user_input(client, message):
             if original_caption:
                 original_caption = original_caption.html if hasattr(original_caption, 'html') else str(original_caption)
             
+            # Snapshot delivery settings
+            session = await DeliverySession.open(message.from_user.id)
+            
             if post_msg.media:
                 media = getattr(post_msg, post_msg.media.value)
-                if hasattr(media, 'file_name') and media.file_name:
-                    raw_filename = media.file_name
-                    formatted_filename = await formate_file_name(raw_filename, message.from_user.id)
-                    size = get_size(media.file_size)
-                    f_caption = await build_file_caption(message.from_user.id, formatted_filename, size, original_caption=original_caption, original_filename=raw_filename)
-                else:
-                    f_caption = await db.get_caption(message.from_user.id) or original_caption
-            
-            # Get delivery settings
-            delivery_mode = await db.get_delivery_mode(message.from_user.id)
-            destinations = await db.get_destinations(message.from_user.id)
+                f_caption = session.media_caption(media, original_caption, filter_fallback=False)
             
             success = False
             
             # Send to PM if mode is 'pm' or 'both'
-            if delivery_mode in ['pm', 'both']:
+            if session.delivery_mode in ['pm', 'both']:
                 try:
                     await post_msg.copy(chat_id=message.from_user.id, caption=f_caption if f_caption else None, protect_content=False)
                     success = True
@@ -1896,19 +1668,16 @@ async def handle_user_input(client, message):
                     logger.error(f"Error sending to PM: {e}")
             
             # Send to enabled destinations if mode is 'channel' or 'both'
-            if delivery_mode in ['channel', 'both'] and destinations:
-                for dest in destinations:
-                    if dest.get('enabled', True):
-                        try:
-                            await post_msg.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=False, message_thread_id=dest.get('topic_id'))
-                            success = True
-                        except Exception as e:
-                            logger.error(f"Error sending to destination {dest['channel_id']}: {e}")
+            notice = ""
+            if session.to_destinations:
+                result = await fan_out(session, lambda dest: post_msg.copy(chat_id=dest['channel_id'], caption=f_caption if f_caption else None, protect_content=False, message_thread_id=dest.get('topic_id')))
+                success = success or bool(result.sent)
+                notice = disabled_notice(result.disabled)
             
             if success:
-                await sts.edit("✅ Post sent successfully!")
+                await sts.edit("✅ Post sent successfully!" + (f"\n\n{notice}" if notice else ""))
             else:
-                await sts.edit("❌ No delivery configured or failed to send")
+                await sts.edit("❌ No delivery configured or failed to send" + (f"\n\n{notice}" if notice else ""))
             
         except Exception as e:
             logger.error(f"Error fetching/sending post: {e}")
@@ -1918,2727 +1687,2534 @@ async def handle_user_input(client, message):
     except Exception as e:
         logger.error(f"Error in handle_tme_link: {e}")
 
-@Client.on_callback_query()
-async def callback(client, query):
+
+CALLBACKS = CallbackRouter("main")
+
+
+@CALLBACKS.prefix("stop_batch_", int)
+async def cb_stop_batch(client, query, arg):
+    # Stop buttons from before jobs had ids: stop everything the user is running
+    user_id = arg
+    if query.from_user.id == user_id:
+        await JOBS.stop_user_jobs(user_id)
+        await query.answer("⏹️ Stopping batch...", show_alert=False)
+    else:
+        await query.answer("❌ This is not your batch!", show_alert=True)
+
+
+@CALLBACKS.prefix("stop_job_", parse_job_id)
+async def cb_stop_job(client, query, arg):
+    if arg and await JOBS.stop(arg, query.from_user.id):
+        await query.answer("⏹️ Stopping...", show_alert=False)
+    else:
+        await query.answer("❌ This job is not running or is not yours!", show_alert=True)
+
+
+@CALLBACKS.prefix("resume_job_", parse_job_id)
+async def cb_resume_job(client, query, arg):
+    if arg and await JOBS.resume(arg, query.from_user.id):
+        await query.answer("▶️ Resuming...", show_alert=False)
+        try:
+            await query.message.edit_text("<b>▶️ Resuming from where it stopped...</b>", reply_markup=stop_button(arg))
+        except Exception:
+            pass
+    else:
+        await query.answer("❌ This job can't be resumed!", show_alert=True)
+
+
+@CALLBACKS.route("clone")
+async def cb_clone(client, query, arg):
+    pass  # Already answered above
+
+
+@CALLBACKS.route("toggle_clone")
+async def cb_toggle_clone(client, query, arg):
+    current = await get_clone_mode()
+    new_status = not current
+    await set_clone_mode(new_status)
+    text = "✅ Enabled" if new_status else "❌ Disabled"
+    buttons = [[InlineKeyboardButton(f"Clone: {text}", callback_data="toggle_clone")]]
+    await query.message.edit_text(f"<b>Clone Mode {text}</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer(f"Clone {text}", show_alert=False)
+
+
+@CALLBACKS.route("close_data")
+async def cb_close_data(client, query, arg):
+    await query.message.delete()
+    await query.answer()
+
+
+@CALLBACKS.route("help")
+async def cb_help(client, query, arg):
+    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
     try:
-        if query.data.startswith("stop_batch_"):
-            user_id = int(query.data.split("_")[2])
-            if query.from_user.id == user_id:
-                BATCH_STOP_FLAGS[user_id] = True
-                await query.answer("⏹️ Stopping batch...", show_alert=False)
-            else:
-                await query.answer("❌ This is not your batch!", show_alert=True)
-            return
+        await query.message.edit_caption(caption=script.HELP_TXT, reply_markup=InlineKeyboardMarkup(buttons))
+    except:
+        await query.message.edit_text(text=script.HELP_TXT, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.route("about")
+async def cb_about(client, query, arg):
+    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
+    me2 = (await bot_identity(client)).mention
+    try:
+        await query.message.edit_caption(caption=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
+    except:
+        await query.message.edit_text(text=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.route("start")
+async def cb_start(client, query, arg):
+    # Use shared function for consistent buttons
+    buttons = build_start_buttons(client)
+    me2 = (await bot_identity(client)).mention
+    try:
+        await query.message.edit_caption(caption=script.START_TXT.format(query.from_user.mention, me2), reply_markup=InlineKeyboardMarkup(buttons))
+    except:
+        await query.message.edit_text(text=script.START_TXT.format(query.from_user.mention, me2), reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.route("settings")
+async def cb_settings(client, query, arg):
+    destinations = await db.get_destinations(query.from_user.id)
+    delivery_mode = await db.get_delivery_mode(query.from_user.id)
+    buttons, text = await build_settings_ui(client, destinations, delivery_mode, query.from_user.id)
+    try:
+        await query.message.edit_caption(caption=text, reply_markup=InlineKeyboardMarkup(buttons))
+    except:
+        await query.message.edit_text(text=text, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.route("view_destinations")
+async def cb_view_destinations(client, query, arg):
+    destinations = await db.get_destinations(query.from_user.id)
+    buttons = []
+    text = "<b>📋 Your Destinations:\n\n</b>"
+    
+    if not destinations:
+        text += "No destinations added yet!"
+    else:
+        for i, dest in enumerate(destinations, 1):
+            # Use cached name from db, only fetch if not cached
+            dest_name = dest.get('cached_name') or f"Chat {dest['channel_id']}"
+            
+            # Show topic info if exists
+            topic_id = dest.get('topic_id')
+            topic_name = dest.get('topic_name')
+            topic_info = ""
+            if topic_id:
+                topic_info = f" → {topic_name}" if topic_name else f" → Topic {topic_id}"
+            
+            # Show status
+            status = "✅" if dest.get('enabled', True) else "❌"
+            
+            # Show as clickable button to view details
+            text += f"{i}. {dest_name}{topic_info} {status}\n"
+            buttons.append([InlineKeyboardButton(f"📌 {dest_name}{topic_info}", callback_data=f"dest_detail_{dest['channel_id']}")])
+    
+    delivery_mode = await db.get_delivery_mode(query.from_user.id)
+    buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
+    mode_display = {"pm": "Bot only", "channel": "Channel only", "both": "Both Bot and Channel"}.get(delivery_mode.lower(), delivery_mode.upper())
+    buttons.append([InlineKeyboardButton(f'📨 Send file in: {mode_display}', callback_data='delivery_mode')])
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.prefix("dest_detail_", int)
+async def cb_dest_detail(client, query, arg):
+    channel_id = arg
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    # Find this destination
+    dest_info = None
+    for dest in destinations:
+        if dest['channel_id'] == channel_id:
+            dest_info = dest
+            break
+    
+    if not dest_info:
+        await query.answer("Destination not found!", show_alert=True)
+        return
+    
+    # Use cached name from db
+    dest_name = dest_info.get('cached_name') or f"Chat {channel_id}"
+    
+    # Get current status
+    is_enabled = dest_info.get('enabled', True)
+    status_button = "Enabled✅" if is_enabled else "Disabled❌"
+    status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
+    
+    # Get topic info if exists (only for groups)
+    dest_type = dest_info.get('type', 'channel')
+    topic_text = ""
+    if dest_type == "group":
+        topic_id = dest_info.get('topic_id')
+        topic_name = dest_info.get('topic_name')
+        if topic_id:
+            topic_text = f"\n📌 Topic: {topic_name}" if topic_name else f"\n📌 Topic ID: {topic_id}"
+        else:
+            topic_text = "\n📌 Topic: General (All Topics)"
+    
+    text = f"<b>📌 Destination Details\n\n"
+    text += f"Channel: {dest_name}\n"
+    text += f"Status: {status_display}{topic_text}\n\n</b>"
+    
+    buttons = [
+        [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
+         InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")]
+    ]
+    
+    # Only show Edit Topic for groups
+    if dest_type == "group":
+        buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")])
+    
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("add_destination")
+async def cb_add_destination(client, query, arg):
+    from config import MAX_DESTINATIONS
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    if len(destinations) >= MAX_DESTINATIONS:
+        await query.answer(f"❌ Maximum {MAX_DESTINATIONS} destinations reached!", show_alert=True)
+        return
+    
+    await query.message.reply_text(
+        "<b>➕ Add New Destination\n\n"
+        "Option 1: Forward a message from channel/group\n"
+        "Option 2: Send a group link like:\n"
+        "<code>https://t.me/c/3354769817/7/8</code>\n"
+        "Option 3: Send a channel ID like:\n"
+        "<code>-1001234567890</code>"
+    )
+    try:
+        user_input = await client.ask(query.message.chat.id, "<b>Forward message, send link, or send ID</b>", timeout=120)
         
-        if query.data == "clone":
-            pass  # Already answered above
-        elif query.data == "toggle_clone":
-            current = await get_clone_mode()
-            new_status = not current
-            await set_clone_mode(new_status)
-            text = "✅ Enabled" if new_status else "❌ Disabled"
-            buttons = [[InlineKeyboardButton(f"Clone: {text}", callback_data="toggle_clone")]]
-            await query.message.edit_text(f"<b>Clone Mode {text}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer(f"Clone {text}", show_alert=False)
-            return
-            
-        if query.data == "close_data":
-            await query.message.delete()
-            await query.answer()
-            return
-            
-        if query.data == "help":
-            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
-            try:
-                await query.message.edit_caption(caption=script.HELP_TXT, reply_markup=InlineKeyboardMarkup(buttons))
-            except:
-                await query.message.edit_text(text=script.HELP_TXT, reply_markup=InlineKeyboardMarkup(buttons))
-            
-        elif query.data == "about":
-            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='start'), InlineKeyboardButton('❌ Close', callback_data='close_data')]]
-            me2 = client.me.mention if client.me else (await client.get_me()).mention
-            try:
-                await query.message.edit_caption(caption=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
-            except:
-                await query.message.edit_text(text=script.ABOUT_TXT.format(me2), reply_markup=InlineKeyboardMarkup(buttons))
+        chat_id = None
+        chat_title = None
+        is_group = False
+        topic_id = None
+        dest_type = "channel"
         
-        elif query.data == "start":
-            # Use shared function for consistent buttons
-            buttons = build_start_buttons()
-            me2 = client.me.mention if client.me else (await client.get_me()).mention
-            try:
-                await query.message.edit_caption(caption=script.START_TXT.format(query.from_user.mention, me2), reply_markup=InlineKeyboardMarkup(buttons))
-            except:
-                await query.message.edit_text(text=script.START_TXT.format(query.from_user.mention, me2), reply_markup=InlineKeyboardMarkup(buttons))
+        # Check forwarded message FIRST
+        if user_input.forward_from_chat:
+            chat_id = user_input.forward_from_chat.id
+            chat_title = user_input.forward_from_chat.title
+            chat_type = user_input.forward_from_chat.type
+            is_group = chat_type in ("group", "supergroup")
+            
+            if is_group and user_input.message_thread_id:
+                topic_id = user_input.message_thread_id
+                dest_type = "group"
+            else:
+                dest_type = "group" if is_group else "channel"
         
-        elif query.data == "settings":
-            destinations = await db.get_destinations(query.from_user.id)
-            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-            buttons, text = await build_settings_ui(destinations, delivery_mode, query.from_user.id)
+        # Check for direct ID (like -1001234567890)
+        elif user_input.text and user_input.text.strip().startswith("-100"):
             try:
-                await query.message.edit_caption(caption=text, reply_markup=InlineKeyboardMarkup(buttons))
-            except:
-                await query.message.edit_text(text=text, reply_markup=InlineKeyboardMarkup(buttons))
+                chat_id = int(user_input.text.strip())
+                dest_type = "channel"
+                is_group = False
+            except ValueError:
+                await query.message.reply_text("<b>❌ Invalid channel ID format!</b>")
+                await user_input.delete()
+                destinations = await db.get_destinations(query.from_user.id)
+                delivery_mode = await db.get_delivery_mode(query.from_user.id)
+                buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+                await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+                return
         
-        elif query.data == "view_destinations":
-            destinations = await db.get_destinations(query.from_user.id)
-            buttons = []
-            text = "<b>📋 Your Destinations:\n\n</b>"
-            
-            if not destinations:
-                text += "No destinations added yet!"
+        # Then check for link
+        elif user_input.text and "t.me" in user_input.text:
+            link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', user_input.text)
+            if link_parts:
+                extracted_chat_id = link_parts[0][0]
+                extracted_topic_id = link_parts[0][1] if link_parts[0][1] else None
+                chat_id = int(f"-100{extracted_chat_id}")
+                topic_id = int(extracted_topic_id) if extracted_topic_id else None
+                dest_type = "group"
+                is_group = True
             else:
-                for i, dest in enumerate(destinations, 1):
-                    # Use cached name from db, only fetch if not cached
-                    dest_name = dest.get('cached_name') or f"Chat {dest['channel_id']}"
-                    
-                    # Show topic info if exists
-                    topic_id = dest.get('topic_id')
-                    topic_name = dest.get('topic_name')
-                    topic_info = ""
-                    if topic_id:
-                        topic_info = f" → {topic_name}" if topic_name else f" → Topic {topic_id}"
-                    
-                    # Show status
-                    status = "✅" if dest.get('enabled', True) else "❌"
-                    
-                    # Show as clickable button to view details
-                    text += f"{i}. {dest_name}{topic_info} {status}\n"
-                    buttons.append([InlineKeyboardButton(f"📌 {dest_name}{topic_info}", callback_data=f"dest_detail_{dest['channel_id']}")])
-            
-            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-            buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
-            mode_display = {"pm": "Bot only", "channel": "Channel only", "both": "Both Bot and Channel"}.get(delivery_mode.lower(), delivery_mode.upper())
-            buttons.append([InlineKeyboardButton(f'📨 Send file in: {mode_display}', callback_data='delivery_mode')])
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-        
-        elif query.data.startswith("dest_detail_"):
-            channel_id = int(query.data.split("_")[2])
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            # Find this destination
-            dest_info = None
-            for dest in destinations:
-                if dest['channel_id'] == channel_id:
-                    dest_info = dest
-                    break
-            
-            if not dest_info:
-                await query.answer("Destination not found!", show_alert=True)
+                await query.message.reply_text("<b>❌ Invalid link format!</b>")
+                await user_input.delete()
+                destinations = await db.get_destinations(query.from_user.id)
+                delivery_mode = await db.get_delivery_mode(query.from_user.id)
+                buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+                await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
                 return
-            
-            # Use cached name from db
-            dest_name = dest_info.get('cached_name') or f"Chat {channel_id}"
-            
-            # Get current status
-            is_enabled = dest_info.get('enabled', True)
-            status_button = "Enabled✅" if is_enabled else "Disabled❌"
-            status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-            
-            # Get topic info if exists (only for groups)
-            dest_type = dest_info.get('type', 'channel')
-            topic_text = ""
-            if dest_type == "group":
-                topic_id = dest_info.get('topic_id')
-                topic_name = dest_info.get('topic_name')
-                if topic_id:
-                    topic_text = f"\n📌 Topic: {topic_name}" if topic_name else f"\n📌 Topic ID: {topic_id}"
-                else:
-                    topic_text = "\n📌 Topic: General (All Topics)"
-            
-            text = f"<b>📌 Destination Details\n\n"
-            text += f"Channel: {dest_name}\n"
-            text += f"Status: {status_display}{topic_text}\n\n</b>"
-            
-            buttons = [
-                [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
-                 InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")]
-            ]
-            
-            # Only show Edit Topic for groups
-            if dest_type == "group":
-                buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")])
-            
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')])
-            
+        else:
+            await query.message.reply_text("<b>❌ Please forward a message, send a link, or send a channel ID!</b>")
+            await user_input.delete()
+            destinations = await db.get_destinations(query.from_user.id)
+            delivery_mode = await db.get_delivery_mode(query.from_user.id)
+            buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
             await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+            return
         
-        elif query.data == "add_destination":
-            from config import MAX_DESTINATIONS
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            if len(destinations) >= MAX_DESTINATIONS:
-                await query.answer(f"❌ Maximum {MAX_DESTINATIONS} destinations reached!", show_alert=True)
-                return
-            
-            await query.message.reply_text(
-                "<b>➕ Add New Destination\n\n"
-                "Option 1: Forward a message from channel/group\n"
-                "Option 2: Send a group link like:\n"
-                "<code>https://t.me/c/3354769817/7/8</code>\n"
-                "Option 3: Send a channel ID like:\n"
-                "<code>-1001234567890</code>"
-            )
+        if chat_id:
             try:
-                user_input = await client.ask(query.message.chat.id, "<b>Forward message, send link, or send ID</b>", timeout=120)
-                
-                chat_id = None
-                chat_title = None
-                is_group = False
-                topic_id = None
-                dest_type = "channel"
-                
-                # Check forwarded message FIRST
-                if user_input.forward_from_chat:
-                    chat_id = user_input.forward_from_chat.id
-                    chat_title = user_input.forward_from_chat.title
-                    chat_type = user_input.forward_from_chat.type
-                    is_group = chat_type in ("group", "supergroup")
+                member = await client.get_chat_member(chat_id, "me")
+                if member.privileges and (member.privileges.can_pin_messages or member.privileges.can_delete_messages):
+                    # Get chat title for caching if not already available
+                    if not chat_title:
+                        try:
+                            chat_obj = await client.get_chat(chat_id)
+                            chat_title = chat_obj.title
+                        except:
+                            chat_title = f"Chat {chat_id}"
                     
-                    if is_group and user_input.message_thread_id:
-                        topic_id = user_input.message_thread_id
-                        dest_type = "group"
-                    else:
-                        dest_type = "group" if is_group else "channel"
-                
-                # Check for direct ID (like -1001234567890)
-                elif user_input.text and user_input.text.strip().startswith("-100"):
-                    try:
-                        chat_id = int(user_input.text.strip())
-                        dest_type = "channel"
-                        is_group = False
-                    except ValueError:
-                        await query.message.reply_text("<b>❌ Invalid channel ID format!</b>")
-                        await user_input.delete()
-                        destinations = await db.get_destinations(query.from_user.id)
-                        delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                        buttons, text = await build_settings_ui(destinations, delivery_mode)
-                        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                        return
-                
-                # Then check for link
-                elif user_input.text and "t.me" in user_input.text:
-                    link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', user_input.text)
-                    if link_parts:
-                        extracted_chat_id = link_parts[0][0]
-                        extracted_topic_id = link_parts[0][1] if link_parts[0][1] else None
-                        chat_id = int(f"-100{extracted_chat_id}")
-                        topic_id = int(extracted_topic_id) if extracted_topic_id else None
-                        dest_type = "group"
-                        is_group = True
+                    # Add destination with cached name for faster future loads
+                    was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id, cached_name=chat_title)
+                    await user_input.delete()
+                    
+                    topic_text = f"\n📌 Topic: {topic_id}" if topic_id else ""
+                    
+                    if was_added:
+                        await query.message.reply_text(
+                            f"<b>✅ Added to destinations!\n\n"
+                            f"Type: {'Group' if is_group else 'Channel'}\n"
+                            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+                        )
                     else:
-                        await query.message.reply_text("<b>❌ Invalid link format!</b>")
-                        await user_input.delete()
-                        destinations = await db.get_destinations(query.from_user.id)
-                        delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                        buttons, text = await build_settings_ui(destinations, delivery_mode)
-                        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                        return
+                        await query.message.reply_text(
+                            f"<b>ℹ️ This destination is already saved!\n\n"
+                            f"Type: {'Group' if is_group else 'Channel'}\n"
+                            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+                        )
+                    destinations = await db.get_destinations(query.from_user.id)
+                    delivery_mode = await db.get_delivery_mode(query.from_user.id)
+                    buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+                    await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
                 else:
-                    await query.message.reply_text("<b>❌ Please forward a message, send a link, or send a channel ID!</b>")
-                    await user_input.delete()
+                    await query.message.reply_text("<b>❌ I'm not admin there!</b>")
                     destinations = await db.get_destinations(query.from_user.id)
                     delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                    buttons, text = await build_settings_ui(destinations, delivery_mode)
+                    buttons, text = await build_settings_ui(client, destinations, delivery_mode)
                     await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
                     await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                    return
-                
-                if chat_id:
-                    try:
-                        member = await client.get_chat_member(chat_id, "me")
-                        if member.privileges and (member.privileges.can_pin_messages or member.privileges.can_delete_messages):
-                            # Get chat title for caching if not already available
-                            if not chat_title:
-                                try:
-                                    chat_obj = await client.get_chat(chat_id)
-                                    chat_title = chat_obj.title
-                                except:
-                                    chat_title = f"Chat {chat_id}"
-                            
-                            # Add destination with cached name for faster future loads
-                            was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id, cached_name=chat_title)
-                            await user_input.delete()
-                            
-                            topic_text = f"\n📌 Topic: {topic_id}" if topic_id else ""
-                            
-                            if was_added:
-                                await query.message.reply_text(
-                                    f"<b>✅ Added to destinations!\n\n"
-                                    f"Type: {'Group' if is_group else 'Channel'}\n"
-                                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                                )
-                            else:
-                                await query.message.reply_text(
-                                    f"<b>ℹ️ This destination is already saved!\n\n"
-                                    f"Type: {'Group' if is_group else 'Channel'}\n"
-                                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                                )
-                            destinations = await db.get_destinations(query.from_user.id)
-                            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                            buttons, text = await build_settings_ui(destinations, delivery_mode)
-                            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                        else:
-                            await query.message.reply_text("<b>❌ I'm not admin there!</b>")
-                            destinations = await db.get_destinations(query.from_user.id)
-                            delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                            buttons, text = await build_settings_ui(destinations, delivery_mode)
-                            await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                    except Exception as e:
-                        logger.error(f"Admin check error: {e}")
-                        await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
-                        destinations = await db.get_destinations(query.from_user.id)
-                        delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                        buttons, text = await build_settings_ui(destinations, delivery_mode)
-                        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except asyncio.TimeoutError:
-                await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
-                destinations = await db.get_destinations(query.from_user.id)
-                delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                buttons, text = await build_settings_ui(destinations, delivery_mode)
-                await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
             except Exception as e:
-                logger.error(f"Add destination error: {e}")
+                logger.error(f"Admin check error: {e}")
                 await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
                 destinations = await db.get_destinations(query.from_user.id)
                 delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                buttons, text = await build_settings_ui(destinations, delivery_mode)
+                buttons, text = await build_settings_ui(client, destinations, delivery_mode)
                 await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
                 await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            return
+    except asyncio.TimeoutError:
+        await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
+        destinations = await db.get_destinations(query.from_user.id)
+        delivery_mode = await db.get_delivery_mode(query.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    except Exception as e:
+        logger.error(f"Add destination error: {e}")
+        await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
+        destinations = await db.get_destinations(query.from_user.id)
+        delivery_mode = await db.get_delivery_mode(query.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode)
+        await client.edit_message_media(query.message.chat.id, query.message.id, InputMediaPhoto(random.choice(PICS)))
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.prefix("select_topic_")
+async def cb_select_topic(client, query, arg):
+    # Handle topic selection: select_topic_chat_id_topic_id_topic_title
+    parts = query.data.split("_", 4)  # Split only into 5 parts max
+    chat_id = int(parts[2])
+    topic_id = int(parts[3]) if parts[3] != "0" else None
+    topic_name = parts[4].replace("_", " ") if len(parts) > 4 and parts[4] != "0" else None
+    
+    # Check if this is from add_destination or edit_topic
+    temp_key_add = f"topic_{query.from_user.id}"
+    temp_key_edit = f"edit_topic_{query.from_user.id}"
+    
+    if temp_key_add in BATCH_FILES:
+        # Adding new destination
+        temp_data = BATCH_FILES[temp_key_add]
+        dest_type = temp_data['dest_type']
+        chat_title = temp_data['chat_title']
+        is_group = temp_data['is_group']
         
-        elif query.data.startswith("select_topic_"):
-            # Handle topic selection: select_topic_chat_id_topic_id_topic_title
-            parts = query.data.split("_", 4)  # Split only into 5 parts max
-            chat_id = int(parts[2])
-            topic_id = int(parts[3]) if parts[3] != "0" else None
-            topic_name = parts[4].replace("_", " ") if len(parts) > 4 and parts[4] != "0" else None
-            
-            # Check if this is from add_destination or edit_topic
-            temp_key_add = f"topic_{query.from_user.id}"
-            temp_key_edit = f"edit_topic_{query.from_user.id}"
-            
-            if temp_key_add in BATCH_FILES:
-                # Adding new destination
-                temp_data = BATCH_FILES[temp_key_add]
-                dest_type = temp_data['dest_type']
-                chat_title = temp_data['chat_title']
-                is_group = temp_data['is_group']
-                
-                was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id, topic_name)
-                
-                topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
-                
-                if was_added:
-                    await query.message.edit_text(
-                        f"<b>✅ Added to destinations!\n\n"
-                        f"Type: {'Group' if is_group else 'Channel'}\n"
-                        f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                    )
-                else:
-                    await query.message.edit_text(
-                        f"<b>ℹ️ This destination is already saved!\n\n"
-                        f"Type: {'Group' if is_group else 'Channel'}\n"
-                        f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                    )
-                
-                del BATCH_FILES[temp_key_add]
-                destinations = await db.get_destinations(query.from_user.id)
-                delivery_mode = await db.get_delivery_mode(query.from_user.id)
-                buttons, text = await build_settings_ui(destinations, delivery_mode)
-                
-                # Wait a moment then go back to settings
-                await asyncio.sleep(1.5)
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            
-            elif temp_key_edit in BATCH_FILES:
-                # Editing existing destination
-                temp_data = BATCH_FILES[temp_key_edit]
-                chat_title = temp_data['chat_title']
-                
-                await db.update_destination_topic(query.from_user.id, chat_id, topic_id, topic_name)
-                
-                topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
-                
-                await query.message.edit_text(
-                    f"<b>✅ Topic updated!\n\n"
-                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                )
-                
-                del BATCH_FILES[temp_key_edit]
-                
-                # Wait a moment then go back to destination detail
-                await asyncio.sleep(1.5)
-                destinations = await db.get_destinations(query.from_user.id)
-                for dest in destinations:
-                    if dest['channel_id'] == chat_id:
-                        dest_info = dest
-                        break
-                
-                try:
-                    chat = await client.get_chat(chat_id)
-                    dest_name = chat.title
-                except:
-                    dest_name = f"Chat {chat_id}"
-                
-                is_enabled = dest_info.get('enabled', True)
-                status_button = "Enabled✅" if is_enabled else "Disabled❌"
-                status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-                
-                new_topic_id = dest_info.get('topic_id')
-                new_topic_name = dest_info.get('topic_name')
-                new_dest_type = dest_info.get('type', 'channel')
-                topic_txt = ""
-                if new_dest_type == "group":
-                    if new_topic_id:
-                        topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
-                    else:
-                        topic_txt = "\n📌 Topic: General (All Topics)"
-                
-                text = f"<b>📌 Destination Details\n\n"
-                text += f"Channel: {dest_name}\n"
-                text += f"Status: {status_display}{topic_txt}\n\n</b>"
-                
-                buttons = [
-                    [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{chat_id}"), 
-                     InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{chat_id}")]
-                ]
-                
-                # Only show Edit Topic for groups
-                if new_dest_type == "group":
-                    buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{chat_id}")])
-                
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')])
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            
-            await query.answer("✅ Topic updated!", show_alert=False)
-            return
+        was_added = await db.add_destination(query.from_user.id, chat_id, dest_type, topic_id, topic_name)
         
-        elif query.data.startswith("edit_topic_"):
-            # Edit topic for existing destination
-            channel_id = int(query.data.split("_")[2])
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            dest_info = None
-            for dest in destinations:
-                if dest['channel_id'] == channel_id:
-                    dest_info = dest
-                    break
-            
-            if not dest_info:
-                await query.answer("Destination not found!", show_alert=True)
-                return
-            
-            try:
-                chat = await client.get_chat(channel_id)
-                chat_title = chat.title
-            except:
-                chat_title = f"Chat {channel_id}"
-            
-            # Ask user to enter topic ID manually or send a link
+        topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
+        
+        if was_added:
             await query.message.edit_text(
-                f"<b>📝 Edit Topic for {chat_title}\n\n"
-                f"Send a topic ID (number), or send a link like:\n"
-                f"<code>https://t.me/c/3354769817/2/52</code>\n\n"
-                f"Or send 0 for General (All Topics)</b>"
+                f"<b>✅ Added to destinations!\n\n"
+                f"Type: {'Group' if is_group else 'Channel'}\n"
+                f"Name: <code>{chat_title}</code>{topic_text}</b>"
+            )
+        else:
+            await query.message.edit_text(
+                f"<b>ℹ️ This destination is already saved!\n\n"
+                f"Type: {'Group' if is_group else 'Channel'}\n"
+                f"Name: <code>{chat_title}</code>{topic_text}</b>"
             )
-            
-            try:
-                topic_input = await client.ask(query.message.chat.id, "<b>Topic ID, link, or 0 for General:</b>", timeout=120)
-                entered_topic_id = None
-                entered_topic_name = None
-                
-                if topic_input.text.strip() == "0":
-                    entered_topic_id = None
-                    entered_topic_name = None
-                elif "t.me" in topic_input.text:
-                    # Parse t.me link: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID
-                    link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', topic_input.text)
-                    if link_parts and link_parts[0][1]:
-                        entered_topic_id = int(link_parts[0][1])
-                        entered_topic_name = f"Topic {entered_topic_id}"
-                    else:
-                        await query.message.reply_text("<b>❌ Invalid link format! Use: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID</b>")
-                        await topic_input.delete()
-                        return
-                else:
-                    try:
-                        entered_topic_id = int(topic_input.text.strip())
-                        entered_topic_name = f"Topic {entered_topic_id}"  # Default name since we can't fetch it
-                    except ValueError:
-                        await query.message.reply_text("<b>❌ Invalid input! Please send a number or a valid link.</b>")
-                        await topic_input.delete()
-                        return
-                
-                await db.update_destination_topic(query.from_user.id, channel_id, entered_topic_id, entered_topic_name)
-                await topic_input.delete()
-                
-                topic_text = f"\n📌 Topic: {entered_topic_name}" if entered_topic_id else "\n📌 Topic: General (All Topics)"
-                
-                await query.message.edit_text(
-                    f"<b>✅ Topic updated!\n\n"
-                    f"Name: <code>{chat_title}</code>{topic_text}</b>"
-                )
-                
-                # Go back to destination detail
-                await asyncio.sleep(1.5)
-                destinations = await db.get_destinations(query.from_user.id)
-                for dest in destinations:
-                    if dest['channel_id'] == channel_id:
-                        dest_info = dest
-                        break
-                
-                try:
-                    chat = await client.get_chat(channel_id)
-                    dest_name = chat.title
-                except:
-                    dest_name = f"Chat {channel_id}"
-                
-                is_enabled = dest_info.get('enabled', True)
-                status_button = "Enabled✅" if is_enabled else "Disabled❌"
-                status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-                
-                new_topic_id = dest_info.get('topic_id')
-                new_topic_name = dest_info.get('topic_name')
-                topic_txt = ""
-                if new_topic_id:
-                    topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
-                else:
-                    topic_txt = "\n📌 Topic: General (All Topics)"
-                
-                text = f"<b>📌 Destination Details\n\n"
-                text += f"Channel: {dest_name}\n"
-                text += f"Status: {status_display}{topic_txt}\n\n</b>"
-                
-                buttons = [
-                    [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
-                     InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
-                    [InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")],
-                    [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
-                ]
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except asyncio.TimeoutError:
-                await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
-            except Exception as e:
-                logger.error(f"Edit topic error: {e}")
-                await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
-            
-            return
         
-        elif query.data.startswith("remove_dest_"):
-            channel_id = int(query.data.split("_")[2])
-            await db.remove_destination(query.from_user.id, channel_id)
-            
-            # Go back to destinations list
-            destinations = await db.get_destinations(query.from_user.id)
-            buttons = []
-            text = "<b>📋 Your Destinations:\n\n</b>"
-            
-            if not destinations:
-                text += "No destinations added yet!"
-            else:
-                for i, dest in enumerate(destinations, 1):
-                    try:
-                        chat = await client.get_chat(dest['channel_id'])
-                        dest_name = chat.title
-                    except:
-                        dest_name = f"Chat {dest['channel_id']}"
-                    
-                    text += f"{i}. {dest_name}\n"
-                    buttons.append([InlineKeyboardButton(f"📌 {dest_name}", callback_data=f"dest_detail_{dest['channel_id']}")])
-            
-            buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer("✅ Destination removed!", show_alert=False)
-            return
+        BATCH_FILES.pop(temp_key_add, None)
+        destinations = await db.get_destinations(query.from_user.id)
+        delivery_mode = await db.get_delivery_mode(query.from_user.id)
+        buttons, text = await build_settings_ui(client, destinations, delivery_mode)
         
-        elif query.data.startswith("toggle_dest_enable_"):
-            channel_id = int(query.data.split("_")[3])
-            await db.toggle_destination_status(query.from_user.id, channel_id)
-            
-            # Refresh the detail view
-            destinations = await db.get_destinations(query.from_user.id)
-            
-            dest_info = None
-            for dest in destinations:
-                if dest['channel_id'] == channel_id:
-                    dest_info = dest
-                    break
-            
-            if not dest_info:
-                await query.answer("Destination not found!", show_alert=True)
-                return
-            
-            try:
-                chat = await client.get_chat(channel_id)
-                dest_name = chat.title
-            except:
-                dest_name = f"Chat {channel_id}"
-            
-            is_enabled = dest_info.get('enabled', True)
-            status_button = "Enabled✅" if is_enabled else "Disabled❌"
-            status_msg = "Enabled ✅" if is_enabled else "Disabled ❌"
-            status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
-            
-            # Get topic info for toggle view (only for groups)
-            toggle_type = dest_info.get('type', 'channel')
-            toggle_topic_txt = ""
-            if toggle_type == "group":
-                toggle_topic_id = dest_info.get('topic_id')
-                toggle_topic_name = dest_info.get('topic_name')
-                if toggle_topic_id:
-                    toggle_topic_txt = f"\n📌 Topic: {toggle_topic_name}" if toggle_topic_name else f"\n📌 Topic ID: {toggle_topic_id}"
-                else:
-                    toggle_topic_txt = "\n📌 Topic: General (All Topics)"
-            
-            text = f"<b>📌 Destination Details\n\n"
-            text += f"Channel: {dest_name}\n"
-            text += f"Status: {status_display}{toggle_topic_txt}\n\n</b>"
-            
-            buttons = [
-                [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
-                 InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
-                [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
-            ]
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer(f"Status changed to {status_msg}!", show_alert=False)
-            return
+        # Wait a moment then go back to settings
+        await asyncio.sleep(1.5)
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    
+    elif temp_key_edit in BATCH_FILES:
+        # Editing existing destination
+        temp_data = BATCH_FILES[temp_key_edit]
+        chat_title = temp_data['chat_title']
         
+        await db.update_destination_topic(query.from_user.id, chat_id, topic_id, topic_name)
         
-        elif query.data == "caption_menu":
-            caption = await db.get_caption(query.from_user.id)
-            buttons = []
-            buttons.append([InlineKeyboardButton('✏️ Set Caption', callback_data='set_caption')])
-            if caption:
-                buttons.append([InlineKeyboardButton('👁️ See Caption', callback_data='see_caption')])
-                buttons.append([InlineKeyboardButton('🗑️ Delete Caption', callback_data='delete_caption')])
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
-            await query.message.edit_text(script.CAPTION_MENU_TXT, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+        topic_text = f"\n📌 Topic: {topic_name}" if topic_id and topic_name else (f"\n📌 Topic ID: {topic_id}" if topic_id else "\n📌 Topic: General (All Topics)")
         
-        elif query.data == "customize_menu":
-            buttons = [
-                [InlineKeyboardButton('🔄 Replace Words', callback_data='replace_words'), InlineKeyboardButton('🗑️ Remove Words', callback_data='remove_words')],
-                [InlineKeyboardButton('🔴 Reset All', callback_data='reset_all')],
-                [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')]
-            ]
-            await query.message.edit_text("<b>⚙️ Customize Settings</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+        await query.message.edit_text(
+            f"<b>✅ Topic updated!\n\n"
+            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+        )
         
-        elif query.data == "manage_folders":
-            try:
-                folders = await db.get_folders(query.from_user.id)
-                selected = await db.get_selected_folder(query.from_user.id)
-                
-                buttons = []
-                text = "<b>📁 Manage Folders</b>\n\n"
-                
-                if folders and len(folders) > 0:
-                    text += "Your folders:\n\n"
-                    for idx, f in enumerate(folders):
-                        if isinstance(f, dict):
-                            folder_name = f.get('name', str(f))
-                        else:
-                            folder_name = str(f)
-                        
-                        marker = "✓" if folder_name == selected else " "
-                        buttons.append([
-                            InlineKeyboardButton(f"[{marker}] {folder_name}", callback_data=f"sel_folder_{idx}"),
-                            InlineKeyboardButton("✏️", callback_data=f"rename_folder_{idx}"),
-                            InlineKeyboardButton("❌", callback_data=f"del_folder_{idx}")
-                        ])
-                    text += "✓ = Selected, ✏️ = Rename, ❌ = Delete"
-                else:
-                    text += "No folders yet"
-                
-                buttons.append([InlineKeyboardButton('➕ Create Folder', callback_data='create_folder_btn')])
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except Exception as e:
-                logger.error(f"Manage folders error: {e}")
-                await query.answer(f"❌ Error: {str(e)[:50]}", show_alert=True)
-            return
+        BATCH_FILES.pop(temp_key_edit, None)
         
-        elif query.data.startswith("sel_folder_"):
-            try:
-                idx = int(query.data.split("_")[2])
-                folders = await db.get_folders(query.from_user.id)
-                
-                if 0 <= idx < len(folders):
-                    f = folders[idx]
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    await db.set_selected_folder(query.from_user.id, folder_name)
-                    await query.answer(f"✅ Selected: {folder_name}", show_alert=False)
-                
-                    # Refresh UI
-                    folders = await db.get_folders(query.from_user.id)
-                    selected = await db.get_selected_folder(query.from_user.id)
-                    
-                    buttons = []
-                    text = "<b>📁 Manage Folders</b>\n\n"
-                    
-                    if folders and len(folders) > 0:
-                        text += "Your folders:\n\n"
-                        for i, f in enumerate(folders):
-                            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                            marker = "✓" if folder_name == selected else " "
-                            buttons.append([
-                                InlineKeyboardButton(f"[{marker}] {folder_name}", callback_data=f"sel_folder_{i}"),
-                                InlineKeyboardButton("✏️", callback_data=f"rename_folder_{i}"),
-                                InlineKeyboardButton("❌", callback_data=f"del_folder_{i}")
-                            ])
-                        text += "✓ = Selected, ✏️ = Rename, ❌ = Delete"
-                    
-                    buttons.append([InlineKeyboardButton('➕ Create Folder', callback_data='create_folder_btn')])
-                    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
-                    
-                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except Exception as e:
-                logger.error(f"Select folder error: {e}")
-            return
+        # Wait a moment then go back to destination detail
+        await asyncio.sleep(1.5)
+        destinations = await db.get_destinations(query.from_user.id)
+        for dest in destinations:
+            if dest['channel_id'] == chat_id:
+                dest_info = dest
+                break
         
-        elif query.data.startswith("del_folder_"):
-            try:
-                idx = int(query.data.split("_")[2])
-                folders = await db.get_folders(query.from_user.id)
-                
-                if 0 <= idx < len(folders):
-                    f = folders[idx]
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    
-                    buttons = [
-                        [InlineKeyboardButton("✅ Confirm Delete", callback_data=f"confirm_del_{idx}"), 
-                         InlineKeyboardButton("❌ Cancel", callback_data='manage_folders')]
-                    ]
-                    
-                    await query.message.edit_text(f"<b>Delete folder '{folder_name}'?</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            except Exception as e:
-                logger.error(f"Delete folder error: {e}")
-            return
+        try:
+            chat = await client.get_chat(chat_id)
+            dest_name = chat.title
+        except:
+            dest_name = f"Chat {chat_id}"
         
-        elif query.data.startswith("confirm_del_"):
-            try:
-                idx = int(query.data.split("_")[2])
-                folders = await db.get_folders(query.from_user.id)
-                
-                if 0 <= idx < len(folders):
-                    f = folders[idx]
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    await db.delete_folder(query.from_user.id, folder_name)
-                    selected = await db.get_selected_folder(query.from_user.id)
-                    if selected == folder_name:
-                        await db.set_selected_folder(query.from_user.id, None)
-                    
-                    await query.answer(f"✅ Deleted: {folder_name}", show_alert=False)
-                    
-                    # Refresh UI
-                    folders = await db.get_folders(query.from_user.id)
-                    selected = await db.get_selected_folder(query.from_user.id)
-                    
-                    buttons = []
-                    text = "<b>📁 Manage Folders</b>\n\n"
-                    
-                    if folders and len(folders) > 0:
-                        text += "Your folders:\n\n"
-                        for i, f in enumerate(folders):
-                            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                            marker = "✓" if folder_name == selected else " "
-                            buttons.append([
-                                InlineKeyboardButton(f"[{marker}] {folder_name}", callback_data=f"sel_folder_{i}"),
-                                InlineKeyboardButton("✏️", callback_data=f"rename_folder_{i}"),
-                                InlineKeyboardButton("❌", callback_data=f"del_folder_{i}")
-                            ])
-                        text += "✓ = Selected, ✏️ = Rename, ❌ = Delete"
-                    else:
-                        text += "No folders yet"
-                    
-                    buttons.append([InlineKeyboardButton('➕ Create Folder', callback_data='create_folder_btn')])
-                    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
-                    
-                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            except Exception as e:
-                logger.error(f"Confirm delete error: {e}")
-            return
+        is_enabled = dest_info.get('enabled', True)
+        status_button = "Enabled✅" if is_enabled else "Disabled❌"
+        status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
         
-        elif query.data == "create_folder_btn":
-            await query.answer()
-            await query.message.reply_text("<b>📁 Create New Folder\n\nSend folder name:</b>")
-            CAPTION_INPUT_MODE[query.from_user.id] = "create_folder"
-            return
+        new_topic_id = dest_info.get('topic_id')
+        new_topic_name = dest_info.get('topic_name')
+        new_dest_type = dest_info.get('type', 'channel')
+        topic_txt = ""
+        if new_dest_type == "group":
+            if new_topic_id:
+                topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
+            else:
+                topic_txt = "\n📌 Topic: General (All Topics)"
         
-        elif query.data.startswith("rename_folder_") and not query.data.startswith("rename_folder_action_"):
-            try:
-                idx = int(query.data.split("_")[2])
-                folders = await db.get_folders(query.from_user.id)
-                
-                if 0 <= idx < len(folders):
-                    f = folders[idx]
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    await query.answer()
-                    await query.message.reply_text(f"<b>📝 Rename folder '{folder_name}'\n\nSend new name:</b>")
-                    CAPTION_INPUT_MODE[query.from_user.id] = f"rename_folder:{idx}:{folder_name}"
-            except Exception as e:
-                logger.error(f"Rename folder error: {e}")
-            return
+        text = f"<b>📌 Destination Details\n\n"
+        text += f"Channel: {dest_name}\n"
+        text += f"Status: {status_display}{topic_txt}\n\n</b>"
         
-        elif query.data == "replace_words":
-            filters_list = await db.get_filename_filters(query.from_user.id)
-            replace_list = [f for f in filters_list if "|" in f]
-            
-            buttons = []
-            text = "<b>🔄 Replace Words</b>\n\n"
-            
-            if replace_list:
-                text += "Current replacements:\n\n"
-                for idx, item in enumerate(replace_list, 1):
-                    old, new = item.split("|", 1)
-                    buttons.append([InlineKeyboardButton(f"{idx}. {old.strip()} → {new.strip()}", callback_data=f"del_replace_{idx-1}")])
-                    text += f"{idx}. <code>{old.strip()}</code> → <code>{new.strip()}</code>\n"
-                buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_replace')])
-            else:
-                text += "No replacements set yet\n"
-                buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_replace')])
-            
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
-        
-        elif query.data == "remove_words":
-            filters_list = await db.get_filename_filters(query.from_user.id)
-            remove_list = [f for f in filters_list if "|" not in f]
-            
-            buttons = []
-            text = "<b>🗑️ Remove Words</b>\n\n"
-            
-            if remove_list:
-                text += "Current removals:\n\n"
-                for idx, item in enumerate(remove_list, 1):
-                    buttons.append([InlineKeyboardButton(f"{idx}. {item}", callback_data=f"del_remove_{idx-1}")])
-                    text += f"{idx}. <code>{item}</code>\n"
-                buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_remove')])
-            else:
-                text += "No removals set yet\n"
-                buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_remove')])
-            
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
-        
-        elif query.data.startswith("del_replace_"):
-            idx = int(query.data.split("_")[2])
-            filters_list = await db.get_filename_filters(query.from_user.id)
-            replace_list = [f for f in filters_list if "|" in f]
-            
-            if 0 <= idx < len(replace_list):
-                await db.remove_filename_filter(query.from_user.id, replace_list[idx])
-                # Clear input mode to prevent issues
-                CAPTION_INPUT_MODE.pop(query.from_user.id, None)
-                await query.answer("✅ Replacement deleted!", show_alert=False)
-                
-                # Refresh UI
-                filters_list = await db.get_filename_filters(query.from_user.id)
-                replace_list = [f for f in filters_list if "|" in f]
-                
-                buttons = []
-                text = "<b>🔄 Replace Words</b>\n\n"
-                
-                if replace_list:
-                    text += "Current replacements:\n\n"
-                    for i, item in enumerate(replace_list, 1):
-                        old, new = item.split("|", 1)
-                        buttons.append([InlineKeyboardButton(f"{i}. {old.strip()} → {new.strip()}", callback_data=f"del_replace_{i-1}")])
-                        text += f"{i}. <code>{old.strip()}</code> → <code>{new.strip()}</code>\n"
-                    buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_replace')])
-                else:
-                    text += "No replacements set yet\n"
-                    buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_replace')])
-                
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            return
-        
-        elif query.data.startswith("del_remove_"):
-            idx = int(query.data.split("_")[2])
-            filters_list = await db.get_filename_filters(query.from_user.id)
-            remove_list = [f for f in filters_list if "|" not in f]
-            
-            if 0 <= idx < len(remove_list):
-                await db.remove_filename_filter(query.from_user.id, remove_list[idx])
-                # Clear input mode to prevent issues
-                CAPTION_INPUT_MODE.pop(query.from_user.id, None)
-                await query.answer("✅ Removal deleted!", show_alert=False)
-                
-                # Refresh UI
-                filters_list = await db.get_filename_filters(query.from_user.id)
-                remove_list = [f for f in filters_list if "|" not in f]
-                
-                buttons = []
-                text = "<b>🗑️ Remove Words</b>\n\n"
-                
-                if remove_list:
-                    text += "Current removals:\n\n"
-                    for i, item in enumerate(remove_list, 1):
-                        buttons.append([InlineKeyboardButton(f"{i}. {item}", callback_data=f"del_remove_{i-1}")])
-                        text += f"{i}. <code>{item}</code>\n"
-                    buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_remove')])
-                else:
-                    text += "No removals set yet\n"
-                    buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_remove')])
-                
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            return
-        
-        elif query.data == "add_replace":
-            await query.answer()
-            await query.message.reply_text("<b>🔄 Add More Replacements\n\nFormat replacements as:\nold1|new1\nold2|new2\n\nExample:\n<code>Bot|MyBot\nHii|💗 Krishna</code></b>")
-            CAPTION_INPUT_MODE[query.from_user.id] = "replace_words"
-            return
+        buttons = [
+            [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{chat_id}"), 
+             InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{chat_id}")]
+        ]
         
-        elif query.data == "add_remove":
-            await query.answer()
-            await query.message.reply_text("<b>🗑️ Add More Words to Remove\n\nSend words separated by space:\n\nExample:\n<code>Downloaded By</code></b>")
-            CAPTION_INPUT_MODE[query.from_user.id] = "remove_words"
-            return
+        # Only show Edit Topic for groups
+        if new_dest_type == "group":
+            buttons.append([InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{chat_id}")])
         
-        elif query.data == "reset_all":
-            await db.delete_caption(query.from_user.id)
-            await db.col.update_one({'id': int(query.from_user.id)}, {'$set': {'filename_filters': []}})
-            await query.answer("✅ All settings reset!", show_alert=True)
-            return
+        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')])
         
-        elif query.data == "set_caption":
-            CAPTION_INPUT_MODE[query.from_user.id] = True
-            await query.answer()
-            help_text = """<b>📝 SET CAPTION
-
-Send me your caption text
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    
+    await query.answer("✅ Topic updated!", show_alert=False)
 
-AVAILABLE TEMPLATE VARIABLES:
-• {filename} - File name
-• {filesize} - File size
-• {duration} - Media duration
 
-EXAMPLE:
-<code>{filename}
-💾 Size: {filesize}
-⏰ Duration: {duration}</code></b>"""
-            await query.message.reply_text(help_text)
-            return
+@CALLBACKS.prefix("edit_topic_", int)
+async def cb_edit_topic(client, query, arg):
+    # Edit topic for existing destination
+    channel_id = arg
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    dest_info = None
+    for dest in destinations:
+        if dest['channel_id'] == channel_id:
+            dest_info = dest
+            break
+    
+    if not dest_info:
+        await query.answer("Destination not found!", show_alert=True)
+        return
+    
+    try:
+        chat = await client.get_chat(channel_id)
+        chat_title = chat.title
+    except:
+        chat_title = f"Chat {channel_id}"
+    
+    # Ask user to enter topic ID manually or send a link
+    await query.message.edit_text(
+        f"<b>📝 Edit Topic for {chat_title}\n\n"
+        f"Send a topic ID (number), or send a link like:\n"
+        f"<code>https://t.me/c/3354769817/2/52</code>\n\n"
+        f"Or send 0 for General (All Topics)</b>"
+    )
+    
+    try:
+        topic_input = await client.ask(query.message.chat.id, "<b>Topic ID, link, or 0 for General:</b>", timeout=120)
+        entered_topic_id = None
+        entered_topic_name = None
         
-        elif query.data == "see_caption":
+        if topic_input.text.strip() == "0":
+            entered_topic_id = None
+            entered_topic_name = None
+        elif "t.me" in topic_input.text:
+            # Parse t.me link: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID
+            link_parts = re.findall(r'https://t\.me/c/(\d+)(?:/(\d+))?(?:/(\d+))?', topic_input.text)
+            if link_parts and link_parts[0][1]:
+                entered_topic_id = int(link_parts[0][1])
+                entered_topic_name = f"Topic {entered_topic_id}"
+            else:
+                await query.message.reply_text("<b>❌ Invalid link format! Use: https://t.me/c/CHANNEL_ID/TOPIC_ID/MESSAGE_ID</b>")
+                await topic_input.delete()
+                return
+        else:
             try:
-                caption = await db.get_caption(query.from_user.id)
-                if caption:
-                    text = f"<b>📝 YOUR CAPTION:</b>\n\n<code>{caption}</code>"
-                    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
-                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                else:
-                    text = "<b>❌ No caption set yet\n\nUse 'Set Caption' to create one</b>"
-                    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
-                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                await query.answer()
-            except Exception as e:
-                logger.error(f"See caption error: {e}")
-                await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
-            return
+                entered_topic_id = int(topic_input.text.strip())
+                entered_topic_name = f"Topic {entered_topic_id}"  # Default name since we can't fetch it
+            except ValueError:
+                await query.message.reply_text("<b>❌ Invalid input! Please send a number or a valid link.</b>")
+                await topic_input.delete()
+                return
         
-        elif query.data == "delete_caption":
-            try:
-                caption = await db.get_caption(query.from_user.id)
-                if caption:
-                    await db.delete_caption(query.from_user.id)
-                    text = "<b>✅ CAPTION DELETED\n\nYour caption has been removed successfully</b>"
-                    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
-                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                    await query.answer("Caption deleted!", show_alert=False)
-                else:
-                    text = "<b>❌ No caption to delete\n\nSet a caption first</b>"
-                    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
-                    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-                    await query.answer("No caption found", show_alert=False)
-            except Exception as e:
-                logger.error(f"Delete caption error: {e}")
-                await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
-            return
+        await db.update_destination_topic(query.from_user.id, channel_id, entered_topic_id, entered_topic_name)
+        await topic_input.delete()
         
-        elif query.data == "delivery_mode":
-            current_mode = await db.get_delivery_mode(query.from_user.id)
-            pm_label = "✅ Bot only" if current_mode == "pm" else "Bot only"
-            channel_label = "✅ Channel only" if current_mode == "channel" else "Channel only"
-            both_label = "✅ Both Bot and Channel" if current_mode == "both" else "Both Bot and Channel"
-            buttons = [
-                [InlineKeyboardButton(pm_label, callback_data='mode_pm'), InlineKeyboardButton(channel_label, callback_data='mode_channel')],
-                [InlineKeyboardButton(both_label, callback_data='mode_both')],
-                [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
-            ]
-            await query.message.edit_text("<b>Send file in :</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
+        topic_text = f"\n📌 Topic: {entered_topic_name}" if entered_topic_id else "\n📌 Topic: General (All Topics)"
         
-        elif query.data.startswith("mode_"):
-            mode = query.data.split("_")[1]
-            
-            # Check if user has destinations when selecting channel or both
-            if mode in ['channel', 'both']:
-                destinations = await db.get_destinations(query.from_user.id)
-                if not destinations:
-                    try:
-                        await query.answer(text="Add at least one channel for send file in channel", show_alert=True)
-                    except Exception as e:
-                        logger.error(f"Alert error: {e}")
-                    return
-            
-            await db.set_delivery_mode(query.from_user.id, mode)
-            mode_text = {"pm": "Bot only", "channel": "Channel only", "both": "Both Bot and Channel"}
-            await query.answer(f"✅ {mode_text.get(mode)}", show_alert=False)
-            pm_label = "✅ Bot only" if mode == "pm" else "Bot only"
-            channel_label = "✅ Channel only" if mode == "channel" else "Channel only"
-            both_label = "✅ Both Bot and Channel" if mode == "both" else "Both Bot and Channel"
-            buttons = [
-                [InlineKeyboardButton(pm_label, callback_data='mode_pm'), InlineKeyboardButton(channel_label, callback_data='mode_channel')],
-                [InlineKeyboardButton(both_label, callback_data='mode_both')],
-                [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
-            ]
-            await query.message.edit_text("<b>Send file in :</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            return
+        await query.message.edit_text(
+            f"<b>✅ Topic updated!\n\n"
+            f"Name: <code>{chat_title}</code>{topic_text}</b>"
+        )
         
-        elif query.data.startswith("select_dest_"):
-            channel_id = int(query.data.split("_")[2])
-            selected = BATCH_FILES.get(query.from_user.id, {}).get('selected_dests', [])
-            
-            if channel_id in selected:
-                selected.remove(channel_id)
-            else:
-                selected.append(channel_id)
-            
-            # Update UI
-            await query.answer()
-            return
+        # Go back to destination detail
+        await asyncio.sleep(1.5)
+        destinations = await db.get_destinations(query.from_user.id)
+        for dest in destinations:
+            if dest['channel_id'] == channel_id:
+                dest_info = dest
+                break
         
-        elif query.data == "send_to_pm":
-            file_data = BATCH_FILES.get(query.from_user.id)
-            if file_data:
-                msg = file_data['msg']
-                caption = file_data['caption']
-                await msg.copy(chat_id=query.from_user.id, caption=caption, protect_content=False)
-                await query.message.delete()
-                BATCH_FILES.pop(query.from_user.id, None)
-                await query.answer("✅ Sent to PM!", show_alert=False)
-            return
+        try:
+            chat = await client.get_chat(channel_id)
+            dest_name = chat.title
+        except:
+            dest_name = f"Chat {channel_id}"
         
-        elif query.data == "send_selected":
-            file_data = BATCH_FILES.get(query.from_user.id)
-            if file_data:
-                msg = file_data['msg']
-                selected_dests = file_data.get('selected_dests', [])
-                
-                if not selected_dests:
-                    await query.answer("❌ No destinations selected!", show_alert=True)
-                    return
-                
-                sts = await query.message.edit_text("🔄 Sending to destinations...")
-                success = 0
-                
-                for dest_id in selected_dests:
-                    try:
-                        await msg.copy(chat_id=dest_id, caption=None, protect_content=False)
-                        success += 1
-                    except Exception as e:
-                        logger.error(f"Error sending to destination: {e}")
-                
-                await sts.edit(f"✅ Sent to {success} destination(s)!")
-                BATCH_FILES.pop(query.from_user.id, None)
-            return
+        is_enabled = dest_info.get('enabled', True)
+        status_button = "Enabled✅" if is_enabled else "Disabled❌"
+        status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
         
-        elif query.data == "my_files_menu":
-            buttons = build_my_files_buttons()
-            await query.message.edit_text("<b>📂 My Files\n\nChoose view:</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+        new_topic_id = dest_info.get('topic_id')
+        new_topic_name = dest_info.get('topic_name')
+        topic_txt = ""
+        if new_topic_id:
+            topic_txt = f"\n📌 Topic: {new_topic_name}" if new_topic_name else f"\n📌 Topic ID: {new_topic_id}"
+        else:
+            topic_txt = "\n📌 Topic: General (All Topics)"
         
-        elif query.data == "backup_restore_menu":
-            backup_text = """<b>🔄 Backup & Restore
-
-Sometimes you may want to delete your Telegram account, but you don't want to lose your files and would like to access them in a new account. We've made this simple for you 😉
+        text = f"<b>📌 Destination Details\n\n"
+        text += f"Channel: {dest_name}\n"
+        text += f"Status: {status_display}{topic_txt}\n\n</b>"
+        
+        buttons = [
+            [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
+             InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
+            [InlineKeyboardButton('📝 Edit Topic', callback_data=f"edit_topic_{channel_id}")],
+            [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
+        ]
+        
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    except asyncio.TimeoutError:
+        await query.message.reply_text("<b>❌ Timeout! Please try again.</b>")
+    except Exception as e:
+        logger.error(f"Edit topic error: {e}")
+        await query.message.reply_text(f"<b>❌ Error: {str(e)[:50]}</b>")
+    
 
-1️⃣ First Method:
-Click 'Generate Token' to create a unique token.
-Save it safely! In your new account, start the bot and click 'Restore'. Enter the token, and all your files will be transferred.
 
-2️⃣ Second Method:
-Click 'Get Restore Link' to create your unique link.
-Open that link in your new account, and you're all set.
+@CALLBACKS.prefix("remove_dest_", int)
+async def cb_remove_dest(client, query, arg):
+    channel_id = arg
+    await db.remove_destination(query.from_user.id, channel_id)
+    
+    # Go back to destinations list
+    destinations = await db.get_destinations(query.from_user.id)
+    buttons = []
+    text = "<b>📋 Your Destinations:\n\n</b>"
+    
+    if not destinations:
+        text += "No destinations added yet!"
+    else:
+        for i, dest in enumerate(destinations, 1):
+            try:
+                chat = await client.get_chat(dest['channel_id'])
+                dest_name = chat.title
+            except:
+                dest_name = f"Chat {dest['channel_id']}"
+            
+            text += f"{i}. {dest_name}\n"
+            buttons.append([InlineKeyboardButton(f"📌 {dest_name}", callback_data=f"dest_detail_{dest['channel_id']}")])
+    
+    buttons.append([InlineKeyboardButton('➕ Add Destination', callback_data='add_destination')])
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer("✅ Destination removed!", show_alert=False)
 
-⚠️ Keep your token/link SECRET - anyone with it can restore your files to their account!</b>"""
-            buttons = build_backup_restore_buttons()
-            await query.message.edit_text(backup_text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
-        
-        elif query.data == "generate_backup_token":
-            token = await db.generate_backup_token(query.from_user.id)
-            text = f"""<b>🔑 Your Backup Token
 
-<code>{token}</code>
+@CALLBACKS.prefix("toggle_dest_enable_", int)
+async def cb_toggle_dest_enable(client, query, arg):
+    channel_id = arg
+    await db.toggle_destination_status(query.from_user.id, channel_id)
+    
+    # Refresh the detail view
+    destinations = await db.get_destinations(query.from_user.id)
+    
+    dest_info = None
+    for dest in destinations:
+        if dest['channel_id'] == channel_id:
+            dest_info = dest
+            break
+    
+    if not dest_info:
+        await query.answer("Destination not found!", show_alert=True)
+        return
+    
+    try:
+        chat = await client.get_chat(channel_id)
+        dest_name = chat.title
+    except:
+        dest_name = f"Chat {channel_id}"
+    
+    is_enabled = dest_info.get('enabled', True)
+    status_button = "Enabled✅" if is_enabled else "Disabled❌"
+    status_msg = "Enabled ✅" if is_enabled else "Disabled ❌"
+    status_display = "✅ Enabled" if is_enabled else "❌ Disabled"
+    
+    # Get topic info for toggle view (only for groups)
+    toggle_type = dest_info.get('type', 'channel')
+    toggle_topic_txt = ""
+    if toggle_type == "group":
+        toggle_topic_id = dest_info.get('topic_id')
+        toggle_topic_name = dest_info.get('topic_name')
+        if toggle_topic_id:
+            toggle_topic_txt = f"\n📌 Topic: {toggle_topic_name}" if toggle_topic_name else f"\n📌 Topic ID: {toggle_topic_id}"
+        else:
+            toggle_topic_txt = "\n📌 Topic: General (All Topics)"
+    
+    text = f"<b>📌 Destination Details\n\n"
+    text += f"Channel: {dest_name}\n"
+    text += f"Status: {status_display}{toggle_topic_txt}\n\n</b>"
+    
+    buttons = [
+        [InlineKeyboardButton(f"❌ Remove", callback_data=f"remove_dest_{channel_id}"), 
+         InlineKeyboardButton(status_button, callback_data=f"toggle_dest_enable_{channel_id}")],
+        [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
+    ]
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer(f"Status changed to {status_msg}!", show_alert=False)
 
-⚠️ IMPORTANT: Keep this token SECRET!
-Anyone with this token can restore your files to their account.
 
-To restore in a new account:
-1. Delete your current Telegram account (if needed)
-2. Create a new Telegram account
-3. Start the bot → My Files → Backup & Restore → Restore
-4. Enter this token
+@CALLBACKS.route("caption_menu")
+async def cb_caption_menu(client, query, arg):
+    caption = await db.get_caption(query.from_user.id)
+    buttons = []
+    buttons.append([InlineKeyboardButton('✏️ Set Caption', callback_data='set_caption')])
+    if caption:
+        buttons.append([InlineKeyboardButton('👁️ See Caption', callback_data='see_caption')])
+        buttons.append([InlineKeyboardButton('🗑️ Delete Caption', callback_data='delete_caption')])
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
+    await query.message.edit_text(script.CAPTION_MENU_TXT, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
 
-The token can only be used ONCE - after restore, it becomes invalid.</b>"""
-            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
-        
-        elif query.data == "restore_files":
-            RESTORE_MODE[query.from_user.id] = True
-            text = """<b>📥 Restore Files
 
-Please send the backup token you received from your old account.
+@CALLBACKS.route("customize_menu")
+async def cb_customize_menu(client, query, arg):
+    buttons = [
+        [InlineKeyboardButton('🔄 Replace Words', callback_data='replace_words'), InlineKeyboardButton('🗑️ Remove Words', callback_data='remove_words')],
+        [InlineKeyboardButton('🔴 Reset All', callback_data='reset_all')],
+        [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')]
+    ]
+    await query.message.edit_text("<b>⚙️ Customize Settings</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
 
-The token format is: <code>UserId:token</code>
-Example: <code>123456789:UyFjZE01PpIWFdIBZKAHLVHRYWT9eyjZ</code>
 
-Send /cancel to cancel.</b>"""
-            buttons = [[InlineKeyboardButton('❌ Cancel', callback_data='backup_restore_menu')]]
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+@CALLBACKS.route("manage_folders")
+async def cb_manage_folders(client, query, arg):
+    try:
+        folders = await db.get_folders(query.from_user.id)
+        selected = await db.get_selected_folder(query.from_user.id)
         
-        elif query.data == "get_restore_link":
-            token = await db.generate_backup_token(query.from_user.id)
-            username = (await client.get_me()).username
-            encoded_token = b64_encode(token)
-            restore_link = f"https://t.me/{username}?start=restore_{encoded_token}"
-            text = f"""<b>🔗 Your Restore Link
-
-{restore_link}
-
-Your Token: <code>{token}</code>
+        buttons = []
+        text = "<b>📁 Manage Folders</b>\n\n"
+        
+        if folders and len(folders) > 0:
+            text += "Your folders:\n\n"
+            for idx, f in enumerate(folders):
+                if isinstance(f, dict):
+                    folder_name = f.get('name', str(f))
+                else:
+                    folder_name = str(f)
+                
+                marker = "✓" if folder_name == selected else " "
+                buttons.append([
+                    InlineKeyboardButton(f"[{marker}] {folder_name}", callback_data=f"sel_folder_{idx}"),
+                    InlineKeyboardButton("✏️", callback_data=f"rename_folder_{idx}"),
+                    InlineKeyboardButton("❌", callback_data=f"del_folder_{idx}")
+                ])
+            text += "✓ = Selected, ✏️ = Rename, ❌ = Delete"
+        else:
+            text += "No folders yet"
+        
+        buttons.append([InlineKeyboardButton('➕ Create Folder', callback_data='create_folder_btn')])
+        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
+        
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    except Exception as e:
+        logger.error(f"Manage folders error: {e}")
+        await query.answer(f"❌ Error: {str(e)[:50]}", show_alert=True)
 
-⚠️ Keep this link safe! Only you can authorize the restore from your current account.
 
-To restore:
-1. Open this link in your new Telegram account
-2. Your files will be transferred automatically</b>"""
-            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+@CALLBACKS.prefix("sel_folder_")
+async def cb_sel_folder(client, query, arg):
+    try:
+        idx = int(query.data.split("_")[2])
+        folders = await db.get_folders(query.from_user.id)
         
-        elif query.data == "change_backup_token":
-            existing_token = await db.get_backup_token(query.from_user.id)
-            if not existing_token:
-                await query.answer("❌ No token exists to change!", show_alert=True)
-                return
+        if 0 <= idx < len(folders):
+            f = folders[idx]
+            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+            await db.set_selected_folder(query.from_user.id, folder_name)
+            await query.answer(f"✅ Selected: {folder_name}", show_alert=False)
+        
+            # Refresh UI
+            folders = await db.get_folders(query.from_user.id)
+            selected = await db.get_selected_folder(query.from_user.id)
+            
+            buttons = []
+            text = "<b>📁 Manage Folders</b>\n\n"
+            
+            if folders and len(folders) > 0:
+                text += "Your folders:\n\n"
+                for i, f in enumerate(folders):
+                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+                    marker = "✓" if folder_name == selected else " "
+                    buttons.append([
+                        InlineKeyboardButton(f"[{marker}] {folder_name}", callback_data=f"sel_folder_{i}"),
+                        InlineKeyboardButton("✏️", callback_data=f"rename_folder_{i}"),
+                        InlineKeyboardButton("❌", callback_data=f"del_folder_{i}")
+                    ])
+                text += "✓ = Selected, ✏️ = Rename, ❌ = Delete"
+            
+            buttons.append([InlineKeyboardButton('➕ Create Folder', callback_data='create_folder_btn')])
+            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
             
-            new_token = await db.change_backup_token(query.from_user.id)
-            text = f"""<b>🔄 Token Changed!
+            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    except Exception as e:
+        logger.error(f"Select folder error: {e}")
 
-New Token: <code>{new_token}</code>
 
-⚠️ Your old token is now invalid and cannot be used.
-Anyone with the old token will no longer be able to restore your files.</b>"""
-            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+@CALLBACKS.prefix("del_folder_")
+async def cb_del_folder(client, query, arg):
+    try:
+        idx = int(query.data.split("_")[2])
+        folders = await db.get_folders(query.from_user.id)
         
-        elif query.data == "delete_backup_token":
-            existing_token = await db.get_backup_token(query.from_user.id)
-            if not existing_token:
-                await query.answer("❌ No token exists to delete!", show_alert=True)
-                return
+        if 0 <= idx < len(folders):
+            f = folders[idx]
+            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+            
+            buttons = [
+                [InlineKeyboardButton("✅ Confirm Delete", callback_data=f"confirm_del_{idx}"), 
+                 InlineKeyboardButton("❌ Cancel", callback_data='manage_folders')]
+            ]
             
-            await db.delete_backup_token(query.from_user.id)
-            text = """<b>🗑️ Token Deleted!
+            await query.message.edit_text(f"<b>Delete folder '{folder_name}'?</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    except Exception as e:
+        logger.error(f"Delete folder error: {e}")
 
-Your backup token has been permanently deleted and cannot be recovered.
-No one can use it to restore your files anymore.
 
-You can generate a new token anytime from the Backup & Restore menu.</b>"""
-            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+@CALLBACKS.prefix("confirm_del_")
+async def cb_confirm_del(client, query, arg):
+    try:
+        idx = int(query.data.split("_")[2])
+        folders = await db.get_folders(query.from_user.id)
         
-        elif query.data == "view_all_files" or query.data.startswith("view_all_files_page_"):
-            user = await db.col.find_one({'id': int(query.from_user.id)})
-            all_files = user.get('stored_files', []) if user else []
+        if 0 <= idx < len(folders):
+            f = folders[idx]
+            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+            await db.delete_folder(query.from_user.id, folder_name)
+            selected = await db.get_selected_folder(query.from_user.id)
+            if selected == folder_name:
+                await db.set_selected_folder(query.from_user.id, None)
             
-            # Get page number
-            page = 0
-            if query.data.startswith("view_all_files_page_"):
-                page = int(query.data.split("_")[-1])
+            await query.answer(f"✅ Deleted: {folder_name}", show_alert=False)
             
-            items_per_page = 10
-            start_idx = page * items_per_page
-            end_idx = start_idx + items_per_page
-            paginated_files = all_files[start_idx:end_idx]
-            
-            username = (await client.get_me()).username
-            text = f"<b>📄 All Files (Page {page + 1})\n\n</b>"
-            if not all_files:
-                text += "❌ No files yet"
-            else:
-                count = start_idx
-                for idx, file_obj in enumerate(paginated_files):
-                    actual_idx = start_idx + idx
-                    file_name = file_obj.get('file_name', 'Unknown')
-                    folder = file_obj.get('folder') or 'Unorganized'
-                    string = f'file_{actual_idx}'
-                    encoded = b64_encode(string)
-                    link = f"https://t.me/{username}?start={encoded}"
-                    text += f"{actual_idx + 1}. <a href='{link}'>{file_name}</a> <b>[{folder}]</b>\n\n"
+            # Refresh UI
+            folders = await db.get_folders(query.from_user.id)
+            selected = await db.get_selected_folder(query.from_user.id)
             
             buttons = []
-            # Add pagination buttons
-            if page > 0:
-                buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'view_all_files_page_{page - 1}'))
-            if end_idx < len(all_files):
-                buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_all_files_page_{page + 1}'))
-            
-            button_rows = [buttons] if buttons else []
-            button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
-            await query.answer()
-            return
-        
-        elif query.data == "files_by_folder" or query.data.startswith("browse_folder_") or query.data.startswith("folderp:"):
-            # Handle folder browsing with subfolder support and pagination
-            current_path = None
-            page = 0
+            text = "<b>📁 Manage Folders</b>\n\n"
             
-            if query.data.startswith("folderp:"):
-                # Format: folderp:{page}:{encoded_path} - using colon delimiter to avoid base64 underscore issues
-                parts = query.data.split(":", 2)  # Split into max 3 parts
-                if len(parts) == 3:
-                    try:
-                        page = int(parts[1])
-                        encoded_path = parts[2]
-                        current_path = b64_decode(encoded_path, "utf-8")
-                    except:
-                        current_path = None
-            elif query.data.startswith("browse_folder_"):
-                # Decode the folder path from base64
-                encoded_path = query.data[14:]
-                try:
-                    current_path = b64_decode(encoded_path, "utf-8")
-                except:
-                    current_path = None
+            if folders and len(folders) > 0:
+                text += "Your folders:\n\n"
+                for i, f in enumerate(folders):
+                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+                    marker = "✓" if folder_name == selected else " "
+                    buttons.append([
+                        InlineKeyboardButton(f"[{marker}] {folder_name}", callback_data=f"sel_folder_{i}"),
+                        InlineKeyboardButton("✏️", callback_data=f"rename_folder_{i}"),
+                        InlineKeyboardButton("❌", callback_data=f"del_folder_{i}")
+                    ])
+                text += "✓ = Selected, ✏️ = Rename, ❌ = Delete"
+            else:
+                text += "No folders yet"
             
-            buttons = []
-            
-            if current_path:
-                # Browsing a specific folder - show subfolders and files
-                display_name = await db.get_folder_display_name(current_path)
-                text = f"<b>📁 {display_name}\n📍 Path: {current_path}\n\n</b>"
-                
-                # Get files in current folder (not recursive)
-                files_in_folder = await db.get_files_by_folder(query.from_user.id, folder=current_path)
-                total_files_recursive = await db.get_files_in_folder_recursive(query.from_user.id, current_path)
-                
-                text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {len(total_files_recursive)}"
-                
-                # Find folder index for Edit button
-                all_folders = await db.get_folders(query.from_user.id)
-                folder_idx = None
-                for i, f in enumerate(all_folders):
-                    fname = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    if fname == current_path:
-                        folder_idx = i
-                        break
-                
-                # 1. Get All Files, Last 5 Files, and Edit buttons on TOP
-                action_row = []
-                encoded = b64_encode(current_path, "utf-8")
-                if total_files_recursive:
-                    action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_folder_{encoded}'))
-                if total_files_recursive:
-                    action_row.append(InlineKeyboardButton('📋 Last 5', callback_data=f'last5_folder_{encoded}'))
-                if folder_idx is not None:
-                    action_row.append(InlineKeyboardButton('✏️ Edit', callback_data=f'edit_folder_{folder_idx}'))
-                if action_row:
-                    buttons.append(action_row)
-                
-                # 2. Separator button with alert - only for root folders
-                if '/' not in current_path:
-                    buttons.append([InlineKeyboardButton('•••••••••••••••••••••••••••••', callback_data='folder_separator_alert')])
-                
-                # Get subfolders
-                subfolders = await db.get_subfolders(query.from_user.id, current_path)
-                
-                # 3. List subfolders - 2 per row
-                row = []
-                for f in subfolders:
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    sub_display = await db.get_folder_display_name(folder_name)
-                    files_in_f = await db.get_files_in_folder_recursive(query.from_user.id, folder_name)
-                    # Encode folder path for callback
-                    encoded = b64_encode(folder_name, "utf-8")
-                    row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_f)})', callback_data=f'browse_folder_{encoded}'))
-                    if len(row) == 2:
-                        buttons.append(row)
-                        row = []
-                if row:
-                    buttons.append(row)
-                
-                # List files directly on this page with pagination
-                if files_in_folder:
-                    username = (await client.get_me()).username
-                    user = await db.col.find_one({'id': int(query.from_user.id)})
-                    all_files = user.get('stored_files', []) if user else []
-                    
-                    items_per_page = 10
-                    total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
-                    # Clamp page to valid range
-                    page = max(0, min(page, total_pages - 1))
-                    start_idx = page * items_per_page
-                    end_idx = start_idx + items_per_page
-                    display_files = files_in_folder[start_idx:end_idx]
-                    
-                    text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-                    for file_obj in display_files:
-                        file_name = file_obj.get('file_name', 'Unknown')
-                        # Truncate long file names
-                        if len(file_name) > 40:
-                            file_name = file_name[:37] + "..."
-                        # Find file index in all_files
-                        file_idx = next((i for i, f in enumerate(all_files) if f.get('file_id') == file_obj.get('file_id')), None)
-                        if file_idx is not None:
-                            string = f'file_{file_idx}'
-                            encoded_file = b64_encode(string)
-                            link = f"https://t.me/{username}?start={encoded_file}"
-                            text += f"• <a href='{link}'>{file_name}</a>\n"
-                        else:
-                            text += f"• {file_name}\n"
-                    
-                    # Add pagination buttons if needed
-                    if total_pages > 1:
-                        encoded_path = b64_encode(current_path, "utf-8")
-                        nav_row = []
-                        if page > 0:
-                            nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'folderp:{page - 1}:{encoded_path}'))
-                        if page < total_pages - 1:
-                            nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'folderp:{page + 1}:{encoded_path}'))
-                        if nav_row:
-                            buttons.append(nav_row)
-                
-                # 4. Add subfolder creation button ONLY for root folders (no "/" in path) - at the end
-                if '/' not in current_path:
-                    encoded = b64_encode(current_path, "utf-8")
-                    buttons.append([InlineKeyboardButton('➕ Add Subfolder', callback_data=f'add_subfolder_{encoded}')])
-                
-                # Back button - go to parent folder or root
-                if '/' in current_path:
-                    parent_path = '/'.join(current_path.split('/')[:-1])
-                    parent_encoded = b64_encode(parent_path, "utf-8")
-                    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'browse_folder_{parent_encoded}')])
-                else:
-                    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_folder')])
-            else:
-                # Root level - show root folders
-                text = "<b>📁 Files by Folder\n\n</b>"
-                root_folders = await db.get_root_folders(query.from_user.id)
-                
-                # List root folders - 2 per row
-                row = []
-                for f in root_folders:
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    if not folder_name or folder_name.lower() == 'default' or folder_name == 'None':
-                        continue
-                    files_in_f = await db.get_files_in_folder_recursive(query.from_user.id, folder_name)
-                    encoded = b64_encode(folder_name, "utf-8")
-                    row.append(InlineKeyboardButton(f'📁 {folder_name} ({len(files_in_f)})', callback_data=f'browse_folder_{encoded}'))
-                    if len(row) == 2:
-                        buttons.append(row)
-                        row = []
-                if row:
-                    buttons.append(row)
-                
-                if not buttons:
-                    buttons.append([InlineKeyboardButton('No folders yet', callback_data='noop')])
-                
-                buttons.append([InlineKeyboardButton('➕ Add Folder', callback_data='add_folder_prompt')])
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
-                text += "Select folder:"
+            buttons.append([InlineKeyboardButton('➕ Create Folder', callback_data='create_folder_btn')])
+            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='settings')])
             
             await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
-            await query.answer()
-            return
+    except Exception as e:
+        logger.error(f"Confirm delete error: {e}")
+
+
+@CALLBACKS.route("create_folder_btn")
+async def cb_create_folder_btn(client, query, arg):
+    await query.answer()
+    await query.message.reply_text("<b>📁 Create New Folder\n\nSend folder name:</b>")
+    CAPTION_INPUT_MODE[query.from_user.id] = "create_folder"
+
+
+@CALLBACKS.prefix("rename_folder_")
+async def cb_rename_folder(client, query, arg):
+    try:
+        idx = int(query.data.split("_")[2])
+        folders = await db.get_folders(query.from_user.id)
         
-        elif query.data == "files_by_category":
-            user = await db.col.find_one({'id': int(query.from_user.id)})
-            all_files = user.get('stored_files', []) if user else []
-            
-            # Group by file type
-            categories = {'photo': [], 'video': [], 'audio': [], 'animation': [], 'sticker': [], 'document': []}
-            for f in all_files:
-                file_type = f.get('file_type', 'document')
-                if file_type in categories:
-                    categories[file_type].append(f)
-            
-            # Show all category buttons with counts - 2 per row
-            buttons = []
-            category_icons = {'photo': '📸', 'video': '🎬', 'audio': '🎵', 'animation': '🎞️', 'sticker': '🎨', 'document': '📄'}
-            category_list = ['photo', 'video', 'audio', 'animation', 'sticker', 'document']
-            
-            row = []
-            for cat_type in category_list:
-                count = len(categories[cat_type])
-                icon = category_icons.get(cat_type, '📌')
-                row.append(InlineKeyboardButton(f'{icon} {cat_type.title()} ({count})', callback_data=f'view_category_{cat_type}'))
-                if len(row) == 2:
-                    buttons.append(row)
-                    row = []
-            if row:
-                buttons.append(row)
-            
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
-            await query.message.edit_text("<b>🏷️ Files by Category\n\nSelect category:</b>", reply_markup=InlineKeyboardMarkup(buttons))
+        if 0 <= idx < len(folders):
+            f = folders[idx]
+            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
             await query.answer()
-            return
+            await query.message.reply_text(f"<b>📝 Rename folder '{folder_name}'\n\nSend new name:</b>")
+            CAPTION_INPUT_MODE[query.from_user.id] = f"rename_folder:{idx}:{folder_name}"
+    except Exception as e:
+        logger.error(f"Rename folder error: {e}")
+
+
+@CALLBACKS.route("replace_words")
+async def cb_replace_words(client, query, arg):
+    filters_list = await db.get_filename_filters(query.from_user.id)
+    replace_list = [f for f in filters_list if "|" in f]
+    
+    buttons = []
+    text = "<b>🔄 Replace Words</b>\n\n"
+    
+    if replace_list:
+        text += "Current replacements:\n\n"
+        for idx, item in enumerate(replace_list, 1):
+            old, new = item.split("|", 1)
+            buttons.append([InlineKeyboardButton(f"{idx}. {old.strip()} → {new.strip()}", callback_data=f"del_replace_{idx-1}")])
+            text += f"{idx}. <code>{old.strip()}</code> → <code>{new.strip()}</code>\n"
+        buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_replace')])
+    else:
+        text += "No replacements set yet\n"
+        buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_replace')])
+    
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("remove_words")
+async def cb_remove_words(client, query, arg):
+    filters_list = await db.get_filename_filters(query.from_user.id)
+    remove_list = [f for f in filters_list if "|" not in f]
+    
+    buttons = []
+    text = "<b>🗑️ Remove Words</b>\n\n"
+    
+    if remove_list:
+        text += "Current removals:\n\n"
+        for idx, item in enumerate(remove_list, 1):
+            buttons.append([InlineKeyboardButton(f"{idx}. {item}", callback_data=f"del_remove_{idx-1}")])
+            text += f"{idx}. <code>{item}</code>\n"
+        buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_remove')])
+    else:
+        text += "No removals set yet\n"
+        buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_remove')])
+    
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.prefix("del_replace_", int)
+async def cb_del_replace(client, query, arg):
+    idx = arg
+    filters_list = await db.get_filename_filters(query.from_user.id)
+    replace_list = [f for f in filters_list if "|" in f]
+    
+    if 0 <= idx < len(replace_list):
+        await db.remove_filename_filter(query.from_user.id, replace_list[idx])
+        # Clear input mode to prevent issues
+        CAPTION_INPUT_MODE.pop(query.from_user.id, None)
+        await query.answer("✅ Replacement deleted!", show_alert=False)
         
-        elif query.data.startswith("getall_folder_"):
-            # Get All Files from folder with flood wait handling
-            encoded_path = query.data[14:]
-            try:
-                folder_path = b64_decode(encoded_path, "utf-8")
-            except:
-                await query.answer("Error decoding folder path", show_alert=True)
-                return
-            
-            # Get all files recursively from folder
-            files = await db.get_files_in_folder_recursive(query.from_user.id, folder_path)
-            if not files:
-                await query.answer("No files in this folder", show_alert=True)
-                return
-            
-            await query.answer(f"Sending {len(files)} files...", show_alert=False)
-            
-            # Set stop flag for this operation
-            BATCH_STOP_FLAGS[query.from_user.id] = False
-            
-            buttons = [[InlineKeyboardButton('Stop', callback_data=f'stop_batch_{query.from_user.id}')]]
-            sts = await query.message.reply_text(f"<b>Sending {len(files)} files from '{folder_path}'...\n\nPlease wait...</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            
-            success_count = 0
-            error_count = 0
-            
-            for file_obj in files:
-                # Check stop flag
-                if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                    await sts.edit(f"<b>Stopped! Sent {success_count} files before stopping.</b>")
-                    BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                    return
-                
-                try:
-                    file_id = file_obj.get('file_id')
-                    if not file_id:
-                        continue
-                    
-                    msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                    if msg and msg.media:
-                        await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                        success_count += 1
-                        
-                        # Update progress every 10 files
-                        if success_count % 10 == 0:
-                            try:
-                                await sts.edit(f"<b>Sending files...\n\nSent: {success_count}/{len(files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                            except:
-                                pass
-                        
-                        # Small delay to avoid flood
-                        await asyncio.sleep(0.5)
-                except FloodWait as e:
-                    logger.info(f"FloodWait: sleeping for {e.value} seconds")
-                    try:
-                        await sts.edit(f"<b>FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{len(files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                    except:
-                        pass
-                    await asyncio.sleep(e.value)
-                    # Check stop flag after FloodWait
-                    if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                        await sts.edit(f"<b>Stopped! Sent {success_count} files before stopping.</b>")
-                        BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                        return
-                    # Retry this file
-                    try:
-                        msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                        if msg and msg.media:
-                            await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                            success_count += 1
-                    except Exception as retry_err:
-                        logger.error(f"Retry error: {retry_err}")
-                        error_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending file: {e}")
-                    error_count += 1
-            
-            BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-            result_text = f"<b>Completed!\n\nSent: {success_count} files"
-            if error_count > 0:
-                result_text += f"\nErrors: {error_count}"
-            result_text += "</b>"
-            await sts.edit(result_text)
-            return
+        # Refresh UI
+        filters_list = await db.get_filename_filters(query.from_user.id)
+        replace_list = [f for f in filters_list if "|" in f]
         
-        elif query.data.startswith("last5_folder_"):
-            # Get last 5 files from folder
-            encoded_path = query.data[13:]
+        buttons = []
+        text = "<b>🔄 Replace Words</b>\n\n"
+        
+        if replace_list:
+            text += "Current replacements:\n\n"
+            for i, item in enumerate(replace_list, 1):
+                old, new = item.split("|", 1)
+                buttons.append([InlineKeyboardButton(f"{i}. {old.strip()} → {new.strip()}", callback_data=f"del_replace_{i-1}")])
+                text += f"{i}. <code>{old.strip()}</code> → <code>{new.strip()}</code>\n"
+            buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_replace')])
+        else:
+            text += "No replacements set yet\n"
+            buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_replace')])
+        
+        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
+        
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.prefix("del_remove_", int)
+async def cb_del_remove(client, query, arg):
+    idx = arg
+    filters_list = await db.get_filename_filters(query.from_user.id)
+    remove_list = [f for f in filters_list if "|" not in f]
+    
+    if 0 <= idx < len(remove_list):
+        await db.remove_filename_filter(query.from_user.id, remove_list[idx])
+        # Clear input mode to prevent issues
+        CAPTION_INPUT_MODE.pop(query.from_user.id, None)
+        await query.answer("✅ Removal deleted!", show_alert=False)
+        
+        # Refresh UI
+        filters_list = await db.get_filename_filters(query.from_user.id)
+        remove_list = [f for f in filters_list if "|" not in f]
+        
+        buttons = []
+        text = "<b>🗑️ Remove Words</b>\n\n"
+        
+        if remove_list:
+            text += "Current removals:\n\n"
+            for i, item in enumerate(remove_list, 1):
+                buttons.append([InlineKeyboardButton(f"{i}. {item}", callback_data=f"del_remove_{i-1}")])
+                text += f"{i}. <code>{item}</code>\n"
+            buttons.append([InlineKeyboardButton('➕ Add More', callback_data='add_remove')])
+        else:
+            text += "No removals set yet\n"
+            buttons.append([InlineKeyboardButton('➕ Add', callback_data='add_remove')])
+        
+        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='customize_menu')])
+        
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.route("add_replace")
+async def cb_add_replace(client, query, arg):
+    await query.answer()
+    await query.message.reply_text("<b>🔄 Add More Replacements\n\nFormat replacements as:\nold1|new1\nold2|new2\n\nExample:\n<code>Bot|MyBot\nHii|💗 Krishna</code></b>")
+    CAPTION_INPUT_MODE[query.from_user.id] = "replace_words"
+
+
+@CALLBACKS.route("add_remove")
+async def cb_add_remove(client, query, arg):
+    await query.answer()
+    await query.message.reply_text("<b>🗑️ Add More Words to Remove\n\nSend words separated by space:\n\nExample:\n<code>Downloaded By</code></b>")
+    CAPTION_INPUT_MODE[query.from_user.id] = "remove_words"
+
+
+@CALLBACKS.route("reset_all")
+async def cb_reset_all(client, query, arg):
+    await db.delete_caption(query.from_user.id)
+    await db.clear_filename_filters(query.from_user.id)
+    await query.answer("✅ All settings reset!", show_alert=True)
+
+
+@CALLBACKS.route("set_caption")
+async def cb_set_caption(client, query, arg):
+    CAPTION_INPUT_MODE[query.from_user.id] = True
+    await query.answer()
+    help_text = """<b>📝 SET CAPTION
+
+Send me your caption text
+
+AVAILABLE TEMPLATE VARIABLES:
+• {filename} - File name
+• {filesize} - File size
+• {duration} - Media duration
+
+EXAMPLE:
+<code>{filename}
+💾 Size: {filesize}
+⏰ Duration: {duration}</code></b>"""
+    await query.message.reply_text(help_text)
+
+
+@CALLBACKS.route("see_caption")
+async def cb_see_caption(client, query, arg):
+    try:
+        caption = await db.get_caption(query.from_user.id)
+        if caption:
+            text = f"<b>📝 YOUR CAPTION:</b>\n\n<code>{caption}</code>"
+            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
+            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+        else:
+            text = "<b>❌ No caption set yet\n\nUse 'Set Caption' to create one</b>"
+            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
+            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+        await query.answer()
+    except Exception as e:
+        logger.error(f"See caption error: {e}")
+        await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
+
+
+@CALLBACKS.route("delete_caption")
+async def cb_delete_caption(client, query, arg):
+    try:
+        caption = await db.get_caption(query.from_user.id)
+        if caption:
+            await db.delete_caption(query.from_user.id)
+            text = "<b>✅ CAPTION DELETED\n\nYour caption has been removed successfully</b>"
+            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
+            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+            await query.answer("Caption deleted!", show_alert=False)
+        else:
+            text = "<b>❌ No caption to delete\n\nSet a caption first</b>"
+            buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='caption_menu')]]
+            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+            await query.answer("No caption found", show_alert=False)
+    except Exception as e:
+        logger.error(f"Delete caption error: {e}")
+        await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
+
+
+@CALLBACKS.route("delivery_mode")
+async def cb_delivery_mode(client, query, arg):
+    current_mode = await db.get_delivery_mode(query.from_user.id)
+    pm_label = "✅ Bot only" if current_mode == "pm" else "Bot only"
+    channel_label = "✅ Channel only" if current_mode == "channel" else "Channel only"
+    both_label = "✅ Both Bot and Channel" if current_mode == "both" else "Both Bot and Channel"
+    buttons = [
+        [InlineKeyboardButton(pm_label, callback_data='mode_pm'), InlineKeyboardButton(channel_label, callback_data='mode_channel')],
+        [InlineKeyboardButton(both_label, callback_data='mode_both')],
+        [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
+    ]
+    await query.message.edit_text("<b>Send file in :</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.prefix("mode_")
+async def cb_mode(client, query, arg):
+    mode = query.data.split("_")[1]
+    
+    # Check if user has destinations when selecting channel or both
+    if mode in ['channel', 'both']:
+        destinations = await db.get_destinations(query.from_user.id)
+        if not destinations:
             try:
-                folder_path = b64_decode(encoded_path, "utf-8")
-            except:
-                await query.answer("Error decoding folder path", show_alert=True)
-                return
-            
-            # Get all files recursively from folder
-            all_files = await db.get_files_in_folder_recursive(query.from_user.id, folder_path)
-            if not all_files:
-                await query.answer("No files in this folder", show_alert=True)
-                return
-            
-            # Get last 5 files
-            last_5_files = all_files[-5:] if len(all_files) >= 5 else all_files
-            
-            await query.answer(f"Sending {len(last_5_files)} files...", show_alert=False)
-            
-            # Set stop flag for this operation
-            BATCH_STOP_FLAGS[query.from_user.id] = False
-            
-            buttons = [[InlineKeyboardButton('Stop', callback_data=f'stop_batch_{query.from_user.id}')]]
-            sts = await query.message.reply_text(f"<b>Sending last {len(last_5_files)} files from '{folder_path}'...\n\nPlease wait...</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            
-            success_count = 0
-            error_count = 0
-            
-            for file_obj in last_5_files:
-                # Check stop flag
-                if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                    await sts.edit(f"<b>Stopped! Sent {success_count} files before stopping.</b>")
-                    BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                    return
-                
-                try:
-                    file_id = file_obj.get('file_id')
-                    if not file_id:
-                        continue
-                    
-                    msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                    if msg and msg.media:
-                        await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                        success_count += 1
-                        await asyncio.sleep(0.5)
-                except FloodWait as e:
-                    logger.info(f"FloodWait: sleeping for {e.value} seconds")
-                    try:
-                        await sts.edit(f"<b>FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{len(last_5_files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                    except:
-                        pass
-                    await asyncio.sleep(e.value)
-                    if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                        await sts.edit(f"<b>Stopped! Sent {success_count} files before stopping.</b>")
-                        BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                        return
-                    try:
-                        msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                        if msg and msg.media:
-                            await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                            success_count += 1
-                    except Exception as retry_err:
-                        logger.error(f"Retry error: {retry_err}")
-                        error_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending file: {e}")
-                    error_count += 1
-            
-            BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-            result_text = f"<b>Completed!\n\nSent: {success_count} files"
-            if error_count > 0:
-                result_text += f"\nErrors: {error_count}"
-            result_text += "</b>"
-            await sts.edit(result_text)
+                await query.answer(text="Add at least one channel for send file in channel", show_alert=True)
+            except Exception as e:
+                logger.error(f"Alert error: {e}")
             return
+    
+    await db.set_delivery_mode(query.from_user.id, mode)
+    mode_text = {"pm": "Bot only", "channel": "Channel only", "both": "Both Bot and Channel"}
+    await query.answer(f"✅ {mode_text.get(mode)}", show_alert=False)
+    pm_label = "✅ Bot only" if mode == "pm" else "Bot only"
+    channel_label = "✅ Channel only" if mode == "channel" else "Channel only"
+    both_label = "✅ Both Bot and Channel" if mode == "both" else "Both Bot and Channel"
+    buttons = [
+        [InlineKeyboardButton(pm_label, callback_data='mode_pm'), InlineKeyboardButton(channel_label, callback_data='mode_channel')],
+        [InlineKeyboardButton(both_label, callback_data='mode_both')],
+        [InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='view_destinations')]
+    ]
+    await query.message.edit_text("<b>Send file in :</b>", reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@CALLBACKS.prefix("select_dest_", int)
+async def cb_select_dest(client, query, arg):
+    channel_id = arg
+    selected = BATCH_FILES.get(query.from_user.id, {}).get('selected_dests', [])
+    
+    if channel_id in selected:
+        selected.remove(channel_id)
+    else:
+        selected.append(channel_id)
+    
+    # Update UI
+    await query.answer()
+
+
+@CALLBACKS.route("send_to_pm")
+async def cb_send_to_pm(client, query, arg):
+    file_data = BATCH_FILES.get(query.from_user.id)
+    if file_data:
+        msg = file_data['msg']
+        caption = file_data['caption']
+        await msg.copy(chat_id=query.from_user.id, caption=caption, protect_content=False)
+        await query.message.delete()
+        BATCH_FILES.pop(query.from_user.id, None)
+        await query.answer("✅ Sent to PM!", show_alert=False)
+
+
+@CALLBACKS.route("send_selected")
+async def cb_send_selected(client, query, arg):
+    file_data = BATCH_FILES.get(query.from_user.id)
+    if file_data:
+        msg = file_data['msg']
+        selected_dests = file_data.get('selected_dests', [])
         
-        elif query.data.startswith("shared_folder_") or query.data.startswith("sharedp:"):
-            # Handle shared folder browsing with pagination
-            owner_id = None
-            current_path = None
-            page = 0
-            
-            if query.data.startswith("sharedp:"):
-                # Format: sharedp:{page}:{owner_id}:{encoded_path}
-                parts = query.data.split(":", 3)
-                if len(parts) == 4:
-                    try:
-                        page = int(parts[1])
-                        owner_id = int(parts[2])
-                        encoded_path = parts[3]
-                        current_path = b64_decode(encoded_path, "utf-8")
-                    except:
-                        await query.answer("Error decoding folder path", show_alert=True)
-                        return
-            elif query.data.startswith("shared_folder_"):
-                # Format: shared_folder_{owner_id}_{encoded_path}
-                remaining = query.data[14:]  # Remove "shared_folder_"
-                parts = remaining.split("_", 1)
-                if len(parts) >= 2:
-                    try:
-                        owner_id = int(parts[0])
-                        encoded_path = parts[1]
-                        current_path = b64_decode(encoded_path, "utf-8")
-                    except:
-                        await query.answer("Error decoding folder path", show_alert=True)
-                        return
-            
-            if not owner_id or not current_path:
-                await query.answer("Invalid folder data", show_alert=True)
-                return
-            
-            # Check if current folder itself is password protected (subfolder can have its own password)
-            is_current_protected = await db.is_folder_password_protected(owner_id, current_path)
-            current_access_key = f"{query.from_user.id}_{owner_id}_{current_path}"
-            
-            if is_current_protected and current_access_key not in VERIFIED_FOLDER_ACCESS:
-                # This specific folder has its own password - require verification
-                encoded_current = b64_encode(current_path, "utf-8")
-                display_name = await db.get_folder_display_name(current_path)
-                CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_current}"
-                await query.message.reply_text(f"<b>🔐 This folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access this folder:", parse_mode=enums.ParseMode.HTML)
-                await query.answer()
-                return
-            
-            # Also check if any parent folder in the path is password protected and not verified
-            if '/' in current_path:
-                path_parts = current_path.split('/')
-                for i in range(len(path_parts)):
-                    parent_path = '/'.join(path_parts[:i+1])
-                    is_parent_protected = await db.is_folder_password_protected(owner_id, parent_path)
-                    parent_access_key = f"{query.from_user.id}_{owner_id}_{parent_path}"
-                    
-                    if is_parent_protected and parent_access_key not in VERIFIED_FOLDER_ACCESS:
-                        # Parent folder requires password
-                        encoded_parent = b64_encode(parent_path, "utf-8")
-                        display_name = await db.get_folder_display_name(parent_path)
-                        CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_parent}"
-                        await query.message.reply_text(f"<b>🔐 Parent folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access this folder:", parse_mode=enums.ParseMode.HTML)
-                        await query.answer()
-                        return
-            
-            # Get folder data
-            display_name = await db.get_folder_display_name(current_path)
-            files_in_folder = await db.get_files_by_folder(owner_id, folder=current_path)
-            total_files_recursive = await db.get_files_in_folder_recursive(owner_id, current_path)
-            
-            text = f"<b>📁 Shared Folder: {display_name}\n📍 Path: {current_path}\n\n</b>"
-            text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {len(total_files_recursive)}"
-            
-            buttons = []
-            
-            # Generate share link for Copy folder link button
-            username = (await client.get_me()).username
-            encoded_path = b64_encode(current_path, "utf-8")
-            link_data = f"folder_{owner_id}_{encoded_path}"
-            encoded_link = b64_encode(link_data)
-            share_link = f"https://t.me/{username}?start={encoded_link}"
-            
-            # 1. Get All Files button
-            action_row = []
-            action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{owner_id}_{encoded_path}'))
-            buttons.append(action_row)
-            
-            # 2. Get subfolders
-            subfolders = await db.get_subfolders(owner_id, current_path)
-            
-            # List subfolders - 2 per row
-            row = []
-            for f in subfolders:
-                sub_folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                sub_display = await db.get_folder_display_name(sub_folder_name)
-                sub_encoded = b64_encode(sub_folder_name, "utf-8")
-                
-                # Check if subfolder has its own password
-                sub_access_key = f"{query.from_user.id}_{owner_id}_{sub_folder_name}"
-                is_sub_protected = await db.is_folder_password_protected(owner_id, sub_folder_name)
-                
-                if is_sub_protected and sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                    # Show lock icon, hide file count for protected subfolders
-                    row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                else:
-                    files_in_sub = await db.get_files_in_folder_recursive(owner_id, sub_folder_name)
-                    row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_sub)})', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                
-                if len(row) == 2:
-                    buttons.append(row)
-                    row = []
-            if row:
-                buttons.append(row)
-            
-            # 3. List files with pagination
-            if files_in_folder:
-                items_per_page = 10
-                total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
-                page = max(0, min(page, total_pages - 1))
-                start_idx = page * items_per_page
-                end_idx = start_idx + items_per_page
-                display_files = files_in_folder[start_idx:end_idx]
-                
-                text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-                for file_obj in display_files:
-                    file_name = file_obj.get('file_name', 'Unknown')
-                    if len(file_name) > 40:
-                        file_name = file_name[:37] + "..."
-                    file_id = file_obj.get('file_id')
-                    if file_id:
-                        file_link_data = f"sharedfile_{owner_id}_{file_id}"
-                        encoded_file_link = b64_encode(file_link_data)
-                        link = f"https://t.me/{username}?start={encoded_file_link}"
-                        text += f"• <a href='{link}'>{file_name}</a>\n"
-                    else:
-                        text += f"• {file_name}\n"
-                
-                # Add pagination buttons if needed
-                if total_pages > 1:
-                    nav_row = []
-                    if page > 0:
-                        nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'sharedp:{page - 1}:{owner_id}:{encoded_path}'))
-                    if page < total_pages - 1:
-                        nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'sharedp:{page + 1}:{owner_id}:{encoded_path}'))
-                    if nav_row:
-                        buttons.append(nav_row)
-            
-            # Back button - go to parent folder if exists
-            if '/' in current_path:
-                parent_path = '/'.join(current_path.split('/')[:-1])
-                parent_encoded = b64_encode(parent_path, "utf-8")
-                buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{owner_id}_{parent_encoded}')])
-            
-            # Convert buttons to raw API format and add copy link buttons
-            last5_callback = f'last5_shared_{owner_id}_{encoded_path}'
-            raw_buttons = [[
-                {"text": "Copy folder link", "copy_text": {"text": share_link}}, 
-                {"text": "📋 Last 5", "callback_data": last5_callback}
-            ]]
-            raw_buttons.extend(convert_pyrogram_buttons_to_raw(buttons))
-            
-            await edit_message_text_raw(query.from_user.id, query.message.id, text, reply_markup=raw_buttons)
-            
-            await query.answer()
+        if not selected_dests:
+            await query.answer("❌ No destinations selected!", show_alert=True)
             return
         
-        elif query.data.startswith("getall_shared_"):
-            # Get All Files from shared folder with flood wait handling
-            remaining = query.data[14:]  # Remove "getall_shared_"
-            parts = remaining.split("_", 1)
-            if len(parts) < 2:
-                await query.answer("Invalid folder data", show_alert=True)
-                return
-            
+        sts = await query.message.edit_text("🔄 Sending to destinations...")
+        success = 0
+        
+        for dest_id in selected_dests:
             try:
-                owner_id = int(parts[0])
-                encoded_path = parts[1]
-                folder_path = b64_decode(encoded_path, "utf-8")
-            except:
-                await query.answer("Error decoding folder path", show_alert=True)
-                return
-            
-            # Check if current folder is password protected
-            is_protected = await db.is_folder_password_protected(owner_id, folder_path)
-            access_key = f"{query.from_user.id}_{owner_id}_{folder_path}"
-            
-            if is_protected and access_key not in VERIFIED_FOLDER_ACCESS:
-                display_name = await db.get_folder_display_name(folder_path)
-                encoded_folder = b64_encode(folder_path, "utf-8")
-                CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_folder}"
-                await query.message.reply_text(f"<b>🔐 This folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access files:", parse_mode=enums.ParseMode.HTML)
-                await query.answer()
-                return
-            
-            # Also check parent folders
-            if '/' in folder_path:
-                path_parts = folder_path.split('/')
-                for i in range(len(path_parts)):
-                    parent_path = '/'.join(path_parts[:i+1])
-                    is_parent_protected = await db.is_folder_password_protected(owner_id, parent_path)
-                    parent_access_key = f"{query.from_user.id}_{owner_id}_{parent_path}"
-                    
-                    if is_parent_protected and parent_access_key not in VERIFIED_FOLDER_ACCESS:
-                        display_name = await db.get_folder_display_name(parent_path)
-                        encoded_parent = b64_encode(parent_path, "utf-8")
-                        CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_parent}"
-                        await query.message.reply_text(f"<b>🔐 Parent folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access files:", parse_mode=enums.ParseMode.HTML)
-                        await query.answer()
-                        return
-            
-            # Get all files recursively from folder
-            all_files = await db.get_files_in_folder_recursive(owner_id, folder_path)
-            
-            # Filter out files from password-protected subfolders that haven't been verified
-            protected_subfolders = await db.get_all_protected_subfolders(owner_id, folder_path)
-            files = []
-            for file_obj in all_files:
-                file_folder = file_obj.get('folder')
-                # Check if file is in a protected subfolder that user hasn't verified
-                is_in_protected = False
-                for pf in protected_subfolders:
-                    sub_access_key = f"{query.from_user.id}_{owner_id}_{pf}"
-                    if file_folder == pf or (file_folder and file_folder.startswith(f"{pf}/")):
-                        if sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                            is_in_protected = True
-                            break
-                if not is_in_protected:
-                    files.append(file_obj)
-            
-            if not files:
-                await query.answer("No accessible files in this folder", show_alert=True)
-                return
-            
-            await query.answer(f"Sending {len(files)} files...", show_alert=False)
-            
-            # Set stop flag for this operation
-            BATCH_STOP_FLAGS[query.from_user.id] = False
-            
-            buttons = [[InlineKeyboardButton('⏹️ Stop', callback_data=f'stop_batch_{query.from_user.id}')]]
-            display_name = await db.get_folder_display_name(folder_path)
-            sts = await query.message.reply_text(f"<b>📁 Sending {len(files)} files from '{display_name}'...\n\nPlease wait...</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            
-            success_count = 0
-            error_count = 0
-            
-            for file_obj in files:
-                # Check stop flag
-                if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                    await sts.edit(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
-                    BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                    return
-                
-                try:
-                    file_id = file_obj.get('file_id')
-                    if not file_id:
-                        continue
-                    
-                    msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                    if msg and msg.media:
-                        await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                        success_count += 1
-                        
-                        # Update progress every 10 files
-                        if success_count % 10 == 0:
-                            try:
-                                await sts.edit(f"<b>📁 Sending files from '{display_name}'...\n\nSent: {success_count}/{len(files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                            except:
-                                pass
-                        
-                        # Small delay to avoid flood
-                        await asyncio.sleep(0.5)
-                except FloodWait as e:
-                    logger.info(f"FloodWait: sleeping for {e.value} seconds")
-                    try:
-                        await sts.edit(f"<b>⏳ FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{len(files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                    except:
-                        pass
-                    await asyncio.sleep(e.value)
-                    # Check stop flag after FloodWait
-                    if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                        await sts.edit(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
-                        BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                        return
-                    # Retry this file
-                    try:
-                        msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                        if msg and msg.media:
-                            await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                            success_count += 1
-                    except Exception as retry_err:
-                        logger.error(f"Retry error: {retry_err}")
-                        error_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending file: {e}")
-                    error_count += 1
-            
-            BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-            result_text = f"<b>✅ Completed!\n\n📁 Folder: {display_name}\n📄 Sent: {success_count} files"
-            if error_count > 0:
-                result_text += f"\n❌ Errors: {error_count}"
-            result_text += "</b>"
-            await sts.edit(result_text)
-            return
+                await msg.copy(chat_id=dest_id, caption=None, protect_content=False)
+                success += 1
+            except Exception as e:
+                logger.error(f"Error sending to destination: {e}")
         
-        elif query.data.startswith("last5_shared_"):
-            # Get last 5 files from shared folder
-            remaining = query.data[13:]  # Remove "last5_shared_"
-            parts = remaining.split("_", 1)
-            if len(parts) < 2:
-                await query.answer("Invalid folder data", show_alert=True)
-                return
-            
+        await sts.edit(f"✅ Sent to {success} destination(s)!")
+        BATCH_FILES.pop(query.from_user.id, None)
+
+
+@CALLBACKS.route("my_files_menu")
+async def cb_my_files_menu(client, query, arg):
+    buttons = build_my_files_buttons(client)
+    await query.message.edit_text("<b>📂 My Files\n\nChoose view:</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("backup_restore_menu")
+async def cb_backup_restore_menu(client, query, arg):
+    backup_text = """<b>🔄 Backup & Restore
+
+Sometimes you may want to delete your Telegram account, but you don't want to lose your files and would like to access them in a new account. We've made this simple for you 😉
+
+1️⃣ First Method:
+Click 'Generate Token' to create a unique token.
+Save it safely! In your new account, start the bot and click 'Restore'. Enter the token, and all your files will be transferred.
+
+2️⃣ Second Method:
+Click 'Get Restore Link' to create your unique link.
+Open that link in your new account, and you're all set.
+
+⚠️ Keep your token/link SECRET - anyone with it can restore your files to their account!</b>"""
+    buttons = build_backup_restore_buttons(client)
+    await query.message.edit_text(backup_text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("generate_backup_token")
+async def cb_generate_backup_token(client, query, arg):
+    token = await db.generate_backup_token(query.from_user.id)
+    text = f"""<b>🔑 Your Backup Token
+
+<code>{token}</code>
+
+⚠️ IMPORTANT: Keep this token SECRET!
+Anyone with this token can restore your files to their account.
+
+To restore in a new account:
+1. Delete your current Telegram account (if needed)
+2. Create a new Telegram account
+3. Start the bot → My Files → Backup & Restore → Restore
+4. Enter this token
+
+The token can only be used ONCE - after restore, it becomes invalid.</b>"""
+    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("restore_files")
+async def cb_restore_files(client, query, arg):
+    RESTORE_MODE[query.from_user.id] = True
+    text = """<b>📥 Restore Files
+
+Please send the backup token you received from your old account.
+
+The token format is: <code>UserId:token</code>
+Example: <code>123456789:UyFjZE01PpIWFdIBZKAHLVHRYWT9eyjZ</code>
+
+Send /cancel to cancel.</b>"""
+    buttons = [[InlineKeyboardButton('❌ Cancel', callback_data='backup_restore_menu')]]
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("get_restore_link")
+async def cb_get_restore_link(client, query, arg):
+    token = await db.generate_backup_token(query.from_user.id)
+    username = await bot_username(client)
+    encoded_token = b64_encode(token)
+    restore_link = f"https://t.me/{username}?start=restore_{encoded_token}"
+    text = f"""<b>🔗 Your Restore Link
+
+{restore_link}
+
+Your Token: <code>{token}</code>
+
+⚠️ Keep this link safe! Only you can authorize the restore from your current account.
+
+To restore:
+1. Open this link in your new Telegram account
+2. Your files will be transferred automatically</b>"""
+    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("change_backup_token")
+async def cb_change_backup_token(client, query, arg):
+    existing_token = await db.get_backup_token(query.from_user.id)
+    if not existing_token:
+        await query.answer("❌ No token exists to change!", show_alert=True)
+        return
+    
+    new_token = await db.change_backup_token(query.from_user.id)
+    text = f"""<b>🔄 Token Changed!
+
+New Token: <code>{new_token}</code>
+
+⚠️ Your old token is now invalid and cannot be used.
+Anyone with the old token will no longer be able to restore your files.</b>"""
+    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("delete_backup_token")
+async def cb_delete_backup_token(client, query, arg):
+    existing_token = await db.get_backup_token(query.from_user.id)
+    if not existing_token:
+        await query.answer("❌ No token exists to delete!", show_alert=True)
+        return
+    
+    await db.delete_backup_token(query.from_user.id)
+    text = """<b>🗑️ Token Deleted!
+
+Your backup token has been permanently deleted and cannot be recovered.
+No one can use it to restore your files anymore.
+
+You can generate a new token anytime from the Backup & Restore menu.</b>"""
+    buttons = [[InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='backup_restore_menu')]]
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("view_all_files")
+@CALLBACKS.prefix("view_all_files_page_")
+async def cb_view_all_files(client, query, arg):
+    # Get page number
+    page = 0
+    if query.data.startswith("view_all_files_page_"):
+        page = int(query.data.split("_")[-1])
+    
+    items_per_page = 10
+    end_idx = (page + 1) * items_per_page
+    paginated_files, total_files = await db.get_files_page(query.from_user.id, page, items_per_page)
+    
+    username = await bot_username(client)
+    text = f"<b>📄 All Files (Page {page + 1})\n\n</b>"
+    if not total_files:
+        text += "❌ No files yet"
+    else:
+        for actual_idx, file_obj in paginated_files:
+            file_name = file_obj.get('file_name', 'Unknown')
+            folder = file_obj.get('folder') or 'Unorganized'
+            encoded = file_ref(actual_idx)
+            link = f"https://t.me/{username}?start={encoded}"
+            text += f"{actual_idx + 1}. <a href='{link}'>{file_name}</a> <b>[{folder}]</b>\n\n"
+    
+    buttons = []
+    # Add pagination buttons
+    if page > 0:
+        buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'view_all_files_page_{page - 1}'))
+    if end_idx < total_files:
+        buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_all_files_page_{page + 1}'))
+    
+    button_rows = [buttons] if buttons else []
+    button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
+    await query.answer()
+
+
+@CALLBACKS.prefix("search_page_", int)
+async def cb_search_page(client, query, arg):
+    search_query = SEARCH_QUERIES.get(query.from_user.id)
+    if search_query is None:
+        await query.answer("Search expired, please run /search again", show_alert=True)
+        return
+    text, buttons = await build_search_results(client, query.from_user.id, search_query, arg)
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons) if buttons else None, disable_web_page_preview=True)
+    await query.answer()
+
+
+@CALLBACKS.route("files_by_folder")
+@CALLBACKS.prefix("browse_folder_")
+@CALLBACKS.prefix("folderp:")
+async def cb_files_by_folder(client, query, arg):
+    # Handle folder browsing with subfolder support and pagination
+    current_path = None
+    page = 0
+    
+    if query.data.startswith("folderp:"):
+        # Legacy format: folderp:{page}:{encoded_path}
+        parts = query.data.split(":", 2)
+        if len(parts) == 3:
             try:
-                owner_id = int(parts[0])
-                encoded_path = parts[1]
-                folder_path = b64_decode(encoded_path, "utf-8")
+                page = int(parts[1])
+                current_path = b64_decode(parts[2], "utf-8")
+            except:
+                current_path = None
+    elif query.data.startswith("browse_folder_"):
+        try:
+            current_path, page = await resolve_folder_ref(query.from_user.id, arg)
+        except:
+            current_path = None
+    
+    if current_path:
+        text, buttons = await build_browse_folder_ui(client, query.from_user.id, current_path, page)
+    else:
+        text, buttons = await build_root_folders_ui(client, query.from_user.id)
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.route("files_by_category")
+async def cb_files_by_category(client, query, arg):
+    counts = await db.get_category_counts(query.from_user.id)
+    
+    # Show all category buttons with counts - 2 per row
+    buttons = []
+    category_icons = {'photo': '📸', 'video': '🎬', 'audio': '🎵', 'animation': '🎞️', 'sticker': '🎨', 'document': '📄'}
+    category_list = ['photo', 'video', 'audio', 'animation', 'sticker', 'document']
+    
+    row = []
+    for cat_type in category_list:
+        count = counts.get(cat_type, 0)
+        icon = category_icons.get(cat_type, '📌')
+        row.append(InlineKeyboardButton(f'{icon} {cat_type.title()} ({count})', callback_data=f'view_category_{cat_type}'))
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+    if row:
+        buttons.append(row)
+    
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
+    await query.message.edit_text("<b>🏷️ Files by Category\n\nSelect category:</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.prefix("getall_folder_")
+async def cb_getall_folder(client, query, arg):
+    # Get All Files from folder with flood wait handling
+    try:
+        folder_path, _ = await resolve_folder_ref(query.from_user.id, arg)
+    except:
+        folder_path = None
+    if not folder_path:
+        await query.answer("Error decoding folder path", show_alert=True)
+        return
+    
+    # Get all files recursively from folder
+    files = await db.get_files_in_folder_recursive(query.from_user.id, folder_path)
+    if not files:
+        await query.answer("No files in this folder", show_alert=True)
+        return
+    
+    await query.answer(f"Sending {len(files)} files...", show_alert=False)
+    
+    await enqueue_file_send(client, query, files, f"from '{folder_path}'")
+
+
+@CALLBACKS.prefix("last5_folder_")
+async def cb_last5_folder(client, query, arg):
+    # Get last 5 files from folder
+    try:
+        folder_path, _ = await resolve_folder_ref(query.from_user.id, arg)
+    except:
+        folder_path = None
+    if not folder_path:
+        await query.answer("Error decoding folder path", show_alert=True)
+        return
+    
+    # Newest 5 files of the folder and its subfolders
+    last_5_files = await db.get_last_files_in_folder(query.from_user.id, folder_path, 5)
+    if not last_5_files:
+        await query.answer("No files in this folder", show_alert=True)
+        return
+    
+    await query.answer(f"Sending {len(last_5_files)} files...", show_alert=False)
+    
+    await enqueue_file_send(client, query, last_5_files, f"from '{folder_path}'")
+
+
+@CALLBACKS.prefix("shared_folder_")
+@CALLBACKS.prefix("sharedp:")
+async def cb_shared_folder(client, query, arg):
+    # Handle shared folder browsing with pagination
+    owner_id = None
+    current_path = None
+    page = 0
+    
+    if query.data.startswith("sharedp:"):
+        # Legacy format: sharedp:{page}:{owner_id}:{encoded_path}
+        parts = query.data.split(":", 3)
+        if len(parts) == 4 and LEGACY_LINKS:
+            try:
+                page = int(parts[1])
+                owner_id = int(parts[2])
+                encoded_path = parts[3]
+                current_path = b64_decode(encoded_path, "utf-8")
             except:
                 await query.answer("Error decoding folder path", show_alert=True)
                 return
-            
-            # Get all files recursively from folder
-            all_files = await db.get_files_in_folder_recursive(owner_id, folder_path)
-            
-            # Filter out files from password-protected subfolders that haven't been verified
-            protected_subfolders = await db.get_all_protected_subfolders(owner_id, folder_path)
-            files = []
-            for file_obj in all_files:
-                file_folder = file_obj.get('folder')
-                is_in_protected = False
-                for pf in protected_subfolders:
-                    sub_access_key = f"{query.from_user.id}_{owner_id}_{pf}"
-                    if file_folder == pf or (file_folder and file_folder.startswith(f"{pf}/")):
-                        if sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                            is_in_protected = True
-                            break
-                if not is_in_protected:
-                    files.append(file_obj)
-            
-            # Get last 5 files
-            last_5_files = files[-5:] if len(files) >= 5 else files
-            
-            if not last_5_files:
-                await query.answer("No accessible files in this folder", show_alert=True)
-                return
-            
-            await query.answer(f"Sending {len(last_5_files)} files...", show_alert=False)
-            
-            # Set stop flag for this operation
-            BATCH_STOP_FLAGS[query.from_user.id] = False
-            
-            buttons = [[InlineKeyboardButton('⏹️ Stop', callback_data=f'stop_batch_{query.from_user.id}')]]
-            display_name = await db.get_folder_display_name(folder_path)
-            sts = await query.message.reply_text(f"<b>📁 Sending last {len(last_5_files)} files from '{display_name}'...\n\nPlease wait...</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            
-            success_count = 0
-            error_count = 0
-            
-            for file_obj in last_5_files:
-                if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                    await sts.edit(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
-                    BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                    return
-                
-                try:
-                    file_id = file_obj.get('file_id')
-                    if not file_id:
-                        continue
-                    
-                    msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                    if msg and msg.media:
-                        await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                        success_count += 1
-                        await asyncio.sleep(0.5)
-                except FloodWait as e:
-                    logger.info(f"FloodWait: sleeping for {e.value} seconds")
-                    try:
-                        await sts.edit(f"<b>⏳ FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{len(last_5_files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                    except:
-                        pass
-                    await asyncio.sleep(e.value)
-                    if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                        await sts.edit(f"<b>⏹️ Stopped! Sent {success_count} files before stopping.</b>")
-                        BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                        return
-                    try:
-                        msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                        if msg and msg.media:
-                            await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                            success_count += 1
-                    except Exception as retry_err:
-                        logger.error(f"Retry error: {retry_err}")
-                        error_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending file: {e}")
-                    error_count += 1
-            
-            BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-            result_text = f"<b>✅ Completed!\n\n📁 Folder: {display_name}\n📄 Sent: {success_count} files"
-            if error_count > 0:
-                result_text += f"\n❌ Errors: {error_count}"
-            result_text += "</b>"
-            await sts.edit(result_text)
-            return
-        
-        elif query.data.startswith("share_back_folder_"):
-            # Go back to shared folder view
-            try:
-                remaining = query.data[18:]  # Remove "share_back_folder_"
-                parts = remaining.split("_", 1)
-                if len(parts) >= 2:
-                    owner_id = int(parts[0])
-                    encoded_path = parts[1]
-                    current_path = b64_decode(encoded_path, "utf-8")
-                    
-                    # Re-render the shared folder view
-                    display_name = await db.get_folder_display_name(current_path)
-                    files_in_folder = await db.get_files_by_folder(owner_id, folder=current_path)
-                    total_files_recursive = await db.get_files_in_folder_recursive(owner_id, current_path)
-                    
-                    text = f"<b>📁 Shared Folder: {display_name}\n📍 Path: {current_path}\n\n</b>"
-                    text += f"📄 Files here: {len(files_in_folder)}\n📂 Total (incl. subfolders): {len(total_files_recursive)}"
-                    
-                    buttons = []
-                    
-                    # Get All Files button
-                    action_row = []
-                    encoded_path_btn = b64_encode(current_path, "utf-8")
-                    action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_shared_{owner_id}_{encoded_path_btn}'))
-                    buttons.append(action_row)
-                    
-                    # Subfolders - 2 per row
-                    subfolders = await db.get_subfolders(owner_id, current_path)
-                    row = []
-                    for f in subfolders:
-                        sub_folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                        sub_display = await db.get_folder_display_name(sub_folder_name)
-                        sub_encoded = b64_encode(sub_folder_name, "utf-8")
-                        
-                        # Check if subfolder has its own password
-                        sub_access_key = f"{query.from_user.id}_{owner_id}_{sub_folder_name}"
-                        is_sub_protected = await db.is_folder_password_protected(owner_id, sub_folder_name)
-                        
-                        if is_sub_protected and sub_access_key not in VERIFIED_FOLDER_ACCESS:
-                            row.append(InlineKeyboardButton(f'🔒 {sub_display}', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                        else:
-                            files_in_sub = await db.get_files_in_folder_recursive(owner_id, sub_folder_name)
-                            row.append(InlineKeyboardButton(f'📁 {sub_display} ({len(files_in_sub)})', callback_data=f'shared_folder_{owner_id}_{sub_encoded}'))
-                        
-                        if len(row) == 2:
-                            buttons.append(row)
-                            row = []
-                    if row:
-                        buttons.append(row)
-                    
-                    # Files with pagination
-                    if files_in_folder:
-                        items_per_page = 10
-                        total_pages = max(1, (len(files_in_folder) + items_per_page - 1) // items_per_page)
-                        page = 0
-                        start_idx = page * items_per_page
-                        end_idx = start_idx + items_per_page
-                        display_files = files_in_folder[start_idx:end_idx]
-                        
-                        text += f"\n\n<b>Files (Page {page + 1}/{total_pages}):</b>\n"
-                        username = (await client.get_me()).username
-                        for file_obj in display_files:
-                            file_name = file_obj.get('file_name', 'Unknown')
-                            if len(file_name) > 40:
-                                file_name = file_name[:37] + "..."
-                            file_id = file_obj.get('file_id')
-                            if file_id:
-                                file_link_data = f"sharedfile_{owner_id}_{file_id}"
-                                encoded_file_link = b64_encode(file_link_data)
-                                link = f"https://t.me/{username}?start={encoded_file_link}"
-                                text += f"• <a href='{link}'>{file_name}</a>\n"
-                            else:
-                                text += f"• {file_name}\n"
-                        
-                        # Add pagination buttons if needed
-                        if total_pages > 1:
-                            nav_row = []
-                            if page > 0:
-                                nav_row.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'sharedp:{page - 1}:{owner_id}:{encoded_path_btn}'))
-                            if page < total_pages - 1:
-                                nav_row.append(InlineKeyboardButton('Next ➡️', callback_data=f'sharedp:{page + 1}:{owner_id}:{encoded_path_btn}'))
-                            if nav_row:
-                                buttons.append(nav_row)
-                    
-                    # Back button
-                    if '/' in current_path:
-                        parent_path = '/'.join(current_path.split('/')[:-1])
-                        parent_encoded = b64_encode(parent_path, "utf-8")
-                        buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'shared_folder_{owner_id}_{parent_encoded}')])
-                    
-                    # Generate share link for copy
-                    username = (await client.get_me()).username
-                    link_data = f"folder_{owner_id}_{encoded_path_btn}"
-                    encoded_link = b64_encode(link_data)
-                    share_link = f"https://t.me/{username}?start={encoded_link}"
-                    
-                    # Convert buttons to raw API format and add copy link buttons
-                    last5_callback = f'last5_shared_{owner_id}_{encoded_path_btn}'
-                    raw_buttons = [[
-                        {"text": "Copy folder link", "copy_text": {"text": share_link}}, 
-                        {"text": "📋 Last 5", "callback_data": last5_callback}
-                    ]]
-                    raw_buttons.extend(convert_pyrogram_buttons_to_raw(buttons))
-                    
-                    await edit_message_text_raw(query.from_user.id, query.message.id, text, reply_markup=raw_buttons)
-                    
-                    await query.answer()
-            except Exception as e:
-                logger.error(f"Share back folder error: {e}")
-                await query.answer("Error", show_alert=True)
+    elif query.data.startswith("shared_folder_"):
+        try:
+            owner_id, current_path, page = await resolve_shared_folder_ref(arg)
+        except:
+            await query.answer("Error decoding folder path", show_alert=True)
             return
-        
-        elif query.data.startswith("getall_category_"):
-            # Get All Files from category with flood wait handling
-            category = query.data[16:]
-            
-            user = await db.col.find_one({'id': int(query.from_user.id)})
-            all_files = user.get('stored_files', []) if user else []
-            
-            # Filter by category
-            category_files = [f for f in all_files if f.get('file_type', 'document') == category]
-            
-            if not category_files:
-                await query.answer("No files in this category", show_alert=True)
+    
+    if not owner_id or not current_path:
+        await query.answer("Invalid folder data", show_alert=True)
+        return
+    
+    # Check if current folder itself is password protected (subfolder can have its own password)
+    is_current_protected = await db.is_folder_password_protected(owner_id, current_path)
+    current_access_key = f"{query.from_user.id}_{owner_id}_{current_path}"
+    
+    if is_current_protected and current_access_key not in VERIFIED_FOLDER_ACCESS:
+        # This specific folder has its own password - require verification
+        encoded_current = b64_encode(current_path, "utf-8")
+        display_name = await db.get_folder_display_name(current_path)
+        CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_current}"
+        await query.message.reply_text(f"<b>🔐 This folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access this folder:", parse_mode=enums.ParseMode.HTML)
+        await query.answer()
+        return
+    
+    # Also check if any parent folder in the path is password protected and not verified
+    if '/' in current_path:
+        path_parts = current_path.split('/')
+        for i in range(len(path_parts)):
+            parent_path = '/'.join(path_parts[:i+1])
+            is_parent_protected = await db.is_folder_password_protected(owner_id, parent_path)
+            parent_access_key = f"{query.from_user.id}_{owner_id}_{parent_path}"
+            
+            if is_parent_protected and parent_access_key not in VERIFIED_FOLDER_ACCESS:
+                # Parent folder requires password
+                encoded_parent = b64_encode(parent_path, "utf-8")
+                display_name = await db.get_folder_display_name(parent_path)
+                CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_parent}"
+                await query.message.reply_text(f"<b>🔐 Parent folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access this folder:", parse_mode=enums.ParseMode.HTML)
+                await query.answer()
                 return
-            
-            await query.answer(f"Sending {len(category_files)} files...", show_alert=False)
-            
-            # Set stop flag for this operation
-            BATCH_STOP_FLAGS[query.from_user.id] = False
-            
-            buttons = [[InlineKeyboardButton('Stop', callback_data=f'stop_batch_{query.from_user.id}')]]
-            sts = await query.message.reply_text(f"<b>Sending {len(category_files)} {category} files...\n\nPlease wait...</b>", reply_markup=InlineKeyboardMarkup(buttons))
-            
-            success_count = 0
-            error_count = 0
-            
-            for file_obj in category_files:
-                # Check stop flag
-                if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                    await sts.edit(f"<b>Stopped! Sent {success_count} files before stopping.</b>")
-                    BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                    return
-                
-                try:
-                    file_id = file_obj.get('file_id')
-                    if not file_id:
-                        continue
-                    
-                    msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                    if msg and msg.media:
-                        await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                        success_count += 1
-                        
-                        # Update progress every 10 files
-                        if success_count % 10 == 0:
-                            try:
-                                await sts.edit(f"<b>Sending files...\n\nSent: {success_count}/{len(category_files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                            except:
-                                pass
-                        
-                        # Small delay to avoid flood
-                        await asyncio.sleep(0.5)
-                except FloodWait as e:
-                    logger.info(f"FloodWait: sleeping for {e.value} seconds")
-                    try:
-                        await sts.edit(f"<b>FloodWait - waiting {e.value}s...\n\nSent: {success_count}/{len(category_files)}</b>", reply_markup=InlineKeyboardMarkup(buttons))
-                    except:
-                        pass
-                    await asyncio.sleep(e.value)
-                    # Check stop flag after FloodWait
-                    if BATCH_STOP_FLAGS.get(query.from_user.id, False):
-                        await sts.edit(f"<b>Stopped! Sent {success_count} files before stopping.</b>")
-                        BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-                        return
-                    # Retry this file
-                    try:
-                        msg = await client.get_messages(LOG_CHANNEL, int(file_id))
-                        if msg and msg.media:
-                            await msg.copy(chat_id=query.from_user.id, protect_content=False)
-                            success_count += 1
-                    except Exception as retry_err:
-                        logger.error(f"Retry error: {retry_err}")
-                        error_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending file: {e}")
-                    error_count += 1
-            
-            BATCH_STOP_FLAGS.pop(query.from_user.id, None)
-            result_text = f"<b>Completed!\n\nSent: {success_count} files"
-            if error_count > 0:
-                result_text += f"\nErrors: {error_count}"
-            result_text += "</b>"
-            await sts.edit(result_text)
-            return
-        
-        elif query.data.startswith("add_subfolder_"):
-            # Add subfolder to existing folder
-            encoded_path = query.data[14:]
-            try:
-                parent_folder = b64_decode(encoded_path, "utf-8")
-            except:
-                await query.answer("Error decoding folder path", show_alert=True)
+    
+    text, raw_buttons = await build_shared_folder_ui(client, owner_id, current_path, query.from_user.id, page)
+    await edit_message_text_raw(query.from_user.id, query.message.id, text, reply_markup=raw_buttons)
+    
+    await query.answer()
+
+
+@CALLBACKS.prefix("getall_shared_")
+async def cb_getall_shared(client, query, arg):
+    # Get All Files from shared folder with flood wait handling
+    try:
+        owner_id, folder_path, _ = await resolve_shared_folder_ref(arg)
+    except:
+        owner_id = None
+    if not owner_id or not folder_path:
+        await query.answer("Invalid folder data", show_alert=True)
+        return
+    
+    # Check if current folder is password protected
+    is_protected = await db.is_folder_password_protected(owner_id, folder_path)
+    access_key = f"{query.from_user.id}_{owner_id}_{folder_path}"
+    
+    if is_protected and access_key not in VERIFIED_FOLDER_ACCESS:
+        display_name = await db.get_folder_display_name(folder_path)
+        encoded_folder = b64_encode(folder_path, "utf-8")
+        CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_folder}"
+        await query.message.reply_text(f"<b>🔐 This folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access files:", parse_mode=enums.ParseMode.HTML)
+        await query.answer()
+        return
+    
+    # Also check parent folders
+    if '/' in folder_path:
+        path_parts = folder_path.split('/')
+        for i in range(len(path_parts)):
+            parent_path = '/'.join(path_parts[:i+1])
+            is_parent_protected = await db.is_folder_password_protected(owner_id, parent_path)
+            parent_access_key = f"{query.from_user.id}_{owner_id}_{parent_path}"
+            
+            if is_parent_protected and parent_access_key not in VERIFIED_FOLDER_ACCESS:
+                display_name = await db.get_folder_display_name(parent_path)
+                encoded_parent = b64_encode(parent_path, "utf-8")
+                CAPTION_INPUT_MODE[query.from_user.id] = f"verify_folder_password_{owner_id}_{encoded_parent}"
+                await query.message.reply_text(f"<b>🔐 Parent folder is password protected</b>\n\n📁 Folder: {display_name}\n\nPlease enter the password to access files:", parse_mode=enums.ParseMode.HTML)
+                await query.answer()
                 return
-            
-            CAPTION_INPUT_MODE[query.from_user.id] = f"create_subfolder_{parent_folder}"
-            keyboard = ReplyKeyboardMarkup(
-                [["❌ Cancel"]],
-                one_time_keyboard=True,
-                resize_keyboard=True
-            )
-            prompt_msg = await query.message.reply_text(f"<b>📁 Create Subfolder\n\n📍 Parent: {parent_folder}\n\nSend subfolder name:</b>", reply_markup=keyboard)
-            FOLDER_PROMPT_MSG[query.from_user.id] = prompt_msg.id
+    
+    # Get all files recursively from folder
+    all_files = await db.get_files_in_folder_recursive(owner_id, folder_path)
+    
+    # Filter out files from password-protected subfolders that haven't been verified
+    protected_subfolders = await db.get_all_protected_subfolders(owner_id, folder_path)
+    files = []
+    for file_obj in all_files:
+        file_folder = file_obj.get('folder')
+        # Check if file is in a protected subfolder that user hasn't verified
+        is_in_protected = False
+        for pf in protected_subfolders:
+            sub_access_key = f"{query.from_user.id}_{owner_id}_{pf}"
+            if file_folder == pf or (file_folder and file_folder.startswith(f"{pf}/")):
+                if sub_access_key not in VERIFIED_FOLDER_ACCESS:
+                    is_in_protected = True
+                    break
+        if not is_in_protected:
+            files.append(file_obj)
+    
+    if not files:
+        await query.answer("No accessible files in this folder", show_alert=True)
+        return
+    
+    await query.answer(f"Sending {len(files)} files...", show_alert=False)
+    
+    display_name = await db.get_folder_display_name(folder_path)
+    await enqueue_file_send(client, query, files, f"from '{display_name}'")
+
+
+@CALLBACKS.prefix("last5_shared_")
+async def cb_last5_shared(client, query, arg):
+    # Get last 5 files from shared folder
+    try:
+        owner_id, folder_path, _ = await resolve_shared_folder_ref(arg)
+    except:
+        owner_id = None
+    if not owner_id or not folder_path:
+        await query.answer("Invalid folder data", show_alert=True)
+        return
+    
+    # Get all files recursively from folder
+    all_files = await db.get_files_in_folder_recursive(owner_id, folder_path)
+    
+    # Filter out files from password-protected subfolders that haven't been verified
+    protected_subfolders = await db.get_all_protected_subfolders(owner_id, folder_path)
+    files = []
+    for file_obj in all_files:
+        file_folder = file_obj.get('folder')
+        is_in_protected = False
+        for pf in protected_subfolders:
+            sub_access_key = f"{query.from_user.id}_{owner_id}_{pf}"
+            if file_folder == pf or (file_folder and file_folder.startswith(f"{pf}/")):
+                if sub_access_key not in VERIFIED_FOLDER_ACCESS:
+                    is_in_protected = True
+                    break
+        if not is_in_protected:
+            files.append(file_obj)
+    
+    # Get last 5 files
+    last_5_files = files[-5:] if len(files) >= 5 else files
+    
+    if not last_5_files:
+        await query.answer("No accessible files in this folder", show_alert=True)
+        return
+    
+    await query.answer(f"Sending {len(last_5_files)} files...", show_alert=False)
+    
+    display_name = await db.get_folder_display_name(folder_path)
+    await enqueue_file_send(client, query, last_5_files, f"from '{display_name}'")
+
+
+@CALLBACKS.prefix("share_back_folder_")
+async def cb_share_back_folder(client, query, arg):
+    # Go back to shared folder view
+    try:
+        owner_id, current_path, page = await resolve_shared_folder_ref(arg)
+        if owner_id and current_path:
+            text, raw_buttons = await build_shared_folder_ui(client, owner_id, current_path, query.from_user.id, page)
+            await edit_message_text_raw(query.from_user.id, query.message.id, text, reply_markup=raw_buttons)
             await query.answer()
-            return
+    except Exception as e:
+        logger.error(f"Share back folder error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("getall_category_")
+async def cb_getall_category(client, query, arg):
+    # Get All Files from category with flood wait handling
+    category = query.data[16:]
+    
+    category_files = await db.get_category_file_ids(query.from_user.id, category)
+    
+    if not category_files:
+        await query.answer("No files in this category", show_alert=True)
+        return
+    
+    await query.answer(f"Sending {len(category_files)} files...", show_alert=False)
+    
+    await enqueue_file_ids_send(client, query, category_files, f"from category '{category}'")
+
+
+@CALLBACKS.prefix("add_subfolder_")
+async def cb_add_subfolder(client, query, arg):
+    # Add subfolder to existing folder
+    try:
+        parent_folder, _ = await resolve_folder_ref(query.from_user.id, arg)
+    except:
+        parent_folder = None
+    if not parent_folder:
+        await query.answer("Error decoding folder path", show_alert=True)
+        return
+    
+    CAPTION_INPUT_MODE[query.from_user.id] = f"create_subfolder_{parent_folder}"
+    keyboard = ReplyKeyboardMarkup(
+        [["❌ Cancel"]],
+        one_time_keyboard=True,
+        resize_keyboard=True
+    )
+    prompt_msg = await query.message.reply_text(f"<b>📁 Create Subfolder\n\n📍 Parent: {parent_folder}\n\nSend subfolder name:</b>", reply_markup=keyboard)
+    FOLDER_PROMPT_MSG[query.from_user.id] = prompt_msg.id
+    await query.answer()
+
+
+@CALLBACKS.prefix("view_category_")
+async def cb_view_category(client, query, arg):
+    # Handle both initial call and pagination
+    if query.data.startswith("view_category_page_"):
+        parts = query.data.split("_")
+        category = parts[2]
+        page = int(parts[-1])
+    else:
+        category = query.data.split("_")[2]
+        page = 0
+    
+    items_per_page = 10
+    start_idx = page * items_per_page
+    end_idx = start_idx + items_per_page
+    # Only this page is fetched; indices come back with the files
+    paginated, category_total = await db.get_files_page(query.from_user.id, page, items_per_page, file_type=category)
+    
+    username = await bot_username(client)
+    text = f"<b>🏷️ {category.title()} ({category_total} files) - Page {page + 1}\n\n</b>"
+    
+    if not category_total:
+        text += "❌ No files"
+    else:
+        display_count = 0
+        for file_idx, file_obj in paginated:
+            display_count += 1
+            file_name = file_obj.get('file_name', 'Unknown')
+            encoded = file_ref(file_idx)
+            link = f"https://t.me/{username}?start={encoded}"
+            text += f"{start_idx + display_count}. <a href='{link}'>{file_name}</a>\n\n"
+    
+    buttons = []
+    # Add pagination buttons
+    if page > 0:
+        buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'view_category_page_{category}_{page - 1}'))
+    if end_idx < category_total:
+        buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_category_page_{category}_{page + 1}'))
+    
+    button_rows = [buttons] if buttons else []
+    
+    # Add Get All Files button if there are files
+    if category_total:
+        button_rows.append([InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_category_{category}')])
+    
+    button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_category')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
+    await query.answer()
+
+
+@CALLBACKS.route("add_folder_prompt")
+async def cb_add_folder_prompt(client, query, arg):
+    try:
+        CAPTION_INPUT_MODE[query.from_user.id] = "create_folder"
+        # Send reply with keyboard containing cancel button
+        keyboard = ReplyKeyboardMarkup(
+            [["❌ Cancel"]],
+            one_time_keyboard=True,
+            resize_keyboard=True
+        )
+        prompt_msg = await query.message.reply_text("<b>📁 Create Folder\n\nSend folder name:</b>", reply_markup=keyboard)
+        # Store the prompt message ID for deletion later
+        FOLDER_PROMPT_MSG[query.from_user.id] = prompt_msg.id
+        logger.info(f"Folder creation prompt sent to user {query.from_user.id}")
+        await query.answer()
+    except Exception as e:
+        logger.error(f"Error in add_folder_prompt: {e}")
+        await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
+
+
+@CALLBACKS.prefix("view_folder_files_")
+@CALLBACKS.prefix("view_folder_page_")
+async def cb_view_folder_files(client, query, arg):
+    # Handle both initial and pagination
+    if query.data.startswith("view_folder_page_"):
+        parts = query.data.split("_")
+        idx = int(parts[3])
+        page = int(parts[-1])
+    else:
+        idx = int(query.data.split("_")[3])
+        page = 0
+    
+    folders = await db.get_folders(query.from_user.id)
+    if not (0 <= idx < len(folders)):
+        return
+    
+    folder_name = folders[idx].get('name', str(folders[idx])) if isinstance(folders[idx], dict) else str(folders[idx])
+    user = await db.col.find_one({'id': int(query.from_user.id)})
+    all_files = user.get('stored_files', []) if user else []
+    
+    # Filter files by folder
+    folder_files = [(f_idx, f) for f_idx, f in enumerate(all_files) if f.get('folder') == folder_name]
+    
+    items_per_page = 10
+    start_idx = page * items_per_page
+    end_idx = start_idx + items_per_page
+    paginated = folder_files[start_idx:end_idx]
+    
+    username = await bot_username(client)
+    text = f"<b>📁 {folder_name} (Page {page + 1})\n\n</b>"
+    
+    if not folder_files:
+        text += "❌ No files"
+    else:
+        display_count = 0
+        for file_idx, file_obj in paginated:
+            display_count += 1
+            file_name = file_obj.get('file_name', 'Unknown')
+            encoded = file_ref(file_idx)
+            link = f"https://t.me/{username}?start={encoded}"
+            text += f"{start_idx + display_count}. <a href='{link}'>{file_name}</a>\n\n"
+    
+    buttons = []
+    # Add pagination buttons
+    if page > 0:
+        buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'view_folder_page_{idx}_{page - 1}'))
+    if end_idx < len(folder_files):
+        buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_folder_page_{idx}_{page + 1}'))
+    
+    button_rows = [buttons] if buttons else []
+    
+    # Add Get All Files and Edit buttons on same row
+    action_row = []
+    if folder_files:
+        encoded = encode_ref(REF_FOLDER, idx, 0)
+        action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_folder_{encoded}'))
+    action_row.append(InlineKeyboardButton('✏️ Edit', callback_data=f'edit_folder_{idx}'))
+    button_rows.append(action_row)
+    
+    # Back to browse folder
+    if '/' in folder_name:
+        parent_path = '/'.join(folder_name.split('/')[:-1])
+        parent_encoded = await folder_ref(query.from_user.id, parent_path)
+        button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'browse_folder_{parent_encoded}')])
+    else:
+        button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_folder')])
+    
+    await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
+    await query.answer()
+
+
+@CALLBACKS.route("folder_separator_alert")
+async def cb_folder_separator_alert(client, query, arg):
+    # Show alert when separator is clicked
+    await query.answer("📁 Subfolders are listed below", show_alert=True)
+
+
+@CALLBACKS.prefix("edit_folder_", int)
+async def cb_edit_folder(client, query, arg):
+    # Show Edit menu with Rename, Delete and Share options
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
+        await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
+        await query.answer()
+
+
+@CALLBACKS.prefix("change_folder_link_", int)
+async def cb_change_folder_link(client, query, arg):
+    # Ask for confirmation before changing link
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        buttons = [
+            [InlineKeyboardButton('✅ Yes, Change Link', callback_data=f'confirm_change_link_{idx}'), 
+             InlineKeyboardButton('❌ Cancel', callback_data=f'cancel_change_link_{idx}')]
+        ]
+        await query.message.edit_text(f"<b>⚠️ Change folder link?</b>\n\nThis will invalidate the old link and generate a new one.", reply_markup=InlineKeyboardMarkup(buttons))
+        await query.answer()
+
+
+@CALLBACKS.prefix("confirm_change_link_", int)
+async def cb_confirm_change_link(client, query, arg):
+    # Actually change the folder link
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
         
-        elif query.data.startswith("view_category_") or query.data.startswith("view_category_page_"):
-            # Handle both initial call and pagination
-            if query.data.startswith("view_category_page_"):
-                parts = query.data.split("_")
-                category = parts[2]
-                page = int(parts[-1])
-            else:
-                category = query.data.split("_")[2]
-                page = 0
-            
-            user = await db.col.find_one({'id': int(query.from_user.id)})
-            all_files = user.get('stored_files', []) if user else []
-            
-            # Filter by category
-            category_files = [f for f in all_files if f.get('file_type', 'document') == category]
-            
-            items_per_page = 10
-            start_idx = page * items_per_page
-            end_idx = start_idx + items_per_page
-            paginated = category_files[start_idx:end_idx]
-            
-            username = (await client.get_me()).username
-            text = f"<b>🏷️ {category.title()} ({len(category_files)} files) - Page {page + 1}\n\n</b>"
-            
-            if not category_files:
-                text += "❌ No files"
-            else:
-                display_count = 0
-                for file_obj in paginated:
-                    display_count += 1
-                    file_name = file_obj.get('file_name', 'Unknown')
-                    # Find index in all_files
-                    file_idx = all_files.index(file_obj)
-                    string = f'file_{file_idx}'
-                    encoded = b64_encode(string)
-                    link = f"https://t.me/{username}?start={encoded}"
-                    text += f"{start_idx + display_count}. <a href='{link}'>{file_name}</a>\n\n"
-            
-            buttons = []
-            # Add pagination buttons
-            if page > 0:
-                buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'view_category_page_{category}_{page - 1}'))
-            if end_idx < len(category_files):
-                buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_category_page_{category}_{page + 1}'))
-            
-            button_rows = [buttons] if buttons else []
-            
-            # Add Get All Files button if there are files
-            if category_files:
-                button_rows.append([InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_category_{category}')])
-            
-            button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_category')])
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
-            await query.answer()
-            return
+        # Generate new token (invalidates old one)
+        await db.change_folder_token(query.from_user.id, folder_name)
+        await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
+        await query.answer("✅ Link changed successfully.\n\nOld links are invalid now.", show_alert=True)
+
+
+@CALLBACKS.prefix("cancel_change_link_", int)
+async def cb_cancel_change_link(client, query, arg):
+    # Cancel changing link - go back to edit menu
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
+        await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
+        await query.answer()
+
+
+@CALLBACKS.prefix("share_folder_", int)
+async def cb_share_folder(client, query, arg):
+    # Show folder share link with Copy folder link button (using token-based links)
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
         
-        elif query.data == "add_folder_prompt":
-            try:
-                CAPTION_INPUT_MODE[query.from_user.id] = "create_folder"
-                # Send reply with keyboard containing cancel button
-                keyboard = ReplyKeyboardMarkup(
-                    [["❌ Cancel"]],
-                    one_time_keyboard=True,
-                    resize_keyboard=True
-                )
-                prompt_msg = await query.message.reply_text("<b>📁 Create Folder\n\nSend folder name:</b>", reply_markup=keyboard)
-                # Store the prompt message ID for deletion later
-                FOLDER_PROMPT_MSG[query.from_user.id] = prompt_msg.id
-                logger.info(f"Folder creation prompt sent to user {query.from_user.id}")
-                await query.answer()
-            except Exception as e:
-                logger.error(f"Error in add_folder_prompt: {e}")
-                await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
-            return
+        # Get or generate token-based share link
+        token = await db.get_folder_token(query.from_user.id, folder_name)
+        if not token:
+            token = await db.generate_folder_token(query.from_user.id, folder_name)
         
-        elif query.data.startswith("view_folder_files_") or query.data.startswith("view_folder_page_"):
-            # Handle both initial and pagination
-            if query.data.startswith("view_folder_page_"):
-                parts = query.data.split("_")
-                idx = int(parts[3])
-                page = int(parts[-1])
-            else:
-                idx = int(query.data.split("_")[3])
-                page = 0
-            
-            folders = await db.get_folders(query.from_user.id)
-            if not (0 <= idx < len(folders)):
-                return
-            
-            folder_name = folders[idx].get('name', str(folders[idx])) if isinstance(folders[idx], dict) else str(folders[idx])
-            user = await db.col.find_one({'id': int(query.from_user.id)})
-            all_files = user.get('stored_files', []) if user else []
-            
-            # Filter files by folder
-            folder_files = [(f_idx, f) for f_idx, f in enumerate(all_files) if f.get('folder') == folder_name]
-            
-            items_per_page = 10
-            start_idx = page * items_per_page
-            end_idx = start_idx + items_per_page
-            paginated = folder_files[start_idx:end_idx]
-            
-            username = (await client.get_me()).username
-            text = f"<b>📁 {folder_name} (Page {page + 1})\n\n</b>"
-            
-            if not folder_files:
-                text += "❌ No files"
-            else:
-                display_count = 0
-                for file_idx, file_obj in paginated:
-                    display_count += 1
-                    file_name = file_obj.get('file_name', 'Unknown')
-                    string = f'file_{file_idx}'
-                    encoded = b64_encode(string)
-                    link = f"https://t.me/{username}?start={encoded}"
-                    text += f"{start_idx + display_count}. <a href='{link}'>{file_name}</a>\n\n"
-            
-            buttons = []
-            # Add pagination buttons
-            if page > 0:
-                buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'view_folder_page_{idx}_{page - 1}'))
-            if end_idx < len(folder_files):
-                buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_folder_page_{idx}_{page + 1}'))
-            
-            button_rows = [buttons] if buttons else []
-            
-            # Add Get All Files and Edit buttons on same row
-            action_row = []
-            if folder_files:
-                encoded = b64_encode(folder_name, "utf-8")
-                action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_folder_{encoded}'))
-            action_row.append(InlineKeyboardButton('✏️ Edit', callback_data=f'edit_folder_{idx}'))
-            button_rows.append(action_row)
-            
-            # Back to browse folder
-            encoded = b64_encode(folder_name, "utf-8")
-            if '/' in folder_name:
-                parent_path = '/'.join(folder_name.split('/')[:-1])
-                parent_encoded = b64_encode(parent_path, "utf-8")
-                button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'browse_folder_{parent_encoded}')])
-            else:
-                button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_folder')])
-            
-            await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
-            await query.answer()
-            return
+        username = await bot_username(client)
+        share_link = f"https://t.me/{username}?start=folder_{token}"
+        
+        raw_buttons = [
+            [{"text": "Copy folder link", "copy_text": {"text": share_link}}, {"text": "📥 Open Link", "url": share_link}],
+            [{"text": "🔄 Change Link", "callback_data": f"change_folder_link_{idx}"}],
+            [{"text": "⋞ ʙᴀᴄᴋ", "callback_data": f"edit_folder_{idx}"}]
+        ]
+        
+        try:
+            await edit_message_reply_markup_raw(query.from_user.id, query.message.id, raw_buttons)
+        except Exception as e:
+            logger.error(f"Share folder error: {e}")
+        
+        await query.answer()
+
+
+@CALLBACKS.prefix("rename_folder_action_", int)
+async def cb_rename_folder_action(client, query, arg):
+    # Rename folder - ask for new name
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        old_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        CAPTION_INPUT_MODE[query.from_user.id] = f"rename_folder_idx_{idx}"
+        await query.message.reply_text(f"<b>✏️ Rename Folder\n\nCurrent name: <code>{old_name}</code>\n\nSend new name:</b>")
+        await query.answer()
+
+
+@CALLBACKS.prefix("delete_folder_action_", int)
+async def cb_delete_folder_action(client, query, arg):
+    # Delete folder - show confirmation
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        buttons = [
+            [InlineKeyboardButton('✅ Yes, Delete', callback_data=f'confirm_delfolder_{idx}'), 
+             InlineKeyboardButton('❌ Cancel', callback_data=f'cancel_delfolder_{idx}')]
+        ]
+        await query.message.edit_text(f"<b>⚠️ Delete folder '{folder_name}'?</b>\n\nThis action cannot be undone.", reply_markup=InlineKeyboardMarkup(buttons))
+        await query.answer()
+
+
+# ============ UNIFIED PASSWORD HANDLERS ============
+# These handle both files and folders using the password module
+@CALLBACKS.prefix("set_password_")
+async def cb_set_password(client, query, arg):
+    parts = query.data.replace("set_password_", "").split("_")
+    item_type = parts[0]
+    idx = int(parts[1])
+    await handle_set_password_callback(client, query, item_type, idx)
+
+
+@CALLBACKS.prefix("view_password_")
+async def cb_view_password(client, query, arg):
+    parts = query.data.replace("view_password_", "").split("_")
+    item_type = parts[0]
+    idx = int(parts[1])
+    await handle_view_password_callback(query, item_type, idx)
+
+
+@CALLBACKS.prefix("confirm_remove_pw_")
+async def cb_confirm_remove_pw(client, query, arg):
+    parts = query.data.replace("confirm_remove_pw_", "").split("_")
+    item_type = parts[0]
+    idx = int(parts[1])
+    await handle_confirm_remove_password_callback(query, item_type, idx)
+
+
+@CALLBACKS.prefix("remove_password_")
+async def cb_remove_password(client, query, arg):
+    parts = query.data.replace("remove_password_", "").split("_")
+    item_type = parts[0]
+    idx = int(parts[1])
+    await handle_remove_password_callback(client, query, item_type, idx, show_folder_edit_menu)
+
+
+# ============ LEGACY PASSWORD HANDLERS (kept for backward compatibility) ============
+@CALLBACKS.prefix("set_folder_password_", int)
+async def cb_set_folder_password(client, query, arg):
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
+        CAPTION_INPUT_MODE[query.from_user.id] = f"set_folder_password_idx_{idx}"
+        await query.message.reply_text(f"<b>🔐 Set Password for: {display_name}</b>\n\nSend the password you want to set for this folder.\nAnyone accessing this folder via share link will need to enter this password.\n\n<i>Send /cancel to cancel</i>", parse_mode=enums.ParseMode.HTML)
+        await query.answer()
+
+
+@CALLBACKS.prefix("view_folder_password_", int)
+async def cb_view_folder_password(client, query, arg):
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        password = await db.get_folder_password_plain(query.from_user.id, folder_name)
+        await query.answer(password_alert(password, "❌ No password set"), show_alert=True)
+    else:
+        await query.answer("❌ Folder not found", show_alert=True)
+
+
+@CALLBACKS.prefix("confirm_remove_password_", int)
+async def cb_confirm_remove_password(client, query, arg):
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
+        buttons = [
+            [InlineKeyboardButton('✅ Yes, Remove', callback_data=f'remove_folder_password_{idx}'), 
+             InlineKeyboardButton('❌ Cancel', callback_data=f'edit_folder_{idx}')]
+        ]
+        await query.message.edit_text(f"<b>⚠️ Remove password from folder '{display_name}'?</b>\n\nAnyone with the share link will be able to access this folder without a password.", reply_markup=InlineKeyboardMarkup(buttons))
+        await query.answer()
+
+
+@CALLBACKS.prefix("remove_folder_password_", int)
+async def cb_remove_folder_password(client, query, arg):
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
+        await db.remove_folder_password(query.from_user.id, folder_name)
+        # Pass force_is_protected=False to ensure button shows "Set Password" immediately
+        await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name, force_is_protected=False)
+        await query.answer("✅ Password deleted successfully!", show_alert=True)
+
+
+@CALLBACKS.prefix("folder_", int)
+async def cb_folder(client, query, arg):
+    # Click on folder to view files
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        all_files = user.get('stored_files', []) if user else []
         
-        elif query.data == "folder_separator_alert":
-            # Show alert when separator is clicked
-            await query.answer("📁 Subfolders are listed below", show_alert=True)
-            return
+        # Filter files by folder
+        folder_files = [(f_idx, f) for f_idx, f in enumerate(all_files) if f.get('folder') == folder_name]
         
-        elif query.data.startswith("edit_folder_"):
-            # Show Edit menu with Rename, Delete and Share options
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
-                await query.answer()
-            return
+        items_per_page = 10
+        start_idx = 0
+        end_idx = start_idx + items_per_page
+        paginated = folder_files[start_idx:end_idx]
         
-        elif query.data.startswith("change_folder_link_"):
-            # Ask for confirmation before changing link
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                
-                buttons = [
-                    [InlineKeyboardButton('✅ Yes, Change Link', callback_data=f'confirm_change_link_{idx}'), 
-                     InlineKeyboardButton('❌ Cancel', callback_data=f'cancel_change_link_{idx}')]
-                ]
-                await query.message.edit_text(f"<b>⚠️ Change folder link?</b>\n\nThis will invalidate the old link and generate a new one.", reply_markup=InlineKeyboardMarkup(buttons))
-                await query.answer()
-            return
+        username = await bot_username(client)
+        display_name = await db.get_folder_display_name(folder_name)
+        text = f"<b>📁 {display_name} (Page 1)\n"
+        if '/' in folder_name:
+            text += f"📍 Path: {folder_name}\n"
+        text += f"\n</b>"
         
-        elif query.data.startswith("confirm_change_link_"):
-            # Actually change the folder link
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                
-                # Generate new token (invalidates old one)
-                await db.change_folder_token(query.from_user.id, folder_name)
-                await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
-                await query.answer("✅ Link changed successfully.\n\nOld links are invalid now.", show_alert=True)
-            return
+        if not folder_files:
+            text += "No files"
+        else:
+            display_count = 0
+            for file_idx, file_obj in paginated:
+                display_count += 1
+                file_name = file_obj.get('file_name', 'Unknown')
+                encoded = file_ref(file_idx)
+                link = f"https://t.me/{username}?start={encoded}"
+                text += f"{start_idx + display_count}. <a href='{link}'>{file_name}</a>\n\n"
         
-        elif query.data.startswith("cancel_change_link_"):
-            # Cancel changing link - go back to edit menu
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
-                await query.answer()
-            return
+        buttons = []
+        # Add pagination buttons
+        if end_idx < len(folder_files):
+            buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_folder_page_{idx}_{1}'))
         
-        elif query.data.startswith("share_folder_"):
-            # Show folder share link with Copy folder link button (using token-based links)
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                
-                # Get or generate token-based share link
-                token = await db.get_folder_token(query.from_user.id, folder_name)
-                if not token:
-                    token = await db.generate_folder_token(query.from_user.id, folder_name)
-                
-                username = (await client.get_me()).username
-                share_link = f"https://t.me/{username}?start=folder_{token}"
-                
-                raw_buttons = [
-                    [{"text": "Copy folder link", "copy_text": {"text": share_link}}, {"text": "📥 Open Link", "url": share_link}],
-                    [{"text": "🔄 Change Link", "callback_data": f"change_folder_link_{idx}"}],
-                    [{"text": "⋞ ʙᴀᴄᴋ", "callback_data": f"edit_folder_{idx}"}]
-                ]
-                
-                try:
-                    await edit_message_reply_markup_raw(query.from_user.id, query.message.id, raw_buttons)
-                except Exception as e:
-                    logger.error(f"Share folder error: {e}")
-                
-                await query.answer()
-            return
+        button_rows = [buttons] if buttons else []
         
-        elif query.data.startswith("rename_folder_action_"):
-            # Rename folder - ask for new name
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                old_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                CAPTION_INPUT_MODE[query.from_user.id] = f"rename_folder_idx_{idx}"
-                await query.message.reply_text(f"<b>✏️ Rename Folder\n\nCurrent name: <code>{old_name}</code>\n\nSend new name:</b>")
-                await query.answer()
-            return
+        # Add Get All Files and Edit buttons on same row
+        action_row = []
+        if folder_files:
+            folder_encoded = encode_ref(REF_FOLDER, idx, 0)
+            action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_folder_{folder_encoded}'))
+        action_row.append(InlineKeyboardButton('✏️ Edit', callback_data=f'edit_folder_{idx}'))
+        button_rows.append(action_row)
         
-        elif query.data.startswith("delete_folder_action_"):
-            # Delete folder - show confirmation
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                buttons = [
-                    [InlineKeyboardButton('✅ Yes, Delete', callback_data=f'confirm_delfolder_{idx}'), 
-                     InlineKeyboardButton('❌ Cancel', callback_data=f'cancel_delfolder_{idx}')]
-                ]
-                await query.message.edit_text(f"<b>⚠️ Delete folder '{folder_name}'?</b>\n\nThis action cannot be undone.", reply_markup=InlineKeyboardMarkup(buttons))
-                await query.answer()
-            return
+        # Back navigation
+        if '/' in folder_name:
+            parent_path = '/'.join(folder_name.split('/')[:-1])
+            parent_encoded = await folder_ref(query.from_user.id, parent_path)
+            button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'browse_folder_{parent_encoded}')])
+        else:
+            button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_folder')])
         
-        # ============ UNIFIED PASSWORD HANDLERS ============
-        # These handle both files and folders using the password module
+        await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
+        await query.answer()
+
+
+@CALLBACKS.prefix("confirm_delfolder_")
+async def cb_confirm_delfolder(client, query, arg):
+    # Confirm delete folder and show folder list
+    try:
+        idx = int(query.data.replace("confirm_delfolder_", ""))
+        folders = await db.get_folders(query.from_user.id)
+        if 0 <= idx < len(folders):
+            f = folders[idx]
+            folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+            await db.delete_folder(query.from_user.id, folder_name)
+            
+            # Now show updated folder list
+            folders = await db.get_folders(query.from_user.id)
+            buttons = []
+            text = "<b>📁 Files by Folder\n\n</b>"
+            
+            row = []
+            for new_idx, new_f in enumerate(folders):
+                new_folder_name = new_f.get('name', str(new_f)) if isinstance(new_f, dict) else str(new_f)
+                # Skip invalid folder names
+                if not new_folder_name or new_folder_name.lower() == 'default' or new_folder_name == 'None':
+                    continue
+                files_in_f = await db.count_files_in_folder(query.from_user.id, new_folder_name, recursive=False)
+                row.append(InlineKeyboardButton(f'📁 {new_folder_name} ({files_in_f})', callback_data=f'folder_{new_idx}'))
+                if len(row) == 2:
+                    buttons.append(row)
+                    row = []
+            
+            if row:
+                buttons.append(row)
+            
+            if not buttons:
+                buttons.append([InlineKeyboardButton('No folders yet', callback_data='noop')])
+            
+            buttons.append([InlineKeyboardButton('➕ Add Folder', callback_data='add_folder_prompt')])
+            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
+            await query.message.edit_text(text + "Select folder:", reply_markup=InlineKeyboardMarkup(buttons))
+            await query.answer()
+    except Exception as e:
+        logger.error(f"Error deleting folder: {e}")
+        await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
+
+
+@CALLBACKS.prefix("cancel_delfolder_", int)
+async def cb_cancel_delfolder(client, query, arg):
+    # Cancel delete - back to edit folder menu (use shared helper)
+    idx = arg
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= idx < len(folders):
+        f = folders[idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        display_name = await db.get_folder_display_name(folder_name)
+        await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
+        await query.answer()
+
+
+@CALLBACKS.prefix("change_file_folder_", int)
+async def cb_change_file_folder(client, query, arg):
+    # Show folder selection for specific file
+    file_idx = arg
+    
+    # Get current file's folder
+    user = await db.col.find_one({'id': int(query.from_user.id)})
+    stored_files = user.get('stored_files', []) if user else []
+    current_folder = None
+    if 0 <= file_idx < len(stored_files):
+        current_folder = stored_files[file_idx].get('folder', None)
+    
+    folders = await db.get_folders(query.from_user.id)
+    buttons = []
+    
+    # Add folder options (skip invalid folder names) - 2 per row
+    valid_folders = []
+    for idx, f in enumerate(folders):
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
+        # Skip invalid folder names
+        if not folder_name or folder_name.lower() == 'default' or folder_name == 'None':
+            continue
+        valid_folders.append((idx, folder_name))
+    
+    # Group folders in pairs (2 per row)
+    for i in range(0, len(valid_folders), 2):
+        row = []
+        for idx, folder_name in valid_folders[i:i+2]:
+            # Show ✅ next to current folder
+            if current_folder and folder_name == current_folder:
+                display_text = f'✅ {folder_name}'
+            else:
+                display_text = f'📁 {folder_name}'
+            row.append(InlineKeyboardButton(
+                display_text,
+                callback_data=f'select_file_folder_{file_idx}_{idx}'
+            ))
+        buttons.append(row)
+    
+    if not buttons:
+        buttons.append([InlineKeyboardButton('No folders yet', callback_data='noop')])
+    
+    buttons.append([InlineKeyboardButton('➕ Add Folder', callback_data='add_folder_prompt')])
+    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'back_file_folder_{file_idx}')])
+    await query.message.edit_text(f"<b>📁 Select Folder\n\n</b>", reply_markup=InlineKeyboardMarkup(buttons))
+    await query.answer()
+
+
+@CALLBACKS.prefix("back_file_folder_", int)
+async def cb_back_file_folder(client, query, arg):
+    # Go back to file view
+    file_idx = arg
+    user = await db.col.find_one({'id': int(query.from_user.id)})
+    stored_files = user.get('stored_files', []) if user else []
+    
+    if 0 <= file_idx < len(stored_files):
+        file_name = stored_files[file_idx].get('file_name', 'File')
+        username = await bot_username(client)
+        encoded = file_ref(file_idx)
+        link = f"https://t.me/{username}?start={encoded}"
         
-        elif query.data.startswith("set_password_"):
-            parts = query.data.replace("set_password_", "").split("_")
-            item_type = parts[0]
-            idx = int(parts[1])
-            await handle_set_password_callback(client, query, item_type, idx)
-            return
+        protected = stored_files[file_idx].get('protected', False)
+        protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
         
-        elif query.data.startswith("view_password_"):
-            parts = query.data.replace("view_password_", "").split("_")
-            item_type = parts[0]
-            idx = int(parts[1])
-            await handle_view_password_callback(query, item_type, idx)
-            return
+        buttons = [
+            [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
+            [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
+            [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+        ]
         
-        elif query.data.startswith("confirm_remove_pw_"):
-            parts = query.data.replace("confirm_remove_pw_", "").split("_")
-            item_type = parts[0]
-            idx = int(parts[1])
-            await handle_confirm_remove_password_callback(query, item_type, idx)
-            return
+        caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
+        await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+    await query.answer()
+
+
+@CALLBACKS.prefix("select_file_folder_")
+async def cb_select_file_folder(client, query, arg):
+    # Save file to selected folder
+    parts = query.data.split("_")
+    file_idx = int(parts[3])
+    folder_idx = int(parts[4])
+    
+    # Get current file's folder to check if same
+    user = await db.col.find_one({'id': int(query.from_user.id)})
+    stored_files = user.get('stored_files', []) if user else []
+    current_folder = None
+    file_caption = None
+    if 0 <= file_idx < len(stored_files):
+        current_folder = stored_files[file_idx].get('folder', None)
+        file_caption = stored_files[file_idx].get('caption', None)
+    
+    folders = await db.get_folders(query.from_user.id)
+    if 0 <= folder_idx < len(folders):
+        f = folders[folder_idx]
+        folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
         
-        elif query.data.startswith("remove_password_"):
-            parts = query.data.replace("remove_password_", "").split("_")
-            item_type = parts[0]
-            idx = int(parts[1])
-            await handle_remove_password_callback(client, query, item_type, idx, show_folder_edit_menu)
+        # Check if file is already in this folder
+        if current_folder and current_folder == folder_name:
+            await query.answer(f"File is already in this folder", show_alert=True)
             return
         
-        # ============ LEGACY PASSWORD HANDLERS (kept for backward compatibility) ============
+        # Update file folder
+        await db.update_file_folder(query.from_user.id, file_idx, folder_name)
+        await query.answer(f"✅ Moved to folder: {folder_name}", show_alert=True)
         
-        elif query.data.startswith("set_folder_password_"):
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                CAPTION_INPUT_MODE[query.from_user.id] = f"set_folder_password_idx_{idx}"
-                await query.message.reply_text(f"<b>🔐 Set Password for: {display_name}</b>\n\nSend the password you want to set for this folder.\nAnyone accessing this folder via share link will need to enter this password.\n\n<i>Send /cancel to cancel</i>", parse_mode=enums.ParseMode.HTML)
-                await query.answer()
-            return
+        # Go back to file view with original caption
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
         
-        elif query.data.startswith("view_folder_password_"):
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                password = await db.get_folder_password_plain(query.from_user.id, folder_name)
-                if password:
-                    await query.answer(f"🔑 Password: {password}", show_alert=True)
-                else:
-                    await query.answer("❌ Password was set before this feature. Please remove and re-set the password to view it.", show_alert=True)
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            file_caption = stored_files[file_idx].get('caption', None)
+            protected = stored_files[file_idx].get('protected', False)
+            protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
+            
+            buttons = [
+                [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
+                [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
+                [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+            ]
+            
+            # Use original file caption if available, otherwise use file name
+            if file_caption:
+                caption = file_caption
             else:
-                await query.answer("❌ Folder not found", show_alert=True)
-            return
+                caption = f"<b>📄 {file_name}</b>"
+            await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+
+
+@CALLBACKS.prefix("file_share_")
+async def cb_file_share(client, query, arg):
+    # Show share options with buttons and caption
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
         
-        elif query.data.startswith("confirm_remove_password_"):
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                buttons = [
-                    [InlineKeyboardButton('✅ Yes, Remove', callback_data=f'remove_folder_password_{idx}'), 
-                     InlineKeyboardButton('❌ Cancel', callback_data=f'edit_folder_{idx}')]
-                ]
-                await query.message.edit_text(f"<b>⚠️ Remove password from folder '{display_name}'?</b>\n\nAnyone with the share link will be able to access this folder without a password.", reply_markup=InlineKeyboardMarkup(buttons))
-                await query.answer()
-            return
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            username = await bot_username(client)
+            
+            # Check if file has a custom token, otherwise use default
+            file_token = stored_files[file_idx].get('access_token')
+            if file_token:
+                encoded = b64_encode(f'ft_{file_token}')
+            else:
+                encoded = file_ref(file_idx)
+            link = f"https://t.me/{username}?start={encoded}"
+            
+            # Check if file is password protected
+            is_password_protected = stored_files[file_idx].get('password') is not None
+            
+            # Build buttons
+            inline_buttons = [
+                [{"text": "Copy file link", "copy_text": {"text": link}}, {"text": "📥 Open Link", "url": link}],
+                [{"text": "♻️ Change Link", "callback_data": f"change_file_link_{file_idx}"}]
+            ]
+            
+            # Use unified password buttons
+            inline_buttons.extend(build_password_buttons('file', file_idx, is_password_protected))
+            
+            inline_buttons.append([{"text": "⋞ Back", "callback_data": f"share_back_{file_idx}"}])
+            
+            protection_status = "🔒 Password Protected" if is_password_protected else ""
+            
+            share_text = f"<b>📤 Share File</b>\n\n<b>📄 {file_name}</b>\n{protection_status}\n\nShare this file with others using the link below:"
+            result = await edit_message_with_fallback(query.from_user.id, query.message.id, share_text, reply_markup=inline_buttons)
+            if not result.get("ok"):
+                await query.answer("Error updating share section", show_alert=True)
+                return
+            
+            await query.answer()
+    except Exception as e:
+        logger.error(f"Share menu error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("share_back_")
+async def cb_share_back(client, query, arg):
+    # Go back to file action buttons
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
         
-        elif query.data.startswith("remove_folder_password_"):
-            idx = int(query.data.split("_")[-1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                await db.remove_folder_password(query.from_user.id, folder_name)
-                # Pass force_is_protected=False to ensure button shows "Set Password" immediately
-                await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name, force_is_protected=False)
-                await query.answer("✅ Password deleted successfully!", show_alert=True)
-            return
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            protected = stored_files[file_idx].get('protected', False)
+            protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
+            
+            buttons = [
+                [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
+                [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
+                [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+            ]
+            
+            caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
+            await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+        await query.answer()
+    except Exception as e:
+        logger.error(f"Share back error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("delete_file_")
+async def cb_delete_file(client, query, arg):
+    # Show confirmation before delete
+    try:
+        file_idx_str = query.data.split("_")[-1]
+        file_idx = int(file_idx_str)
         
-        elif query.data.startswith("folder_"):
-            # Click on folder to view files
-            idx = int(query.data.split("_")[1])
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                all_files = user.get('stored_files', []) if user else []
-                
-                # Filter files by folder
-                folder_files = [(f_idx, f) for f_idx, f in enumerate(all_files) if f.get('folder') == folder_name]
-                
-                items_per_page = 10
-                start_idx = 0
-                end_idx = start_idx + items_per_page
-                paginated = folder_files[start_idx:end_idx]
-                
-                username = (await client.get_me()).username
-                display_name = await db.get_folder_display_name(folder_name)
-                text = f"<b>📁 {display_name} (Page 1)\n"
-                if '/' in folder_name:
-                    text += f"📍 Path: {folder_name}\n"
-                text += f"\n</b>"
-                
-                if not folder_files:
-                    text += "No files"
-                else:
-                    display_count = 0
-                    for file_idx, file_obj in paginated:
-                        display_count += 1
-                        file_name = file_obj.get('file_name', 'Unknown')
-                        string = f'file_{file_idx}'
-                        encoded = b64_encode(string)
-                        link = f"https://t.me/{username}?start={encoded}"
-                        text += f"{start_idx + display_count}. <a href='{link}'>{file_name}</a>\n\n"
-                
-                buttons = []
-                # Add pagination buttons
-                if end_idx < len(folder_files):
-                    buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'view_folder_page_{idx}_{1}'))
-                
-                button_rows = [buttons] if buttons else []
-                
-                # Add Get All Files and Edit buttons on same row
-                action_row = []
-                if folder_files:
-                    folder_encoded = b64_encode(folder_name, "utf-8")
-                    action_row.append(InlineKeyboardButton('📥 Get All Files', callback_data=f'getall_folder_{folder_encoded}'))
-                action_row.append(InlineKeyboardButton('✏️ Edit', callback_data=f'edit_folder_{idx}'))
-                button_rows.append(action_row)
-                
-                # Back navigation
-                if '/' in folder_name:
-                    parent_path = '/'.join(folder_name.split('/')[:-1])
-                    parent_encoded = b64_encode(parent_path, "utf-8")
-                    button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'browse_folder_{parent_encoded}')])
-                else:
-                    button_rows.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='files_by_folder')])
-                
-                await query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(button_rows), parse_mode=enums.ParseMode.HTML)
-                await query.answer()
-            return
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
         
-        elif query.data.startswith("confirm_delfolder_"):
-            # Confirm delete folder and show folder list
-            try:
-                idx = int(query.data.replace("confirm_delfolder_", ""))
-                folders = await db.get_folders(query.from_user.id)
-                if 0 <= idx < len(folders):
-                    f = folders[idx]
-                    folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                    await db.delete_folder(query.from_user.id, folder_name)
-                    
-                    # Now show updated folder list
-                    folders = await db.get_folders(query.from_user.id)
-                    buttons = []
-                    text = "<b>📁 Files by Folder\n\n</b>"
-                    
-                    row = []
-                    for new_idx, new_f in enumerate(folders):
-                        new_folder_name = new_f.get('name', str(new_f)) if isinstance(new_f, dict) else str(new_f)
-                        # Skip invalid folder names
-                        if not new_folder_name or new_folder_name.lower() == 'default' or new_folder_name == 'None':
-                            continue
-                        files_in_f = await db.get_files_by_folder(query.from_user.id, folder=new_folder_name)
-                        row.append(InlineKeyboardButton(f'📁 {new_folder_name} ({len(files_in_f)})', callback_data=f'folder_{new_idx}'))
-                        if len(row) == 2:
-                            buttons.append(row)
-                            row = []
-                    
-                    if row:
-                        buttons.append(row)
-                    
-                    if not buttons:
-                        buttons.append([InlineKeyboardButton('No folders yet', callback_data='noop')])
-                    
-                    buttons.append([InlineKeyboardButton('➕ Add Folder', callback_data='add_folder_prompt')])
-                    buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data='my_files_menu')])
-                    await query.message.edit_text(text + "Select folder:", reply_markup=InlineKeyboardMarkup(buttons))
-                    await query.answer()
-            except Exception as e:
-                logger.error(f"Error deleting folder: {e}")
-                await query.answer(f"Error: {str(e)[:50]}", show_alert=True)
-            return
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            buttons = [
+                [InlineKeyboardButton('✅ Yes, Delete', callback_data=f'confirm_delete_{file_idx}'), 
+                 InlineKeyboardButton('❌ Cancel', callback_data=f'cancel_delete_{file_idx}')]
+            ]
+            await query.message.edit_text(f"<b>⚠️ Delete '{file_name}'?</b>\n\nThis action cannot be undone.", reply_markup=InlineKeyboardMarkup(buttons))
+            await query.answer()
+        else:
+            await query.answer("File not found", show_alert=True)
+    except ValueError:
+        await query.answer("Invalid file format", show_alert=True)
+
+
+@CALLBACKS.prefix("confirm_delete_")
+async def cb_confirm_delete(client, query, arg):
+    # Confirm and delete file
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
         
-        elif query.data.startswith("cancel_delfolder_"):
-            # Cancel delete - back to edit folder menu (use shared helper)
-            idx = int(query.data.replace("cancel_delfolder_", ""))
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= idx < len(folders):
-                f = folders[idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                display_name = await db.get_folder_display_name(folder_name)
-                await show_folder_edit_menu(client, query.from_user.id, query.message.id, idx, folder_name, display_name)
-                await query.answer()
-            return
+        if 0 <= file_idx < len(stored_files):
+            file_id = stored_files[file_idx].get('file_id')
+            
+            # Delete from database (keeps the cached indexes in step)
+            if not await db.delete_file(query.from_user.id, file_id, file_idx):
+                await query.answer("File not found", show_alert=True)
+                return
+            
+            # Delete the message
+            await query.message.delete()
+            await query.answer("✅ File deleted!", show_alert=False)
+        else:
+            await query.answer("File not found", show_alert=True)
+    except Exception as e:
+        logger.error(f"Delete error: {e}")
+        await query.answer("Error deleting file", show_alert=True)
+
+
+@CALLBACKS.prefix("toggle_protected_")
+async def cb_toggle_protected(client, query, arg):
+    # Toggle file protected status
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        is_protected = await db.toggle_file_protected(query.from_user.id, file_idx)
         
-        elif query.data.startswith("change_file_folder_"):
-            # Show folder selection for specific file
-            file_idx = int(query.data.split("_")[-1])
+        if is_protected is not None:
+            status = "✅ Protected" if is_protected else "❌ Not Protected"
+            await query.answer(f"🛡️ {status}", show_alert=False)
             
-            # Get current file's folder
+            # Refresh buttons with updated protection status
             user = await db.col.find_one({'id': int(query.from_user.id)})
             stored_files = user.get('stored_files', []) if user else []
-            current_folder = None
+            
             if 0 <= file_idx < len(stored_files):
-                current_folder = stored_files[file_idx].get('folder', None)
+                file_name = stored_files[file_idx].get('file_name', 'File')
+                username = await bot_username(client)
+                encoded = file_ref(file_idx)
+                link = f"https://t.me/{username}?start={encoded}"
+                
+                protected = stored_files[file_idx].get('protected', False)
+                protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
+                
+                buttons = [
+                    [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
+                    [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
+                    [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+                ]
+                
+                caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
+                await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+        else:
+            await query.answer("File not found", show_alert=True)
+    except Exception as e:
+        logger.error(f"Toggle protected error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("cancel_delete_")
+async def cb_cancel_delete(client, query, arg):
+    # Cancel delete - show action buttons again
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
+        
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            username = await bot_username(client)
+            encoded = file_ref(file_idx)
+            link = f"https://t.me/{username}?start={encoded}"
             
-            folders = await db.get_folders(query.from_user.id)
-            buttons = []
+            protected = stored_files[file_idx].get('protected', False)
+            protect_btn = '🛡️✅ Protect' if protected else '🛡️❌ Protect'
             
-            # Add folder options (skip invalid folder names) - 2 per row
-            valid_folders = []
-            for idx, f in enumerate(folders):
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                # Skip invalid folder names
-                if not folder_name or folder_name.lower() == 'default' or folder_name == 'None':
-                    continue
-                valid_folders.append((idx, folder_name))
+            buttons = [
+                [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
+                [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
+                [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+            ]
             
-            # Group folders in pairs (2 per row)
-            for i in range(0, len(valid_folders), 2):
-                row = []
-                for idx, folder_name in valid_folders[i:i+2]:
-                    # Show ✅ next to current folder
-                    if current_folder and folder_name == current_folder:
-                        display_text = f'✅ {folder_name}'
-                    else:
-                        display_text = f'📁 {folder_name}'
-                    row.append(InlineKeyboardButton(
-                        display_text,
-                        callback_data=f'select_file_folder_{file_idx}_{idx}'
-                    ))
-                buttons.append(row)
+            caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
+            await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+            await query.answer()
+    except Exception as e:
+        logger.error(f"Cancel delete error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("set_file_password_")
+async def cb_set_file_password(client, query, arg):
+    # Set password for file - prompt user for password
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
+        
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            CAPTION_INPUT_MODE[query.from_user.id] = f"set_file_password_idx_{file_idx}"
+            await query.message.reply_text(
+                f"<b>🔐 Set Password for: {file_name}</b>\n\n"
+                f"Send the password you want to set for this file.\n"
+                f"Password must be 2-8 characters.\n"
+                f"Anyone accessing this file via share link will need to enter this password.\n\n"
+                f"<i>Send /cancel to cancel</i>",
+                parse_mode=enums.ParseMode.HTML
+            )
+            await query.answer()
+    except Exception as e:
+        logger.error(f"Set file password error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("show_file_link_")
+async def cb_show_file_link(client, query, arg):
+    # Show file link in alert (for copying)
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
+        
+        if 0 <= file_idx < len(stored_files):
+            username = await bot_username(client)
+            file_token = stored_files[file_idx].get('access_token')
+            if file_token:
+                encoded = b64_encode(f'ft_{file_token}')
+            else:
+                encoded = file_ref(file_idx)
+            link = f"https://t.me/{username}?start={encoded}"
             
-            if not buttons:
-                buttons.append([InlineKeyboardButton('No folders yet', callback_data='noop')])
+            # Send link as a message so user can copy it
+            await query.message.reply_text(f"<b>🔗 Copy this link:</b>\n\n<code>{link}</code>", parse_mode=enums.ParseMode.HTML)
+            await query.answer()
+        else:
+            await query.answer("File not found", show_alert=True)
+    except Exception as e:
+        logger.error(f"Show file link error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("view_file_password_")
+async def cb_view_file_password(client, query, arg):
+    # View file password (show to owner)
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        password = await db.get_file_password(query.from_user.id, file_idx)
+        await query.answer(password_alert(password), show_alert=True)
+    except Exception as e:
+        logger.error(f"View file password error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("confirm_remove_file_password_")
+async def cb_confirm_remove_file_password(client, query, arg):
+    # Confirm removal of file password
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
+        
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
             
-            buttons.append([InlineKeyboardButton('➕ Add Folder', callback_data='add_folder_prompt')])
-            buttons.append([InlineKeyboardButton('⋞ ʙᴀᴄᴋ', callback_data=f'back_file_folder_{file_idx}')])
-            await query.message.edit_text(f"<b>📁 Select Folder\n\n</b>", reply_markup=InlineKeyboardMarkup(buttons))
+            buttons = [
+                [InlineKeyboardButton('✅ Yes, Remove', callback_data=f'remove_file_password_{file_idx}'), 
+                 InlineKeyboardButton('❌ Cancel', callback_data=f'file_share_{file_idx}')]
+            ]
+            await query.message.edit_text(
+                f"<b>⚠️ Remove Password Protection?</b>\n\n<b>📄 {file_name}</b>\n\nAnyone with the link will be able to access this file without entering a password.",
+                reply_markup=InlineKeyboardMarkup(buttons),
+                parse_mode=enums.ParseMode.HTML
+            )
             await query.answer()
-            return
+    except Exception as e:
+        logger.error(f"Confirm remove file password error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("remove_file_password_")
+async def cb_remove_file_password(client, query, arg):
+    # Remove file password
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        success = await db.remove_file_password(query.from_user.id, file_idx)
         
-        elif query.data.startswith("back_file_folder_"):
-            # Go back to file view
-            file_idx = int(query.data.split("_")[-1])
+        if success:
+            await query.answer("✅ Password removed successfully!", show_alert=True)
+            # Go back to main file menu (like folders do)
             user = await db.col.find_one({'id': int(query.from_user.id)})
             stored_files = user.get('stored_files', []) if user else []
             
             if 0 <= file_idx < len(stored_files):
                 file_name = stored_files[file_idx].get('file_name', 'File')
-                username = (await client.get_me()).username
-                string = f'file_{file_idx}'
-                encoded = b64_encode(string)
-                link = f"https://t.me/{username}?start={encoded}"
-                
                 protected = stored_files[file_idx].get('protected', False)
                 protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
                 
@@ -4650,463 +4226,201 @@ You can generate a new token anytime from the Backup & Restore menu.</b>"""
                 
                 caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
                 await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+        else:
+            await query.answer("Error removing password", show_alert=True)
+    except Exception as e:
+        logger.error(f"Remove file password error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("change_file_link_")
+async def cb_change_file_link(client, query, arg):
+    # Show confirmation with original caption
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        user = await db.col.find_one({'id': int(query.from_user.id)})
+        stored_files = user.get('stored_files', []) if user else []
+        
+        if 0 <= file_idx < len(stored_files):
+            file_name = stored_files[file_idx].get('file_name', 'File')
+            file_caption = stored_files[file_idx].get('caption', None)
+            
+            buttons = [
+                [InlineKeyboardButton('Yes I am 💯 sure', callback_data=f'confirm_change_file_link_{file_idx}')],
+                [InlineKeyboardButton('Return', callback_data=f'file_share_{file_idx}')]
+            ]
+            
+            if file_caption:
+                caption = file_caption
+            else:
+                caption = f"<b>📄 {file_name}</b>"
+            await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
             await query.answer()
-            return
+    except Exception as e:
+        logger.error(f"Change file link error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.prefix("confirm_change_file_link_")
+async def cb_confirm_change_file_link(client, query, arg):
+    # Generate new token for file
+    try:
+        file_idx = int(query.data.split("_")[-1])
+        new_token = await db.change_file_token(query.from_user.id, file_idx)
         
-        elif query.data.startswith("select_file_folder_"):
-            # Save file to selected folder
-            parts = query.data.split("_")
-            file_idx = int(parts[3])
-            folder_idx = int(parts[4])
+        if new_token:
+            await query.answer("✅ Link changed!", show_alert=True)
             
-            # Get current file's folder to check if same
             user = await db.col.find_one({'id': int(query.from_user.id)})
             stored_files = user.get('stored_files', []) if user else []
-            current_folder = None
-            file_caption = None
+            
             if 0 <= file_idx < len(stored_files):
-                current_folder = stored_files[file_idx].get('folder', None)
+                file_name = stored_files[file_idx].get('file_name', 'File')
                 file_caption = stored_files[file_idx].get('caption', None)
-            
-            folders = await db.get_folders(query.from_user.id)
-            if 0 <= folder_idx < len(folders):
-                f = folders[folder_idx]
-                folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
-                
-                # Check if file is already in this folder
-                if current_folder and current_folder == folder_name:
-                    await query.answer(f"File is already in this folder", show_alert=True)
-                    return
-                
-                # Update file folder
-                await db.update_file_folder(query.from_user.id, file_idx, folder_name)
-                await query.answer(f"✅ Moved to folder: {folder_name}", show_alert=True)
-                
-                # Go back to file view with original caption
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    file_caption = stored_files[file_idx].get('caption', None)
-                    protected = stored_files[file_idx].get('protected', False)
-                    protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
-                    
-                    buttons = [
-                        [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
-                        [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
-                        [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-                    ]
-                    
-                    # Use original file caption if available, otherwise use file name
-                    if file_caption:
-                        caption = file_caption
-                    else:
-                        caption = f"<b>📄 {file_name}</b>"
-                    await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-            return
-        
-        elif query.data.startswith("file_share_"):
-            # Show share options with buttons and caption
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    username = (await client.get_me()).username
-                    
-                    # Check if file has a custom token, otherwise use default
-                    file_token = stored_files[file_idx].get('access_token')
-                    if file_token:
-                        string = f'ft_{file_token}'
-                    else:
-                        string = f'file_{file_idx}'
-                    encoded = b64_encode(string)
-                    link = f"https://t.me/{username}?start={encoded}"
-                    
-                    # Check if file is password protected
-                    is_password_protected = stored_files[file_idx].get('password') is not None
-                    
-                    # Build buttons
-                    inline_buttons = [
-                        [{"text": "Copy file link", "copy_text": {"text": link}}, {"text": "📥 Open Link", "url": link}],
-                        [{"text": "♻️ Change Link", "callback_data": f"change_file_link_{file_idx}"}]
-                    ]
-                    
-                    # Use unified password buttons
-                    inline_buttons.extend(build_password_buttons('file', file_idx, is_password_protected))
-                    
-                    inline_buttons.append([{"text": "⋞ Back", "callback_data": f"share_back_{file_idx}"}])
-                    
-                    protection_status = "🔒 Password Protected" if is_password_protected else ""
-                    
-                    share_text = f"<b>📤 Share File</b>\n\n<b>📄 {file_name}</b>\n{protection_status}\n\nShare this file with others using the link below:"
-                    result = await edit_message_with_fallback(query.from_user.id, query.message.id, share_text, reply_markup=inline_buttons)
-                    if not result.get("ok"):
-                        await query.answer("Error updating share section", show_alert=True)
-                        return
-                    
-                    await query.answer()
-            except Exception as e:
-                logger.error(f"Share menu error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("share_back_"):
-            # Go back to file action buttons
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    protected = stored_files[file_idx].get('protected', False)
-                    protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
-                    
-                    buttons = [
-                        [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
-                        [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
-                        [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-                    ]
-                    
-                    caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
-                    await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-                await query.answer()
-            except Exception as e:
-                logger.error(f"Share back error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("delete_file_"):
-            # Show confirmation before delete
-            try:
-                file_idx_str = query.data.split("_")[-1]
-                file_idx = int(file_idx_str)
-                
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    buttons = [
-                        [InlineKeyboardButton('✅ Yes, Delete', callback_data=f'confirm_delete_{file_idx}'), 
-                         InlineKeyboardButton('❌ Cancel', callback_data=f'cancel_delete_{file_idx}')]
-                    ]
-                    await query.message.edit_text(f"<b>⚠️ Delete '{file_name}'?</b>\n\nThis action cannot be undone.", reply_markup=InlineKeyboardMarkup(buttons))
-                    await query.answer()
-                else:
-                    await query.answer("File not found", show_alert=True)
-            except ValueError:
-                await query.answer("Invalid file format", show_alert=True)
-            return
-        
-        elif query.data.startswith("confirm_delete_"):
-            # Confirm and delete file
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    file_id = stored_files[file_idx].get('file_id')
-                    
-                    # Delete from database
-                    await db.col.update_one(
-                        {'id': int(query.from_user.id)},
-                        {'$pull': {'stored_files': {'file_name': file_name, 'file_id': file_id}}}
-                    )
-                    
-                    # Delete the message
-                    await query.message.delete()
-                    await query.answer("✅ File deleted!", show_alert=False)
-                else:
-                    await query.answer("File not found", show_alert=True)
-            except Exception as e:
-                logger.error(f"Delete error: {e}")
-                await query.answer("Error deleting file", show_alert=True)
-            return
-        
-        elif query.data.startswith("toggle_protected_"):
-            # Toggle file protected status
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                is_protected = await db.toggle_file_protected(query.from_user.id, file_idx)
-                
-                if is_protected is not None:
-                    status = "✅ Protected" if is_protected else "❌ Not Protected"
-                    await query.answer(f"🛡️ {status}", show_alert=False)
-                    
-                    # Refresh buttons with updated protection status
-                    user = await db.col.find_one({'id': int(query.from_user.id)})
-                    stored_files = user.get('stored_files', []) if user else []
-                    
-                    if 0 <= file_idx < len(stored_files):
-                        file_name = stored_files[file_idx].get('file_name', 'File')
-                        username = (await client.get_me()).username
-                        string = f'file_{file_idx}'
-                        encoded = b64_encode(string)
-                        link = f"https://t.me/{username}?start={encoded}"
-                        
-                        protected = stored_files[file_idx].get('protected', False)
-                        protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
-                        
-                        buttons = [
-                            [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
-                            [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
-                            [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-                        ]
-                        
-                        caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
-                        await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-                else:
-                    await query.answer("File not found", show_alert=True)
-            except Exception as e:
-                logger.error(f"Toggle protected error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("cancel_delete_"):
-            # Cancel delete - show action buttons again
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    username = (await client.get_me()).username
-                    string = f'file_{file_idx}'
-                    encoded = b64_encode(string)
-                    link = f"https://t.me/{username}?start={encoded}"
-                    
-                    protected = stored_files[file_idx].get('protected', False)
-                    protect_btn = '🛡️✅ Protect' if protected else '🛡️❌ Protect'
-                    
-                    buttons = [
-                        [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
-                        [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
-                        [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-                    ]
-                    
-                    caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
-                    await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-                    await query.answer()
-            except Exception as e:
-                logger.error(f"Cancel delete error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("set_file_password_"):
-            # Set password for file - prompt user for password
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
+                protected = stored_files[file_idx].get('protected', False)
+                protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
                 
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    CAPTION_INPUT_MODE[query.from_user.id] = f"set_file_password_idx_{file_idx}"
-                    await query.message.reply_text(
-                        f"<b>🔐 Set Password for: {file_name}</b>\n\n"
-                        f"Send the password you want to set for this file.\n"
-                        f"Password must be 2-8 characters.\n"
-                        f"Anyone accessing this file via share link will need to enter this password.\n\n"
-                        f"<i>Send /cancel to cancel</i>",
-                        parse_mode=enums.ParseMode.HTML
-                    )
-                    await query.answer()
-            except Exception as e:
-                logger.error(f"Set file password error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("show_file_link_"):
-            # Show file link in alert (for copying)
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
+                buttons = [
+                    [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
+                    [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
+                    [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+                ]
                 
-                if 0 <= file_idx < len(stored_files):
-                    username = (await client.get_me()).username
-                    file_token = stored_files[file_idx].get('access_token')
-                    if file_token:
-                        string = f'ft_{file_token}'
-                    else:
-                        string = f'file_{file_idx}'
-                    encoded = b64_encode(string)
-                    link = f"https://t.me/{username}?start={encoded}"
-                    
-                    # Send link as a message so user can copy it
-                    await query.message.reply_text(f"<b>🔗 Copy this link:</b>\n\n<code>{link}</code>", parse_mode=enums.ParseMode.HTML)
-                    await query.answer()
-                else:
-                    await query.answer("File not found", show_alert=True)
-            except Exception as e:
-                logger.error(f"Show file link error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("view_file_password_"):
-            # View file password (show to owner)
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                password = await db.get_file_password(query.from_user.id, file_idx)
-                if password:
-                    await query.answer(f"🔐 Password: {password}", show_alert=True)
+                if file_caption:
+                    caption = file_caption
                 else:
-                    await query.answer("No password set", show_alert=True)
-            except Exception as e:
-                logger.error(f"View file password error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
+                    caption = f"<b>📄 {file_name}</b>"
+                await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+        else:
+            await query.answer("Error changing link", show_alert=True)
+    except Exception as e:
+        logger.error(f"Confirm change file link error: {e}")
+        await query.answer("Error", show_alert=True)
+
+
+@CALLBACKS.route("close_file_message")
+async def cb_close_file_message(client, query, arg):
+    # Delete the file message and reply chain
+    try:
+        # Delete the file message
+        await query.message.delete()
         
-        elif query.data.startswith("confirm_remove_file_password_"):
-            # Confirm removal of file password
+        # Also try to delete reply-to message if exists
+        if query.message.reply_to_message:
             try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    
-                    buttons = [
-                        [InlineKeyboardButton('✅ Yes, Remove', callback_data=f'remove_file_password_{file_idx}'), 
-                         InlineKeyboardButton('❌ Cancel', callback_data=f'file_share_{file_idx}')]
-                    ]
-                    await query.message.edit_text(
-                        f"<b>⚠️ Remove Password Protection?</b>\n\n<b>📄 {file_name}</b>\n\nAnyone with the link will be able to access this file without entering a password.",
-                        reply_markup=InlineKeyboardMarkup(buttons),
-                        parse_mode=enums.ParseMode.HTML
-                    )
-                    await query.answer()
-            except Exception as e:
-                logger.error(f"Confirm remove file password error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("remove_file_password_"):
-            # Remove file password
+                await query.message.reply_to_message.delete()
+            except:
+                pass
+    except:
+        pass
+    await query.answer()
+
+
+@Client.on_callback_query()
+async def callback(client, query):
+    try:
+        await CALLBACKS.dispatch(client, query)
+    except Exception as e:
+        logger.error(f"Callback error: {e}")
+        try:
+            await query.answer("Error occurred", show_alert=False)
+        except:
+            pass
+
+
+async def store_uploads(user_id, uploads):
+    """Save a burst of uploads: one LOG_CHANNEL forward per 100 files, one DB write, one reply"""
+    client = uploads[0][0]
+    uploads.sort(key=lambda u: u[1].id)
+    saved, saved_msg_ids, failed = [], [], 0
+    for start in range(0, len(uploads), UPLOAD_FORWARD_LIMIT):
+        chunk = uploads[start:start + UPLOAD_FORWARD_LIMIT]
+        log_ids = [None] * len(chunk)
+        for attempt in range(2):
             try:
-                file_idx = int(query.data.split("_")[-1])
-                success = await db.remove_file_password(query.from_user.id, file_idx)
-                
-                if success:
-                    await query.answer("✅ Password removed successfully!", show_alert=True)
-                    # Go back to main file menu (like folders do)
-                    user = await db.col.find_one({'id': int(query.from_user.id)})
-                    stored_files = user.get('stored_files', []) if user else []
-                    
-                    if 0 <= file_idx < len(stored_files):
-                        file_name = stored_files[file_idx].get('file_name', 'File')
-                        protected = stored_files[file_idx].get('protected', False)
-                        protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
-                        
-                        buttons = [
-                            [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
-                            [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
-                            [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-                        ]
-                        
-                        caption = f"<b>✅ File saved!</b>\n\n<b>📄 {file_name}</b>"
-                        await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
+                # Files already in LOG_CHANNEL are reused; the rest are forwarded in one call
+                log_ids = await BLOBS.store_many(
+                    [u[1] for u in chunk],
+                    lambda fresh: copy_many(client, LOG_CHANNEL, user_id, [m.id for m in fresh])
+                )
+                break
+            except FloodWait as e:
+                if attempt:
+                    logger.error(f"Error forwarding to LOG_CHANNEL: {e}")
                 else:
-                    await query.answer("Error removing password", show_alert=True)
-            except Exception as e:
-                logger.error(f"Remove file password error: {e}")
-                await query.answer("Error", show_alert=True)
-            return
-        
-        elif query.data.startswith("change_file_link_"):
-            # Show confirmation with original caption
-            try:
-                file_idx = int(query.data.split("_")[-1])
-                user = await db.col.find_one({'id': int(query.from_user.id)})
-                stored_files = user.get('stored_files', []) if user else []
-                
-                if 0 <= file_idx < len(stored_files):
-                    file_name = stored_files[file_idx].get('file_name', 'File')
-                    file_caption = stored_files[file_idx].get('caption', None)
-                    
-                    buttons = [
-                        [InlineKeyboardButton('Yes I am 💯 sure', callback_data=f'confirm_change_file_link_{file_idx}')],
-                        [InlineKeyboardButton('Return', callback_data=f'file_share_{file_idx}')]
-                    ]
-                    
-                    if file_caption:
-                        caption = file_caption
-                    else:
-                        caption = f"<b>📄 {file_name}</b>"
-                    await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-                    await query.answer()
+                    await asyncio.sleep(e.value)
             except Exception as e:
-                logger.error(f"Change file link error: {e}")
-                await query.answer("Error", show_alert=True)
+                logger.error(f"Error forwarding to LOG_CHANNEL: {e}")
+                break
+        for (_, message, file_name, file_type), log_id in zip(chunk, log_ids):
+            if log_id:
+                saved.append((log_id, file_name, file_type))
+                saved_msg_ids.append(message.id)
+            else:
+                failed += 1
+    
+    first_index = await db.save_files(user_id, saved) if saved else None
+    if first_index is None:
+        failed += len(saved)
+        saved, saved_msg_ids = [], []
+    
+    async def acknowledge():
+        if not saved:
+            await client.send_message(user_id, f"❌ Error saving {'file' if failed == 1 else f'{failed} files'}")
             return
         
-        elif query.data.startswith("confirm_change_file_link_"):
-            # Generate new token for file
+        if len(saved) == 1 and not failed:
+            log_message_id, file_name, file_type = saved[0]
+            file_index = first_index
+            # Create action buttons with Share containing copy/open options
+            buttons = [
+                [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_index}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_index}')],
+                [InlineKeyboardButton('🛡️❌ Protect', callback_data=f'toggle_protected_{file_index}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_index}')],
+                [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
+            ]
+            
+            # Build caption with file info
+            caption = f"<b>✅ File saved!</b>\n\n"
+            caption += f"<b>📄 {file_name}</b>\n"
+            caption += f"<b>Type:</b> {file_type}"
+            
+            # Copy the stored file back with buttons and caption; the original may already be gone
             try:
-                file_idx = int(query.data.split("_")[-1])
-                new_token = await db.change_file_token(query.from_user.id, file_idx)
-                
-                if new_token:
-                    await query.answer("✅ Link changed!", show_alert=True)
-                    
-                    user = await db.col.find_one({'id': int(query.from_user.id)})
-                    stored_files = user.get('stored_files', []) if user else []
-                    
-                    if 0 <= file_idx < len(stored_files):
-                        file_name = stored_files[file_idx].get('file_name', 'File')
-                        file_caption = stored_files[file_idx].get('caption', None)
-                        protected = stored_files[file_idx].get('protected', False)
-                        protect_btn = '🛡️✅ Protected' if protected else '🛡️❌ Protect'
-                        
-                        buttons = [
-                            [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_idx}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_idx}')],
-                            [InlineKeyboardButton(protect_btn, callback_data=f'toggle_protected_{file_idx}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_idx}')],
-                            [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-                        ]
-                        
-                        if file_caption:
-                            caption = file_caption
-                        else:
-                            caption = f"<b>📄 {file_name}</b>"
-                        await query.message.edit_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-                else:
-                    await query.answer("Error changing link", show_alert=True)
+                await client.copy_message(user_id, LOG_CHANNEL, log_message_id, caption=caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
             except Exception as e:
-                logger.error(f"Confirm change file link error: {e}")
-                await query.answer("Error", show_alert=True)
+                logger.error(f"Error copying file as reply: {e}")
+                # Fallback to a text message if copy fails
+                await client.send_message(user_id, caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
             return
         
-        elif query.data == "close_file_message":
-            # Delete the file message and reply chain
-            try:
-                # Delete the file message
-                await query.message.delete()
-                
-                # Also try to delete reply-to message if exists
-                if query.message.reply_to_message:
-                    try:
-                        await query.message.reply_to_message.delete()
-                    except:
-                        pass
-            except:
-                pass
-            await query.answer()
+        # Several files: one summary with a link per file
+        username = await bot_username(client)
+        text = f"<b>✅ Saved {len(saved)} files!</b>\n\n"
+        for k, (_, file_name, _) in enumerate(saved[:UPLOAD_SUMMARY_LINES]):
+            link = f"https://t.me/{username}?start={file_ref(first_index + k)}"
+            text += f"• <a href='{link}'>{html.escape(file_name)}</a>\n"
+        if len(saved) > UPLOAD_SUMMARY_LINES:
+            text += f"\n<i>…and {len(saved) - UPLOAD_SUMMARY_LINES} more in My Files</i>\n"
+        if failed:
+            text += f"\n❌ Failed: {failed}"
+        buttons = [[InlineKeyboardButton('📂 My Files', callback_data='my_files_menu'), InlineKeyboardButton('✖️ Close', callback_data='close_file_message')]]
+        await client.send_message(user_id, text, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML, disable_web_page_preview=True)
+    
+    async def delete_originals():
+        if not saved_msg_ids:
             return
-    except Exception as e:
-        logger.error(f"Callback error: {e}")
         try:
-            await query.answer("Error occurred", show_alert=False)
+            await client.delete_messages(user_id, saved_msg_ids)
         except:
             pass
+    
+    # The reply no longer needs the user's messages, so both go out together
+    await asyncio.gather(acknowledge(), delete_originals())
+
+
+UPLOAD_FORWARD_LIMIT = 100  # Ids per messages.forwardMessages call
+UPLOAD_SUMMARY_LINES = 20  # Files listed by name in a multi-file summary
+UPLOADS = IngestBuffer(store_uploads, UPLOAD_BATCH_WINDOW, UPLOAD_BATCH_MAX_WAIT, UPLOAD_FORWARD_LIMIT)
 
 
 @Client.on_message(filters.private & (filters.document | filters.video | filters.photo | filters.audio | filters.animation | filters.sticker))
@@ -5141,54 +4455,8 @@ async def handle_file_upload(client, message):
             await message.reply_text("❌ Could not process file")
             return
         
-        # Forward file to LOG_CHANNEL
-        try:
-            forwarded_msg = await message.copy(chat_id=LOG_CHANNEL)
-            log_message_id = forwarded_msg.id
-            logger.info(f"File forwarded to LOG_CHANNEL with message ID: {log_message_id}")
-        except Exception as e:
-            logger.error(f"Error forwarding to LOG_CHANNEL: {e}")
-            await message.reply_text(f"❌ Error saving file: {str(e)[:50]}")
-            return
-        
-        # Save file to database with LOG_CHANNEL message ID
-        await db.save_file(user_id, log_message_id, file_name, folder=None, file_type=file_type)
-        
-        # Generate numeric link (file_N where N is the file index)
-        user = await db.col.find_one({'id': int(user_id)})
-        stored_files = user.get('stored_files', []) if user else []
-        file_index = len(stored_files) - 1  # 0-based index of newly added file
-        
-        username = (await client.get_me()).username
-        string = f'file_{file_index}'
-        encoded = b64_encode(string)
-        link = f"https://t.me/{username}?start={encoded}"
-        
-        # Create action buttons with Share containing copy/open options
-        buttons = [
-            [InlineKeyboardButton('🔗 Share', callback_data=f'file_share_{file_index}'), InlineKeyboardButton('📁 Change Folder', callback_data=f'change_file_folder_{file_index}')],
-            [InlineKeyboardButton('🛡️❌ Protect', callback_data=f'toggle_protected_{file_index}'), InlineKeyboardButton('❌ Delete', callback_data=f'delete_file_{file_index}')],
-            [InlineKeyboardButton('✖️ Close', callback_data=f'close_file_message')]
-        ]
-        
-        # Build caption with file info
-        caption = f"<b>✅ File saved!</b>\n\n"
-        caption += f"<b>📄 {file_name}</b>\n"
-        caption += f"<b>Type:</b> {file_type}"
-        
-        # Copy the file as reply with buttons and caption
-        try:
-            reply_msg = await message.copy(chat_id=message.from_user.id, caption=caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-        except Exception as e:
-            logger.error(f"Error copying file as reply: {e}")
-            # Fallback to text reply if copy fails
-            reply_msg = await message.reply_text(caption, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=enums.ParseMode.HTML)
-        
-        # Delete original user file message
-        try:
-            await message.delete()
-        except:
-            pass
+        # Saved together with whatever else the user sends within the next moments
+        UPLOADS.add(user_id, (client, message, file_name, file_type), message.media_group_id)
         
     except Exception as e:
         logger.error(f"File upload handler error: {e}")
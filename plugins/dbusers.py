@@ -1,14 +1,44 @@
 
 import motor.motor_asyncio
+from pymongo import ReturnDocument
+import re
 import time
+import datetime
+import hmac
+import bcrypt
+import itertools
 from config import DB_NAME, DB_URI
+from core.utils.metrics import DB_SECONDS, instrument_methods
+from core.utils.text_filters import compile_filters, CompiledFilterCache
+from core.utils.offload import offload
+from core.utils.search import FileSearchIndex, SearchIndexes
+from core.utils.catalog import FileCatalog, FileCatalogs, CategoryIndex, CategoryIndexes
+from core.utils.blobs import BLOBS
 
 CACHE_TTL = 300
 
+
+def is_password_hash(value):
+    """True for a bcrypt hash, False for a password stored in plain text by older versions"""
+    return isinstance(value, str) and value.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def check_password(password, stored):
+    if is_password_hash(stored):
+        return bcrypt.checkpw(password.encode(), stored.encode())
+    return hmac.compare_digest(password.encode(), stored.encode())
+
+
 class UserCache:
     def __init__(self, ttl=CACHE_TTL):
         self._cache = {}
         self._ttl = ttl
+        self._versions = {}
+        self._clock = itertools.count(1)
     
     def get(self, user_id):
         key = int(user_id)
@@ -24,10 +54,16 @@ class UserCache:
     
     def invalidate(self, user_id):
         self._cache.pop(int(user_id), None)
+        self._versions[int(user_id)] = next(self._clock)
+    
+    def version(self, user_id):
+        """Counter that changes on every write for this user"""
+        return self._versions.get(int(user_id), 0)
     
     def clear(self):
         self._cache.clear()
 
+@instrument_methods(DB_SECONDS)
 class Database:
     
     def __init__(self, uri, database_name):
@@ -35,6 +71,11 @@ class Database:
         self.db = self._client[database_name]
         self.col = self.db.users
         self._cache = UserCache()
+        self._compiled_filters = CompiledFilterCache()  # Filename filters of users with recent deliveries
+        self._file_counts = {}  # {user_id: (state_version, number of stored files)}
+        self._search = SearchIndexes()  # File-name indexes of users who searched recently
+        self._catalogs = FileCatalogs()  # Columnar stored_files of users who browsed recently
+        self._categories = CategoryIndexes()  # File ids per file_type, updated in place by writes
 
     def new_user(self, id, name):
         return dict(
@@ -58,6 +99,10 @@ class Database:
             self._cache.set(user_id, user)
         return user
     
+    def state_version(self, user_id):
+        """Version of a user's document, bumped by every mutator"""
+        return self._cache.version(user_id)
+    
     async def add_user(self, id, name):
         user = self.new_user(id, name)
         await self.col.insert_one(user)
@@ -75,8 +120,15 @@ class Database:
         return self.col.find({})
 
     async def delete_user(self, user_id):
+        user = await self.col.find_one({'id': int(user_id)}, {'_id': 0, 'stored_files.file_id': 1})
         await self.col.delete_many({'id': int(user_id)})
+        if user:
+            await BLOBS.release({f.get('file_id') for f in user.get('stored_files', [])})
         self._cache.invalidate(user_id)
+        self._search.drop(user_id)
+        self._catalogs.drop(user_id)
+        self._categories.drop(user_id)
+        self._compiled_filters.drop(user_id)
     
     async def add_destination(self, user_id, channel_id, dest_type, topic_id=None, topic_name=None, cached_name=None):
         """Add a destination (supports multiple, prevents duplicates)"""
@@ -128,6 +180,15 @@ class Database:
         self._cache.invalidate(user_id)
         return True
     
+    async def disable_destination(self, user_id, channel_id):
+        """Mark a destination as disabled without touching the others"""
+        result = await self.col.update_one(
+            {'id': int(user_id), 'destinations.channel_id': int(channel_id)},
+            {'$set': {'destinations.$.enabled': False}}
+        )
+        self._cache.invalidate(user_id)
+        return result.modified_count > 0
+    
     async def update_destination_topic(self, user_id, channel_id, topic_id, topic_name=None):
         """Update topic for a specific destination"""
         user = await self._get_user_cached(user_id)
@@ -200,6 +261,7 @@ class Database:
             {'$addToSet': {'filename_filters': filter_text}}
         )
         self._cache.invalidate(user_id)
+        self._compiled_filters.drop(user_id)
     
     async def remove_filename_filter(self, user_id, filter_text):
         """Remove word/phrase filter"""
@@ -208,12 +270,28 @@ class Database:
             {'$pull': {'filename_filters': filter_text}}
         )
         self._cache.invalidate(user_id)
+        self._compiled_filters.drop(user_id)
+    
+    async def clear_filename_filters(self, user_id):
+        """Remove every filename filter"""
+        await self.col.update_one({'id': int(user_id)}, {'$set': {'filename_filters': []}})
+        self._cache.invalidate(user_id)
+        self._compiled_filters.drop(user_id)
     
     async def get_filename_filters(self, user_id):
         """Get all filename filters"""
         user = await self._get_user_cached(user_id)
         return user.get('filename_filters', []) if user else []
     
+    async def get_compiled_filters(self, user_id):
+        """Filename filters compiled for single-pass replacement, cached per user"""
+        version = self.state_version(user_id)
+        compiled = self._compiled_filters.get(user_id, version)
+        if compiled is None:
+            compiled = compile_filters(tuple(await self.get_filename_filters(user_id)))
+            self._compiled_filters.put(user_id, version, compiled)
+        return compiled
+    
     async def create_folder(self, user_id, folder_name, parent_folder=None):
         """Create a new folder (supports subfolders with path notation)
         
@@ -283,92 +361,105 @@ class Database:
     
     async def get_files_in_folder_recursive(self, user_id, folder_path):
         """Get all files in a folder and all its subfolders"""
-        user = await self._get_user_cached(user_id)
-        if not user:
-            return []
-        files = user.get('stored_files', [])
-        result = []
-        for f in files:
-            file_folder = f.get('folder')
-            # Include files in exact folder or any subfolder
-            if file_folder == folder_path or (file_folder and file_folder.startswith(f"{folder_path}/")):
-                result.append(f)
-        return result
+        catalog = await self._catalog(user_id)
+        return catalog.rows(catalog.in_tree(folder_path))
+    
+    async def count_files_in_folder(self, user_id, folder_path, recursive=True):
+        """Number of files in a folder (and its subfolders unless recursive=False)"""
+        catalog = await self._catalog(user_id)
+        if recursive:
+            return len(catalog.in_tree(folder_path))
+        return len(catalog.in_folder(folder_path))
+    
+    async def get_last_files_in_folder(self, user_id, folder_path, count=5):
+        """The count newest files of a folder and its subfolders, oldest first"""
+        catalog = await self._catalog(user_id)
+        return catalog.rows(catalog.newest(catalog.in_tree(folder_path), count))
     
     async def delete_folder(self, user_id, folder_name):
-        """Delete a folder and all its subfolders (cascade delete)"""
+        """Delete a folder and all its subfolders (cascade delete)
+        
+        Runs as one server-side update: the folders are pulled and only the
+        affected files are touched through an array filter, so the cost
+        follows the number of files in the folder, not the whole catalog.
+        """
         user = await self._get_user_cached(user_id)
         if not user:
             return False
         
-        folders = user.get('folders', [])
-        updated_folders = []
-        
-        for folder in folders:
-            fname = folder.get('name', str(folder)) if isinstance(folder, dict) else str(folder)
-            # Keep folders that are NOT the target folder AND NOT subfolders of it
-            if fname != folder_name and not fname.startswith(f"{folder_name}/"):
-                updated_folders.append(folder)
-        
-        # Also update files - clear folder reference for files in deleted folder and subfolders
-        files = user.get('stored_files', [])
-        for f in files:
-            file_folder = f.get('folder')
-            if file_folder == folder_name or (file_folder and file_folder.startswith(f"{folder_name}/")):
-                f['folder'] = None  # Move files to unorganized
-        
-        await self.col.update_one({'id': int(user_id)}, {'$set': {'folders': updated_folders, 'stored_files': files}})
+        in_tree = {'$regex': f"^{re.escape(folder_name)}(/|$)"}
+        if 'stored_files' in user:
+            # Files in the deleted folder and its subfolders move to unorganized
+            await self.col.update_one(
+                {'id': int(user_id)},
+                {'$pull': {'folders': {'name': in_tree}}, '$set': {'stored_files.$[f].folder': None}},
+                array_filters=[{'f.folder': in_tree}]
+            )
+        else:
+            await self.col.update_one({'id': int(user_id)}, {'$pull': {'folders': {'name': in_tree}}})
+        # Folders saved as plain names by old versions are not documents
+        legacy = [f for f in user.get('folders', []) if isinstance(f, str) and (f == folder_name or f.startswith(f"{folder_name}/"))]
+        if legacy:
+            await self.col.update_one({'id': int(user_id)}, {'$pull': {'folders': {'$in': legacy}}})
         self._cache.invalidate(user_id)
         return True
     
     async def rename_folder(self, user_id, old_name, new_name):
-        """Rename a folder and cascade to all subfolders and files"""
+        """Rename a folder and cascade to all subfolders and files
+        
+        Every affected path gets its own array filter, so folders, files and
+        selected_folder change together in one atomic update that only
+        writes the matching elements.
+        """
         user = await self._get_user_cached(user_id)
         if not user:
             return False
         
-        # 1. Rename the folder and all subfolders
-        folders = user.get('folders', [])
         old_prefix = f"{old_name}/"
         
-        for folder in folders:
+        def renamed(path):
+            if path == old_name or (path and path.startswith(old_prefix)):
+                return new_name + path[len(old_name):]
+            return None
+        
+        updates = {}
+        array_filters = []
+        now = datetime.datetime.now()
+        
+        # 1. The folder and all subfolders
+        folder_paths = set()
+        for folder in user.get('folders', []):
             folder_path = folder.get('name', str(folder)) if isinstance(folder, dict) else str(folder)
-            
-            if folder_path == old_name:
-                # Exact match - rename
-                if isinstance(folder, dict):
-                    folder['name'] = new_name
-                else:
-                    folder_idx = folders.index(folder)
-                    folders[folder_idx] = {'name': new_name, 'created_at': __import__('datetime').datetime.now()}
-            elif folder_path.startswith(old_prefix):
-                # Subfolder - update the prefix
-                new_path = new_name + folder_path[len(old_name):]
-                if isinstance(folder, dict):
-                    folder['name'] = new_path
-                else:
-                    folder_idx = folders.index(folder)
-                    folders[folder_idx] = {'name': new_path, 'created_at': __import__('datetime').datetime.now()}
+            new_path = renamed(folder_path)
+            if new_path is None or folder_path in folder_paths:
+                continue
+            folder_paths.add(folder_path)
+            n = len(array_filters)
+            if isinstance(folder, dict):
+                updates[f'folders.$[d{n}].name'] = new_path
+                array_filters.append({f'd{n}.name': folder_path})
+            else:
+                # Plain names from old versions become documents
+                updates[f'folders.$[d{n}]'] = {'name': new_path, 'created_at': now}
+                array_filters.append({f'd{n}': folder_path})
         
-        # 2. Update all files that are in the renamed folder or its subfolders
-        files = user.get('stored_files', [])
-        for f in files:
-            file_folder = f.get('folder')
-            if file_folder == old_name:
-                f['folder'] = new_name
-            elif file_folder and file_folder.startswith(old_prefix):
-                f['folder'] = new_name + file_folder[len(old_name):]
-        
-        await self.col.update_one({'id': int(user_id)}, {'$set': {'folders': folders, 'stored_files': files}})
-        
-        # 3. Update selected_folder if it was the renamed folder or a subfolder
-        selected = user.get('selected_folder')
-        if selected == old_name:
-            await self.col.update_one({'id': int(user_id)}, {'$set': {'selected_folder': new_name}})
-        elif selected and selected.startswith(old_prefix):
-            new_selected = new_name + selected[len(old_name):]
-            await self.col.update_one({'id': int(user_id)}, {'$set': {'selected_folder': new_selected}})
+        # 2. Files in the renamed folder or its subfolders, one filter per path
+        file_paths = {f.get('folder') for f in user.get('stored_files', [])}
+        for file_path in file_paths:
+            new_path = renamed(file_path)
+            if new_path is None:
+                continue
+            n = len(array_filters)
+            updates[f'stored_files.$[f{n}].folder'] = new_path
+            array_filters.append({f'f{n}.folder': file_path})
+        
+        # 3. selected_folder if it was the renamed folder or a subfolder
+        new_selected = renamed(user.get('selected_folder'))
+        if new_selected is not None:
+            updates['selected_folder'] = new_selected
         
+        if updates:
+            await self.col.update_one({'id': int(user_id)}, {'$set': updates}, array_filters=array_filters or None)
         self._cache.invalidate(user_id)
         return True
     
@@ -386,8 +477,13 @@ class Database:
         return user.get('selected_folder') if user else None
     
     async def save_file(self, user_id, file_id, file_name, folder=None, file_type='document'):
-        """Save file with folder information and file type"""
-        import datetime
+        """Save file with folder information and file type; returns its index in stored_files
+        
+        The write hands back the old array size in the same round trip, so
+        callers can build file_N links without reading the user again, and
+        tells whether the user already had this LOG_CHANNEL message, which
+        decides whether the message gains a reference.
+        """
         file_obj = {
             'file_id': str(file_id),
             'folder': folder,
@@ -396,11 +492,63 @@ class Database:
             'file_type': file_type,
             'protected': False
         }
-        await self.col.update_one(
+        files = {'$ifNull': ['$stored_files', []]}
+        before = await self.col.find_one_and_update(
             {'id': int(user_id)},
-            {'$addToSet': {'stored_files': file_obj}}
+            {'$addToSet': {'stored_files': file_obj}},
+            projection={'_id': 0, 'total': {'$size': files}, 'had': {'$in': [file_obj['file_id'], {'$ifNull': ['$stored_files.file_id', []]}]}},
+            return_document=ReturnDocument.BEFORE
         )
         self._cache.invalidate(user_id)
+        if before is None:
+            return None
+        # created_at makes every file_obj unique, so $addToSet always appends
+        total = before['total'] + 1
+        self._file_counts[int(user_id)] = (self.state_version(user_id), total)
+        if not before.get('had'):
+            await BLOBS.acquire([file_obj['file_id']])
+        index = self._search.get(user_id)
+        if index is not None:
+            index.add(file_obj['file_id'], file_name)
+        categories = self._categories.get(user_id)
+        if categories is not None:
+            categories.add(file_obj['file_id'], file_type)
+        return total - 1
+    
+    async def save_files(self, user_id, files, folder=None):
+        """save_file for a batch of (file_id, file_name, file_type) in one write; returns the first new index"""
+        now = datetime.datetime.now()
+        file_objs = [{
+            'file_id': str(file_id),
+            'folder': folder,
+            'created_at': now,
+            'file_name': file_name,
+            'file_type': file_type,
+            'protected': False
+        } for file_id, file_name, file_type in files]
+        if not file_objs:
+            return None
+        ids = list({f['file_id'] for f in file_objs})
+        before = await self.col.find_one_and_update(
+            {'id': int(user_id)},
+            {'$push': {'stored_files': {'$each': file_objs}}},
+            projection={'_id': 0, 'total': {'$size': {'$ifNull': ['$stored_files', []]}},
+                        'had': {'$setIntersection': [ids, {'$ifNull': ['$stored_files.file_id', []]}]}},
+            return_document=ReturnDocument.BEFORE
+        )
+        self._cache.invalidate(user_id)
+        if before is None:
+            return None
+        self._file_counts[int(user_id)] = (self.state_version(user_id), before['total'] + len(file_objs))
+        await BLOBS.acquire(set(ids) - set(before.get('had') or []))
+        index = self._search.get(user_id)
+        categories = self._categories.get(user_id)
+        for f in file_objs:
+            if index is not None:
+                index.add(f['file_id'], f['file_name'])
+            if categories is not None:
+                categories.add(f['file_id'], f['file_type'])
+        return before['total']
     
     async def toggle_file_protected(self, user_id, file_idx):
         """Toggle protected status for a file by index"""
@@ -418,11 +566,130 @@ class Database:
     
     async def get_files_by_folder(self, user_id, folder=None):
         """Get files in a specific folder (None = no folder)"""
-        user = await self._get_user_cached(user_id)
-        if not user:
-            return []
-        files = user.get('stored_files', [])
-        return [f for f in files if f.get('folder') == folder]
+        catalog = await self._catalog(user_id)
+        return catalog.rows(catalog.in_folder(folder))
+    
+    async def get_folder_files_page(self, user_id, folder, page, per_page=10):
+        """One page of the files directly in folder as ([(file_idx, file), ...], total)"""
+        catalog = await self._catalog(user_id)
+        indexes = catalog.in_folder(folder)
+        start = max(page, 0) * per_page
+        shown = indexes[start:start + per_page]
+        return list(zip(shown, catalog.rows(shown))), len(indexes)
+    
+    async def _category_index(self, user_id):
+        categories = self._categories.get(user_id)
+        if categories is None:
+            user = await self.col.find_one(
+                {'id': int(user_id)},
+                {'_id': 0, 'stored_files.file_id': 1, 'stored_files.file_type': 1}
+            )
+            categories = self._categories.put(user_id, CategoryIndex(user.get('stored_files', []) if user else []))
+        return categories
+    
+    async def get_category_counts(self, user_id):
+        """{file_type: number of stored files}"""
+        categories = await self._category_index(user_id)
+        return dict(categories.counts)
+    
+    async def get_category_file_ids(self, user_id, file_type):
+        """Stored file ids of one category, in stored order"""
+        categories = await self._category_index(user_id)
+        return categories.file_ids(file_type)
+    
+    async def _catalog(self, user_id):
+        """Columnar copy of stored_files, rebuilt after any write to the user"""
+        version = self.state_version(user_id)
+        catalog = self._catalogs.get(user_id, version)
+        if catalog is None:
+            user = await self.col.find_one({'id': int(user_id)}, {'_id': 0, 'stored_files': 1})
+            files = user.get('stored_files', []) if user else []
+            catalog = FileCatalog(files) if len(files) < 2000 else await offload(FileCatalog, files)
+            catalog = self._catalogs.put(user_id, version, catalog)
+        return catalog
+    
+    async def count_files(self, user_id):
+        """Number of stored files, counted by the server and cached per user version"""
+        version = self.state_version(user_id)
+        entry = self._file_counts.get(int(user_id))
+        if entry and entry[0] == version:
+            return entry[1]
+        result = await self.col.aggregate([
+            {'$match': {'id': int(user_id)}},
+            {'$project': {'_id': 0, 'total': {'$size': {'$ifNull': ['$stored_files', []]}}}}
+        ]).to_list(length=1)
+        total = result[0]['total'] if result else 0
+        self._file_counts[int(user_id)] = (version, total)
+        return total
+    
+    async def get_files_page(self, user_id, page, per_page=10, file_type=None):
+        """One page of stored files as ([(file_idx, file), ...], total)
+        
+        Only the requested page leaves the server: all files are sliced with
+        $slice, and a category is filtered server-side with each file's
+        index kept, since links are built from the index.
+        """
+        start = max(page, 0) * per_page
+        if file_type is None:
+            total = await self.count_files(user_id)
+            if start >= total:
+                return [], total
+            result = await self.col.aggregate([
+                {'$match': {'id': int(user_id)}},
+                {'$project': {'_id': 0, 'page': {'$slice': [{'$ifNull': ['$stored_files', []]}, start, per_page]}}}
+            ]).to_list(length=1)
+            files = result[0]['page'] if result else []
+            return [(start + i, f) for i, f in enumerate(files)], total
+        
+        files = {'$ifNull': ['$stored_files', []]}
+        result = await self.col.aggregate([
+            {'$match': {'id': int(user_id)}},
+            {'$project': {'_id': 0, 'matches': {'$filter': {
+                'input': {'$map': {
+                    'input': {'$range': [0, {'$size': files}]},
+                    'as': 'i',
+                    'in': {'idx': '$$i', 'file': {'$arrayElemAt': [files, '$$i']}}
+                }},
+                'as': 'm',
+                'cond': {'$eq': [{'$ifNull': ['$$m.file.file_type', 'document']}, file_type]}
+            }}}},
+            {'$project': {'total': {'$size': '$matches'}, 'page': {'$slice': ['$matches', start, per_page]}}}
+        ]).to_list(length=1)
+        if not result:
+            return [], 0
+        return [(m['idx'], m['file']) for m in result[0]['page']], result[0]['total']
+    
+    async def get_files_at(self, user_id, indexes):
+        """Stored files at the given positions, fetched server-side ({file_idx: file})"""
+        indexes = [int(i) for i in indexes]
+        if not indexes:
+            return {}
+        result = await self.col.aggregate([
+            {'$match': {'id': int(user_id)}},
+            {'$project': {'_id': 0, 'files': {'$map': {
+                'input': indexes,
+                'in': {'$arrayElemAt': [{'$ifNull': ['$stored_files', []]}, '$$this']}
+            }}}}
+        ]).to_list(length=1)
+        files = result[0]['files'] if result else []
+        return {idx: f for idx, f in zip(indexes, files) if f}
+    
+    async def search_files(self, user_id, query):
+        """[(file_idx, file_name)] whose names contain every word of query (as prefixes)
+        
+        The index is built from file ids and names only, the first time a
+        user searches, and kept up to date by save_file and delete_file.
+        """
+        index = self._search.get(user_id)
+        if index is None:
+            user = await self.col.find_one(
+                {'id': int(user_id)},
+                {'_id': 0, 'stored_files.file_id': 1, 'stored_files.file_name': 1}
+            )
+            # Tokenizing a large catalog is CPU work
+            index = await offload(FileSearchIndex, user.get('stored_files', []) if user else [])
+            index = self._search.put(user_id, index)
+        return index.search(query)
     
     async def move_file_to_folder(self, user_id, file_id, new_folder):
         """Move file to different folder"""
@@ -440,13 +707,36 @@ class Database:
         self._cache.invalidate(user_id)
         return True
     
-    async def delete_file(self, user_id, file_id):
-        """Delete file from storage"""
-        await self.col.update_one(
-            {'id': int(user_id)},
-            {'$pull': {'stored_files': {'file_id': str(file_id)}}}
+    async def delete_file(self, user_id, file_id, file_idx):
+        """Delete the stored file at file_idx, provided it still holds file_id; returns True if deleted
+        
+        Only that entry goes: the same file can be stored more than once,
+        and the LOG_CHANNEL message is released when the last copy is gone.
+        """
+        file_id, file_idx = str(file_id), int(file_idx)
+        before = await self.col.find_one_and_update(
+            {'id': int(user_id), f'stored_files.{file_idx}.file_id': file_id},
+            [{'$set': {'stored_files': {'$concatArrays': [
+                {'$slice': ['$stored_files', file_idx]},
+                {'$slice': ['$stored_files', file_idx + 1, {'$size': '$stored_files'}]}
+            ]}}}],
+            projection={'_id': 0, 'copies': {'$size': {'$filter': {
+                'input': '$stored_files', 'cond': {'$eq': ['$$this.file_id', file_id]}
+            }}}},
+            return_document=ReturnDocument.BEFORE
         )
         self._cache.invalidate(user_id)
+        if not before:
+            return False
+        if before.get('copies') == 1:
+            await BLOBS.release([file_id])
+        index = self._search.get(user_id)
+        if index is not None:
+            index.remove_at(file_idx)
+        categories = self._categories.get(user_id)
+        if categories is not None:
+            categories.remove(file_id)
+        return True
     
     async def update_file_folder(self, user_id, file_idx, new_folder):
         """Update folder for a file by index in stored_files array"""
@@ -546,16 +836,31 @@ class Database:
         if not files:
             return False, 0
         
-        await self.col.update_one(
+        before = await self.col.find_one_and_update(
             {'id': int(to_user_id)},
             {
                 '$addToSet': {
                     'stored_files': {'$each': files},
                     'folders': {'$each': folders}
                 }
-            }
+            },
+            projection={'_id': 0, 'stored_files.file_id': 1},
+            return_document=ReturnDocument.BEFORE
         )
         self._cache.invalidate(to_user_id)
+        if before is not None:
+            had = {f.get('file_id') for f in before.get('stored_files', [])}
+            await BLOBS.acquire({f.get('file_id') for f in files} - had)
+        # $addToSet may skip some of them; rebuild on the next search
+        self._search.drop(to_user_id)
+        categories = self._categories.get(to_user_id)
+        if categories is not None:
+            if any(f.get('file_id') in categories for f in files):
+                # Same skip problem, only possible for ids the user already has
+                self._categories.drop(to_user_id)
+            else:
+                for f in files:
+                    categories.add(f.get('file_id'), f.get('file_type'))
         return True, len(files)
     
     async def invalidate_backup_token(self, user_id):
@@ -571,17 +876,18 @@ class Database:
         self._cache.invalidate(user_id)
     
     async def set_folder_password(self, user_id, folder_name, password):
-        """Set password protection for a folder (stored in plain text, same as files)"""
+        """Set password protection for a folder (stored as a bcrypt hash)"""
         user = await self._get_user_cached(user_id)
         if not user:
             return False
         
+        password_hash = await offload(hash_password, password)
         folders = user.get('folders', [])
         for folder in folders:
             fname = folder.get('name', str(folder)) if isinstance(folder, dict) else str(folder)
             if fname == folder_name:
                 if isinstance(folder, dict):
-                    folder['password'] = password
+                    folder['password'] = password_hash
                 break
         
         await self.col.update_one({'id': int(user_id)}, {'$set': {'folders': folders}})
@@ -622,15 +928,15 @@ class Database:
         return None
     
     async def get_folder_password_plain(self, user_id, folder_name):
-        """Get plain text password for a folder (same as get_folder_password since stored in plain text)"""
+        """Get the stored folder password (a bcrypt hash unless set by an older version)"""
         return await self.get_folder_password(user_id, folder_name)
     
     async def verify_folder_password(self, user_id, folder_name, password):
-        """Verify password for a folder (plain text comparison, same as files)"""
+        """Verify password for a folder; the bcrypt check runs off the event loop"""
         stored_password = await self.get_folder_password(user_id, folder_name)
         if stored_password is None:
             return True
-        return password == stored_password
+        return await offload(check_password, password, stored_password)
     
     async def is_folder_password_protected(self, user_id, folder_name):
         """Check if a folder has password protection"""
@@ -714,7 +1020,7 @@ class Database:
     # ============ FILE PASSWORD PROTECTION ============
     
     async def set_file_password(self, user_id, file_idx, password):
-        """Set password protection for a file (stored in plain text, 2-8 chars)"""
+        """Set password protection for a file (2-8 chars, stored as a bcrypt hash)"""
         if len(password) < 2 or len(password) > 8:
             return False
         
@@ -724,7 +1030,7 @@ class Database:
         
         files = user.get('stored_files', [])
         if 0 <= file_idx < len(files):
-            files[file_idx]['password'] = password
+            files[file_idx]['password'] = await offload(hash_password, password)
             await self.col.update_one({'id': int(user_id)}, {'$set': {'stored_files': files}})
             self._cache.invalidate(user_id)
             return True
@@ -757,11 +1063,11 @@ class Database:
         return None
     
     async def verify_file_password(self, user_id, file_idx, password):
-        """Verify password for a file (plain text comparison)"""
+        """Verify password for a file; the bcrypt check runs off the event loop"""
         stored_password = await self.get_file_password(user_id, file_idx)
         if stored_password is None:
             return True
-        return password == stored_password
+        return await offload(check_password, password, stored_password)
     
     async def is_file_password_protected(self, user_id, file_idx):
         """Check if file has password protection"""
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from pyrogram.errors import FloodWait
+from pyrogram.raw import functions, types as raw_types
+from pyrogram.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
+from plugins.dbusers import db
+from config import DEST_FAILURE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+def get_size(size):
+    """Get size in readable format"""
+
+    units = ["Bytes", "KB", "MB", "GB", "TB", "PB", "EB"]
+    size = float(size)
+    i = 0
+    while size >= 1024.0 and i < len(units):
+        i += 1
+        size /= 1024.0
+    return "%.2f %s" % (size, units[i])
+
+
+def clean_file_name(file_name):
+    """Remove brackets, URLs and mentions from a filename"""
+    for c in ("[", "]", "(", ")"):
+        file_name = file_name.replace(c, "")
+    return ' '.join(x for x in file_name.split() if not x.startswith('http') and not x.startswith('@') and not x.startswith('www.'))
+
+
+def render_caption(template, compiled_filters, file_name, file_size, duration=None, original_caption=None):
+    """Fill a caption template (or keep the original caption), then apply filters"""
+    if not template:
+        # No custom caption → use original if available, otherwise empty
+        caption = original_caption or ""
+    else:
+        caption = template
+        caption = caption.replace("{filename}", file_name)
+        caption = caption.replace("{filesize}", file_size)
+        caption = caption.replace("{duration}", duration or "N/A")
+
+    if caption:
+        caption = compiled_filters.apply(caption)
+    return caption
+
+
+class DeliverySession:
+    """Snapshot of a user's delivery settings for one send.
+
+    Opened once at the start of a batch, folder or single-file send, so the
+    per-file work (filename cleanup, caption rendering, picking targets) is
+    pure CPU and never touches the database.
+    """
+
+    __slots__ = ('user_id', 'caption_template', 'filters', 'delivery_mode', 'destinations')
+
+    def __init__(self, user_id, caption_template, filters, delivery_mode, destinations):
+        self.user_id = user_id
+        self.caption_template = caption_template
+        self.filters = filters
+        self.delivery_mode = delivery_mode
+        self.destinations = destinations
+
+    @classmethod
+    async def open(cls, user_id):
+        caption_template = await db.get_caption(user_id)
+        compiled = await db.get_compiled_filters(user_id)
+        delivery_mode = await db.get_delivery_mode(user_id)
+        destinations = await db.get_destinations(user_id)
+        enabled = [d for d in destinations if d.get('enabled', True)]
+        return cls(user_id, caption_template, compiled, delivery_mode, enabled)
+
+    @property
+    def to_pm(self):
+        return self.delivery_mode != 'channel'
+
+    @property
+    def to_destinations(self):
+        return self.delivery_mode in ('channel', 'both') and bool(self.destinations)
+
+    def format_file_name(self, file_name):
+        return self.filters.apply(clean_file_name(file_name))
+
+    def build_caption(self, file_name, file_size, duration=None, original_caption=None):
+        return render_caption(self.caption_template, self.filters, file_name, file_size, duration, original_caption)
+
+    def media_caption(self, media, original_caption=None, filter_fallback=True):
+        """Caption for a media object: templated when it has a filename, else template or original"""
+        file_name = getattr(media, 'file_name', None)
+        if file_name:
+            size = get_size(media.file_size) if getattr(media, 'file_size', None) is not None else "Unknown"
+            return self.build_caption(self.format_file_name(file_name), size, original_caption=original_caption)
+        caption = self.caption_template or original_caption or ""
+        if caption and filter_fallback:
+            caption = self.filters.apply(caption)
+        return caption
+
+
+async def copy_many(client, chat_id, from_chat_id, message_ids, protect_content=False):
+    """Copy up to 100 messages with one messages.forwardMessages call.
+
+    drop_author makes them arrive as copies with their own captions and no
+    "Forwarded from" header, the same as Message.copy() without a caption.
+    Ids that no longer exist are skipped by Telegram. Returns the new
+    message id for each of message_ids, None where nothing was sent.
+    """
+    message_ids = list(message_ids)
+    random_ids = [client.rnd_id() for _ in message_ids]
+    updates = await client.invoke(functions.messages.ForwardMessages(
+        from_peer=await client.resolve_peer(from_chat_id),
+        id=message_ids,
+        random_id=random_ids,
+        to_peer=await client.resolve_peer(chat_id),
+        drop_author=True,
+        noforwards=protect_content or None,
+    ))
+    sent = {u.random_id: u.id for u in getattr(updates, 'updates', []) if isinstance(u, raw_types.UpdateMessageID)}
+    return [sent.get(random_id) for random_id in random_ids]
+
+
+ALBUM_SIZE = 10  # Telegram's limit per media group
+# Media that may share an album; photos and videos mix, documents and audio only with their own kind
+ALBUM_GROUPS = {'photo': 'visual', 'video': 'visual', 'document': 'document', 'audio': 'audio'}
+INPUT_MEDIA = {'photo': InputMediaPhoto, 'video': InputMediaVideo, 'document': InputMediaDocument, 'audio': InputMediaAudio}
+
+
+def pack_albums(items):
+    """Split [(message, caption)] into runs that can each go out as one media group.
+
+    Order is kept: a run ends at ALBUM_SIZE items or when the next message
+    can't join it, and media that can't be in an album at all (stickers,
+    animations, voice notes) form runs of one.
+    """
+    runs, run, run_group = [], [], None
+    for msg, caption in items:
+        group = ALBUM_GROUPS.get(msg.media.value)
+        if run and (group is None or group != run_group or len(run) == ALBUM_SIZE):
+            runs.append(run)
+            run = []
+        run.append((msg, caption))
+        run_group = group
+    if run:
+        runs.append(run)
+    return runs
+
+
+class AlbumFloodWait(FloodWait):
+    """FloodWait that stopped send_album after sent items of its run had gone out"""
+
+    def __init__(self, sent, value):
+        super().__init__(value)
+        self.sent = sent
+
+
+async def send_album(client, chat_id, run, protect_content=False, message_thread_id=None):
+    """Deliver one run from pack_albums; returns the number of files sent.
+
+    Several items go out with one send_media_group call, each keeping its
+    own caption. If Telegram rejects the album for anything but FloodWait
+    the items are copied one by one instead. A FloodWait is raised as
+    AlbumFloodWait, whose sent tells how many items already arrived, so a
+    retry can send only run[sent:].
+    """
+    extra = {'message_thread_id': message_thread_id} if message_thread_id else {}
+    if len(run) > 1:
+        media = []
+        for msg, caption in run:
+            kind = msg.media.value
+            media.append(INPUT_MEDIA[kind](getattr(msg, kind).file_id, caption=caption or ""))
+        try:
+            await client.send_media_group(chat_id, media, protect_content=protect_content, **extra)
+            return len(run)
+        except FloodWait as e:
+            raise AlbumFloodWait(0, e.value) from e
+        except Exception as e:
+            logger.warning(f"Album to {chat_id} rejected, copying one by one: {e}")
+    sent = 0
+    for msg, caption in run:
+        try:
+            await msg.copy(chat_id=chat_id, caption=caption if caption else None, protect_content=protect_content, **extra)
+        except FloodWait as e:
+            raise AlbumFloodWait(sent, e.value) from e
+        sent += 1
+    return sent
+
+
+DESTINATION_FAILURES = {}  # {(user_id, channel_id): consecutive failures}
+
+
+class FanOutResult:
+    """Per-destination outcome of one fan-out"""
+
+    def __init__(self):
+        self.sent = []
+        self.failed = {}
+        self.disabled = []
+
+    @property
+    def success_count(self):
+        return len(self.sent)
+
+
+async def _send_one(session, dest, send, result):
+    chat_id = dest['channel_id']
+    key = (session.user_id, chat_id)
+    for attempt in range(2):
+        # Pacing and FloodWait back-off for chat_id happen in the outbound governor
+        try:
+            await send(dest)
+            break
+        except FloodWait as e:
+            if attempt:
+                result.failed[chat_id] = e
+        except Exception as e:
+            result.failed[chat_id] = e
+            break
+    
+    if chat_id not in result.failed:
+        DESTINATION_FAILURES.pop(key, None)
+        result.sent.append(chat_id)
+        return
+    
+    logger.error(f"Error sending to destination {chat_id}: {result.failed[chat_id]}")
+    failures = DESTINATION_FAILURES[key] = DESTINATION_FAILURES.get(key, 0) + 1
+    if failures >= DEST_FAILURE_LIMIT:
+        DESTINATION_FAILURES.pop(key, None)
+        try:
+            await db.disable_destination(session.user_id, chat_id)
+            result.disabled.append(chat_id)
+            logger.warning(f"Disabled destination {chat_id} for user {session.user_id} after {failures} failures")
+        except Exception as e:
+            logger.error(f"Could not disable destination {chat_id}: {e}")
+
+
+async def fan_out(session, send):
+    """Send to every enabled destination of session concurrently.
+
+    send(dest) performs the actual copy for one destination. Sends are paced
+    per chat by the outbound governor, FloodWait gets one retry (which waits
+    out the penalty in the governor), and a destination that fails DEST_FAILURE_LIMIT times in
+    a row is disabled for the user.
+    """
+    result = FanOutResult()
+    if session.destinations:
+        await asyncio.gather(*(_send_one(session, dest, send, result) for dest in session.destinations))
+        if result.disabled:
+            disabled = set(result.disabled)
+            session.destinations = [d for d in session.destinations if d['channel_id'] not in disabled]
+    return result
+
+
+def disabled_notice(chat_ids):
+    """Text telling the user which destinations were switched off, or empty"""
+    if not chat_ids:
+        return ""
+    ids = ", ".join(f"<code>{chat_id}</code>" for chat_id in chat_ids)
+    return f"<b>⚠️ Disabled destination(s) {ids} after repeated send failures. Re-enable them in Settings.</b>"
@@ -5,7 +5,10 @@ from pyrogram.errors.exceptions.bad_request_400 import ChannelInvalid, UsernameI
 from config import ADMINS, LOG_CHANNEL, PUBLIC_FILE_STORE, WEBSITE_URL, WEBSITE_URL_MODE
 import os
 import json
-import base64
+from utils import encode_ref, REF_MESSAGE, REF_BATCH
+from core.bot.identity import bot_username
+from core.utils.progress import ProgressReporter
+from core.utils.blobs import BLOBS
 
 
 async def allowed(_, __, message):
@@ -19,13 +22,12 @@ async def allowed(_, __, message):
 @Client.on_message((filters.document | filters.video | filters.audio | filters.photo) & filters.private & filters.create(allowed))
 async def incoming_gen_link(bot, message):
     from plugins.dbusers import db
-    username = (await bot.get_me()).username
+    username = await bot_username(bot)
     file_type = message.media
-    post = await message.copy(LOG_CHANNEL, caption=None)
-    file_id = str(post.id)
-    string = 'file_'
-    string += file_id
-    outstr = base64.urlsafe_b64encode(string.encode("ascii")).decode().strip("=")
+    # Pinned: the link points at the LOG_CHANNEL message itself
+    post_id = await BLOBS.store(message, lambda: message.copy(LOG_CHANNEL, caption=None), pin=True)
+    file_id = str(post_id)
+    outstr = encode_ref(REF_MESSAGE, post_id)
     if WEBSITE_URL_MODE == True:
         share_link = f"{WEBSITE_URL}?file={outstr}"
     else:
@@ -47,17 +49,15 @@ async def incoming_gen_link(bot, message):
 async def gen_link_s(bot, message):
     try:
         from plugins.dbusers import db
-        username = (await bot.get_me()).username
+        username = await bot_username(bot)
         replied = message.reply_to_message
         if not replied:
             return await message.reply('Reply to a message to get a shareable link.')
 
         # Copy without captions
-        post = await replied.copy(LOG_CHANNEL, caption=None)
-        file_id = str(post.id)
-        string = f"file_"
-        string += file_id
-        outstr = base64.urlsafe_b64encode(string.encode("ascii")).decode().strip("=")
+        post_id = await BLOBS.store(replied, lambda: replied.copy(LOG_CHANNEL, caption=None), pin=True)
+        file_id = str(post_id)
+        outstr = encode_ref(REF_MESSAGE, post_id)
         if WEBSITE_URL_MODE == True:
             share_link = f"{WEBSITE_URL}?file={outstr}"
         else:
@@ -80,7 +80,7 @@ async def gen_link_s(bot, message):
 
 @Client.on_message(filters.command(['batch']) & filters.create(allowed))
 async def gen_link_batch(bot, message):
-    username = (await bot.get_me()).username
+    username = await bot_username(bot)
     if " " not in message.text:
         return await message.reply("Use correct format.\nExample /batch https://t.me/premium/10 https://t.me/premium/20.")
     links = message.text.strip().split(" ")
@@ -138,6 +138,7 @@ async def gen_link_batch(bot, message):
 
     FRMT = "**ɢᴇɴᴇʀᴀᴛɪɴɢ ʟɪɴᴋ...**\n**ᴛᴏᴛᴀʟ ᴍᴇssᴀɢᴇs:** {total}\n**ᴅᴏɴᴇ:** {current}\n**ʀᴇᴍᴀɪɴɪɴɢ:** {rem}\n**sᴛᴀᴛᴜs:** {sts}"
 
+    progress = ProgressReporter.for_message(sts)
     outlist = []
     og_msg = 0
     tot = 0
@@ -145,11 +146,7 @@ async def gen_link_batch(bot, message):
     try:
         async for msg in bot.get_chat_history(f_chat_id, limit=(l_msg_id - f_msg_id + 1), offset=f_msg_id - 1):
             tot += 1
-            if og_msg % 10 == 0:
-                try:
-                    await sts.edit(FRMT.format(total=l_msg_id-f_msg_id, current=tot, rem=((l_msg_id-f_msg_id) - tot), sts="Saving Messages"))
-                except:
-                    pass
+            await progress.update(FRMT.format(total=l_msg_id-f_msg_id, current=tot, rem=((l_msg_id-f_msg_id) - tot), sts="Saving Messages"))
             if msg.empty or msg.service:
                 continue
             file = {
@@ -161,11 +158,7 @@ async def gen_link_batch(bot, message):
     except:
         for msg_id in range(f_msg_id, l_msg_id + 1):
             tot += 1
-            if og_msg % 10 == 0:
-                try:
-                    await sts.edit(FRMT.format(total=l_msg_id-f_msg_id, current=tot, rem=((l_msg_id-f_msg_id) - tot), sts="Saving Messages"))
-                except:
-                    pass
+            await progress.update(FRMT.format(total=l_msg_id-f_msg_id, current=tot, rem=((l_msg_id-f_msg_id) - tot), sts="Saving Messages"))
             try:
                 msg = await bot.get_messages(f_chat_id, msg_id)
                 if msg and not msg.empty and not msg.service:
@@ -183,11 +176,9 @@ async def gen_link_batch(bot, message):
         json.dump(outlist, out)
     post = await bot.send_document(LOG_CHANNEL, f"batchmode_{message.from_user.id}.json", file_name="Batch.json", caption="⚠️ Batch Generated For Filestore.")
     os.remove(f"batchmode_{message.from_user.id}.json")
-    string = f"file_{post.id}"
-    encoded_id = base64.urlsafe_b64encode(string.encode("ascii")).decode().strip("=")
-    file_id = f"BATCH-{encoded_id}"
+    file_id = encode_ref(REF_BATCH, post.id)
     if WEBSITE_URL_MODE == True:
         share_link = f"{WEBSITE_URL}?file={file_id}"
     else:
         share_link = f"https://t.me/{username}?start={file_id}"
-    await sts.edit(f"<b>⭕ ʜᴇʀᴇ ɪs ʏᴏᴜʀ ʟɪɴᴋ:\n\nContains `{og_msg}` files.\n\n🔗 ʟɪɴᴋ :- {share_link}</b>")
+    await progress.flush(f"<b>⭕ ʜᴇʀᴇ ɪs ʏᴏᴜʀ ʟɪɴᴋ:\n\nContains `{og_msg}` files.\n\n🔗 ʟɪɴᴋ :- {share_link}</b>")
@@ -0,0 +1,164 @@
+import logging
+from pyrogram import Client
+from pyrogram.types import (
+    InlineQueryResultArticle,
+    InlineQueryResultCachedAnimation,
+    InlineQueryResultCachedAudio,
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedSticker,
+    InlineQueryResultCachedVideo,
+    InlineQueryResultCachedVoice,
+    InputTextMessageContent,
+)
+from plugins.dbusers import db
+from plugins.Folder import shared_file_ref
+from core.bot.identity import bot_username
+from core.utils.search import tokenize
+from core.utils.state import STATE
+from config import LOG_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+INLINE_PAGE_SIZE = 50  # Telegram's maximum per answer
+INLINE_CACHE_TIME = 30  # Seconds Telegram may reuse an answer for the same user and query
+INLINE_QUERIES_PER_USER = 8  # Recent queries whose results are kept for narrowing
+
+# {user_id: (state version, {query: [(file_idx, file_name), ...]})} - typing narrows a cached query
+INLINE_RESULTS = STATE.namespace("inline_results", 300, 20000)
+# {log message id: (media kind, file_id)} - file ids of stored media don't change
+INLINE_MEDIA = STATE.namespace("inline_media", 24 * 3600, 100000)
+
+
+def _matches(tokens, file_name):
+    name_tokens = tokenize(file_name)
+    return all(any(word.startswith(token) for word in name_tokens) for token in tokens)
+
+
+async def search_cached(user_id, text):
+    """Search results for text, narrowing a cached shorter query when the user is still typing"""
+    version = db.state_version(user_id)
+    cached = INLINE_RESULTS.get(user_id)
+    if cached is None or cached[0] != version:
+        # Files were added, removed or renamed since - start over
+        cached = INLINE_RESULTS[user_id] = (version, {})
+    cache = cached[1]
+    results = cache.get(text)
+    if results is not None:
+        return results
+
+    # Every match of "batm" is also a match of "bat", so filter those instead of searching again
+    previous = max((q for q in cache if q and text.startswith(q)), key=len, default=None)
+    if previous is not None:
+        tokens = tokenize(text)
+        results = [r for r in cache[previous] if _matches(tokens, r[1])]
+    else:
+        results = await db.search_files(user_id, text)
+
+    cache[text] = results
+    while len(cache) > INLINE_QUERIES_PER_USER:
+        cache.pop(next(iter(cache)))
+    return results
+
+
+async def media_ids(client, log_ids):
+    """(kind, file_id) per LOG_CHANNEL message id, fetching the unknown ones in one call"""
+    missing = [i for i in log_ids if i not in INLINE_MEDIA]
+    if missing:
+        try:
+            messages = await client.get_messages(LOG_CHANNEL, missing)
+        except Exception as e:
+            logger.error(f"Inline media lookup error: {e}")
+            messages = []
+        for msg in messages:
+            if msg and not msg.empty and msg.media:
+                kind = msg.media.value
+                media = getattr(msg, kind, None)
+                if media is not None and getattr(media, 'file_id', None):
+                    INLINE_MEDIA[msg.id] = (kind, media.file_id)
+    return {i: INLINE_MEDIA.get(i) for i in log_ids}
+
+
+async def folder_locked(user_id, folder, checked):
+    """True if folder or one of its parents has a password; checked caches answers per query"""
+    if not folder:
+        return False
+    parts = folder.split('/')
+    for i in range(len(parts)):
+        path = '/'.join(parts[:i + 1])
+        if path not in checked:
+            checked[path] = await db.is_folder_password_protected(user_id, path)
+        if checked[path]:
+            return True
+    return False
+
+
+def media_result(result_id, kind, file_id, title):
+    if kind == 'video':
+        return InlineQueryResultCachedVideo(file_id, id=result_id, title=title)
+    if kind == 'audio':
+        return InlineQueryResultCachedAudio(file_id, id=result_id)
+    if kind == 'photo':
+        return InlineQueryResultCachedPhoto(file_id, id=result_id, title=title)
+    if kind == 'animation':
+        return InlineQueryResultCachedAnimation(file_id, id=result_id, title=title)
+    if kind == 'sticker':
+        return InlineQueryResultCachedSticker(file_id, id=result_id)
+    if kind == 'voice':
+        return InlineQueryResultCachedVoice(file_id, id=result_id, title=title)
+    return InlineQueryResultCachedDocument(file_id, title=title, id=result_id)
+
+
+def link_result(result_id, title, link):
+    return InlineQueryResultArticle(
+        title=title,
+        input_message_content=InputTextMessageContent(f"<b>📄 {title}</b>\n\n🔗 {link}"),
+        id=result_id,
+        description="🔐 Protected - shares a link",
+    )
+
+
+@Client.on_inline_query()
+async def inline_file_picker(client, query):
+    """@bot words - pick one of your stored files and send it into any chat"""
+    user_id = query.from_user.id
+    text = query.query.strip()[:100]
+    if not text:
+        await query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True,
+                           switch_pm_text="Type to search your files", switch_pm_parameter="start")
+        return
+
+    try:
+        offset = int(query.offset or 0)
+    except ValueError:
+        offset = 0
+    matches = await search_cached(user_id, text)
+    page = matches[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(matches) else ""
+
+    files = await db.get_files_at(user_id, [idx for idx, _ in page])
+    log_ids = [int(f['file_id']) for f in files.values() if str(f.get('file_id', '')).isdigit()]
+    media = await media_ids(client, log_ids)
+    username = None
+    locked_folders = {}
+
+    results = []
+    for idx, _ in page:
+        file_obj = files.get(idx)
+        if not file_obj or not str(file_obj.get('file_id', '')).isdigit():
+            continue
+        title = file_obj.get('file_name') or 'File'
+        result_id = f"{idx}_{file_obj['file_id']}"
+        if (file_obj.get('password') or file_obj.get('protected')
+                or await folder_locked(user_id, file_obj.get('folder'), locked_folders)):
+            # Sending the media itself would skip the password / forwarding protection
+            if username is None:
+                username = await bot_username(client)
+            link = f"https://t.me/{username}?start={shared_file_ref(user_id, file_obj['file_id'])}"
+            results.append(link_result(result_id, title, link))
+            continue
+        found = media.get(int(file_obj['file_id']))
+        if found:
+            results.append(media_result(result_id, found[0], found[1], title))
+
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True, next_offset=next_offset)
@@ -1,18 +1,20 @@
 import logging
 from pyrogram import enums
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from plugins.dbusers import db
+from plugins.dbusers import db, is_password_hash
 from plugins.rawapi import edit_message_text_raw
-from utils import b64_encode, b64_decode
-from config import LOG_CHANNEL
+from utils import b64_encode, b64_decode, encode_ref, REF_FILE
+from core.bot.identity import bot_username
+from core.utils.state import STATE
+from config import LOG_CHANNEL, CONVERSATION_TTL, CONVERSATION_MAX_USERS, FOLDER_ACCESS_TTL
 
 logger = logging.getLogger(__name__)
 
-CAPTION_INPUT_MODE = {}
-VERIFIED_FOLDER_ACCESS = {}
-PASSWORD_ATTEMPTS = {}
-PASSWORD_PROMPT_MESSAGES = {}
-PASSWORD_RESPONSE_MESSAGES = {}
+CAPTION_INPUT_MODE = STATE.namespace("input_mode", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
+VERIFIED_FOLDER_ACCESS = STATE.namespace("folder_access", FOLDER_ACCESS_TTL, CONVERSATION_MAX_USERS)
+PASSWORD_ATTEMPTS = STATE.namespace("password_attempts", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
+PASSWORD_PROMPT_MESSAGES = STATE.namespace("password_prompts", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
+PASSWORD_RESPONSE_MESSAGES = STATE.namespace("password_responses", CONVERSATION_TTL, CONVERSATION_MAX_USERS)
 
 
 def build_password_buttons(item_type, identifier, is_protected):
@@ -62,26 +64,29 @@ async def handle_set_password_callback(client, query, item_type, idx):
             await query.answer()
 
 
+def password_alert(stored_password, missing="No password set"):
+    """Alert text for a View Password button"""
+    if not stored_password:
+        return missing
+    if is_password_hash(stored_password):
+        return "🔒 Passwords are stored hashed and can't be shown. Remove and re-set the password to change it."
+    return f"🔑 Password: {stored_password}"
+
+
 async def handle_view_password_callback(query, item_type, idx):
     """Handle view_password_ callback for both files and folders"""
     user_id = query.from_user.id
     
     if item_type == 'file':
         password = await db.get_file_password(user_id, idx)
-        if password:
-            await query.answer(f"🔑 Password: {password}", show_alert=True)
-        else:
-            await query.answer("No password set", show_alert=True)
+        await query.answer(password_alert(password), show_alert=True)
     elif item_type == 'folder':
         folders = await db.get_folders(user_id)
         if 0 <= idx < len(folders):
             f = folders[idx]
             folder_name = f.get('name', str(f)) if isinstance(f, dict) else str(f)
             password = await db.get_folder_password_plain(user_id, folder_name)
-            if password:
-                await query.answer(f"🔑 Password: {password}", show_alert=True)
-            else:
-                await query.answer("❌ Password was set before this feature. Please remove and re-set.", show_alert=True)
+            await query.answer(password_alert(password, "❌ No password set"), show_alert=True)
         else:
             await query.answer("❌ Item not found", show_alert=True)
 
@@ -137,13 +142,12 @@ async def handle_remove_password_callback(client, query, item_type, idx, show_fo
             stored_files = user.get('stored_files', []) if user else []
             if 0 <= idx < len(stored_files):
                 file_name = stored_files[idx].get('file_name', 'File')
-                username = (await client.get_me()).username
+                username = await bot_username(client)
                 file_token = stored_files[idx].get('access_token')
                 if file_token:
-                    string = f'ft_{file_token}'
+                    encoded = b64_encode(f'ft_{file_token}')
                 else:
-                    string = f'file_{idx}'
-                encoded = b64_encode(string)
+                    encoded = encode_ref(REF_FILE, idx)
                 link = f"https://t.me/{username}?start={encoded}"
                 
                 inline_buttons = [
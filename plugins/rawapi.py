@@ -1,12 +1,31 @@
 import aiohttp
 import logging
 from config import BOT_TOKEN
+from core.bot import StreamBot
+from core.utils.metrics import RPC_SECONDS, timer
+from core.utils.governor import GOVERNOR
 
 logger = logging.getLogger(__name__)
 
+async def _post(method, payload):
+    """POST one Bot API call, paced by the outbound governor"""
+    chat_id = payload["chat_id"]
+    is_group = str(chat_id).startswith("-")
+    await GOVERNOR.acquire(StreamBot.name, chat_id, is_group)
+    api_url = f"https://api.telegram.org/bot{BOT_TOKEN}/{method}"
+    async with aiohttp.ClientSession() as session:
+        with timer(RPC_SECONDS, method):
+            async with session.post(api_url, json=payload) as resp:
+                result = await resp.json()
+    retry_after = (result.get("parameters") or {}).get("retry_after")
+    if retry_after:
+        GOVERNOR.flood_wait(StreamBot.name, chat_id, is_group, retry_after)
+    elif result.get("ok"):
+        GOVERNOR.success(StreamBot.name, chat_id, is_group)
+    return result
+
 async def send_message_raw(chat_id, text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=None):
     """Send a message using raw Telegram Bot API (supports copy_text buttons)"""
-    api_url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": text,
@@ -16,16 +35,13 @@ async def send_message_raw(chat_id, text, parse_mode="HTML", disable_web_page_pr
     if reply_markup:
         payload["reply_markup"] = {"inline_keyboard": reply_markup}
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as resp:
-            result = await resp.json()
-            if not result.get("ok"):
-                logger.error(f"Send message error: {result.get('description')}")
-            return result
+    result = await _post("sendMessage", payload)
+    if not result.get("ok"):
+        logger.error(f"Send message error: {result.get('description')}")
+    return result
 
 async def edit_message_text_raw(chat_id, message_id, text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=None):
     """Edit message text using raw Telegram Bot API (supports copy_text buttons)"""
-    api_url = f"https://api.telegram.org/bot{BOT_TOKEN}/editMessageText"
     payload = {
         "chat_id": chat_id,
         "message_id": message_id,
@@ -36,16 +52,13 @@ async def edit_message_text_raw(chat_id, message_id, text, parse_mode="HTML", di
     if reply_markup:
         payload["reply_markup"] = {"inline_keyboard": reply_markup}
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as resp:
-            result = await resp.json()
-            if not result.get("ok"):
-                logger.error(f"Edit message text error: {result.get('description')}")
-            return result
+    result = await _post("editMessageText", payload)
+    if not result.get("ok"):
+        logger.error(f"Edit message text error: {result.get('description')}")
+    return result
 
 async def edit_message_caption_raw(chat_id, message_id, caption, parse_mode="HTML", reply_markup=None):
     """Edit message caption using raw Telegram Bot API (supports copy_text buttons)"""
-    api_url = f"https://api.telegram.org/bot{BOT_TOKEN}/editMessageCaption"
     payload = {
         "chat_id": chat_id,
         "message_id": message_id,
@@ -55,28 +68,23 @@ async def edit_message_caption_raw(chat_id, message_id, caption, parse_mode="HTM
     if reply_markup:
         payload["reply_markup"] = {"inline_keyboard": reply_markup}
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as resp:
-            result = await resp.json()
-            if not result.get("ok"):
-                logger.error(f"Edit message caption error: {result.get('description')}")
-            return result
+    result = await _post("editMessageCaption", payload)
+    if not result.get("ok"):
+        logger.error(f"Edit message caption error: {result.get('description')}")
+    return result
 
 async def edit_message_reply_markup_raw(chat_id, message_id, reply_markup):
     """Edit message reply markup using raw Telegram Bot API (supports copy_text buttons)"""
-    api_url = f"https://api.telegram.org/bot{BOT_TOKEN}/editMessageReplyMarkup"
     payload = {
         "chat_id": chat_id,
         "message_id": message_id,
         "reply_markup": {"inline_keyboard": reply_markup}
     }
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as resp:
-            result = await resp.json()
-            if not result.get("ok"):
-                logger.error(f"Edit message reply markup error: {result.get('description')}")
-            return result
+    result = await _post("editMessageReplyMarkup", payload)
+    if not result.get("ok"):
+        logger.error(f"Edit message reply markup error: {result.get('description')}")
+    return result
 
 async def edit_message_with_fallback(chat_id, message_id, text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=None):
     """Edit message text with fallback to caption for media messages"""
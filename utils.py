@@ -1,10 +1,17 @@
 
-import logging, asyncio, os, re, random, pytz, aiohttp, requests, string, json, http.client, base64
-from datetime import date, datetime
+import logging, asyncio, os, re, aiohttp, requests, json, http.client, base64, hmac, hashlib
+from config import LINK_SECRET
+from core.utils.verification import VERIFICATION
 
 logger = logging.getLogger(__name__)
 
 
+def read_json(path):
+    """Load a JSON file; large batch manifests go through core.utils.offload"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
 def b64_encode(data: str, encoding: str = "ascii") -> str:
     """Encode a string to URL-safe base64 without padding."""
     return base64.urlsafe_b64encode(data.encode(encoding)).decode().strip("=")
@@ -14,52 +21,106 @@ def b64_decode(data: str, encoding: str = "ascii") -> str:
     """Decode a URL-safe base64 string (handles missing padding)."""
     padded = data + "=" * (-len(data) % 4)
     return base64.urlsafe_b64decode(padded).decode(encoding)
+
+
+# ============ COMPACT REFERENCE CODEC ============
+# Callback data and deep links reference folders and files by numeric id in
+# a small versioned binary form: one header byte (version, high bit set when
+# signed), one kind byte, unsigned varints, then a truncated HMAC for signed
+# refs. Legacy base64 payloads decode to ASCII text, so the header byte never
+# collides with them.
+
+REF_VERSION = 1
+REF_SIGNED = 0x80
+REF_MAC_SIZE = 6
+
+REF_FOLDER = 1          # (folder_idx, page) - own folder
+REF_FILE = 2            # (file_idx,) - own stored file
+REF_SHARED_FOLDER = 3   # (owner_id, folder_key, page) - signed
+REF_SHARED_FILE = 4     # (owner_id, file_id) - signed
+REF_MESSAGE = 5         # (log_msg_id,) - signed
+REF_BATCH = 6           # (batch_msg_id,) - signed
+
+SIGNED_REF_KINDS = {REF_SHARED_FOLDER, REF_SHARED_FILE, REF_MESSAGE, REF_BATCH}
+
+
+def _ref_mac(payload: bytes) -> bytes:
+    return hmac.new(LINK_SECRET.encode(), payload, hashlib.sha256).digest()[:REF_MAC_SIZE]
+
+
+def encode_ref(kind: int, *values: int) -> str:
+    """Pack a kind and non-negative ints into a compact URL-safe token."""
+    signed = kind in SIGNED_REF_KINDS
+    out = bytearray((REF_VERSION | (REF_SIGNED if signed else 0), kind))
+    for value in values:
+        value = int(value)
+        if value < 0:
+            raise ValueError("ref values must be non-negative")
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if value:
+                out.append(byte | 0x80)
+            else:
+                out.append(byte)
+                break
+    if signed:
+        out += _ref_mac(bytes(out))
+    return base64.urlsafe_b64encode(bytes(out)).decode().strip("=")
+
+
+def decode_ref(data: str):
+    """Unpack a token from encode_ref.
+
+    Returns (kind, values) or None when data is not a valid ref, has an
+    unknown version, or is a kind that must be signed and the signature is
+    missing or wrong.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (ValueError, TypeError):
+        return None
+    if len(raw) < 2 or raw[0] & 0x7F != REF_VERSION:
+        return None
+    is_signed = bool(raw[0] & REF_SIGNED)
+    if is_signed != (raw[1] in SIGNED_REF_KINDS):
+        return None
+    if is_signed:
+        if len(raw) < 2 + REF_MAC_SIZE:
+            return None
+        raw, mac = raw[:-REF_MAC_SIZE], raw[-REF_MAC_SIZE:]
+        if not hmac.compare_digest(mac, _ref_mac(raw)):
+            return None
+    values = []
+    value = shift = 0
+    for byte in raw[2:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    if shift:
+        return None
+    return raw[1], values
+
+
 logger.setLevel(logging.INFO)
-TOKENS = {}
-VERIFIED = {}
 
 async def get_verify_shorted_link(link):
     return link
 
-async def check_token(bot, userid, token):
-    user = await bot.get_users(userid)
-    if user.id in TOKENS.keys():
-        TKN = TOKENS[user.id]
-        if token in TKN.keys():
-            is_used = TKN[token]
-            if is_used == True:
-                return False
-            else:
-                return True
-    else:
-        return False
-
-async def get_token(bot, userid, link):
-    user = await bot.get_users(userid)
-    token = ''.join(random.choices(string.ascii_letters + string.digits, k=7))
-    TOKENS[user.id] = {token: False}
-    link = f"{link}verify-{user.id}-{token}"
+async def check_token(userid, token):
+    return await VERIFICATION.token_valid(userid, token)
+
+async def get_token(userid, link):
+    token = await VERIFICATION.new_token(userid)
+    link = f"{link}verify-{int(userid)}-{token}"
     shortened_verify_url = await get_verify_shorted_link(link)
     return str(shortened_verify_url)
 
-async def verify_user(bot, userid, token):
-    user = await bot.get_users(userid)
-    TOKENS[user.id] = {token: True}
-    tz = pytz.timezone('Asia/Kolkata')
-    today = date.today()
-    VERIFIED[user.id] = str(today)
-
-async def check_verification(bot, userid):
-    user = await bot.get_users(userid)
-    tz = pytz.timezone('Asia/Kolkata')
-    today = date.today()
-    if user.id in VERIFIED.keys():
-        EXP = VERIFIED[user.id]
-        years, month, day = EXP.split('-')
-        comp = date(int(years), int(month), int(day))
-        if comp<today:
-            return False
-        else:
-            return True
-    else:
-        return False
+async def verify_user(userid, token):
+    return await VERIFICATION.redeem(userid, token)
+
+async def check_verification(userid):
+    return await VERIFICATION.is_verified(userid)